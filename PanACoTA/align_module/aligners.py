@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# ###############################################################################
+# This file is part of PanACOTA.                                                #
+#                                                                               #
+# Authors: Amandine Perrin                                                      #
+# Copyright © 2018-2020 Institut Pasteur (Paris).                               #
+# See the COPYRIGHT file for details.                                           #
+#                                                                               #
+# PanACOTA is a software providing tools for large scale bacterial comparative  #
+# genomics. From a set of complete and/or draft genomes, you can:               #
+#    -  Do a quality control of your strains, to eliminate poor quality         #
+# genomes, which would not give any information for the comparative study       #
+#    -  Uniformly annotate all genomes                                          #
+#    -  Do a Pan-genome                                                         #
+#    -  Do a Core or Persistent genome                                          #
+#    -  Align all Core/Persistent families                                      #
+#    -  Infer a phylogenetic tree from the Core/Persistent families             #
+#                                                                               #
+# PanACOTA is free software: you can redistribute it and/or modify it under the #
+# terms of the Affero GNU General Public License as published by the Free       #
+# Software Foundation, either version 3 of the License, or (at your option)     #
+# any later version.                                                            #
+#                                                                               #
+# PanACOTA is distributed in the hope that it will be useful, but WITHOUT ANY   #
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS     #
+# FOR A PARTICULAR PURPOSE. See the Affero GNU General Public License           #
+# for more details.                                                             #
+#                                                                               #
+# You should have received a copy of the Affero GNU General Public License      #
+# along with PanACOTA (COPYING file).                                           #
+# If not, see <https://www.gnu.org/licenses/>.                                  #
+# ###############################################################################
+
+
+"""
+Software which can be used to align the proteins of each family.
+
+Each aligner is described by an ``Aligner`` record, with:
+
+- executable: the executable which must be installed
+- name: name of the software, used in logs
+- identity: program and options which change the alignment (used as cache key, so that
+  alignments from different aligners are not mixed)
+- cmd: a function giving the command aligning a fasta file: ``cmd(prt_file, out_file, threads)``
+  returns the command line, and True if the alignment is written to stdout (False if it is
+  written to out_file by the aligner)
+
+@author: GEM, Institut Pasteur
+"""
+
+import collections
+
+Aligner = collections.namedtuple("Aligner", ["executable", "name", "identity", "cmd"])
+
+
+def mafft_cmd(prt_file, out_file, threads=1):
+    """
+    mafft with automatic choice of the strategy, according to the size of the family
+    """
+    thread_opt = f" --thread {threads}" if threads > 1 else ""
+    return f"mafft --auto{thread_opt} {prt_file}", True
+
+
+def mafft_fft_cmd(prt_file, out_file, threads=1):
+    """
+    mafft FFT-NS-1: progressive alignment with a single guide tree, and no refinement.
+    Much faster than ``--auto`` on large families, less accurate.
+    """
+    thread_opt = f" --thread {threads}" if threads > 1 else ""
+    return f"mafft --retree 1 --maxiterate 0{thread_opt} {prt_file}", True
+
+
+def muscle_cmd(prt_file, out_file, threads=1):
+    """
+    muscle v5 with the Super5 algorithm, for large families
+    """
+    return f"muscle -super5 {prt_file} -output {out_file} -threads {threads}", False
+
+
+def famsa_cmd(prt_file, out_file, threads=1):
+    """
+    FAMSA
+    """
+    return f"famsa -t {threads} {prt_file} {out_file}", False
+
+
+def clustalo_cmd(prt_file, out_file, threads=1):
+    """
+    Clustal Omega, with output in fasta format
+    """
+    return (f"clustalo -i {prt_file} -o {out_file} --outfmt=fasta --threads={threads} "
+            "--force"), False
+
+
+# {aligner: Aligner}
+ALIGNERS = {"mafft": Aligner(executable="mafft", name="Mafft", identity="mafft --auto",
+                             cmd=mafft_cmd),
+            "mafft-fft": Aligner(executable="mafft", name="Mafft",
+                                 identity="mafft --retree 1 --maxiterate 0", cmd=mafft_fft_cmd),
+            "muscle": Aligner(executable="muscle", name="Muscle", identity="muscle -super5",
+                              cmd=muscle_cmd),
+            "famsa": Aligner(executable="famsa", name="FAMSA", identity="famsa", cmd=famsa_cmd),
+            "clustalo": Aligner(executable="clustalo", name="Clustal Omega", identity="clustalo",
+                                cmd=clustalo_cmd),
+            }
+
+
+def get_executable(aligner):
+    """
+    Get the executable which must be installed to use the given aligner
+
+    Parameters
+    ----------
+    aligner : str
+        name of aligner (key of ALIGNERS)
+
+    Returns
+    -------
+    str
+        name of executable
+    """
+    return ALIGNERS[aligner].executable
+
+
+def get_name(aligner):
+    """
+    Get the name of the software, as written in logs
+
+    Parameters
+    ----------
+    aligner : str
+        name of aligner (key of ALIGNERS)
+
+    Returns
+    -------
+    str
+        name of software
+    """
+    return ALIGNERS[aligner].name
+
+
+def get_identity(aligner):
+    """
+    Get the program and options which change the alignment made by the given aligner
+
+    Parameters
+    ----------
+    aligner : str
+        name of aligner (key of ALIGNERS)
+
+    Returns
+    -------
+    str
+        identity of aligner
+    """
+    return ALIGNERS[aligner].identity
+
+
+def get_command(aligner, prt_file, out_file, threads=1):
+    """
+    Get the command aligning the proteins of prt_file with the given aligner
+
+    Parameters
+    ----------
+    aligner : str
+        name of aligner (key of ALIGNERS)
+    prt_file : str
+        path to fasta file with the proteins to align
+    out_file : str
+        path to the file which will contain the alignment
+    threads : int
+        number of threads used by the aligner
+
+    Returns
+    -------
+    tuple
+        (command, to_stdout) with to_stdout True if the aligner writes the alignment to
+        stdout, False if it writes it to out_file
+    """
+    return ALIGNERS[aligner].cmd(prt_file, out_file, threads)
@@ -45,18 +45,36 @@ March 2017
 """
 
 import os
+import re
 import sys
+import glob
+import time
 import logging
 import multiprocessing
 import progressbar
+import queue
 import threading
+import collections
 
 from PanACoTA import utils
+from PanACoTA.align_module import aln_cache
+from PanACoTA.align_module import aligners
 
 main_logger = logging.getLogger("align.alignment")
 
+# Runs of gaps or of amino acids in an aligned protein
+GAP_RUNS = re.compile(rb"-+|[^-]+")
 
-def align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads):
+# Index of the protein alignments of a previous run, in each process: (prev_prefix,
+# {protein name: previous family number}), set by init_previous
+_PREV_FAMILIES = (None, {})
+# {num_fam: number of proteins added with mafft --add} for families of this process whose
+# alignment was taken from the previous run
+_ADDED = {}
+
+
+def align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads, cache_dir=None,
+                       prev_prefix=None, batch_residues=None, aligner="mafft"):
     """
     For each family:
 
@@ -79,6 +97,20 @@ def align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads):
         True if nothing must be written in stdout/stderr, False otherwise
     threads : int
         max number of threads that can be used by mafft
+    cache_dir : str or None
+        path to directory where protein alignments are cached (see ``aln_cache``), or None
+        to not use any cache
+    prev_prefix : str or None
+        path to ``aldir/<name of dataset>`` of a previous run. If given, the proteins of each
+        family which were not in the previous alignment of its proteins (whatever its family
+        number in the previous run) are added to it (``mafft --add``) instead of re-aligning
+        the whole family.
+    batch_residues : int or None
+        When running on several threads, small families are grouped into batches of at least
+        this number of residues (estimated by ``get_family_cost``), each batch being aligned by 1
+        process. None to give each family to a process separately.
+    aligner : str
+        software used to align proteins (see ``aligners.ALIGNERS``)
 
     Returns
     -------
@@ -97,45 +129,84 @@ def align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads):
                    ]
         bar = progressbar.ProgressBar(widgets=widgets, max_value=nbfam,
                                       term_width=79).start()
-    final = []
-    if threads == 1:
-        update_bar = 1
-        for num_fam in all_fams:
-            f = handle_family_1thread((prefix, num_fam, ngenomes))
-            final.append(f)
-            bar.update(update_bar)
-            update_bar+=1
+    # Families already done and validated in a previous run are not checked again
+    journal = f"{prefix}-align.journal"
+    done_fams = get_done_families(journal, prefix, all_fams)
+    if done_fams:
+        main_logger.info(f"{len(done_fams)} families already aligned in a previous run "
+                         f"(according to {journal}): they are not checked again.")
+    todo_fams = [num_fam for num_fam in all_fams if num_fam not in done_fams]
+    # Start with the largest families, so that they do not run alone at the end. Cost is
+    # estimated from file sizes, without reading the families
+    costs = {num_fam: get_family_cost(f"{prefix}-current.{num_fam}.prt")
+             for num_fam in todo_fams}
+    sorted_fams = sorted(todo_fams, key=lambda num_fam: costs[num_fam], reverse=True)
+    mafft_threads = {num_fam: 1 for num_fam in todo_fams}
+    timings = []
+    update_bar = len(done_fams)
+    if not quiet:
+        bar.update(update_bar)
+    if prev_prefix:
+        init_previous(prev_prefix, get_previous_families(prev_prefix))
+    with open(journal, "a") as journalf:
+        if threads == 1:
+            for num_fam in sorted_fams:
+                timing = time_family((prefix, num_fam, ngenomes, None, 1, cache_dir,
+                                      prev_prefix, aligner))
+                timings.append(timing)
+                write_journal(journalf, prefix, *timing[:2])
+                update_bar += 1
+                if not quiet:
+                    bar.update(update_bar)
 
-    else:
-        pool = multiprocessing.Pool(threads)
+        else:
+            main_logger.log(utils.detail_lvl(), f"Aligning families with {threads} processes")
+            pool = multiprocessing.Pool(threads, initializer=init_previous,
+                                        initargs=_PREV_FAMILIES)
 
-        # Create a Queue to put logs from processes, and handle them after from a single thread
-        m = multiprocessing.Manager()
-        q = m.Queue()
-        # arguments : (gpath, cores_prokka, name, force, nbcont, q) for each genome
-        arguments = [(prefix, num_fam, ngenomes, q) for num_fam in all_fams]
-        try:
-            final = pool.map_async(handle_family, arguments, chunksize=1)
-            pool.close()
-            # Listen for logs in processes
-            lp = threading.Thread(target=utils.logger_thread, args=(q,))
-            lp.start()
-            if not quiet:
-                while True:
-                    if final.ready():
-                        break
-                    remaining = final._number_left
-                    bar.update(nbfam - remaining)
-                bar.finish()
-            pool.join()
-            q.put(None)
-            lp.join()
-            final = final.get()
-        # If an error occurs (or user kills with keybord), terminate pool and exit
-        except Exception as excp:  # pragma: no cover
-            pool.terminate()
-            main_logger.error(excp)
-            sys.exit(1)
+            # Create a Queue to put logs from processes, and handle them after from a single thread
+            m = multiprocessing.Manager()
+            q = m.Queue()
+            # arguments : (prefix, [(num_fam, mafft_threads)], ngenomes, q, cache_dir,
+            # prev_prefix, aligner) for each batch of families. The number of threads is only
+            # known when the batch is started
+            batches = make_batches(sorted_fams, costs, batch_residues)
+
+            def get_args(batch, nb_threads):
+                return (prefix, [(num_fam, nb_threads) for num_fam in batch], ngenomes, q,
+                        cache_dir, prev_prefix, aligner)
+
+            try:
+                # Listen for logs in processes
+                lp = threading.Thread(target=utils.logger_thread, args=(q,))
+                lp.start()
+                # Journal each family as soon as it is done, so that a crash does not lose it
+                for nb_threads, batch_timings in run_batches(pool, align_batch, batches, costs,
+                                                             threads, get_args):
+                    for timing in batch_timings:
+                        timings.append(timing)
+                        mafft_threads[timing[0]] = nb_threads
+                        write_journal(journalf, prefix, *timing[:2])
+                    update_bar += len(batch_timings)
+                    if not quiet:
+                        bar.update(update_bar)
+                pool.close()
+                pool.join()
+                q.put(None)
+                lp.join()
+            # If an error occurs (or user kills with keybord), terminate pool and exit
+            except Exception as excp:  # pragma: no cover
+                pool.terminate()
+                main_logger.error(excp)
+                sys.exit(1)
+    if not quiet:
+        bar.finish()
+    final = [timing[1] for timing in timings] + ["OK"] * len(done_fams)
+    write_timings(f"{prefix}-align-times.tsv", timings, costs, mafft_threads)
+    if prev_prefix:
+        added = [timing[3] for timing in timings if timing[3] is not None]
+        main_logger.info(f"{len(added)} families taken from alignments of the previous run, "
+                         f"{sum(1 for nb in added if nb)} of them completed with mafft --add")
     # We re-aligned (or added missing genomes) at least one family 
     # -> remove concatenated files and groupby files (if they exist)
     if set(final) != {"OK"}:
@@ -153,6 +224,425 @@ def align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads):
     return False not in final
 
 
+def get_previous_families(prev_prefix):
+    """
+    Index the protein alignments of a previous run, to find the previous alignment of each
+    family from its proteins: families may have been renumbered since the previous run.
+
+    Parameters
+    ----------
+    prev_prefix : str
+        path to ``aldir/<name of dataset>`` of the previous run
+
+    Returns
+    -------
+    dict
+        {protein name (bytes): previous family number (str)} for each protein aligned in the
+        previous run (missing genomes added to alignments are ignored)
+    """
+    prev_families = {}
+    start = len(prev_prefix) + len("-mafft-align.")
+    for prev_file in glob.glob(f"{glob.escape(prev_prefix)}-mafft-align.*.aln"):
+        prev_fam = prev_file[start:-len(".aln")]
+        if not prev_fam.isdigit():
+            continue
+        for name, row in read_fasta_records(prev_file):
+            if row.replace(b"-", b""):
+                prev_families[name] = prev_fam
+    main_logger.log(utils.detail_lvl(), f"{len(prev_families)} proteins found in alignments "
+                                        f"of {prev_prefix}")
+    return prev_families
+
+
+def init_previous(prev_prefix, prev_families):
+    """
+    Keep the index of the previous run in the current process (initializer of the pool
+    aligning families)
+
+    Parameters
+    ----------
+    prev_prefix : str or None
+        path to ``aldir/<name of dataset>`` of the previous run
+    prev_families : dict
+        {protein name: previous family number}, as returned by ``get_previous_families``
+    """
+    global _PREV_FAMILIES
+    _PREV_FAMILIES = (prev_prefix, prev_families)
+
+
+def get_previous_file(prev_prefix, prt_file):
+    """
+    Find the alignment of a previous run containing the proteins of a family: the previous
+    family containing most of its proteins (the smallest family number if several ones
+    contain as many proteins).
+
+    Parameters
+    ----------
+    prev_prefix : str
+        path to ``aldir/<name of dataset>`` of the previous run
+    prt_file : str
+        path to file containing all proteins extracted for the family
+
+    Returns
+    -------
+    str or None
+        path to the previous protein alignment, or None if no protein of the family was
+        aligned in the previous run
+    """
+    if _PREV_FAMILIES[0] != prev_prefix:
+        init_previous(prev_prefix, get_previous_families(prev_prefix))
+    prev_families = _PREV_FAMILIES[1]
+    counts = collections.Counter()
+    with open(prt_file, "rb") as prtf:
+        for line in prtf:
+            if line.startswith(b">"):
+                words = line[1:].split(maxsplit=1)
+                if words and words[0] in prev_families:
+                    counts[prev_families[words[0]]] += 1
+    if not counts:
+        return None
+    prev_fam = min(counts, key=lambda fam: (-counts[fam], int(fam)))
+    return f"{prev_prefix}-mafft-align.{prev_fam}.aln"
+
+
+def get_family_files(prefix, num_fam):
+    """
+    Get all files of a family: extractions, list of missing genomes and alignments
+
+    Parameters
+    ----------
+    prefix : str
+        path to ``aldir/<name of dataset>``
+    num_fam : int or str
+        family number
+
+    Returns
+    -------
+    list
+        [prt file, gen file, miss file, mafft file, btr file]
+    """
+    return [f"{prefix}-current.{num_fam}.prt", f"{prefix}-current.{num_fam}.gen",
+            f"{prefix}-current.{num_fam}.miss.lst", f"{prefix}-mafft-align.{num_fam}.aln",
+            f"{prefix}-mafft-prt2nuc.{num_fam}.aln"]
+
+
+def get_fingerprint(prefix, num_fam):
+    """
+    Get the size and modification time of all files of a family. Only uses file metadata,
+    files are not read.
+
+    Parameters
+    ----------
+    prefix : str
+        path to ``aldir/<name of dataset>``
+    num_fam : int or str
+        family number
+
+    Returns
+    -------
+    str or None
+        'size:mtime' of all family files, separated by ',', or None if a file is missing
+    """
+    stats = []
+    for famfile in get_family_files(prefix, num_fam):
+        try:
+            stat = os.stat(famfile)
+        except OSError:
+            return None
+        stats.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return ",".join(stats)
+
+
+def write_journal(journalf, prefix, num_fam, status):
+    """
+    Append a family to the journal of families aligned, if its alignment went well.
+
+    Each line of the journal contains a family number, the stage reached (only 'done' for now:
+    aligned, back-translated and completed with missing genomes), and the fingerprint of its
+    files (see get_fingerprint).
+
+    Parameters
+    ----------
+    journalf : _io.TextIOWrapper
+        journal file, open in append mode
+    prefix : str
+        path to ``aldir/<name of dataset>``
+    num_fam : int or str
+        family number
+    status : bool or str
+        status returned by handle_family. Family is journaled only if it is True or "OK"
+    """
+    if not status:
+        return
+    fingerprint = get_fingerprint(prefix, num_fam)
+    if fingerprint:
+        journalf.write(f"{num_fam}\tdone\t{fingerprint}\n")
+        journalf.flush()
+
+
+def get_done_families(journal, prefix, all_fams):
+    """
+    Get families which were completely done in a previous run, and whose files did not
+    change since (same size and modification time as when they were journaled).
+
+    Parameters
+    ----------
+    journal : str
+        path to journal file
+    prefix : str
+        path to ``aldir/<name of dataset>``
+    all_fams : []
+        list of all family numbers
+
+    Returns
+    -------
+    set
+        family numbers (as given in all_fams) which do not need to be checked again
+    """
+    if not os.path.isfile(journal):
+        return set()
+    journaled = {}
+    with open(journal, "r") as journalf:
+        for line in journalf:
+            fields = line.strip().split("\t")
+            # Ignore incomplete lines (crash while writing)
+            if len(fields) == 3 and fields[1] == "done":
+                # If a family was journaled several times, keep its last state
+                journaled[fields[0]] = fields[2]
+    done = set()
+    for num_fam in all_fams:
+        fingerprint = journaled.get(str(num_fam))
+        if fingerprint and fingerprint == get_fingerprint(prefix, num_fam):
+            done.add(num_fam)
+    return done
+
+
+def get_family_cost(prt_file):
+    """
+    Estimate the cost of aligning a family: size of the file of its extracted proteins.
+    This file contains, for each protein, its header and its residues: its size is about
+    the number of sequences times their mean length, plus the headers. Only uses file
+    metadata, so that families do not need to be read (nor their sequences counted) in the
+    main process before starting to align them.
+
+    Parameters
+    ----------
+    prt_file : str
+        path to file containing proteins extracted for the family
+
+    Returns
+    -------
+    int
+        estimated cost (0 if the file does not exist: the error is handled when aligning)
+    """
+    try:
+        return os.path.getsize(prt_file)
+    except OSError:
+        return 0
+
+
+def get_mafft_threads(cost, remaining_cost, free, nb_remaining):
+    """
+    Number of threads given to mafft for the batch of families about to be started. While
+    there are at least as many batches left as idle cores, each batch gets 1 thread. At the
+    tail of the run, idle cores are shared between the last batches, according to their
+    share of the remaining cost, so that the largest ones do not end alone on 1 core.
+
+    Parameters
+    ----------
+    cost : int
+        estimated cost of the batch
+    remaining_cost : int
+        sum of estimated costs of all batches not started yet, including this one
+    free : int
+        number of cores not used by the batches already running
+    nb_remaining : int
+        number of batches not started yet, including this one
+
+    Returns
+    -------
+    int
+        number of threads for mafft, between 1 and free, leaving at least 1 core to each
+        of the other batches not started yet
+    """
+    if nb_remaining >= free or remaining_cost == 0:
+        return 1
+    return max(1, min(free - nb_remaining + 1, int(free * cost / remaining_cost)))
+
+
+def run_batches(pool, function, batches, costs, threads, get_args):
+    """
+    Run the given batches of families in the pool, and yield the result of each batch as soon
+    as it is done. Batches are started, in the given order, as long as cores are idle: the
+    number of threads of each batch is given by get_mafft_threads when it is started, so
+    that the cores left idle at the tail of the run are given to the last batches.
+
+    Parameters
+    ----------
+    pool : multiprocessing.Pool
+        pool of 'threads' processes
+    function : function
+        function run on each batch (called with get_args(batch, mafft_threads))
+    batches : list
+        list of batches, each batch being a list of family numbers
+    costs : dict
+        {num_fam: estimated cost}
+    threads : int
+        max number of threads running at the same time
+    get_args : function
+        get_args(batch, mafft_threads) returns the arguments given to function for this batch
+
+    Returns
+    -------
+    generator
+        (mafft_threads, result of function) for each batch, in the order they end
+    """
+    done = queue.Queue()
+    pending = collections.deque(batches)
+    remaining_cost = sum(costs[num_fam] for batch in batches for num_fam in batch)
+    free = threads
+    running = 0
+    while pending or running:
+        while pending and free > 0:
+            batch = pending.popleft()
+            cost = sum(costs[num_fam] for num_fam in batch)
+            nb_threads = get_mafft_threads(cost, remaining_cost, free, len(pending) + 1)
+            remaining_cost -= cost
+            free -= nb_threads
+            running += 1
+            pool.apply_async(function, (get_args(batch, nb_threads),),
+                             callback=lambda res, nb=nb_threads: done.put((nb, res)),
+                             error_callback=lambda err: done.put((None, err)))
+        nb_threads, res = done.get()
+        if nb_threads is None:
+            raise res
+        running -= 1
+        free += nb_threads
+        yield nb_threads, res
+
+
+def make_batches(sorted_fams, costs, batch_residues):
+    """
+    Group families into batches aligned by the same process. Families are taken in the given
+    order, and a batch is closed as soon as its total cost reaches batch_residues: large
+    families are alone in their batch, and small ones are grouped.
+
+    Parameters
+    ----------
+    sorted_fams : []
+        family numbers, in the order they must be aligned
+    costs : dict
+        {num_fam: estimated cost}
+    batch_residues : int or None
+        minimum total cost of a batch. None to put each family in its own batch
+
+    Returns
+    -------
+    list
+        list of batches, each batch being a list of family numbers
+    """
+    if not batch_residues:
+        return [[num_fam] for num_fam in sorted_fams]
+    batches = []
+    batch = []
+    batch_cost = 0
+    for num_fam in sorted_fams:
+        batch.append(num_fam)
+        batch_cost += costs[num_fam]
+        if batch_cost >= batch_residues:
+            batches.append(batch)
+            batch = []
+            batch_cost = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def align_batch(args):
+    """
+    Align all families of a batch, one after the other, in the current process.
+
+    Parameters
+    ----------
+    args : ()
+         (prefix, batch, ngenomes, q, cache_dir, prev_prefix, aligner) with:
+
+         - prefix: path to ``aldir/<name of dataset>``
+         - batch: [(num_fam, mafft_threads)] for each family of the batch
+         - ngenomes: the total number of genomes in dataset
+         - q: a queue, which will be used by logger to put logs while in other process
+         - cache_dir: directory of the alignment cache (None: no cache)
+         - prev_prefix: path to ``aldir/<name of dataset>`` of a previous run (or None)
+         - aligner: software used to align proteins
+
+    Returns
+    -------
+    list
+        [(num_fam, status returned by handle_family, time in seconds, number of proteins
+        added to a previous alignment or None)] for each family of the batch
+    """
+    prefix, batch, ngenomes, q, cache_dir, prev_prefix, aligner = args
+    return [time_family((prefix, num_fam, ngenomes, q, mafft_threads, cache_dir,
+                         prev_prefix, aligner))
+            for num_fam, mafft_threads in batch]
+
+
+def time_family(args):
+    """
+    Align the given family (handle_family, or handle_family_1thread if there is no queue),
+    and measure its wall time.
+
+    Parameters
+    ----------
+    args : ()
+         (prefix, num_fam, ngenomes, q, mafft_threads, cache_dir, prev_prefix, aligner),
+         with q the queue receiving logs of the process aligning the family, or None in the
+         main process
+
+    Returns
+    -------
+    tuple
+        (num_fam, status returned by handle_family, time in seconds, number of proteins added
+        to the alignment of the previous run, or None if it was not used)
+    """
+    prefix, num_fam, ngenomes, q, *options = args
+    start = time.perf_counter()
+    if q is None:
+        status = handle_family_1thread((prefix, num_fam, ngenomes, *options))
+    else:
+        status = handle_family((prefix, num_fam, ngenomes, q, *options))
+    elapsed = time.perf_counter() - start
+    logging.getLogger('align.align_family').log(utils.detail_lvl(),
+                                                f"fam {num_fam} handled in {elapsed:.2f} s")
+    return num_fam, status, elapsed, _ADDED.pop(num_fam, None)
+
+
+def write_timings(outfile, timings, costs, mafft_threads):
+    """
+    Write the wall time of each family to a tsv file, from the slowest to the fastest family.
+
+    Parameters
+    ----------
+    outfile : str
+        path to tsv file
+    timings : []
+        [(num_fam, status, time in seconds, ...)] for each family
+    costs : dict
+        {num_fam: estimated cost}
+    mafft_threads : dict
+        {num_fam: number of threads given to mafft}
+    """
+    with open(outfile, "w") as outf:
+        outf.write("family\tcost\tmafft_threads\ttime_s\tstatus\n")
+        for num_fam, status, elapsed, *_ in sorted(timings, key=lambda x: x[2], reverse=True):
+            outf.write(f"{num_fam}\t{costs[num_fam]}\t{mafft_threads[num_fam]}\t"
+                       f"{elapsed:.3f}\t{status}\n")
+    if timings:
+        slowest = max(timings, key=lambda x: x[2])
+        main_logger.log(utils.detail_lvl(), f"Slowest family: {slowest[0]} "
+                                            f"({slowest[2]:.2f} s). Time per family in {outfile}")
+
+
 def handle_family_1thread(args):
     """
     For the given family:
@@ -164,11 +654,17 @@ def handle_family_1thread(args):
     Parameters
     ----------
     args : ()
-         (prefix, num_fam, ngenomes, q) with:
+         (prefix, num_fam, ngenomes[, mafft_threads[, cache_dir[, prev_prefix[, aligner]]]])
+         with:
 
          - prefix: path to ``aldir/<name of dataset>``
          - num_fam: the current family number
          - ngenomes: the total number of genomes in dataset
+         - mafft_threads: number of threads used by mafft (1 if not given)
+         - cache_dir: directory of the alignment cache (None if not given: no cache)
+         - prev_prefix: path to ``aldir/<name of dataset>`` of a previous run, whose
+           alignment of the family proteins is completed with new proteins (None if not given)
+         - aligner: software used to align proteins ("mafft" if not given)
 
     Returns
     -------
@@ -180,7 +676,11 @@ def handle_family_1thread(args):
         - False if any problem (extractions, alignment, btr, add missing genomes...)
         - True if just generated all files, and everything is ok
     """
-    prefix, num_fam, ngenomes = args
+    prefix, num_fam, ngenomes, *options = args
+    mafft_threads = options[0] if options else 1
+    cache_dir = options[1] if len(options) > 1 else None
+    prev_prefix = options[2] if len(options) > 2 else None
+    aligner = options[3] if len(options) > 3 else "mafft"
     logger = logging.getLogger('align.align_family')
     # Get file names
     prt_file = f"{prefix}-current.{num_fam}.prt"
@@ -188,9 +688,11 @@ def handle_family_1thread(args):
     miss_file = f"{prefix}-current.{num_fam}.miss.lst"
     mafft_file = f"{prefix}-mafft-align.{num_fam}.aln"
     btr_file = f"{prefix}-mafft-prt2nuc.{num_fam}.aln"
+    prev_file = get_previous_file(prev_prefix, prt_file) if prev_prefix else None
     # Align all sequences for given family
     status1 = family_alignment(prt_file, gen_file, miss_file, mafft_file, btr_file,
-                               num_fam, ngenomes, logger)
+                               num_fam, ngenomes, logger, mafft_threads, cache_dir, prev_file,
+                               aligner)
     #  status1 is:
     # - False if problem with extractions, alignment or backtranslation -> return False
     # - 'nb_seqs' = number of sequences aligned if everything went well (extractions and
@@ -231,6 +733,11 @@ def handle_family(args):
          - num_fam: the current family number
          - ngenomes: the total number of genomes in dataset
          - q: a queue, which will be used by logger to put logs while in other process
+         - mafft_threads (optional): number of threads used by mafft (1 if not given)
+         - cache_dir (optional): directory of the alignment cache (None if not given: no cache)
+         - prev_prefix (optional): path to ``aldir/<name of dataset>`` of a previous run
+           (None if not given)
+         - aligner (optional): software used to align proteins ("mafft" if not given)
 
     Returns
     -------
@@ -242,15 +749,14 @@ def handle_family(args):
         - False if any problem (extractions, alignment, btr, add missing genomes...)
         - True if just generated all files, and everything is ok
     """
-    prefix, num_fam, ngenomes, q = args
+    prefix, num_fam, ngenomes, q, *options = args
     qh = logging.handlers.QueueHandler(q)
     root = logging.getLogger()
     root.setLevel(logging.DEBUG)
     root.handlers = []
     logging.addLevelName(utils.detail_lvl(), "DETAIL")
     root.addHandler(qh)
-    logger = logging.getLogger('align.align_family')
-    return handle_family_1thread((prefix, num_fam, ngenomes))
+    return handle_family_1thread((prefix, num_fam, ngenomes, *options))
 
 
 def add_missing_genomes(align_file, ali_type, miss_file, num_fam, ngenomes, status1, logger):
@@ -296,7 +802,11 @@ def add_missing_genomes(align_file, ali_type, miss_file, num_fam, ngenomes, stat
     # btr_file should always exist.
     # Sometimes it comes from previous step ('missing genomes' are missing)
     # Sometimes it comes from a previous run (all genomes should be here)
-    status = check_add_missing(align_file, num_fam, ngenomes, logger, prev=True)
+    res = check_lens(align_file, num_fam, logger)
+    if not res:
+        return False
+    len_aln, nb_seqs = res
+    status = check_nb_genomes(len_aln, nb_seqs, num_fam, ngenomes, logger, prev=True)
     # If btr_file has the correct number of sequences, all the same length, return True
     if status is True:
         if status1 == "OK":
@@ -311,16 +821,17 @@ def add_missing_genomes(align_file, ali_type, miss_file, num_fam, ngenomes, stat
     # All sequences have same length but some genomes are missing -> Add missing genomes
     # status is length of sequence (if it was True or False, it already ended this function)
     logger.log(utils.detail_lvl(), f"Adding missing genomes for family {num_fam} in {ali_type} alignment.")
-    len_aln = status
     with open(miss_file, "r") as missf, open(align_file, "a") as alif:
         for genome in missf:
             genome = genome.strip()
             toadd = ">" + genome + "\n" + "-" * len_aln + "\n"
             alif.write(toadd)
-    # check_add_missing called with prev=False :
-    # output is True if all ok, or False if problems. Cannot be sequence length (as it can be with prev=True)
-    ret = check_add_missing(align_file, num_fam, ngenomes, logger, prev=False)
-    return ret
+            nb_seqs += 1
+    # Added sequences have the alignment length, so no need to re-read the file: only check
+    # that there are now as many sequences as genomes.
+    # Called with prev=False: output is True if all ok, or False if problems. Cannot be
+    # sequence length (as it can be with prev=True)
+    return check_nb_genomes(len_aln, nb_seqs, num_fam, ngenomes, logger, prev=False)
 
 
 def check_add_missing(btr_file, num_fam, ngenomes, logger, prev):
@@ -361,6 +872,37 @@ def check_add_missing(btr_file, num_fam, ngenomes, logger, prev):
     # otherwise, return False: problem while aligning or back-translating
     else:
         return False
+    return check_nb_genomes(len_aln, nb, num_fam, ngenomes, logger, prev)
+
+
+def check_nb_genomes(len_aln, nb, num_fam, ngenomes, logger, prev):
+    """
+    Check that an alignment, whose sequences all have the same length, contains all genomes
+
+    Parameters
+    ----------
+    len_aln : int
+        length of the alignment
+    nb : int
+        number of sequences in the alignment
+    num_fam : int
+        current family number
+    ngenomes : int
+        total number of genomes in dataset
+    logger : logging.Logger
+        logger with queueHandler to give logs to main logger
+    prev : bool
+        True if missing genomes were not added yet (see check_add_missing)
+
+    Returns
+    -------
+    bool or int
+        - True if right number of sequences
+        - False if not the right number of sequences, while missing genomes should have
+          been added (prev=False)
+        - alignment length if not the right number of sequences, but missing genomes are
+          not added yet (prev=True)
+    """
     # If number of sequences in btr file is not the same as the total number of genomes, either:
     #   - btr comes from a previous run, but was not complete (prev)
     #   - we just created btr file, and there are missing genomes in this family.
@@ -383,7 +925,8 @@ def check_add_missing(btr_file, num_fam, ngenomes, logger, prev):
 
 
 def family_alignment(prt_file, gen_file, miss_file, mafft_file, btr_file,
-                     num_fam, ngenomes, logger):
+                     num_fam, ngenomes, logger, mafft_threads=1, cache_dir=None,
+                     prev_file=None, aligner="mafft"):
     """
     From a given family, align all its proteins with mafft, back-translate
     to nucleotides, and add missing genomes in this family.
@@ -407,6 +950,15 @@ def family_alignment(prt_file, gen_file, miss_file, mafft_file, btr_file,
         total number of genomes in dataset
     logger : logging.Logger
         logger with queueHandler to give logs to main logger
+    mafft_threads : int
+        number of threads used by mafft
+    cache_dir : str or None
+        path to directory of the alignment cache, or None to not use any cache
+    prev_file : str or None
+        path to the protein alignment of this family in a previous run, to which new
+        proteins are added. None to align the whole family.
+    aligner : str
+        software used to align proteins (see ``aligners.ALIGNERS``)
 
     Returns
     -------
@@ -432,16 +984,11 @@ def family_alignment(prt_file, gen_file, miss_file, mafft_file, btr_file,
     if os.path.isfile(mafft_file):
         # There can be nbfprt (number of proteins extracted) 
         # or nb_genomes (proteins extracted + missing added with '-')
-        nbfal1 = check_nb_seqs(mafft_file, nbfprt, logger, "")
-        nbfal2 = check_nb_seqs(mafft_file, ngenomes, logger, "")
-        # if nbfal1: missing genomes have not been added yet. Save this value for later
-        if nbfal1:
-            nbfal = nbfal1
-        # if nbfal2: missing genomes already there, save for later
-        elif nbfal2:
-            nbfal = nbfal2
+        # If nbfprt: missing genomes have not been added yet. If ngenomes: missing genomes
+        # already there. Save this value for later
+        nbfal = check_nb_seqs(mafft_file, [nbfprt, ngenomes], logger, "")
         # If not any of those 2 numbers: error
-        else:
+        if not nbfal:
             message = (f"fam {num_fam}: Will redo alignment, because found a different number of proteins "
                        f"extracted in {prt_file} ({nbfprt}) and proteins aligned in "
                        f"existing {mafft_file}")
@@ -452,7 +999,8 @@ def family_alignment(prt_file, gen_file, miss_file, mafft_file, btr_file,
     # yet), remove btr (will be regenerated), and do alignment with mafft
     if not os.path.isfile(mafft_file):
         utils.remove(btr_file)  # remove if exists...
-        nbfal = mafft_align(num_fam, prt_file, mafft_file, nbfprt, logger)
+        nbfal = mafft_align(num_fam, prt_file, mafft_file, nbfprt, logger, mafft_threads,
+                            cache_dir, prev_file, aligner)
     # If problem with alignment, return False
     if not nbfal:
         return False
@@ -520,8 +1068,8 @@ def check_extractions(num_fam, miss_file, prt_file, gen_file, ngenomes, logger):
         logger.error(f"fam {num_fam}: no file with proteins extracted "
                      f"('{prt_file}'). Cannot align.")
         sys.exit(1)
-    nbfprt = utils.grep(prt_file, "^>", counts=True)
-    nbfgen = utils.grep(gen_file, "^>", counts=True)
+    nbfprt, _ = get_aln_stats(prt_file)
+    nbfgen, _ = get_aln_stats(gen_file)
     if nbmiss + nbfprt != ngenomes:
         logger.error(("fam {}: wrong sum of missing genomes ({}) and prt extracted ({}) for {} "
                       "genomes in the dataset.").format(num_fam, nbmiss, nbfprt, ngenomes))
@@ -533,9 +1081,16 @@ def check_extractions(num_fam, miss_file, prt_file, gen_file, ngenomes, logger):
     return nbfprt
 
 
-def mafft_align(num_fam, prt_file, mafft_file, nbfprt, logger):
+def mafft_align(num_fam, prt_file, mafft_file, nbfprt, logger, mafft_threads=1, cache_dir=None,
+                prev_file=None, aligner="mafft"):
     """
-    Align all proteins of the given family with mafft
+    Align all proteins of the given family with mafft, or with the given aligner
+
+    If a cache directory is given, and an alignment of the same proteins is found in it, this
+    alignment is used instead of running mafft. Otherwise, the new alignment is saved in the
+    cache.
+    If the alignment of this family in a previous run is given, and can be completed with
+    the new proteins (see ``add_to_alignment``), the family is not re-aligned.
 
     Parameters
     ----------
@@ -549,6 +1104,14 @@ def mafft_align(num_fam, prt_file, mafft_file, nbfprt, logger):
         number of proteins extracted in prt file
     logger : logging.Logger
         logger with queueHandler to give logs to main logger
+    mafft_threads : int
+        number of threads used by mafft
+    cache_dir : str or None
+        path to directory of the alignment cache, or None to not use any cache
+    prev_file : str or None
+        path to the protein alignment of the proteins of this family in a previous run, or None
+    aligner : str
+        software used to align proteins (see ``aligners.ALIGNERS``)
 
     Returns
     -------
@@ -557,21 +1120,129 @@ def mafft_align(num_fam, prt_file, mafft_file, nbfprt, logger):
         False otherwise
     """
     logger.log(utils.detail_lvl(), f"Aligning family {num_fam}")
-    cmd = f"mafft --auto {prt_file}"
+    message = (f"fam {num_fam}: different number of proteins extracted in {prt_file} ({nbfprt}) and proteins "
+               f"aligned in {mafft_file}")
+    if cache_dir:
+        records = aln_cache.read_records(prt_file)
+        key = aln_cache.get_key(records, aligners.get_identity(aligner))
+        if aln_cache.get_alignment(cache_dir, key, records, mafft_file):
+            logger.log(utils.detail_lvl(), f"fam {num_fam}: alignment found in cache")
+            return check_nb_seqs(mafft_file, nbfprt, logger, message)
+    if prev_file and add_to_alignment(num_fam, prt_file, mafft_file, prev_file, logger,
+                                      mafft_threads):
+        return check_nb_seqs(mafft_file, nbfprt, logger, message)
+    cmd, to_stdout = aligners.get_command(aligner, prt_file, mafft_file, mafft_threads)
     error = f"Problem while trying to align fam {num_fam}"
-    stdout = open(mafft_file, "w")
     stderr = open(mafft_file + ".log", "w")
-    logger.log(utils.detail_lvl(), f"Mafft command: {cmd}")
+    # Aligners writing the alignment to a file write their messages to stdout
+    stdout = open(mafft_file, "w") if to_stdout else stderr
+    logger.log(utils.detail_lvl(), f"{aligners.get_name(aligner)} command: {cmd}")
     ret = utils.run_cmd(cmd, error, stdout=stdout, stderr=stderr, logger=logger)
     stdout.close()
+    stderr.close()
     if not isinstance(ret, int):
         ret = ret.returncode
     if ret != 0:
-        os.remove(mafft_file)
+        utils.remove(mafft_file)
         return False
-    message = (f"fam {num_fam}: different number of proteins extracted in {prt_file} ({nbfprt}) and proteins "
-               f"aligned in {mafft_file}")
-    return check_nb_seqs(mafft_file, nbfprt, logger, message)
+    nbfal = check_nb_seqs(mafft_file, nbfprt, logger, message)
+    if nbfal and cache_dir:
+        aln_cache.save_alignment(cache_dir, key, records, mafft_file)
+    return nbfal
+
+
+def add_to_alignment(num_fam, prt_file, mafft_file, prev_file, logger, mafft_threads=1):
+    """
+    Write the alignment of a family by adding its new proteins to its alignment from a
+    previous run, with ``mafft --add``: the previous alignment is kept as is, and only new
+    proteins are aligned to it.
+
+    This is possible only if all proteins of the previous alignment are still in the family,
+    with the same sequence. Otherwise (or if mafft fails), nothing is written, and the
+    family must be aligned from scratch. When the alignment is written, the number of
+    proteins added is kept for ``time_family``.
+
+    Parameters
+    ----------
+    num_fam : int
+        current family number
+    prt_file : str
+        path to file containing all proteins extracted for the family
+    mafft_file : str
+        path to file which will contain proteins alignment
+    prev_file : str
+        path to the protein alignment of the proteins of this family in the previous run
+        (maybe with missing genomes added, and with another family number)
+    logger : logging.Logger
+        logger with queueHandler to give logs to main logger
+    mafft_threads : int
+        number of threads used by mafft
+
+    Returns
+    -------
+    bool
+        True if mafft_file was written, False if the family must be aligned from scratch
+    """
+    if not os.path.isfile(prev_file):
+        return False
+    # Proteins of previous alignment (missing genomes added have an empty sequence)
+    prev_rows = {name: row for name, row in read_fasta_records(prev_file)
+                 if row.replace(b"-", b"")}
+    records = aln_cache.read_records(prt_file)
+    new_records = []
+    changed = False
+    for header, seq in records:
+        row = prev_rows.get(header.split()[0])
+        if row is None:
+            new_records.append((header, seq))
+        elif row.replace(b"-", b"").upper() != seq.upper():
+            changed = True
+    # All proteins of the previous alignment must still be in the family, with the same sequence
+    if changed or not prev_rows or len(prev_rows) != len(records) - len(new_records):
+        logger.log(utils.detail_lvl(), f"fam {num_fam}: proteins of previous alignment "
+                                       f"{prev_file} changed. Aligning the whole family.")
+        return False
+    if new_records:
+        logger.log(utils.detail_lvl(), f"fam {num_fam}: adding {len(new_records)} new proteins "
+                                       f"to previous alignment {prev_file}")
+        existing_file = mafft_file + ".existing"
+        new_file = mafft_file + ".new"
+        with open(existing_file, "wb") as existf:
+            for name, row in prev_rows.items():
+                existf.write(b">" + name + b"\n" + row + b"\n")
+        with open(new_file, "wb") as newf:
+            for header, seq in new_records:
+                newf.write(b">" + header + b"\n" + seq + b"\n")
+        threads = f" --thread {mafft_threads}" if mafft_threads > 1 else ""
+        cmd = f"mafft --auto{threads} --add {new_file} {existing_file}"
+        error = f"Problem while trying to add new proteins to alignment of fam {num_fam}"
+        logger.log(utils.detail_lvl(), f"Mafft command: {cmd}")
+        with open(mafft_file, "w") as stdout, open(mafft_file + ".log", "w") as stderr:
+            ret = utils.run_cmd(cmd, error, stdout=stdout, stderr=stderr, logger=logger)
+        utils.remove(existing_file)
+        utils.remove(new_file)
+        if not isinstance(ret, int):
+            ret = ret.returncode
+        if ret != 0:
+            utils.remove(mafft_file)
+            return False
+        aligned = dict(read_fasta_records(mafft_file))
+    else:
+        aligned = prev_rows
+    # Write alignment in the same order as extracted proteins, with their full header
+    rows = [aligned.get(header.split()[0], b"") for header, _ in records]
+    if any(row.replace(b"-", b"").upper() != seq.upper()
+           for row, (_, seq) in zip(rows, records)):
+        logger.log(utils.detail_lvl(), f"fam {num_fam}: could not add new proteins to "
+                                       f"{prev_file}. Aligning the whole family.")
+        utils.remove(mafft_file)
+        return False
+    with open(mafft_file, "wb") as mafftf:
+        for (header, _), row in zip(records, rows):
+            mafftf.write(b">" + header + b"\n")
+            mafftf.write(b"".join(row[i:i + 60] + b"\n" for i in range(0, len(row), 60)))
+    _ADDED[num_fam] = len(new_records)
+    return True
 
 
 def back_translate(num_fam, mafft_file, gen_file, btr_file, nbfal, logger):
@@ -601,23 +1272,100 @@ def back_translate(num_fam, mafft_file, gen_file, btr_file, nbfal, logger):
         - number of sequences in btr file if everything went well
     """
     logger.log(utils.detail_lvl(), f"Back-translating family {num_fam}")
-    curpath = os.path.dirname(os.path.abspath(__file__))
-    awk_script = os.path.join(curpath, "prt2codon.awk")
-    cmd = f"awk -f {awk_script} {mafft_file} {gen_file}"
-    stdout = open(btr_file, "w")
     error = f"Problem while trying to backtranslate {mafft_file} to a nucleotide alignment"
-    ret = utils.run_cmd(cmd, error, stdout=stdout, logger=logger)
-    stdout.close()
-    if not isinstance(ret, int):
-        ret = ret.returncode
-    if ret != 0:
-        os.remove(btr_file)
+    try:
+        res = write_back_translation(mafft_file, gen_file, btr_file)
+    except OSError as err:
+        logger.error(error)
+        logger.error(err)
+        utils.remove(btr_file)
+        return False
+    nb_seqs, all_lens = res
+    if len(all_lens) > 1:
+        logger.error(f"Nucleic alignments for family {num_fam} (in {btr_file}) do not all have "
+                     f"the same length. Lengths found are: {all_lens}\n")
         return False
-    message = (f"fam {num_fam}: different number of proteins aligned in {mafft_file} ({nbfal}) and genes "
-               f"back-translated in {btr_file}")
-    # Check number of sequences in btr file, and return True/False according to it
-    # It should contain the same number of sequences as the mafft file.
-    return check_nb_seqs(mafft_file, nbfal, logger, message)
+    # btr file should contain the same number of sequences as the mafft file.
+    if nb_seqs != nbfal:
+        logger.error(f"fam {num_fam}: different number of proteins aligned in {mafft_file} "
+                     f"({nbfal}) and genes back-translated in {btr_file} ({nb_seqs})")
+        return False
+    return nb_seqs
+
+
+def write_back_translation(mafft_file, gen_file, btr_file):
+    """
+    Write the nucleotide alignment corresponding to the protein alignment in mafft_file:
+    each amino acid is replaced by its codon in gen_file, and each gap by 3 gaps. Sequences
+    are written on lines of 60 characters, in the order of mafft_file.
+
+    Parameters
+    ----------
+    mafft_file : str
+        path to file containing protein alignments by mafft
+    gen_file : str
+        path to file containing all sequences, not aligned, in nucleotides
+    btr_file : str
+        path to the file that will contain the nucleotide alignment
+
+    Returns
+    -------
+    tuple
+        (nb_seqs, all_lens): number of sequences written, and set of their lengths. If a gene
+        is missing or too short for its protein, its sequence is shorter than the others.
+    """
+    genes = dict(read_fasta_records(gen_file))
+    nb_seqs = 0
+    all_lens = set()
+    with open(btr_file, "wb") as btrf:
+        for name, prot in read_fasta_records(mafft_file):
+            gene = genes.get(name, b"")
+            codons = []
+            pos = 0
+            for run in GAP_RUNS.finditer(prot):
+                length = 3 * (run.end() - run.start())
+                if run.group().startswith(b"-"):
+                    codons.append(b"-" * length)
+                else:
+                    codons.append(gene[pos:pos + length])
+                    pos += length
+            seq = b"".join(codons)
+            btrf.write(b">" + name + b"\n")
+            btrf.write(b"".join(seq[i:i + 60] + b"\n" for i in range(0, len(seq), 60)))
+            nb_seqs += 1
+            all_lens.add(len(seq))
+    return nb_seqs, all_lens
+
+
+def read_fasta_records(fasta):
+    """
+    Read the sequences of a fasta file, one at a time.
+
+    Parameters
+    ----------
+    fasta : str
+        path to fasta file
+
+    Returns
+    -------
+    generator
+        (name, sequence) for each sequence of the file, with name the first word of the header
+        (without '>') and sequence on a single line, both as bytes
+    """
+    name = None
+    seq = []
+    with open(fasta, "rb") as fastf:
+        for line in fastf:
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(seq)
+                words = line[1:].split(maxsplit=1)
+                name = words[0] if words else b""
+                seq = []
+            else:
+                seq.append(line.strip())
+    if name is not None:
+        yield name, b"".join(seq)
 
 
 def check_nb_seqs(alnfile, nbfal, logger, message=""):
@@ -641,7 +1389,7 @@ def check_nb_seqs(alnfile, nbfal, logger, message=""):
         - False if not same number of sequences
         - nbseqs in align file if found among values in 'nbfal'
     """
-    nbseqs = utils.grep(alnfile, "^>", counts=True)
+    nbseqs, _ = get_aln_stats(alnfile)
     if isinstance(nbfal, int):
         nbfal = [nbfal]
     for num in nbfal:
@@ -674,24 +1422,42 @@ def check_lens(aln_file, num_fam, logger):
         same length).
         If they all have the same length, returns this length and the number of sequences
     """
-    nb_gen = 0
-    all_sums = set()
-    with open(aln_file, "r") as btrf:
-        cur_sum = 0
-        start = True
-        for line in btrf:
-            if line.startswith(">"):
-                nb_gen += 1
-                if not start:
-                    all_sums.add(cur_sum)
-                    cur_sum = 0
-            else:
-                start = False
-                cur_sum += len(line.strip())
-        all_sums.add(cur_sum)
+    nb_gen, all_sums = get_aln_stats(aln_file)
     if len(all_sums) > 1:
         logger.error(f"Nucleic alignments for family {num_fam} (in {aln_file}) do not all have the same "
                      f"length. Lengths found are: {all_sums}\n")
         return False
     # Return sequence length and number of sequences in alignment file
     return list(all_sums)[0], nb_gen
+
+
+def get_aln_stats(aln_file):
+    """
+    Read an alignment (or any fasta) file once, and get its number of sequences and the
+    lengths of its sequences.
+
+    Parameters
+    ----------
+    aln_file : str
+        path to the alignment file
+
+    Returns
+    -------
+    tuple
+        (nb_seqs, all_lens): number of sequences, and set of all sequence lengths ({0} if there
+        is no sequence)
+    """
+    nb_seqs = 0
+    all_lens = set()
+    cur_len = None
+    with open(aln_file, "rb") as alnf:
+        for line in alnf:
+            if line.startswith(b">"):
+                nb_seqs += 1
+                if cur_len is not None:
+                    all_lens.add(cur_len)
+                cur_len = 0
+            else:
+                cur_len = (cur_len or 0) + len(line.strip())
+    all_lens.add(cur_len or 0)
+    return nb_seqs, all_lens
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# ###############################################################################
+# This file is part of PanACOTA.                                                #
+#                                                                               #
+# Authors: Amandine Perrin                                                      #
+# Copyright © 2018-2020 Institut Pasteur (Paris).                               #
+# See the COPYRIGHT file for details.                                           #
+#                                                                               #
+# PanACOTA is a software providing tools for large scale bacterial comparative  #
+# genomics. From a set of complete and/or draft genomes, you can:               #
+#    -  Do a quality control of your strains, to eliminate poor quality         #
+# genomes, which would not give any information for the comparative study       #
+#    -  Uniformly annotate all genomes                                          #
+#    -  Do a Pan-genome                                                         #
+#    -  Do a Core or Persistent genome                                          #
+#    -  Align all Core/Persistent families                                      #
+#    -  Infer a phylogenetic tree from the Core/Persistent families             #
+#                                                                               #
+# PanACOTA is free software: you can redistribute it and/or modify it under the #
+# terms of the Affero GNU General Public License as published by the Free       #
+# Software Foundation, either version 3 of the License, or (at your option)     #
+# any later version.                                                            #
+#                                                                               #
+# PanACOTA is distributed in the hope that it will be useful, but WITHOUT ANY   #
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS     #
+# FOR A PARTICULAR PURPOSE. See the Affero GNU General Public License           #
+# for more details.                                                             #
+#                                                                               #
+# You should have received a copy of the Affero GNU General Public License      #
+# along with PanACOTA (COPYING file).                                           #
+# If not, see <https://www.gnu.org/licenses/>.                                  #
+# ###############################################################################
+
+
+"""
+Cache of protein alignments, shared between runs and datasets.
+
+An alignment is stored under a key computed from the content of the family (sorted protein
+sequences) and from the aligner used, so that a family with the same proteins is not
+re-aligned, whatever its family number or dataset name.
+
+For each distinct protein sequence of the family, the cache file contains its aligned row
+(one row per line, in the order of sorted sequences). When reusing a cached alignment, each
+protein gets the row of its sequence, so that names of proteins do not matter.
+
+@author: GEM, Institut Pasteur
+"""
+
+import os
+import hashlib
+import logging
+
+logger = logging.getLogger("align.cache")
+
+
+def read_records(fasta):
+    """
+    Read all sequences of a fasta file
+
+    Parameters
+    ----------
+    fasta : str
+        path to fasta file
+
+    Returns
+    -------
+    list
+        [(header, sequence)] with header the full header line (without '>' and newline) and
+        sequence on a single line, both as bytes
+    """
+    records = []
+    header = None
+    seq = []
+    with open(fasta, "rb") as fastf:
+        for line in fastf:
+            if line.startswith(b">"):
+                if header is not None:
+                    records.append((header, b"".join(seq)))
+                header = line[1:].rstrip(b"\r\n")
+                seq = []
+            else:
+                seq.append(line.strip())
+    if header is not None:
+        records.append((header, b"".join(seq)))
+    return records
+
+
+def get_key(records, aligner):
+    """
+    Get the cache key of a family
+
+    Parameters
+    ----------
+    records : list
+        [(header, sequence)] of all proteins of the family
+    aligner : str
+        identity of the aligner (name and options changing the alignment)
+
+    Returns
+    -------
+    str
+        sha256 of the aligner and the sorted protein sequences
+    """
+    digest = hashlib.sha256(aligner.encode() + b"\n")
+    for seq in sorted(seq.upper() for _, seq in records):
+        digest.update(seq + b"\n")
+    return digest.hexdigest()
+
+
+def get_cache_file(cache_dir, key):
+    """
+    Get the path to the file containing the alignment of the given key
+
+    Parameters
+    ----------
+    cache_dir : str
+        path to cache directory
+    key : str
+        cache key of the family
+
+    Returns
+    -------
+    str
+        path to cache file (in a subfolder named by the first 2 characters of the key, to
+        avoid too many files in the same folder)
+    """
+    return os.path.join(cache_dir, key[:2], key + ".aln")
+
+
+def get_alignment(cache_dir, key, records, mafft_file):
+    """
+    If the alignment of the family is in the cache, write it to mafft_file.
+
+    Parameters
+    ----------
+    cache_dir : str
+        path to cache directory
+    key : str
+        cache key of the family
+    records : list
+        [(header, sequence)] of all proteins of the family, in the order wanted in mafft_file
+    mafft_file : str
+        path to file which will contain proteins alignment
+
+    Returns
+    -------
+    bool
+        True if the alignment was found in the cache and written, False otherwise
+    """
+    cache_file = get_cache_file(cache_dir, key)
+    if not os.path.isfile(cache_file):
+        return False
+    seqs = sorted({seq.upper() for _, seq in records})
+    with open(cache_file, "rb") as cachef:
+        rows = [line.strip() for line in cachef]
+    # Check that cache file corresponds to the sequences (not truncated, no hash collision)
+    if len(rows) != len(seqs):
+        logger.warning(f"Cache file {cache_file} does not correspond to the family. Ignored.")
+        return False
+    aligned = {}
+    for seq, row in zip(seqs, rows):
+        if row.replace(b"-", b"").upper() != seq:
+            logger.warning(f"Cache file {cache_file} does not correspond to the family. "
+                           "Ignored.")
+            return False
+        aligned[seq] = row
+    with open(mafft_file, "wb") as mafftf:
+        for header, seq in records:
+            row = aligned[seq.upper()]
+            mafftf.write(b">" + header + b"\n")
+            mafftf.write(b"".join(row[i:i + 60] + b"\n" for i in range(0, len(row), 60)))
+    return True
+
+
+def save_alignment(cache_dir, key, records, mafft_file):
+    """
+    Save the alignment of a family in the cache. The file is first written to a temporary
+    file, then renamed, so that other processes never read an incomplete cache file.
+
+    Parameters
+    ----------
+    cache_dir : str
+        path to cache directory
+    key : str
+        cache key of the family
+    records : list
+        [(header, sequence)] of all proteins of the family
+    mafft_file : str
+        path to file containing proteins alignment
+
+    Returns
+    -------
+    bool
+        True if the alignment was saved, False if it does not correspond to the proteins
+        of the family (then, it is not saved)
+    """
+    aligned = {}
+    for _, row in read_records(mafft_file):
+        aligned.setdefault(row.replace(b"-", b"").upper(), row)
+    seqs = sorted({seq.upper() for _, seq in records})
+    if any(seq not in aligned for seq in seqs):
+        logger.warning(f"Alignment in {mafft_file} does not correspond to the aligned "
+                       "proteins. It is not saved in cache.")
+        return False
+    cache_file = get_cache_file(cache_dir, key)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as cachef:
+        for seq in seqs:
+            cachef.write(aligned[seq] + b"\n")
+    os.replace(tmp_file, cache_file)
+    return True
@@ -35,19 +35,34 @@
 
 import sys
 import os
+import math
 import logging
+import collections
+import multiprocessing
 import progressbar
 
 from PanACoTA import utils
 
 logger = logging.getLogger("align.extract")
 
+# Batch of each output file, in processes indexing genomes (see init_index_worker)
+_FILE_BATCH = None
 
-def get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, all_fams, quiet):
+
+def get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, all_fams, quiet, batch=None,
+                 threads=1, to_extract=None):
     """
     For all genomes, extract its proteins present in a persistent family to the file
     corresponding to this family.
 
+    By default, genomes are handled one after the other (genome-major). If 'batch' is given,
+    families are handled by batches of 'batch' families (family-major): all sequences of the
+    batch are read from all genomes, and each family file is written at once.
+    With several threads, extraction is always family-major: genomes are indexed in
+    parallel, and each batch of families is then handled by 1 process (so that 2 processes
+    never write to the same file). Without a given batch size, families are split into
+    1 batch per thread.
+
     Parameters
     ----------
     all_genomes : []
@@ -64,6 +79,14 @@ def get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, all_fams, quiet):
         list of all family numbers
     quiet : bool
         True if nothin must be written to stdout/stderr, False otherwise
+    batch : int or None
+        number of families extracted together in family-major mode. None for genome-major
+        extraction.
+    threads : int
+        number of processes extracting batches of families in parallel
+    to_extract : dict or None
+        {genome: {member: fam_num}} proteins (and corresponding genes) to extract from each
+        genome. If None, they are read from the getEntry files in listdir.
     """
     # Get list of files not already existing
     files_todo = check_existing_extract(all_fams, aldir, dname)
@@ -76,6 +99,12 @@ def get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, all_fams, quiet):
                        "re-extract all families, use option -F (or --force).")
         return
     logger.info("Extracting proteins and genes from all genomes")
+    if threads > 1 and not batch:
+        batch = math.ceil(len(files_todo) / 2 / threads)
+    if batch:
+        get_all_seqs_by_family(all_genomes, dname, dbpath, listdir, aldir, files_todo, batch,
+                               quiet, threads, to_extract)
+        return
     nbgen = len(all_genomes)
     bar = None
     curnum = 1
@@ -87,21 +116,248 @@ def get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, all_fams, quiet):
                    progressbar.ETA()]
         bar = progressbar.ProgressBar(widgets=widgets, max_value=nbgen, term_width=79).start()
         curnum = 1
-    for genome in all_genomes:
-        ge_gen = os.path.join(listdir, dname + "-getEntry_gen_" + genome + ".txt")
-        ge_prt = os.path.join(listdir, dname + "-getEntry_prt_" + genome + ".txt")
-        logger.details(f"Extracting proteins and genes from {genome}")
-        prtdb = os.path.join(dbpath, "Proteins", genome + ".prt")
-        gendb = os.path.join(dbpath, "Genes", genome + ".gen")
-        get_genome_seqs(prtdb, ge_prt, files_todo)
-        get_genome_seqs(gendb, ge_gen, files_todo)
-        if not quiet:
-            bar.update(curnum)
-            curnum += 1
+    files_todo = frozenset(files_todo)
+    # Keep family files open between genomes, instead of opening them for each sequence
+    with FileHandlePool() as handles:
+        for genome in all_genomes:
+            logger.details(f"Extracting proteins and genes from {genome}")
+            genome_extract = get_genome_to_extract(genome, dname, listdir, aldir, to_extract)
+            for fasta, seqs in zip(get_genome_fastas(dbpath, genome), genome_extract):
+                index = get_fasta_index(fasta, listdir)
+                extract_indexed(fasta, index, seqs, files_todo, handles)
+            if not quiet:
+                bar.update(curnum)
+                curnum += 1
     if not quiet:
         bar.finish()
 
 
+def get_all_seqs_by_family(all_genomes, dname, dbpath, listdir, aldir, files_todo, batch,
+                           quiet, threads=1, to_extract=None):
+    """
+    Family-major extraction: for each batch of 'batch' families, read the sequences of
+    those families from all genomes, and write each family file at once.
+    Family files are the same as with genome-major extraction (sequences ordered by genome,
+    then by position in the genome fasta file).
+
+    Parameters
+    ----------
+    all_genomes : []
+        list of all genome names
+    dname : str
+        name of dataset
+    dbpath : str
+        path to folder containing 'Proteins' and 'Genes' folders
+    listdir : str
+        path to folder containing the lists of proteins/genes to extract
+    aldir : str
+        path to folder where extracted proteins/genes must be saved
+    files_todo : list
+        prt and gen files to generate, as returned by check_existing_extract (gen and prt
+        files of each family)
+    batch : int
+        number of families extracted together
+    quiet : bool
+        True if nothin must be written to stdout/stderr, False otherwise
+    threads : int
+        number of processes extracting batches in parallel
+    to_extract : dict or None
+        {genome: {member: fam_num}}. If None, read from getEntry files.
+    """
+    # Batch number of each output file (2 files per family: gen and prt)
+    file_batch = {out: (num // 2) // batch for num, out in enumerate(files_todo)}
+    nb_batches = (len(files_todo) // 2 + batch - 1) // batch
+    # records[batch_num] = [(fasta, [(offset, length, out)])] in genome order
+    records = [[] for _ in range(nb_batches)]
+    arguments = [(genome, dname, dbpath, listdir, aldir,
+                  None if to_extract is None else {genome: to_extract.get(genome, {})})
+                 for genome in all_genomes]
+    if threads == 1:
+        init_index_worker(file_batch)
+        genome_recs = map(get_genome_records, arguments)
+        pool = None
+    else:
+        # Indexing genomes (reading all their sequences) is the longest part of extraction
+        logger.details(f"Indexing {len(all_genomes)} genomes on {threads} threads")
+        pool = multiprocessing.Pool(threads, initializer=init_index_worker,
+                                    initargs=(file_batch,))
+        # imap keeps genome order, so that sequences are written in this order
+        genome_recs = pool.imap(get_genome_records, arguments)
+    try:
+        for fasta_recs in genome_recs:
+            for num, fasta, recs in fasta_recs:
+                records[num].append((fasta, recs))
+        if pool:
+            pool.close()
+            pool.join()
+    # If an error occurs (or user kills with keybord), terminate pool and exit
+    except Exception as excp:  # pragma: no cover
+        if pool:
+            pool.terminate()
+        logger.error(excp)
+        sys.exit(1)
+    bar = None
+    if not quiet:
+        widgets = ['Extraction:',
+                   progressbar.Bar(marker='█', left='', right='', fill=' '),
+                   ' ', progressbar.Counter(), "/{}".format(nb_batches), ' (',
+                   progressbar.Percentage(), ") - ", progressbar.Timer(), ' ',
+                   progressbar.ETA()]
+        bar = progressbar.ProgressBar(widgets=widgets, max_value=nb_batches,
+                                      term_width=79).start()
+    if threads == 1:
+        for num, batch_recs in enumerate(records):
+            logger.details("Extracting proteins and genes of families batch "
+                           f"{num + 1}/{nb_batches}")
+            extract_batch(batch_recs)
+            if not quiet:
+                bar.update(num + 1)
+    else:
+        logger.details(f"Extracting {nb_batches} batches of families on {threads} threads")
+        pool = multiprocessing.Pool(threads)
+        try:
+            # Each batch writes to its own family files: no conflict between processes
+            for num, _ in enumerate(pool.imap_unordered(extract_batch, records)):
+                if not quiet:
+                    bar.update(num + 1)
+            pool.close()
+            pool.join()
+        # If an error occurs (or user kills with keybord), terminate pool and exit
+        except Exception as excp:  # pragma: no cover
+            pool.terminate()
+            logger.error(excp)
+            sys.exit(1)
+    if not quiet:
+        bar.finish()
+
+
+def init_index_worker(file_batch):
+    """
+    Save the batch of each output file, used by all genomes indexed by this process
+
+    Parameters
+    ----------
+    file_batch : dict
+        {output file: batch number}
+    """
+    global _FILE_BATCH
+    _FILE_BATCH = file_batch
+
+
+def get_genome_records(args):
+    """
+    Index the protein and gene files of a genome, and get the position of each sequence to
+    extract, split by batch of families.
+
+    Parameters
+    ----------
+    args : tuple
+        (genome, dname, dbpath, listdir, aldir, to_extract), with to_extract as given to
+        get_genome_to_extract
+
+    Returns
+    -------
+    list
+        [(batch number, fasta, [(offset, length, out)])], sequences being sorted by position
+        in each fasta file
+    """
+    genome, dname, dbpath, listdir, aldir, to_extract = args
+    genome_extract = get_genome_to_extract(genome, dname, listdir, aldir, to_extract)
+    genome_recs = []
+    for fasta, seqs in zip(get_genome_fastas(dbpath, genome), genome_extract):
+        index = get_fasta_index(fasta, listdir)
+        fasta_recs = {}
+        for (offset, length), seq in sorted((index[seq], seq) for seq in seqs
+                                            if seq in index):
+            out = seqs[seq]
+            if out not in _FILE_BATCH:
+                print(f"Sequence {seq} not written because no output file specified",
+                      file=sys.stderr)
+                continue
+            fasta_recs.setdefault(_FILE_BATCH[out], []).append((offset, length, out))
+        genome_recs += [(num, fasta, recs) for num, recs in sorted(fasta_recs.items())]
+    return genome_recs
+
+
+def get_genome_fastas(dbpath, genome):
+    """
+    Get the protein and gene files of a genome
+
+    Parameters
+    ----------
+    dbpath : str
+        path to folder containing 'Proteins' and 'Genes' folders
+    genome : str
+        genome name
+
+    Returns
+    -------
+    tuple
+        (protein file, gene file)
+    """
+    return (os.path.join(dbpath, "Proteins", genome + ".prt"),
+            os.path.join(dbpath, "Genes", genome + ".gen"))
+
+
+def get_genome_to_extract(genome, dname, listdir, aldir, to_extract=None):
+    """
+    Get the proteins and genes to extract from a genome, with the family file to which
+    each of them must be extracted.
+
+    Parameters
+    ----------
+    genome : str
+        genome name
+    dname : str
+        name of dataset
+    listdir : str
+        path to folder containing the getEntry files (used if to_extract is None)
+    aldir : str
+        path to folder where extracted proteins/genes must be saved
+    to_extract : dict or None
+        {genome: {member: fam_num}}. If None, read from getEntry files.
+
+    Returns
+    -------
+    tuple
+        ({protein: prt file}, {gene: gen file})
+    """
+    if to_extract is None:
+        ge_prt = os.path.join(listdir, dname + "-getEntry_prt_" + genome + ".txt")
+        ge_gen = os.path.join(listdir, dname + "-getEntry_gen_" + genome + ".txt")
+        with open(ge_prt, "r") as tabf:
+            prts = get_names_to_extract(tabf, None)
+        with open(ge_gen, "r") as tabf:
+            gens = get_names_to_extract(tabf, None)
+        return prts, gens
+    members = to_extract.get(genome, {})
+    prefix = os.path.join(aldir, dname + "-current.")
+    prts = {mem: prefix + fam + ".prt" for mem, fam in members.items()}
+    gens = {mem: prefix + fam + ".gen" for mem, fam in members.items()}
+    return prts, gens
+
+
+def extract_batch(batch_recs):
+    """
+    Read all sequences of a batch of families, and write each family file at once.
+
+    Parameters
+    ----------
+    batch_recs : list
+        [(fasta, [(offset, length, out)])]: for each fasta file, position of the sequences
+        to read, and file to which they must be written
+    """
+    contents = {}  # {out: [sequences]}
+    for fasta, recs in batch_recs:
+        with open(fasta, "rb") as fasf:
+            for offset, length, out in recs:
+                fasf.seek(offset)
+                contents.setdefault(out, []).append(fasf.read(length))
+    for out, seqs in contents.items():
+        with open(out, "ab") as outf:
+            outf.write(b"".join(seqs))
+
+
 def check_existing_extract(all_fams, aldir, dname):
     """
     For each family, check if its prt and gen extraction file already exist.
@@ -148,48 +404,6 @@ def check_existing_extract(all_fams, aldir, dname):
     return extract_fams
 
 
-def get_genome_seqs(fasta, tabfile, files_todo, outfile=None):
-    """
-    From a fasta file, extract all sequences given in the tab file.
-    The tab file can contain:
-
-    - 1 sequence name per line -> all sequences will be extracted to the same file
-    - 1 sequence + 1 filename per line -> each sequence will be extracted in the given file
-
-    If outfile not given, the tab file must contain 2 columns (1 for the sequence name,
-    1 for its output file). If an outfile is given, only the 1st column of tab file
-    will be considered, and all sequences will be extracted to the given outfile.
-
-    Parameters
-    ----------
-    fasta : str
-        path to fasta file from which sequences must be extracted
-    tabfile : str
-        path to the tab file containing the names of sequences to extract
-    files_todo : list
-        list of files which must be generated (prt and gen files). Others
-        already exist, so ignore them.
-    outfile : str or None
-        if None, the tab file must contain 2 columns (1 for the sequence name,
-        1 for its output file). If an outfile is given (not None), only the 1st column of tab file
-        will be considered, and all sequences will be extracted to the given outfile.
-    """
-    with open(tabfile, "r") as tabf:
-        to_extract = get_names_to_extract(tabf, outfile)
-    if outfile:
-        if os.path.isfile(outfile):
-            logger.warning("Sequences are already extracted in {}. This will "
-                           "be used for next step. If you want "
-                           "to re-extract all sequences, use option -F (or "
-                           "--force)".format(outfile))
-            return
-        with open(fasta, "r") as fasf, open(outfile, "a") as outf:
-            extract_sequences(to_extract, fasf, outf=outf)
-    else:
-        with open(fasta, "r") as fasf:
-            extract_sequences(to_extract, fasf, files_todo=files_todo)
-
-
 def get_names_to_extract(tabf, outfile):
     """
     From the tab file, get names of sequences to extract.
@@ -226,64 +440,193 @@ def get_names_to_extract(tabf, outfile):
     return to_extract
 
 
-def extract_sequences(to_extract, fasf, files_todo=None, outf=None):
+def extract_indexed(fasta, index, to_extract, files_todo, handles):
     """
-    Extract sequences from an open fasta file 'fasf', and a list of sequences to
-    extract
+    Extract sequences from a fasta file, seeking directly to each of them.
+    Sequences are read in their order in the fasta file, so that output files are the same
+    as when reading the whole file.
 
     Parameters
     ----------
-    to_extract : dict or []
-        {sequence_to_extract: file_to_which_it_will_be_extracted} or list of sequences to
-        extract, all in a same outfile (name must be given in 'outf')
-    fasf : _io.TextIO
-        open file containing sequences in multi-fasta format
-    files_todo : list or None
-        list of files which must be generated (prt and gen files). Others
-        already exist, so ignore them.
-    outf : _io.TextIO or None
-        If an outfile is given (not None), and 'to_extract' is a dict, only its keys will be
-        considered, and all these sequences will be extracted to 'outfile' (if 'to_extract' is a
-        list, will extract all sequences of this list). Otherwise, if None,
-        each sequence will be extracted to its corresponding value in 'to_extract'.
+    fasta : str
+        path to fasta file from which sequences must be extracted
+    index : dict
+        {sequence name: (offset, length)} of the fasta file (see build_fasta_index)
+    to_extract : dict
+        {sequence_to_extract: file_to_which_it_will_be_extracted}
+    files_todo : set
+        files which must be generated. Sequences to extract to other files are ignored.
+    handles : FileHandlePool
+        pool of open output files
     """
+    # Sequences not found in fasta file are ignored
+    found = sorted((index[seq], seq) for seq in to_extract if seq in index)
+    with open(fasta, "rb") as fasf:
+        for (offset, length), seq in found:
+            out = to_extract[seq]
+            if out not in files_todo:
+                print(f"Sequence {seq} not written because no output file specified",
+                      file=sys.stderr)
+                continue
+            fasf.seek(offset)
+            handles.get(out).write(fasf.read(length))
 
-    # Create optimized index for requests
-    if files_todo is None:
-        files_todo = []
-    files_todo = frozenset(files_todo)
-    if type(to_extract) == list:
-        to_extract = frozenset(to_extract)
-    # State machine variables
-    previous_fp = None
-
-    for line in fasf:
-        if line[0] == '>':
-            # Close previous file if needed
-            if outf is None and previous_fp is not None:
-                previous_fp.close()
-            previous_fp = None
-
-            # Extract sequence name
-            last_char = line.find(' ')
-            if last_char == -1:
-                last_char = len(line)
-            seq = line[1:last_char].strip()
-
-            # Seq is part of sequences to extract
-            if seq in to_extract:
-                # Open the right file
-                previous_fp = outf
-                if previous_fp is None:
-                    out = to_extract[seq]
-                    if out in files_todo:
-                        previous_fp = open(out, "a")
-                    else:
-                        print(f"Sequence {seq} not written because no output file specified", file=sys.stderr)
-
-        # Write the line content if the file pointer is opened
-        if previous_fp is not None:
-            previous_fp.write(line)
-
-    if outf is None and previous_fp is not None:
-        previous_fp.close()
+
+def get_fasta_index(fasta, idxdir=None):
+    """
+    Get the index of a fasta file: for each sequence, offset and length (in bytes) of its
+    entry (header + sequence lines) in the file.
+
+    If 'idxdir' is given, the index is cached in ``<idxdir>/<fasta filename>.idx``, and
+    reused as long as it is more recent than the fasta file. If this file cannot be
+    written, the index is only kept in memory.
+
+    Parameters
+    ----------
+    fasta : str
+        path to fasta file
+    idxdir : str or None
+        directory where the index is cached
+
+    Returns
+    -------
+    dict
+        {sequence name: (offset, length)}
+    """
+    idxfile = None
+    if idxdir:
+        idxfile = os.path.join(idxdir, os.path.basename(fasta) + ".idx")
+        if (os.path.isfile(idxfile)
+                and os.path.getmtime(idxfile) >= os.path.getmtime(fasta)):
+            return read_fasta_index(idxfile)
+    index = build_fasta_index(fasta)
+    if idxfile:
+        try:
+            write_fasta_index(index, idxfile)
+        except OSError:
+            logger.debug(f"Could not save index of {fasta} to {idxfile}")
+    return index
+
+
+def build_fasta_index(fasta):
+    """
+    Read a fasta file, and get offset and length (in bytes) of each entry.
+    Sequence name is the header, until the first space.
+
+    Parameters
+    ----------
+    fasta : str
+        path to fasta file
+
+    Returns
+    -------
+    dict
+        {sequence name: (offset, length)}
+    """
+    index = {}
+    seq = None
+    start = 0
+    pos = 0
+    with open(fasta, "rb") as fasf:
+        for line in fasf:
+            if line[:1] == b'>':
+                if seq is not None:
+                    index[seq] = (start, pos - start)
+                seq = line[1:].split(b' ', 1)[0].strip().decode()
+                start = pos
+            pos += len(line)
+    if seq is not None:
+        index[seq] = (start, pos - start)
+    return index
+
+
+def write_fasta_index(index, idxfile):
+    """
+    Save the index of a fasta file: 1 line per sequence, with sequence name, offset and
+    length separated by tabs.
+
+    Parameters
+    ----------
+    index : dict
+        {sequence name: (offset, length)}
+    idxfile : str
+        file where index must be saved
+    """
+    # Write to temporary file, so that an interrupted run does not leave a partial index
+    tmpfile = idxfile + ".tmp"
+    with open(tmpfile, "w") as idxf:
+        for seq, (offset, length) in index.items():
+            idxf.write(f"{seq}\t{offset}\t{length}\n")
+    os.replace(tmpfile, idxfile)
+
+
+def read_fasta_index(idxfile):
+    """
+    Read the index of a fasta file saved by write_fasta_index
+
+    Parameters
+    ----------
+    idxfile : str
+        file containing the index
+
+    Returns
+    -------
+    dict
+        {sequence name: (offset, length)}
+    """
+    index = {}
+    with open(idxfile, "r") as idxf:
+        for line in idxf:
+            seq, offset, length = line.split("\t")
+            index[seq] = (int(offset), int(length))
+    return index
+
+
+class FileHandlePool:
+    """
+    Keep at most 'max_open' output files open (in binary append mode). When a new file must
+    be opened and the pool is full, the least recently used file is closed.
+    """
+
+    def __init__(self, max_open=256):
+        self.max_open = max_open
+        self.handles = collections.OrderedDict()
+
+    def get(self, path):
+        """
+        Get the open handle of 'path', opening it if needed
+
+        Parameters
+        ----------
+        path : str
+            path to output file
+
+        Returns
+        -------
+        _io.BufferedWriter
+            file open in append mode
+        """
+        handle = self.handles.get(path)
+        if handle is not None:
+            self.handles.move_to_end(path)
+            return handle
+        if len(self.handles) >= self.max_open:
+            _, oldest = self.handles.popitem(last=False)
+            oldest.close()
+        handle = open(path, "ab")
+        self.handles[path] = handle
+        return handle
+
+    def close(self):
+        """
+        Close all open files
+        """
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
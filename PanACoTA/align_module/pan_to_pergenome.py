@@ -46,6 +46,9 @@ Input:
 
 Output:
 
+- for each genome, the list of its persistent proteins, with the family to which they belong,
+  given in memory to the extraction step or, with the 'getentry' option, written to the 2
+  following files:
 - for each genome: ``<outdir>/List-<dname>/<dname>-getEntry_gen_<genome>.txt``: list of all
   genes from the 'genome' which correspond to persistent proteins. 2 columns:
   the first one is the protein name, the second is the filename to which it must be extracted
@@ -66,12 +69,13 @@ import logging
 logger = logging.getLogger("align.pan_to_pergenome")
 
 
-def get_per_genome(persgen, list_gen, dname, outdir):
+def get_per_genome(persgen, list_gen, dname, outdir, getentry=False):
     """
     From persistent genome and list of all genomes, sort persistent proteins by genome
 
-    For each genome, write all persistent proteins to a file, with the family from which they
-    are, in order to extract those proteins after.
+    For each genome, get all persistent proteins, with the family from which they
+    are, in order to extract those proteins after. They are given to the extraction step in
+    memory, and, if 'getentry' is True, also written to files.
     For each family, also save the names of genomes which do not have any member. This will
     be used to complete the alignments by stretches of '-'.
 
@@ -86,15 +90,20 @@ def get_per_genome(persgen, list_gen, dname, outdir):
     outdir : str
         Directory where files must be saved. Will create 2 subfolders: ``Align-<dname>``
         and ``List-<dname>``
+    getentry : bool
+        True to write, for each genome, the files with the proteins and genes to extract
+        (``<dname>-getEntry_<prt or gen>_<genome>.txt``). Extraction then uses those files.
 
     Returns
     -------
-    (all_genomes, aldir, listdir, families) : tuple
+    (all_genomes, aldir, listdir, families, to_extract) : tuple
 
         * all_genomes : [] list of all genome names
         * aldir : str, path to align directory
         * listdir : str, path to List directory
         * families : str, list of family numbers
+        * to_extract : dict, {genome: {member: fam_num}} proteins to extract from each
+          genome. None if 'getentry' is True (extraction uses getEntry files)
     """
     # Define output directories
     aldir = os.path.join(outdir, "Align-" + dname)
@@ -110,9 +119,14 @@ def get_per_genome(persgen, list_gen, dname, outdir):
     logger.info("Reading PersGenome and constructing lists of missing genomes in each family.")
     all_prots, fam_genomes, several = proteins_per_strain(persgen, all_genomes)
     # Write output files
-    write_getentry_files(all_prots, several, listdir, aldir, dname, all_genomes)
+    to_extract = None
+    if getentry:
+        write_getentry_files(all_prots, several, listdir, aldir, dname, all_genomes)
+    else:
+        check_genomes_prots(all_prots, all_genomes)
+        to_extract = get_to_extract(all_prots, several)
     write_missing_genomes(fam_genomes, several, all_genomes, aldir, dname)
-    return all_genomes, aldir, listdir, fam_genomes.keys()
+    return all_genomes, aldir, listdir, fam_genomes.keys(), to_extract
 
 
 def get_all_genomes(list_gen):
@@ -216,12 +230,22 @@ def write_getentry_files(all_prots, several, listdir, aldir, dname, all_genomes)
     """
     for strain, member in all_prots.items():
         write_genome_file(listdir, aldir, dname, strain, member, several)
-    error = []
-    for strain in all_genomes:
-        gegenfile = os.path.join(listdir, dname + "-getEntry_gen_" + strain + ".txt")
-        geprtfile = os.path.join(listdir, dname + "-getEntry_prt_" + strain + ".txt")
-        if not os.path.isfile(gegenfile) or not os.path.isfile(geprtfile):
-            error.append(strain)
+    check_genomes_prots(all_prots, all_genomes)
+
+
+def check_genomes_prots(all_prots, all_genomes):
+    """
+    Check that each genome has at least 1 protein in a persistent family. If not, exit with
+    an error message.
+
+    Parameters
+    ----------
+    all_prots : dict
+        {strain: {member: fam_num}}
+    all_genomes : list
+        list of all genomes
+    """
+    error = [strain for strain in all_genomes if strain not in all_prots]
     if error:
         for gen in error:
             logger.error(f"There is not any protein for genome {gen} in any family! "
@@ -230,6 +254,27 @@ def write_getentry_files(all_prots, several, listdir, aldir, dname, all_genomes)
         sys.exit(1)
 
 
+def get_to_extract(all_prots, several):
+    """
+    For each genome, get the proteins to extract (same as in getEntry files): all its
+    persistent proteins, except those from families where the genome has several members.
+
+    Parameters
+    ----------
+    all_prots : dict
+        {strain: {member: fam_num}}
+    several : dict
+        {fam_num: [genomes having several members in family]}
+
+    Returns
+    -------
+    dict
+        {strain: {member: fam_num}}
+    """
+    return {strain: {mem: fam for mem, fam in members.items() if strain not in several[fam]}
+            for strain, members in all_prots.items()}
+
+
 def write_genome_file(listdir, aldir, dname, strain, member, several):
     """
     For a given genome, write all the proteins and genes to extract to its file.
@@ -277,6 +322,10 @@ def write_missing_genomes(fam_genomes, several, all_genomes, aldir, dname):
     For each family, write the names of all genomes which do not have any member in
     the family.
 
+    Genomes are sorted, and a file which already contains the same genomes is not
+    rewritten, so that the alignment journal of a previous run (see
+    ``alignment.get_done_families``) still matches it.
+
     Parameters
     ----------
     fam_genomes : dict
@@ -293,10 +342,14 @@ def write_missing_genomes(fam_genomes, several, all_genomes, aldir, dname):
     for fam, genomes in fam_genomes.items():
         # File where missing genomes will be written
         missfile = os.path.join(aldir, f"{dname}-current.{fam}.miss.lst")
+        # missing = missing or several members:
+        # miss: all genomes - genomes in the family
+        # several: add to 'miss' genomes with several members in the family
+        missing = (set(all_genomes) - set(genomes)).union(set(several[fam]))
+        content = "".join(genome + "\n" for genome in sorted(missing))
+        if os.path.isfile(missfile):
+            with open(missfile, "r") as mff:
+                if mff.read() == content:
+                    continue
         with open(missfile, "w") as mff:
-            # missing = missing or several members:
-            # miss: all genomes - genomes in the family
-            # several: add to 'miss' genomes with several members in the family
-            missing = (set(all_genomes) - set(genomes)).union(set(several[fam]))
-            if missing:
-                mff.write("\n".join(missing) + "\n")
+            mff.write(content)
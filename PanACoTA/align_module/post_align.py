@@ -43,21 +43,31 @@ March 2017
 
 import os
 import sys
+import mmap
 import logging
+import shutil
+import logging.handlers
+import threading
 import progressbar
 import multiprocessing
+from multiprocessing.pool import ThreadPool
 from PanACoTA import utils
 
 logger = logging.getLogger("align.post")
 
 
-def post_alignment(fam_nums, all_genomes, prefix, outdir, dname, prot_ali, quiet):
+def post_alignment(fam_nums, all_genomes, prefix, outdir, dname, prot_ali, quiet, concat=True,
+                   threads=1):
     """
     After the alignment of all proteins by family:
 
     - concatenate all alignment files
     - group the alignment by genome
 
+    Nucleic and protein alignments are grouped by genome at the same time, each of them
+    being split into chunks (of families, or of the concatenated file) processed in parallel
+    (see group_alignments).
+
     Parameters
     ----------
     fam_nums : []
@@ -74,32 +84,130 @@ def post_alignment(fam_nums, all_genomes, prefix, outdir, dname, prot_ali, quiet
         true: also give concatenated alignment in aa
     quiet : bool
         True if nothing must be sent to sdtout/stderr, False otherwise
+    concat : bool
+        True (default) to write the concatenation of all alignment files, and group it by
+        genome. False to group alignments by genome directly from the family alignment files,
+        without writing the concatenated file.
+    threads : int
+        max number of processes used to concatenate alignments and group them by genome
     """
-    all_alns_nucl, status_nucl = concat_alignments(fam_nums, prefix, "nucl", quiet)
     treedir = os.path.join(outdir, "Phylo-" + dname)
     os.makedirs(treedir, exist_ok=True)
-    outfile_nucl = os.path.join(treedir, dname + ".nucl.grp.aln")
-    res_nucl = launch_group_by_genome(all_genomes, all_alns_nucl, status_nucl, outfile_nucl, dname, "nucleic", quiet)
-    if not res_nucl:
-        utils.remove(all_alns_nucl)
-        utils.remove(outfile_nucl)
+    # (type of alignment files, type given to user)
+    ali_types = [("nucl", "nucleic")]
+    if prot_ali:
+        ali_types.append(("aa", "protein"))
+    outfiles = {}
+    to_group = []
+    for ali_type, type_ali in ali_types:
+        outfile = os.path.join(treedir, f"{dname}.{ali_type}.grp.aln")
+        outfiles[ali_type] = outfile
+        all_alns, status = get_alignments(fam_nums, prefix, ali_type, outfile, concat, quiet,
+                                          threads)
+        if not check_grouped(outfile, status, type_ali):
+            to_group.append((ali_type, all_alns, outfile, type_ali))
+    results = group_alignments(all_genomes, [job[1:] for job in to_group], threads, quiet)
+    failed = {}
+    for (ali_type, all_alns, outfile, _), res in zip(to_group, results):
+        if not res:
+            if concat:
+                utils.remove(all_alns)
+            utils.remove(outfile)
+            failed[ali_type] = True
+    if "nucl" in failed:
         logger.error("An error occurred. We could not group DNA alignments by genome.")
         sys.exit(1)
-    if prot_ali:
-        all_alns_aa, status_aa = concat_alignments(fam_nums, prefix, "aa", quiet)
-        outfile_aa = os.path.join(treedir, dname + ".aa.grp.aln")
-        res_aa = launch_group_by_genome(all_genomes, all_alns_aa, status_aa, outfile_aa, dname, "protein", quiet)
-        if not res_aa:
-            utils.remove(all_alns_aa)
-            utils.remove(outfile_aa)
-            logger.error("An error occurred. We could not group protein alignments by genome.")
-    return outfile_nucl
+    if "aa" in failed:
+        logger.error("An error occurred. We could not group protein alignments by genome.")
+    return outfiles["nucl"]
+
+
+def get_alignments(fam_nums, prefix, ali_type, outfile, concat, quiet, threads=1):
+    """
+    Get alignments which must be grouped by genome: either the concatenation of all
+    alignment files (concat_alignments), or the list of family alignment files.
+
+    Without concatenation, we cannot know if the families changed since the grouped file
+    was written. So, it is considered as already done ("OK") only if it is more recent than
+    all family alignment files.
+
+    Parameters
+    ----------
+    fam_nums : []
+        list of family numbers
+    prefix : str
+        path to ``aldir/<name of dataset>``
+    ali_type : str
+        aa or nucl
+    outfile : str
+        file which will contain all families aligned by genome
+    concat : bool
+        True to concatenate all alignment files, False to use family files directly
+    quiet : bool
+        True if nothing must be sent to sdtout/stderr, False otherwise
+    threads : int
+        max number of threads used to concatenate alignment files
+
+    Returns
+    -------
+    tuple
+        (alns, str) with:
+
+        - alns: path to concatenated file if concat, list of family alignment files otherwise
+        - str: "OK" if concatenation (or grouped file) already exists and is up to date,
+          "Done" otherwise
+    """
+    if concat:
+        return concat_alignments(fam_nums, prefix, ali_type, quiet, threads)
+    list_files = get_family_files(fam_nums, prefix, ali_type)
+    if (os.path.isfile(outfile) and
+            all(os.path.getmtime(f) <= os.path.getmtime(outfile) for f in list_files)):
+        return list_files, "OK"
+    return list_files, "Done"
+
+
+def get_family_files(fam_nums, prefix, ali_type):
+    """
+    Get the list of alignment files of all families, and check that they all exist.
+
+    Parameters
+    ----------
+    fam_nums : []
+        list of family numbers
+    prefix : str
+        path to ``aldir/<name of dataset>``
+    ali_type : str
+        aa or nucl
+
+    Returns
+    -------
+    list
+        list of alignment files, in the order of fam_nums
+    """
+    if ali_type == "aa":
+        info = "mafft-align"
+    elif ali_type == "nucl":
+        info = "mafft-prt2nuc"
+    else:
+        logger.error(f"Not possible to concatenate '{ali_type}' type of alignments.")
+        sys.exit(1)
+    list_files = [f"{prefix}-{info}.{num_fam}.aln" for num_fam in fam_nums]
+    # Check that all files exist
+    for f in list_files:
+        if not os.path.isfile(f):
+            logger.error(f"The alignment file {f} does not exist. Please check the families you "
+                         "want, and their corresponding alignment files")
+            sys.exit(1)
+    return list_files
 
 
-def concat_alignments(fam_nums, prefix, ali_type, quiet):
+def concat_alignments(fam_nums, prefix, ali_type, quiet, threads=1):
     """
     Concatenate all family alignment files to a unique file
 
+    With several threads, the output file is created with its final size, and chunks of
+    family files are copied at the same time to their own region of it (see concat_files).
+
     Parameters
     ----------
     fam_nums : []
@@ -111,6 +219,8 @@ def concat_alignments(fam_nums, prefix, ali_type, quiet):
         aa or nucl
     quiet : bool
         True if nothing must be sent to sdtout/stderr, False otherwise
+    threads : int
+        max number of threads used to copy alignment files
 
     Returns
     -------
@@ -120,11 +230,7 @@ def concat_alignments(fam_nums, prefix, ali_type, quiet):
         - output: path to file containing concatenation of all alignments
         - str: "OK" if concatenation file already exists, "Done" if just did concatenation
     """
-    if ali_type == "aa":
-        info = "mafft-align"
-    elif ali_type == "nucl":
-        info = "mafft-prt2nuc"
-    else:
+    if ali_type not in ["aa", "nucl"]:
         logger.error(f"Not possible to concatenate '{ali_type}' type of alignments.")
         sys.exit(1)
     output = f"{prefix}-complete.{ali_type}.cat.aln"
@@ -135,47 +241,69 @@ def concat_alignments(fam_nums, prefix, ali_type, quiet):
                         "running.")
         return output, "OK"
     logger.info(f"Concatenating all {ali_type} alignment files")
-    list_files = [f"{prefix}-{info}.{num_fam}.aln" for num_fam in fam_nums]
-    # Check that all files exist
-    for f in list_files:
-        if not os.path.isfile(f):
-            logger.error(f"The alignment file {f} does not exist. Please check the families you "
-                         "want, and their corresponding alignment files")
-            sys.exit(1)
-    if quiet:
+    list_files = get_family_files(fam_nums, prefix, ali_type)
+    if threads > 1:
+        concat_files(list_files, output, threads)
+    elif quiet:
         utils.cat(list_files, output)
     else:
         utils.cat(list_files, output, title="Concatenation")
     return output, "Done"
 
 
-def launch_group_by_genome(all_genomes, all_alns, status, outfile, dname, type_ali, quiet):
+def concat_files(list_files, output, threads):
     """
-    Function calling group_by_genome in a pool, while giving information to user
-    (time elapsed)
+    Concatenate files with several threads: output is created with its final size, and each
+    thread copies a chunk of consecutive files to its region of output.
+
+    Parameters
+    ----------
+    list_files : []
+        list of files to concatenate, in order
+    output : str
+        path to file where all files are concatenated
+    threads : int
+        max number of threads to use
+    """
+    sizes = [os.path.getsize(file) for file in list_files]
+    with open(output, "wb") as outf:
+        outf.truncate(sum(sizes))
+    nb_chunks = max(1, min(threads, len(list_files)))
+    size = -(-len(list_files) // nb_chunks)
+    chunks = []  # [(position of chunk in output, files of chunk)]
+    for start in range(0, len(list_files), size):
+        chunks.append((sum(sizes[:start]), list_files[start:start + size]))
+
+    def copy_chunk(chunk):
+        offset, files = chunk
+        with open(output, "r+b") as outf:
+            outf.seek(offset)
+            for file in files:
+                with open(file, "rb") as inf:
+                    shutil.copyfileobj(inf, outf)
+
+    # Copies release the GIL: threads are enough
+    with ThreadPool(nb_chunks) as pool:
+        pool.map(copy_chunk, chunks)
+
+
+def check_grouped(outfile, status, type_ali):
+    """
+    Check if alignments are already grouped by genome in outfile.
 
     Parameters
     ----------
-    all_genomes : []
-        list of all genomes in the dataset
-    all_alns : str
-        path to file containing all alignments concatenated
-    status : str
-        "OK" if concatenation file already existed before running, "Done" if just did concatenation
     outfile : str
         file containing all families align by genome
-    dname : str
-        name of dataset
+    status : str
+        "OK" if concatenation file already existed before running, "Done" if just did concatenation
     type_ali : str
         nucleic or protein
-    quiet : bool
-        True if nothing must be sent to sdtout/stderr, False otherwise
 
     Returns
     -------
     bool
-        - True if everything went well or was already done
-        - False if error occurred in at least one step
+        True if outfile already exists and can be used, False if grouping must be done
     """
     # Status = Done means that we just did the concatenation. So, if grouped by genome
     # file already exists, remove it.
@@ -189,121 +317,448 @@ def launch_group_by_genome(all_genomes, all_alns, status, outfile, dname, type_a
         logger.warning((f"{type_ali} alignments already grouped by genome in {outfile}. "
                         "Program will end. "))
         return True
-    logger.info(f"Grouping {type_ali} alignments per genome")
+    return False
+
+
+def group_alignments(all_genomes, to_group, threads, quiet):
+    """
+    Group several alignments by genome at the same time.
+
+    The alignment files of each output are split into at most 'threads' chunks of consecutive
+    families. A concatenated alignment file is split into at most 'threads' chunks of
+    consecutive sequences (see split_alignment): the row of a genome is the concatenation of
+    its sequences in file order, so each chunk gives consecutive columns of each row.
+    Then, all chunks of all outputs are processed by a pool of 'threads' processes,
+    in 2 steps:
+
+    - scan each chunk (scan_chunk), to get the number and length of sequences of each genome
+    - once each output file is created with its final size (init_grouped_file), copy each
+      chunk to its own columns of the rows of the output file (write_chunk). Chunks are written
+      to disjoint regions of the file, so they do not need to wait for each other.
+
+    Parameters
+    ----------
+    all_genomes : []
+        list of all genomes in the dataset
+    to_group : []
+        [(all_alns, outfile, type_ali)] for each output to create, with all_alns the
+        concatenated alignment file or the list of family alignment files, outfile the file
+        that will contain alignments grouped by genome, and type_ali its type (nucleic or
+        protein)
+    threads : int
+        max number of processes to use
+    quiet : bool
+        True if nothing must be sent to sdtout/stderr, False otherwise
+
+    Returns
+    -------
+    []
+        for each output, True if alignments were grouped by genome, False if an error occurred
+    """
+    tasks = []  # [(num of output, list of alignment files)]
+    for num, (all_alns, _, type_ali) in enumerate(to_group):
+        logger.info(f"Grouping {type_ali} alignments per genome")
+        if isinstance(all_alns, str):
+            tasks.extend((num, [segment]) for segment in split_alignment(all_alns, threads))
+            continue
+        nb_chunks = max(1, min(threads, len(all_alns)))
+        size = -(-len(all_alns) // nb_chunks)
+        for start in range(0, len(all_alns), size):
+            tasks.append((num, all_alns[start:start + size]))
+    if not tasks:
+        return []
     bar = None
     if not quiet:
-        widgets = [progressbar.BouncingBar(marker=progressbar.RotatingMarker(markers="◐◓◑◒")),
-                   "  -  ", progressbar.Timer()]
-        bar = progressbar.ProgressBar(widgets=widgets, max_value=20, term_width=50)
-    pool = multiprocessing.Pool(1)
-    args = [all_genomes, all_alns, outfile]
-    final = pool.map_async(group_by_genome, [args], chunksize=1)
-    pool.close()
+        widgets = ['Grouping:', progressbar.Bar(marker='█', left='', right='', fill=' '),
+                   ' ', progressbar.Counter(), f"/{2 * len(tasks)}", ' (',
+                   progressbar.Percentage(), ") - ", progressbar.Timer()]
+        bar = progressbar.ProgressBar(widgets=widgets, max_value=2 * len(tasks),
+                                      term_width=79).start()
+    pool = None
+    q = None
+    lp = None
+    if threads > 1:
+        pool = multiprocessing.Pool(threads)
+        # Create a Queue to put logs from processes, and handle them after from a single thread
+        m = multiprocessing.Manager()
+        q = m.Queue()
+        lp = threading.Thread(target=utils.logger_thread, args=(q,))
+        lp.start()
+    try:
+        # Step 1: number and length of sequences per genome, for each chunk
+        arguments = [(all_genomes, aln_files, q) for _, aln_files in tasks]
+        chunk_rows = run_tasks(pool, scan_chunk, arguments, bar, 0)
+        # Merge chunks of each output, and prepare output files
+        results = [True] * len(to_group)
+        cursors = [None] * len(tasks)
+        for num, (_, outfile, _) in enumerate(to_group):
+            task_nums = [tnum for tnum, task in enumerate(tasks) if task[0] == num]
+            if any(chunk_rows[tnum] is None for tnum in task_nums):
+                results[num] = False
+                continue
+            rows = {}
+            for tnum in task_nums:
+                for genome, (nb_seqs, length) in chunk_rows[tnum].items():
+                    rows.setdefault(genome, [0, 0])
+                    rows[genome][0] += nb_seqs
+                    rows[genome][1] += length
+            if not check_rows(rows):
+                results[num] = False
+                continue
+            starts = init_grouped_file(outfile, rows)
+            # Columns of each chunk start after the columns of the previous chunks
+            for tnum in task_nums:
+                cursors[tnum] = dict(starts)
+                for genome, (_, length) in chunk_rows[tnum].items():
+                    starts[genome] += length
+        # Step 2: copy each chunk to its region of the output file
+        arguments = [(to_group[num][1], aln_files, cursors[tnum], all_genomes, q)
+                     for tnum, (num, aln_files) in enumerate(tasks) if cursors[tnum]]
+        run_tasks(pool, write_chunk, arguments, bar, len(tasks))
+        if pool:
+            pool.close()
+            pool.join()
+            q.put(None)
+            lp.join()
+    # If an error occurs (or user kills with keybord), terminate pool and exit
+    except Exception as excp:  # pragma: no cover
+        if pool:
+            pool.terminate()
+            q.put(None)
+            lp.join()
+        logger.error(excp)
+        sys.exit(1)
     if not quiet:
-        while True:
-            if final.ready():
-                break
-            bar.update()
         bar.finish()
-    pool.join()
-    return False not in final.get()
+    return results
+
+
+def run_tasks(pool, function, arguments, bar, done):
+    """
+    Run 'function' on all arguments, in the given pool if any, and return results in the
+    order of arguments.
+
+    Parameters
+    ----------
+    pool : multiprocessing.Pool or None
+        pool of processes to use. If None, run everything in the current process
+    function : function
+        function to run on each argument
+    arguments : []
+        list of arguments to give to function
+    bar : progressbar.ProgressBar or None
+        progressbar to update after each task
+    done : int
+        number of tasks already done before those ones (for progressbar)
+
+    Returns
+    -------
+    []
+        list of results of function, in the same order as arguments
+    """
+    if pool:
+        results = []
+        for num, res in enumerate(pool.imap(function, arguments)):
+            results.append(res)
+            if bar:
+                bar.update(done + num + 1)
+        return results
+    results = []
+    for num, args in enumerate(arguments):
+        results.append(function(args))
+        if bar:
+            bar.update(done + num + 1)
+    return results
+
+
+def init_process_logger(q):
+    """
+    In a process of the pool, send all logs to the given queue, so that they are handled
+    by the main process.
+
+    Parameters
+    ----------
+    q : multiprocessing.managers.AutoProxy[Queue] or None
+        queue where logs must be put. If None (no pool), nothing is done.
+    """
+    if q is None:
+        return
+    qh = logging.handlers.QueueHandler(q)
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    root.handlers = []
+    logging.addLevelName(utils.detail_lvl(), "DETAIL")
+    root.addHandler(qh)
+
+
+def scan_chunk(args):
+    """
+    Get the number and length of sequences of each genome in a chunk of alignment files.
+
+    Parameters
+    ----------
+    args : tuple
+        (all_genomes, aln_files, q) with all_genomes the list of all genomes, aln_files the
+        alignment files of the chunk, and q the queue to send logs (or None)
+
+    Returns
+    -------
+    dict or None
+        {genome: [number of sequences, total length of sequences]}, None if a protein
+        does not correspond to any genome
+    """
+    all_genomes, aln_files, q = args
+    init_process_logger(q)
+    return count_alignments(aln_files, all_genomes, build_genome_index(all_genomes))
 
 
-def group_by_genome(args):
+def write_chunk(args):
     """
-    From the alignment file 'all_alns' containing all proteins, group the alignments of
-    proteins by their genome (listed in 'all_genomes'), and save the result
-    in 'treedir'
+    Copy the sequences of a chunk of alignment files to their positions in the output file.
 
     Parameters
     ----------
     args : tuple
-        - all_genomes: list of all genomes
-        - all_alns: path to file containing all alignments concatenated
-        - outfile: path to file which will contain alignments grouped by genome
+        (outfile, aln_files, cursors, all_genomes, q), with cursors the position of the
+        first column of the chunk in the row of each genome (see fill_grouped_file)
 
     Returns
     -------
     bool
-        - True if everything went well
-        - False if problem when trying to group by genomes
+        True when done
     """
-    all_genomes, all_alns, outfile = args
-    sequences = read_alignments(all_alns, all_genomes)
-    if not sequences:
-        return False
-    write_groups(outfile, sequences)
+    outfile, aln_files, cursors, all_genomes, q = args
+    init_process_logger(q)
+    fill_grouped_file(outfile, aln_files, cursors, all_genomes, build_genome_index(all_genomes))
     return True
 
 
-def read_alignments(all_alns, all_genomes):
+def count_alignments(aln_files, all_genomes, genome_index):
     """
-    Read alignment file, and assign each sequence to a genome
+    Get, for each genome, its number of sequences and the total length of its sequences
+    in the given alignment files.
 
     Parameters
     ----------
-    all_alns : str
-        path to file containing all alignments concatenated
+    aln_files : []
+        list of alignment files to read (or parts of them, see read_lines)
     all_genomes : []
         list of all genomes
+    genome_index : tuple
+        index of genome names, as returned by build_genome_index
 
     Returns
     -------
     dict or None
-        - {genome_name: [list of sequences for this genome]}
+        - {genome_name: [number of sequences, total length of sequences]}
         - None if problem with a protein for which we don't find the genome
     """
-    sequences = {}  # name: [ordered list of sequences]
-    genome = None
-    seq = ""
-    with open(all_alns, 'r') as alnf:
-        for line in alnf:
-            if line.startswith(">"):
-                # If new header, write previous protein name/sequence to 'sequences'
-                if genome and seq:
-                    sequences[genome].append(seq)
-                    seq = ""
-                # Get new genome header
-                genome = get_genome(line, all_genomes)
+    rows = {}  # genome: [nb sequences, length of concatenated sequences]
+    for aln_file in aln_files:
+        genome = None
+        seq_len = 0
+        for line in read_lines(aln_file):
+            if line.startswith(b">"):
+                if genome and seq_len:
+                    rows[genome][0] += 1
+                    rows[genome][1] += seq_len
+                seq_len = 0
+                genome = get_genome(line.decode(), all_genomes, genome_index)
                 if not genome:
                     return None
-                if genome not in sequences:
-                    sequences[genome] = []
+                if genome not in rows:
+                    rows[genome] = [0, 0]
             else:
-                seq += line.strip()
-    if genome and seq:
-        sequences[genome].append(seq)
-    per_genome = [len(seq) for seq in sequences.values()]
+                seq_len += len(line.strip())
+        if genome and seq_len:
+            rows[genome][0] += 1
+            rows[genome][1] += seq_len
+    return rows
+
+
+def check_rows(rows):
+    """
+    Check that all genomes have the same number of sequences, and the same alignment length.
+
+    Parameters
+    ----------
+    rows : dict
+        {genome_name: [number of sequences, total length of sequences]}
+
+    Returns
+    -------
+    bool
+        True if all genomes have the same number of sequences and alignment length
+    """
+    per_genome = [nb_seqs for nb_seqs, _ in rows.values()]
     if len(set(per_genome)) != 1:
         logger.error("Problems occurred while grouping alignments by genome: all genomes "
                      "do not have the same number of sequences. Check that each protein "
                      "name contains the name of the genome from which it comes.")
-        return None
+        return False
+    if len({length for _, length in rows.values()}) != 1:
+        logger.error("Problems occurred while grouping alignments by genome: all genomes "
+                     "do not have the same alignment length. Check your alignment files.")
+        return False
     logger.log(utils.detail_lvl(), f"{per_genome[0]} sequences found per genome")
-    return sequences
+    return True
 
 
-def write_groups(outfile, sequences):
+def init_grouped_file(outfile, rows):
     """
-    Writing alignments per genome to output file.
+    Create the file which will contain alignments grouped by genome, with its final size:
+    write the header of each genome, followed by an empty row of the length of its sequence.
 
     Parameters
     ----------
     outfile : str
         path to file that will contain alignments grouped by genome
-    sequences : dict
-        {genome_name: [list of sequences (DNA, prot...) for this genome]}
+    rows : dict
+        {genome_name: [number of sequences, total length of sequences]}
+
+    Returns
+    -------
+    dict
+        {genome: position in outfile of the first column of its sequence}
     """
     logger.log(utils.detail_lvl(), "Writing alignments per genome")
-    with open(outfile, "w") as outf:
-        for genome in sorted(sequences, key=utils.sort_genomes_by_name):
-            # write header for genome
-            outf.write(">" + genome + "\n")
-            # Write all sequences
-            outf.write("".join(sequences[genome]) + "\n")
+    cursors = {}
+    with open(outfile, "wb") as outf:
+        for genome in sorted(rows, key=utils.sort_genomes_by_name):
+            outf.write((">" + genome + "\n").encode())
+            cursors[genome] = outf.tell()
+            # Sequence will be written later, just leave space for it
+            outf.seek(rows[genome][1], os.SEEK_CUR)
+            outf.write(b"\n")
+    return cursors
+
+
+def fill_grouped_file(outfile, aln_files, cursors, all_genomes, genome_index):
+    """
+    Copy each sequence line read in the alignment files at the current position of its
+    genome row in outfile (created by init_grouped_file).
+
+    Parameters
+    ----------
+    outfile : str
+        path to file that will contain alignments grouped by genome
+    aln_files : []
+        list of alignment files to read (or parts of them, see read_lines), in the order of
+        concatenation
+    cursors : dict
+        {genome: position in outfile where the first sequence of aln_files must be written}
+    all_genomes : []
+        list of all genomes
+    genome_index : tuple
+        index of genome names, as returned by build_genome_index
+    """
+    size = os.path.getsize(outfile)
+    if size == 0:
+        return
+    cursors = dict(cursors)
+    with open(outfile, "r+b") as outf, mmap.mmap(outf.fileno(), size) as outmap:
+        for aln_file in aln_files:
+            genome = None
+            for line in read_lines(aln_file):
+                if line.startswith(b">"):
+                    genome = get_genome(line.decode(), all_genomes, genome_index)
+                    continue
+                seq = line.strip()
+                cursor = cursors[genome]
+                outmap[cursor:cursor + len(seq)] = seq
+                cursors[genome] = cursor + len(seq)
+
+
+def split_alignment(aln_file, nb_chunks):
+    """
+    Split an alignment file into at most nb_chunks parts of about the same size, each part
+    starting at the header of a sequence.
+
+    Parameters
+    ----------
+    aln_file : str
+        path to alignment file
+    nb_chunks : int
+        max number of parts
+
+    Returns
+    -------
+    list
+        [(aln_file, start, end)] for each part, with start and end its positions in the file
+    """
+    size = os.path.getsize(aln_file)
+    if size == 0:
+        return [(aln_file, 0, 0)]
+    starts = [0]
+    with open(aln_file, "rb") as alnf, mmap.mmap(alnf.fileno(), 0,
+                                                 access=mmap.ACCESS_READ) as alnmap:
+        for num in range(1, max(1, nb_chunks)):
+            # Next header after the expected start of this part
+            pos = alnmap.find(b"\n>", max(starts[-1], num * size // nb_chunks - 1))
+            if pos == -1:
+                break
+            starts.append(pos + 1)
+    ends = starts[1:] + [size]
+    return [(aln_file, start, end) for start, end in zip(starts, ends)]
+
+
+def read_lines(aln_file):
+    """
+    Read the lines of an alignment file, or of a part of it
+
+    Parameters
+    ----------
+    aln_file : str or tuple
+        path to alignment file, or (path, start, end) to read only from position start to
+        position end (see split_alignment)
+
+    Returns
+    -------
+    generator
+        lines read, as bytes
+    """
+    if isinstance(aln_file, str):
+        aln_file, start, end = aln_file, 0, None
+    else:
+        aln_file, start, end = aln_file
+    with open(aln_file, "rb") as alnf:
+        alnf.seek(start)
+        pos = start
+        for line in alnf:
+            if end is not None and pos >= end:
+                break
+            pos += len(line)
+            yield line
+
+
+def build_genome_index(all_genomes):
+    """
+    Index genome names by their length, so that the genome of a header can be found with
+    a few dict lookups (1 per distinct genome name length) instead of comparing the header
+    to all genome names.
+
+    Parameters
+    ----------
+    all_genomes : []
+        list of all genomes
+
+    Returns
+    -------
+    tuple
+        (lengths, ranks) with:
+
+        - lengths: sorted list of all distinct genome name lengths
+        - ranks: {genome: position of genome in all_genomes}
+    """
+    ranks = {}
+    for rank, genome in enumerate(all_genomes):
+        # If a genome is given several times, keep its first position
+        ranks.setdefault(genome, rank)
+    lengths = sorted({len(genome) for genome in ranks})
+    return lengths, ranks
 
 
-def get_genome(header, all_genomes):
+def get_genome(header, all_genomes, genome_index=None):
     """
     Find to which genome belongs 'header'
 
@@ -313,6 +768,9 @@ def get_genome(header, all_genomes):
         header read in alignment file
     all_genomes : []
         list of all genomes
+    genome_index : tuple or None
+        index of genome names, as returned by build_genome_index. If not given, it is built
+        from all_genomes (give it when calling this function for many headers)
 
     Returns
     -------
@@ -324,12 +782,21 @@ def get_genome(header, all_genomes):
     # Ex: in gembase complete DB: >TOTO.0215.00002.i006_00065 is from genome TOTO.0215.00002
     # So, genome name cannot be deduced directly from header. But it is always included in header
     header = header.split(">")[1].split()[0]
-
-    for genome in all_genomes:
-        if header.startswith(genome):
-            # header should start with the genome name. Nothing before it.
-            # Ex: >86KG_12345 is from genome 86KG. >6KG_12345 is from genome 6KG, not 86KG
-            return genome
+    if genome_index is None:
+        genome_index = build_genome_index(all_genomes)
+    lengths, ranks = genome_index
+    # header should start with the genome name. Nothing before it.
+    # Ex: >86KG_12345 is from genome 86KG. >6KG_12345 is from genome 6KG, not 86KG
+    # If several genome names are prefixes of the header, keep the first one in all_genomes
+    found = None
+    for length in lengths:
+        if length > len(header):
+            break
+        rank = ranks.get(header[:length])
+        if rank is not None and (found is None or rank < found[0]):
+            found = (rank, header[:length])
+    if found:
+        return found[1]
     logger.error((f"Protein {header} does not correspond to any genome name "
                   f"given... {all_genomes}"))
     return None
@@ -39,14 +39,24 @@ Functions to generate a persistent genome from a pangenome.
 @author gem
 April 2017
 """
+import os
+import sys
 import logging
+import logging.handlers
 import math
+import multiprocessing
+import threading
+import numpy as np
 
 from PanACoTA import utils
 from PanACoTA import utils_pangenome as utilsp
 
 logger = logging.getLogger("corepers.pers")
 
+# Pangenome data shared (read-only) by all processes computing subsets of genomes.
+# Filled by init_subsets: with fork, child processes get it by copy-on-write.
+SUBSET_DATA = {}
+
 
 def get_subset_genomes(fam_by_strain, fam_all_members, list_file):
     """
@@ -72,16 +82,65 @@ def get_subset_genomes(fam_by_strain, fam_all_members, list_file):
     """
     logger.info(f"Getting subset of pangenome for genomes in {list_file}.")
     list_genomes = utilsp.read_lstinfo(list_file, logger)
+    # set for O(1) lookups
+    genomes = set(list_genomes)
     sub_fbs = {}
     sub_fam = {}
     for fam_num, family in fam_by_strain.items():
-        kept = {genome:members for genome, members in family.items() if genome in list_genomes}
+        kept = {genome:members for genome, members in family.items() if genome in genomes}
         if kept != {}:
             sub_fbs[fam_num] = kept
-            sub_fam[fam_num] = [member for member in fam_all_members[fam_num] if is_in_subset(member, list_genomes)]
+            sub_fam[fam_num] = [member for member in fam_all_members[fam_num] if is_in_subset(member, genomes)]
     return sub_fbs, sub_fam, list_genomes
 
 
+def get_subset_matrix(matrix, all_strains, list_file):
+    """
+    Same as get_subset_genomes, but on the count matrix of the pangenome: only keep the columns
+    corresponding to the genomes in the given list. Family members are not read: use
+    get_subset_pers to get the members of the persistent families.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.spmatrix
+        count matrix (lines = families, columns = genomes). When getting several subsets from
+        the same matrix, give it in CSC format, so that extracting columns is fast.
+    all_strains : list
+        genome names, in the order of matrix columns
+    list_file : str
+        name of file containing all genome names
+
+    Return
+    ------
+    tuple
+        (sub_matrix, list_genomes), with sub_matrix the count matrix (CSR format) with only
+        the genomes of list_genomes
+    """
+    logger.info(f"Getting subset of pangenome for genomes in {list_file}.")
+    list_genomes = utilsp.read_lstinfo(list_file, logger)
+    return matrix[:, get_genome_mask(all_strains, list_genomes)].tocsr(), list_genomes
+
+
+def get_genome_mask(all_strains, list_genomes):
+    """
+    Get the mask of columns of the count matrix corresponding to the given genomes
+
+    Parameters
+    ----------
+    all_strains : list
+        genome names, in the order of matrix columns
+    list_genomes : list
+        genomes to keep
+
+    Returns
+    -------
+    numpy.ndarray
+        boolean array, True for columns of genomes in list_genomes
+    """
+    genomes = set(list_genomes)
+    return np.array([strain in genomes for strain in all_strains], dtype=bool)
+
+
 def is_in_subset(member, list_genomes):
     """
     From a list of members, keep only those in the given list of genomes
@@ -90,8 +149,8 @@ def is_in_subset(member, list_genomes):
     ----------
     members : str
         protein name
-    list_genomes : str
-        filename containing list of genomes
+    list_genomes : list or set
+        list of genomes (give a set for faster lookups)
 
     Return
     ------
@@ -147,10 +206,7 @@ def get_pers(fam_by_strain, fam_all_members, nb_strains, tol=1, multi=False, mix
                 f"containing {nb_strains} genomes")
     pers = {}  # {fam_num: {strain1: [genes from strain1], strain2: [genes from strain2]}}
     fams = {}  # {fam_num: [list of members]}
-    if floor:
-        min_members = math.floor(tol * nb_strains)
-    else:
-        min_members = math.ceil(tol * nb_strains)
+    min_members = get_min_members(nb_strains, tol, floor)
     for fam_num, family in fam_by_strain.items():
         # If enough strains and multi accepted, or multi not accepted but 1 member per
         # strain, add family to core
@@ -162,29 +218,213 @@ def get_pers(fam_by_strain, fam_all_members, nb_strains, tol=1, multi=False, mix
             if len(family) >= min_members and (multi or uniq_members(family)):
                 pers[fam_num] = family
                 fams[fam_num] = fam_all_members[fam_num]
+    log_pers(len(pers), min_members, nb_strains, tol, multi, mixed)
+    return fams
+
+
+def get_pers_matrix(matrix, fam_nums, fam_all_members, nb_strains, tol=1, multi=False,
+                    mixed=False, floor=False, stats=None):
+    """
+    Same as get_pers, but using the count matrix of the pangenome (families x genomes) instead
+    of looping over all genomes of all families: all thresholds are evaluated at once on
+    per-family statistics (see get_fam_stats). Returns the same families as get_pers.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        count matrix (lines = families, columns = genomes), as built by
+        utils_pangenome.build_count_matrix
+    fam_nums : list
+        family numbers, in the order of matrix rows
+    fam_all_members : dict
+        {fam_num: [all members]} (or any other information on the family, which will be
+        returned as is for persistent families)
+    nb_strains : int
+        total number of strains/genomes in dataset
+    tol : float
+        min percentage of different genomes present in a family
+    multi : bool
+        True if multiple genes from the same genome/strain in a family are tolerated
+    mixed : bool
+        True if mixed families are allowed
+    floor : bool
+        Use floor(nb_strains*tol) as minimum number of genomes if True, ceil(nb_strains*tol)
+        if False.
+    stats : tuple or None
+        (nb_present, nb_mono, max_members) as returned by get_fam_stats. If None, they are
+        computed from the matrix.
+
+    Returns
+    -------
+    dict
+        {fam_num: [list of members]} for persistent families
+    """
+    logger.info("Generating Persistent genome of a dataset "
+                f"containing {nb_strains} genomes")
+    if stats is None:
+        stats = get_fam_stats(matrix)
+    min_members = get_min_members(nb_strains, tol, floor)
+    selected = select_pers(stats, min_members, multi, mixed)
+    fams = {fam_nums[row]: fam_all_members[fam_nums[row]] for row in np.flatnonzero(selected)}
+    log_pers(len(fams), min_members, nb_strains, tol, multi, mixed)
+    return fams
+
+
+def get_subset_pers(sub_matrix, fam_nums, fam_by_strain, list_genomes, tol=1, multi=False,
+                    mixed=False, floor=False, stats=None):
+    """
+    Get the persistent genome of a subset of genomes, from the count matrix restricted to
+    those genomes (see get_subset_matrix). Only the members of the persistent families are
+    read, to keep only the ones from the genomes of the subset.
+
+    Parameters
+    ----------
+    sub_matrix : scipy.sparse.csr_matrix
+        count matrix with only the columns of genomes in list_genomes
+    fam_nums : list
+        family numbers, in the order of matrix rows
+    fam_by_strain : dict
+        {fam_num: {genome1: [members], genome2: [members]}} for all genomes of the pangenome
+    list_genomes : list
+        genomes of the subset
+    tol, multi, mixed, floor, stats :
+        see get_pers_matrix
+
+    Returns
+    -------
+    dict
+        {fam_num: [list of members from genomes in list_genomes]} for persistent families
+    """
+    genomes = set(list_genomes)
+    pers = get_pers_matrix(sub_matrix, fam_nums, fam_by_strain, len(list_genomes), tol, multi,
+                           mixed, floor, stats=stats)
+    return {fam_num: [member for genome, members in family.items() if genome in genomes
+                      for member in members]
+            for fam_num, family in pers.items()}
+
+
+def get_min_members(nb_strains, tol, floor):
+    """
+    Get minimum number of genomes required in a family to be persistent
+
+    Parameters
+    ----------
+    nb_strains : int
+        total number of strains/genomes in dataset
+    tol : float
+        min percentage of different genomes present in a family
+    floor : bool
+        floor(nb_strains*tol) if True, ceil(nb_strains*tol) if False
+
+    Returns
+    -------
+    int
+        minimum number of genomes
+    """
+    if floor:
+        return math.floor(tol * nb_strains)
+    return math.ceil(tol * nb_strains)
+
+
+def get_fam_stats(matrix):
+    """
+    For each family (line of the count matrix), get:
+
+    - the number of genomes present in the family (equivalent to len(family) in get_pers)
+    - the number of genomes having exactly 1 member
+    - the maximum number of members from a same genome
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        count matrix (lines = families, columns = genomes)
+
+    Returns
+    -------
+    (nb_present, nb_mono, max_members) : tuple
+        3 numpy arrays, with 1 value per family
+    """
+    matrix = matrix.tocsr()
+    nb_fams = matrix.shape[0]
+    # Stored entries of each row = genomes present in the family
+    nb_present = np.diff(matrix.indptr)
+    rows = np.repeat(np.arange(nb_fams), nb_present)
+    nb_mono = np.bincount(rows, weights=(matrix.data == 1), minlength=nb_fams).astype(int)
+    max_members = matrix.max(axis=1).toarray().ravel()
+    return nb_present, nb_mono, max_members
+
+
+def select_pers(stats, min_members, multi=False, mixed=False):
+    """
+    Find which families are persistent, from their statistics
+
+    Parameters
+    ----------
+    stats : tuple
+        (nb_present, nb_mono, max_members) as returned by get_fam_stats
+    min_members : int
+        minimum number of genomes required in a persistent family
+    multi : bool
+        True if multigenic families are allowed
+    mixed : bool
+        True if mixed families are allowed
+
+    Returns
+    -------
+    numpy.ndarray
+        boolean array, True for persistent families
+    """
+    nb_present, nb_mono, max_members = stats
+    # Families without any genome (possible for subsets of genomes) are never persistent
+    if mixed:
+        return (nb_mono >= min_members) & (nb_present > 0)
+    selected = (nb_present >= min_members) & (nb_present > 0)
+    if not multi:
+        selected &= max_members <= 1
+    return selected
+
+
+def log_pers(nb_pers, min_members, nb_strains, tol, multi, mixed):
+    """
+    Give the user information on the persistent genome found
+
+    Parameters
+    ----------
+    nb_pers : int
+        number of persistent families found
+    min_members : int
+        minimum number of genomes required in a persistent family
+    nb_strains : int
+        total number of strains/genomes in dataset
+    tol : float
+        min percentage of different genomes present in a family
+    multi : bool
+        True if multigenic families are allowed
+    mixed : bool
+        True if mixed families are allowed
+    """
     # coregenome computed
     if tol == 1 and not multi and not mixed:
-        logger.info(f"The core genome contains {len(pers)} families, each one having "
+        logger.info(f"The core genome contains {nb_pers} families, each one having "
                     f"exactly {int(min_members)} members, from the {nb_strains} different genomes.")
     # multi persistent genome with multigenic families allowed
     elif multi:
-        logger.info(f"The persistent genome contains {len(pers)} families with members present "
+        logger.info(f"The persistent genome contains {nb_pers} families with members present "
                     f"in at least {min_members} different genomes ({tol*100}% of the total number of "
                     "genomes).")
     # mixed persistent genome, tol% families with exactly 1 member from each genome,
     # multigenic families allowed for the '1-tol'% remaining families
     elif mixed:
-        logger.info(f"The persistent genome contains {len(pers)} families, "
+        logger.info(f"The persistent genome contains {nb_pers} families, "
                     f"each one having exactly 1 member from at least {tol*100}% of the genomes ({min_members} "
                     f"genomes). In the remaining {round((1-tol)*100,3)}% genomes, there can be 0, 1 or "
                     "several members.")
     # Strict persistent genome. tol% families with exactly one member in each genome
     else:
-        logger.info(f"The persistent genome contains {len(pers)} families, each one having "
+        logger.info(f"The persistent genome contains {nb_pers} families, each one having "
                     f"exactly 1 member from at least {tol*100}% of the {nb_strains} "
                     f"different genomes (that is {min_members} genomes). The other genomes are absent from "
                     "the family.")
-    return fams
 
 
 def mixed_family(family, thres):
@@ -258,3 +498,182 @@ def write_persistent(fams, outfile):
             for mem in sorted(fam, key=utils.sort_proteins):
                 outf.write(" " + mem)
             outf.write("\n")
+
+
+def read_subset_lists(subsets):
+    """
+    Get the list of files containing the genomes of each subset.
+
+    Parameters
+    ----------
+    subsets : str
+        Either a directory, containing 1 list file per subset (all files of the directory
+        are used, except hidden ones), or a manifest file with 1 list file path per line
+        (relative paths are relative to the manifest directory, empty lines and lines
+        starting with '#' are ignored).
+
+    Returns
+    -------
+    list
+        paths to all subset list files. Exits with an error if 2 list files have the same
+        name, as output files are named after them.
+    """
+    if os.path.isdir(subsets):
+        list_files = [os.path.join(subsets, name) for name in sorted(os.listdir(subsets))
+                      if not name.startswith(".")
+                      and os.path.isfile(os.path.join(subsets, name))]
+    elif os.path.isfile(subsets):
+        list_files = []
+        mandir = os.path.dirname(subsets)
+        with open(subsets) as manf:
+            for line in manf:
+                line = line.strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                list_files.append(os.path.join(mandir, line))
+    else:
+        logger.error(f"{subsets} does not exist.")
+        sys.exit(1)
+    if not list_files:
+        logger.error(f"No list of genomes found in {subsets}.")
+        sys.exit(1)
+    missing = [lst for lst in list_files if not os.path.isfile(lst)]
+    if missing:
+        logger.error(f"The following list files, given in {subsets}, do not exist: "
+                     f"{', '.join(missing)}")
+        sys.exit(1)
+    # Output files are named after list files: 2 lists with the same name would overwrite
+    # the output files of each other
+    names = {}
+    for lst in list_files:
+        names.setdefault(os.path.basename(lst), []).append(lst)
+    duplicates = [lst for same in names.values() if len(same) > 1 for lst in same]
+    if duplicates:
+        logger.error(f"Output files are named after list files, so list files given in "
+                     f"{subsets} must have different names. Rename the following ones: "
+                     f"{', '.join(duplicates)}")
+        sys.exit(1)
+    return list_files
+
+
+def init_subsets(matrix, fam_nums, fam_by_strain, all_strains):
+    """
+    Save pangenome information used by all subsets (count matrix, in CSC format so that
+    genome columns are extracted quickly, family numbers and members).
+    Called once in the main process, and as pool initializer.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.spmatrix
+        count matrix (lines = families, columns = genomes)
+    fam_nums : list
+        family numbers, in the order of matrix rows
+    fam_by_strain : dict
+        {fam_num: {genome: [members]}}
+    all_strains : list
+        genome names, in the order of matrix columns
+    """
+    SUBSET_DATA["matrix"] = matrix.tocsc()
+    SUBSET_DATA["fam_nums"] = fam_nums
+    SUBSET_DATA["fam_by_strain"] = fam_by_strain
+    SUBSET_DATA["all_strains"] = all_strains
+
+
+def get_all_subsets(matrix, fam_nums, fam_by_strain, all_strains, subsets, tol, multi, mixed,
+                    floor, threads):
+    """
+    Compute and write the persistent genome of each subset of genomes, reusing the same
+    pangenome information. Subsets are dispatched on 'threads' processes, sharing
+    pangenome information.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.spmatrix
+        count matrix (lines = families, columns = genomes)
+    fam_nums : list
+        family numbers, in the order of matrix rows
+    fam_by_strain : dict
+        {fam_num: {genome: [members]}}
+    all_strains : list
+        genome names, in the order of matrix columns
+    subsets : list
+        [(list_file, outputfile)] for each subset of genomes
+    tol, multi, mixed, floor :
+        see get_pers
+    threads : int
+        number of processes to use
+
+    Returns
+    -------
+    list
+        paths to all persistent genome files generated
+    """
+    logger.info(f"Generating persistent genomes of {len(subsets)} subsets of genomes")
+    arguments = [(list_file, outfile, tol, multi, mixed, floor) for list_file, outfile in subsets]
+    if threads == 1:
+        init_subsets(matrix, fam_nums, fam_by_strain, all_strains)
+        final = [handle_subset(args) for args in arguments]
+    else:
+        m = multiprocessing.Manager()
+        q = m.Queue()
+        arguments = [args + (q,) for args in arguments]
+        # Pangenome information is given once to each process, not with each subset
+        pool = multiprocessing.Pool(threads, initializer=init_subsets,
+                                    initargs=(matrix, fam_nums, fam_by_strain, all_strains))
+        try:
+            final = pool.map_async(handle_subset, arguments, chunksize=1)
+            pool.close()
+            # Listen for logs in processes
+            lp = threading.Thread(target=utils.logger_thread, args=(q,))
+            lp.start()
+            pool.join()
+            q.put(None)
+            lp.join()
+            final = final.get()
+        # If an error occurs (or user kills with keybord), terminate pool and exit
+        except Exception as excp:  # pragma: no cover
+            pool.terminate()
+            logger.error(excp)
+            sys.exit(1)
+    failed = [args[0] for args, ok in zip(arguments, final) if not ok]
+    if failed:
+        logger.error(f"Problem while generating persistent genome of: {', '.join(failed)}")
+        sys.exit(1)
+    return [args[1] for args in arguments]
+
+
+def handle_subset(args):
+    """
+    Compute and write the persistent genome of 1 subset of genomes, using the pangenome
+    information saved by init_subsets.
+
+    Parameters
+    ----------
+    args : tuple
+        (list_file, outputfile, tol, multi, mixed, floor[, q]), with q a queue used by the
+        logger when running in another process
+
+    Returns
+    -------
+    bool
+        True if persistent genome was written, False if any problem
+    """
+    if len(args) == 7:
+        q = args[-1]
+        qh = logging.handlers.QueueHandler(q)
+        root = logging.getLogger()
+        root.setLevel(logging.DEBUG)
+        root.handlers = []
+        logging.addLevelName(utils.detail_lvl(), "DETAIL")
+        root.addHandler(qh)
+    list_file, outputfile, tol, multi, mixed, floor = args[:6]
+    try:
+        sub_matrix, list_genomes = get_subset_matrix(SUBSET_DATA["matrix"],
+                                                     SUBSET_DATA["all_strains"], list_file)
+    # read_lstinfo exits if there is no genome in the list
+    except SystemExit:
+        return False
+    fams = get_subset_pers(sub_matrix, SUBSET_DATA["fam_nums"], SUBSET_DATA["fam_by_strain"],
+                           list_genomes, tol, multi, mixed, floor)
+    write_persistent(fams, outputfile)
+    return True
@@ -49,7 +49,7 @@ from PanACoTA import utils_pangenome as utilsp
 logger = logging.getLogger("pangenome.post-treat")
 
 
-def post_treat(families, pangenome):
+def post_treat(families, pangenome, sparse_fmt=None):
     """
     From clusters = {num: [members]}, create:
 
@@ -75,10 +75,43 @@ def post_treat(families, pangenome):
         pangenome file
     pangenome : str
         file containing pangenome
+    sparse_fmt : str or None
+        If not None, also save the quantitative matrix (lines = families, columns = genomes)
+        in a sparse format: 'npz' (scipy) or 'mtx' (Matrix Market).
     """
     fams_by_strain, families, all_strains = utilsp.read_pangenome(pangenome, logger, families)
     open_outputs_to_write(fams_by_strain, families, all_strains, pangenome)
     # result of open_outputs_to_write = (qualis, quantis, summaries)
+    if sparse_fmt:
+        write_sparse_outputs(fams_by_strain, all_strains, pangenome, sparse_fmt)
+
+
+def write_sparse_outputs(fams_by_strain, all_strains, pangenome, sparse_fmt):
+    """
+    Save the quantitative matrix in a sparse format, so that it can be loaded by
+    downstream analyses (see utils_pangenome.load_sparse_matrix) without parsing
+    the text matrix.
+
+    Parameters
+    ----------
+    fams_by_strain : dict
+        {fam_num: {strain: [members]}}
+    all_strains : list
+        list of all genome names
+    pangenome : str
+        filename containing pangenome. Will be extended for the output file
+    sparse_fmt : str
+        'npz' or 'mtx'
+
+    Returns
+    -------
+    str
+        path to the sparse matrix file
+    """
+    logger.info(f"Saving quantitative matrix in sparse format ({sparse_fmt})")
+    matrix, fam_nums = utilsp.build_count_matrix(fams_by_strain, all_strains)
+    return utilsp.write_sparse_matrix(matrix, fam_nums, all_strains, pangenome + ".quanti",
+                                      sparse_fmt)
 
 
 def open_outputs_to_write(fams_by_strain, families, all_strains, pangenome):
@@ -56,11 +56,15 @@ def main_from_parse(args):
     """
     cmd = "PanACoTA " + ' '.join(args.argv)
     main(cmd, args.corepers, args.list_genomes, args.dataset_name, args.dbpath, 
-         args.outdir, args.prot_ali, args.threads, args.force, args.verbose, args.quiet)
+         args.outdir, args.prot_ali, args.threads, args.force, args.verbose, args.quiet,
+         extract_batch=args.extract_batch, getentry=args.getentry, concat=not args.no_concat,
+         cache_dir=args.cache_dir, add_genomes=args.add_genomes, align_batch=args.align_batch,
+         aligner=args.aligner)
 
 
 def main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, verbose=0,
-         quiet=False):
+         quiet=False, extract_batch=None, getentry=False, concat=True, cache_dir=None,
+         add_genomes=None, align_batch=None, aligner="mafft"):
     """
     Align given core genome families
 
@@ -92,6 +96,31 @@ def main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads,
 
     quiet : bool
         True if nothing must be sent to stdout/stderr, False otherwise
+    extract_batch : int or None
+        If given, extract sequences family by family, by batches of 'extract_batch' families,
+        instead of genome by genome.
+    getentry : bool
+        True to write, for each genome, the list of proteins and genes to extract in
+        ``List-<dname>`` folder, and extract sequences from those files (for debugging).
+        Otherwise, lists are given to extraction step in memory.
+    concat : bool
+        True to write the concatenation of all family alignments (``<dname>-complete.*.cat.aln``
+        files) before grouping them by genome. False to group alignments by genome directly
+        from the family alignment files.
+    cache_dir : str or None
+        Directory where protein alignments are cached, to be reused by any run aligning a
+        family with the same proteins. None to not use any cache.
+    add_genomes : str or None
+        ``Align-<dataset_name>`` directory of a previous run. If given, the new proteins of
+        each family are added to its alignment from this run, instead of re-aligning the
+        whole family.
+    align_batch : int or None
+        With several threads, group small families into batches of at least 'align_batch'
+        residues, each batch being aligned by 1 process. None to align each family in a
+        separate task.
+    aligner : str
+        Software used to align the proteins of each family (see
+        ``align_module.aligners.ALIGNERS``)
     """
     # import needed packages
     import logging
@@ -101,11 +130,18 @@ def main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads,
     from PanACoTA.align_module import get_seqs as gseqs
     from PanACoTA.align_module import alignment as ali
     from PanACoTA.align_module import post_align as post
+    from PanACoTA.align_module import aligners
     from PanACoTA import __version__ as version
 
-    # test if prokka is installed and in the path
-    if not utils.check_installed("mafft"):  # pragma: no cover
-        print("mafft is not installed. 'PanACoTA align' cannot run.")
+    # test if aligner is installed and in the path
+    executable = aligners.get_executable(aligner)
+    if not utils.check_installed(executable):  # pragma: no cover
+        print(f"{executable} is not installed. 'PanACoTA align' cannot run.")
+        sys.exit(1)
+    # New proteins are added to previous alignments with mafft, whatever the aligner
+    if add_genomes and not utils.check_installed("mafft"):  # pragma: no cover
+        print("mafft is not installed. 'PanACoTA align' cannot add genomes to previous "
+              "alignments.")
         sys.exit(1)
 
     if force and os.path.isdir(outdir):
@@ -129,14 +165,30 @@ def main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads,
     logger.info(f'PanACoTA version {version}')
     logger.info("Command used\n \t > " + cmd)
 
-    all_genomes, aldir, listdir, fam_nums = p2g.get_per_genome(corepers, list_genomes,
-                                                               dname, outdir)
+    prev_prefix = None
+    if add_genomes:
+        aldir = os.path.join(outdir, "Align-" + dname)
+        if os.path.abspath(add_genomes) == os.path.abspath(aldir):
+            logger.error(f"{add_genomes} is the alignment directory of this run. To add new "
+                         "genomes to a previous run, give another output directory or "
+                         "dataset name.")
+            sys.exit(1)
+        prev_dname = os.path.basename(os.path.normpath(add_genomes))[len("Align-"):]
+        prev_prefix = os.path.join(add_genomes, prev_dname)
+        logger.info(f"New proteins of each family will be added to its alignment in {add_genomes}")
+
+    all_genomes, aldir, listdir, fam_nums, to_extract = p2g.get_per_genome(corepers,
+                                                                           list_genomes, dname,
+                                                                           outdir, getentry)
     # generate required files
-    gseqs.get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, fam_nums, quiet)
+    gseqs.get_all_seqs(all_genomes, dname, dbpath, listdir, aldir, fam_nums, quiet,
+                       batch=extract_batch, threads=threads, to_extract=to_extract)
     prefix = os.path.join(aldir, dname)
 
     # Align all families
-    status = ali.align_all_families(prefix, fam_nums, len(all_genomes), dname, quiet, threads)
+    status = ali.align_all_families(prefix, fam_nums, len(all_genomes), dname, quiet, threads,
+                                    cache_dir=cache_dir, prev_prefix=prev_prefix,
+                                    batch_residues=align_batch, aligner=aligner)
     if not status:
         logger.error(("At least one alignment did not run well. See detailed log file for "
                       "more information. Program will stop here, alignments won't be "
@@ -144,7 +196,8 @@ def main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads,
         sys.exit(1)
 
     # post-process alignment files
-    align_file = post.post_alignment(fam_nums, all_genomes, prefix, outdir, dname, prot_ali, quiet)
+    align_file = post.post_alignment(fam_nums, all_genomes, prefix, outdir, dname, prot_ali, quiet,
+                                     concat=concat, threads=threads)
     logger.info("END")
     return align_file
 
@@ -161,6 +214,7 @@ def build_parser(parser):
     import argparse
     import multiprocessing
     from PanACoTA import utils_argparse
+    from PanACoTA.align_module import aligners
 
     # Create command-line parser for all options and arguments to give
     required = parser.add_argument_group('Required arguments')
@@ -201,6 +255,50 @@ def build_parser(parser):
                           help=("Add this option if you also need the aa alignment of the concatenation of "
                                 "all persistent proteins. "
                                 "By default, PanACoTA only gives the nucleic alignment."))
+    optional.add_argument("--aligner", dest="aligner", choices=list(aligners.ALIGNERS),
+                          default="mafft",
+                          help=("Software used to align the proteins of each family. "
+                                "'mafft' (default) runs 'mafft --auto'. Faster choices for "
+                                "very large families: 'mafft-fft' (mafft FFT-NS-1, "
+                                "'--retree 1 --maxiterate 0'), 'muscle' (muscle v5, Super5 "
+                                "algorithm), 'famsa', 'clustalo' (Clustal Omega). The chosen "
+                                "software must be installed."))
+    optional.add_argument("--extract-batch", dest="extract_batch", type=int,
+                          help=("Extract sequences family by family instead of genome by "
+                                "genome: sequences of 'extract_batch' families are read from "
+                                "all genomes, and each family file is written at once. Faster "
+                                "for large datasets, but the sequences of each batch are kept "
+                                "in memory."))
+    optional.add_argument("--getentry", dest="getentry", action="store_true",
+                          help=("Write, for each genome, the list of proteins and genes to "
+                                "extract (List-<dataset_name>/<dataset_name>-getEntry_*.txt "
+                                "files), and use those files for the extraction. Useful for "
+                                "debugging. By default, those lists are kept in memory."))
+    optional.add_argument("--align-batch", dest="align_batch", type=int, metavar="RESIDUES",
+                          help=("With --threads, group small families into batches of at "
+                                "least RESIDUES residues (estimated from the size of the "
+                                "family protein file), each batch being aligned by 1 process. Reduces "
+                                "the overhead of dispatching thousands of small families to "
+                                "processes. By default, each family is a separate task."))
+    optional.add_argument("--no-concat", dest="no_concat", action="store_true",
+                          help=("Do not write the concatenation of all family alignments "
+                                "(Align-<dataset_name>/<dataset_name>-complete.*.cat.aln "
+                                "files): group alignments by genome directly from the family "
+                                "alignment files. Saves disk space and I/O for large datasets."))
+    optional.add_argument("--cache-dir", dest="cache_dir",
+                          help=("Directory where protein alignments are cached (created if it "
+                                "does not exist). A family whose proteins have the same "
+                                "sequences as a family already aligned in this cache is not "
+                                "re-aligned, whatever its family number or dataset name. "
+                                "The same cache can be shared by several runs."))
+    optional.add_argument("--add-genomes", dest="add_genomes", metavar="PREV_ALIGN_DIR",
+                          help=("'Align-<dataset_name>' directory of a previous run, on a "
+                                "subset of the genomes. For each family, the proteins which "
+                                "were already aligned in this previous run (whatever their "
+                                "family number in this run) are kept as they were aligned, "
+                                "and only new proteins are added to their alignment (mafft "
+                                "--add). Families whose previous proteins changed are "
+                                "re-aligned from scratch."))
     helper = parser.add_argument_group('Others')
     helper.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
                         help="Increase verbosity in stdout/stderr.")
@@ -227,7 +325,19 @@ def parse(parser, argu):
     argparse.Namespace
         Parsed arguments
     """
-    return parser.parse_args(argu)
+    args = parser.parse_args(argu)
+    if args.extract_batch is not None and args.extract_batch < 1:
+        parser.error("--extract-batch must be a positive number of families. Invalid value: "
+                     f"{args.extract_batch}")
+    if args.align_batch is not None and args.align_batch < 1:
+        parser.error("--align-batch must be a positive number of residues. Invalid value: "
+                     f"{args.align_batch}")
+    if args.add_genomes is not None:
+        prev_dir = os.path.basename(os.path.normpath(args.add_genomes))
+        if not os.path.isdir(args.add_genomes) or not prev_dir.startswith("Align-"):
+            parser.error("--add-genomes must be the 'Align-<dataset_name>' directory of a "
+                         f"previous run. Invalid value: {args.add_genomes}")
+    return args
 
 
 if __name__ == '__main__':
@@ -544,7 +544,8 @@ def get_corepers(dict_argv):
     conf_conffile.update(dict_argv, "corepers")
     # Add default arguments if not found in commandline nor config file
     defaults = {"verbose": 0, "quiet": False, "tol": 1, "mixed": False, "multi": False,
-                "floor": False, "threads": 1}
+                "floor": False, "threads": 1, "sweep": None, "modes": None,
+                "subsets": None}
     conf_conffile.add_default(defaults, "corepers")
     conf_conffile.set_boolean("corepers", "quiet")
     conf_conffile.set_boolean("corepers", "floor")
@@ -591,11 +592,13 @@ def get_tree(dict_argv):
     # Add default arguments if not found in commandline nor config file
     defaults = {"verbose": 0, "quiet": False, "threads": 1,
                 "soft": "iqtree", "model": None, "boot": 0, "write_boot": False,
-                "memory": None, "fast": False}
+                "memory": None, "fast": False, "sites": None, "distances": None,
+                "par_boot": False}
     conf_conffile.add_default(defaults, "tree")
     conf_conffile.set_boolean("tree", "quiet")
     conf_conffile.set_boolean("tree", "fast")
     conf_conffile.set_boolean("tree", "write_boot")
+    conf_conffile.set_boolean("tree", "par_boot")
     conf_conffile.set_int("tree", "boot")
     conf_conffile.set_int("tree", "verbose")
     conf_conffile.set_int("tree", "threads")
@@ -65,12 +65,18 @@ def main_from_parse(args):
     """
     cmd = "PanACoTA " + ' '.join(args.argv)
     main(cmd, args.pangenome, args.tol, args.multi, args.mixed, args.outputdir,
-         args.lstinfo_file, args.floor, args.verbose, args.quiet)
+         args.lstinfo_file, args.floor, args.verbose, args.quiet, sweep=args.sweep,
+         modes=args.modes, subsets=args.subsets, threads=args.threads)
 
 
-def main(cmd, pangenome, tol, multi, mixed, outputdir, lstinfo_file, floor, verbose, quiet):
+def main(cmd, pangenome, tol, multi, mixed, outputdir, lstinfo_file, floor, verbose, quiet,
+         sweep=None, modes=None, subsets=None, threads=1):
     """
-    Read pangenome and deduce Persistent genome according to the user criteria
+    Read pangenome and deduce Persistent genome according to the user criteria.
+
+    If a list of tol values is given in 'sweep', the pangenome is read and the statistics of
+    each family are computed only once, and a persistent genome is generated for each
+    (tol, mode) combination. A summary file gives the number of families in each of them.
 
     Parameters
     ----------
@@ -96,6 +102,23 @@ def main(cmd, pangenome, tol, multi, mixed, outputdir, lstinfo_file, floor, verb
         - >=15: Add DEBUG in stdout
     quiet : bool
         True if nothing must be sent to stdout/stderr, False otherwise
+    sweep : list or None
+        list of tol values for which a persistent genome must be generated. If given,
+        'tol', 'multi' and 'mixed' are ignored.
+    modes : list or None
+        with 'sweep', list of persistent genome types to generate for each tol value,
+        among 'strict', 'mixed' and 'multi'. Default is ['strict']
+    subsets : str or None
+        directory containing 1 list of genomes per subset, or file with the path to 1 list of
+        genomes per line. If given, a persistent genome is generated for each subset.
+    threads : int
+        number of processes used to compute the persistent genomes of all subsets
+
+    Returns
+    -------
+    str or list
+        path to the persistent genome file, or list of paths to all persistent genome files
+        generated if 'sweep' or 'subsets' is given
     """
     # import needed packages
     import logging
@@ -110,21 +133,9 @@ def main(cmd, pangenome, tol, multi, mixed, outputdir, lstinfo_file, floor, verb
         _, base_lst = os.path.split(lstinfo_file)
     else:
         base_lst = "all"
-    # Define output filename
-    output_name = f"PersGenome_{base_pan}-{base_lst}_"
-    if floor:
-        output_name += "F"
-    output_name += str(tol)
-    if multi:
-        output_name += "-multi.lst"
-    elif mixed:
-        output_name += "-mixed.lst"
-    else:
-        output_name += ".lst"
-    # Define output directory and filename path
+    # Define output directory
     if not os.path.isdir(outputdir):
         os.makedirs(outputdir)
-    outputfile = os.path.join(outputdir, output_name)
     logfile_base = os.path.join(outputdir, "PanACoTA-corepers")
     # level is the minimum level that will be considered.
     # for verbose = 0 or 1, ignore details and debug, start from info
@@ -141,21 +152,168 @@ def main(cmd, pangenome, tol, multi, mixed, outputdir, lstinfo_file, floor, verb
     logger.info(f'PanACoTA version {version}')
     logger.info("Command used\n \t > " + cmd)
 
-    logger.info(get_info(tol, multi, mixed, floor))
+    if not sweep:
+        logger.info(get_info(tol, multi, mixed, floor))
 
     # Read pangenome
     fams_by_strain, families, all_strains = utilsp.read_pangenome(pangenome, logger)
-    # If list of genomes given, get subset of previous dicts, including only the genomes aksed
+    # Generate persistent genome, from the count matrix of the pangenome
+    matrix, fam_nums = utilsp.build_count_matrix(fams_by_strain, all_strains)
+    # Persistent genome of each subset of genomes, reusing the same pangenome
+    if subsets:
+        list_files = pers.read_subset_lists(subsets)
+        subset_outputs = [(list_file,
+                           os.path.join(outputdir,
+                                        get_output_name(base_pan, os.path.basename(list_file),
+                                                        tol, multi, mixed, floor)))
+                          for list_file in list_files]
+        outputfiles = pers.get_all_subsets(matrix, fam_nums, fams_by_strain, all_strains,
+                                           subset_outputs, tol, multi, mixed, floor, threads)
+        logger.info("Persistent genome step done.")
+        return outputfiles
+    # If list of genomes given, only keep the columns of the matrix corresponding to those
+    # genomes
+    list_genomes = None
     if lstinfo_file:
-        fams_by_strain, families, all_strains = pers.get_subset_genomes(fams_by_strain, families, lstinfo_file)
-    # Generate persistent genome
-    fams = pers.get_pers(fams_by_strain, families, len(all_strains), tol, multi, mixed, floor)
+        matrix, list_genomes = pers.get_subset_matrix(matrix, all_strains, lstinfo_file)
+    if sweep:
+        outputfiles = do_sweep(matrix, fam_nums, families, fams_by_strain, all_strains,
+                               list_genomes, sweep, modes, floor, outputdir, base_pan, base_lst)
+        logger.info("Persistent genome step done.")
+        return outputfiles
+    if list_genomes:
+        fams = pers.get_subset_pers(matrix, fam_nums, fams_by_strain, list_genomes, tol, multi,
+                                    mixed, floor)
+    else:
+        fams = pers.get_pers_matrix(matrix, fam_nums, families, len(all_strains), tol, multi,
+                                    mixed, floor)
     # Write persistent genome to file
+    outputfile = os.path.join(outputdir, get_output_name(base_pan, base_lst, tol, multi,
+                                                         mixed, floor))
     pers.write_persistent(fams, outputfile)
     logger.info("Persistent genome step done.")
     return outputfile
 
 
+def get_output_name(base_pan, base_lst, tol, multi, mixed, floor):
+    """
+    Get the name of the persistent genome file:
+    PersGenome_<base_pan>-<base_lst>_[F]<tol>[-multi|-mixed].lst
+
+    Parameters
+    ----------
+    base_pan : str
+        pangenome filename (without path)
+    base_lst : str
+        list of genomes filename (without path), or 'all'
+    tol : float
+        min % of genomes present in a family to consider it as persistent (between 0 and 1)
+    multi : bool
+        True if multigenic families are allowed, False otherwise
+    mixed : bool
+        True if mixed families are allowed, False otherwise
+    floor : bool
+        Require at least floor(nb_genomes*tol) genomes if True, ceil(nb_genomes*tol) if False
+
+    Returns
+    -------
+    str
+        name of the persistent genome file
+    """
+    output_name = f"PersGenome_{base_pan}-{base_lst}_"
+    if floor:
+        output_name += "F"
+    output_name += str(tol)
+    if multi:
+        output_name += "-multi.lst"
+    elif mixed:
+        output_name += "-mixed.lst"
+    else:
+        output_name += ".lst"
+    return output_name
+
+
+def do_sweep(matrix, fam_nums, families, fams_by_strain, all_strains, list_genomes, sweep,
+             modes, floor, outputdir, base_pan, base_lst):
+    """
+    Generate a persistent genome for each combination of tol value and mode, computing the
+    statistics of all families only once. Write a summary file, with the number of families
+    found for each combination.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        count matrix of the pangenome (lines = families, columns = genomes)
+    fam_nums : list
+        family numbers, in the order of matrix rows
+    families : dict
+        {fam_num: [all members]}
+    fams_by_strain : dict
+        {fam_num: {genome: [members]}}
+    all_strains : list
+        all genomes of the pangenome
+    list_genomes : list or None
+        if the matrix was restricted to a subset of genomes, list of those genomes
+    sweep : list
+        list of tol values
+    modes : list or None
+        list of persistent genome types among 'strict', 'mixed' and 'multi'
+    floor : bool
+        Require at least floor(nb_genomes*tol) genomes if True, ceil(nb_genomes*tol) if False
+    outputdir : str
+        directory where persistent genomes and summary must be saved
+    base_pan : str
+        pangenome filename (without path)
+    base_lst : str
+        list of genomes filename (without path), or 'all'
+
+    Returns
+    -------
+    list
+        list of all persistent genome files generated
+    """
+    import logging
+    import PanACoTA.corepers_module.persistent_functions as pers
+    logger = logging.getLogger("corepers")
+
+    if not modes:
+        modes = ["strict"]
+    logger.info(f"Generating persistent genomes for tol in {sweep}, with mode(s) "
+                f"{', '.join(modes)}.")
+    stats = pers.get_fam_stats(matrix)
+    if list_genomes:
+        nb_strains = len(list_genomes)
+    else:
+        nb_strains = len(all_strains)
+    outputfiles = []
+    summary = os.path.join(outputdir, f"PersGenome_{base_pan}-{base_lst}_sweep-summary.txt")
+    with open(summary, "w") as sumf:
+        sumf.write("tol\tmode\tmin_genomes\tnb_families\tfile\n")
+        for tol in sweep:
+            for mode in modes:
+                multi = mode == "multi"
+                mixed = mode == "mixed"
+                if mixed and tol == 1:
+                    logger.warning("Mixed persistent genome is not compatible with tol=1 "
+                                   "(100% of the genomes having exactly 1 member): skipped.")
+                    continue
+                if list_genomes:
+                    fams = pers.get_subset_pers(matrix, fam_nums, fams_by_strain, list_genomes,
+                                                tol, multi, mixed, floor, stats=stats)
+                else:
+                    fams = pers.get_pers_matrix(matrix, fam_nums, families, nb_strains, tol,
+                                                multi, mixed, floor, stats=stats)
+                outputfile = os.path.join(outputdir, get_output_name(base_pan, base_lst, tol,
+                                                                     multi, mixed, floor))
+                pers.write_persistent(fams, outputfile)
+                outputfiles.append(outputfile)
+                min_members = pers.get_min_members(nb_strains, tol, floor)
+                sumf.write(f"{tol}\t{mode}\t{min_members}\t{len(fams)}\t"
+                           f"{os.path.basename(outputfile)}\n")
+    logger.info(f"Number of persistent families for each threshold saved in {summary}")
+    return outputfiles
+
+
 def get_info(tol, multi, mixed, floor):
     """
     Get a string corresponding to the information that will be given to logger.
@@ -245,12 +403,34 @@ def build_parser(parser):
                                "than 1, you can add this option to use floor('tol'*N) "
                                "as a minimum number of genomes instead of ceil('tol'*N) "
                                "which is the default behavior.")
+    optional.add_argument("--sweep", dest="sweep", nargs="+", type=utils_argparse.percentage,
+                          metavar="TOL",
+                          help=("Generate several persistent genomes in a single run, one for "
+                                "each given tol value (between 0 and 1), and for each mode given "
+                                "with '--modes'. The pangenome is read only once, and a summary "
+                                "file gives the number of families found for each threshold. "
+                                "Replaces '-t', '-M' and '-X' options."))
+    optional.add_argument("--modes", dest="modes", nargs="+",
+                          choices=["strict", "mixed", "multi"],
+                          help=("With '--sweep', types of persistent genome to generate for each "
+                                "tol value: 'strict' (default), 'mixed' (as with -X) and/or "
+                                "'multi' (as with -M)."))
     optional.add_argument("-l", dest="lstinfo_file",
                           help=("By default, the core/persistent genome will include all genomes "
                                 "found in the given pangenome file. If you want to do a core/persistent "
                                 "genome on a subset of those genomes, give a file with this "
                                 "list of genomes. This file must have 1 line per genome, only the first column "
                                 "(genome name without extension) will be used."))
+    optional.add_argument("--subsets", dest="subsets",
+                          help=("Generate the core/persistent genome of several subsets of "
+                                "genomes in a single run, reading the pangenome only once. Give "
+                                "either a directory containing 1 file per subset, or a file "
+                                "with the path to 1 subset file per line. Subset files have the "
+                                "same format as for '-l' option."))
+    optional.add_argument("--threads", dest="threads", default=1,
+                          type=utils_argparse.thread_num,
+                          help=("With '--subsets', number of subsets computed in parallel. "
+                                "Put 0 to use all threads of your computer. Default is 1."))
 
     helper = parser.add_argument_group('Others')
     helper.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
@@ -279,6 +459,15 @@ def check_args(parser, args):
         The arguments parsed, updated according to some rules. Exit program
         with error message if error occurs with arguments given.
     """
+    if args.sweep and (args.multi or args.mixed):
+        parser.error("With --sweep, choose the type(s) of persistent genome to generate with "
+                     "--modes (strict, mixed and/or multi) instead of -M/-X options.")
+    if args.modes and not args.sweep:
+        parser.error("--modes option can only be used with --sweep. Use -M or -X to choose "
+                     "the type of persistent genome.")
+    if args.subsets and (args.lstinfo_file or args.sweep):
+        parser.error("--subsets option cannot be used with -l (list of genomes is given "
+                     "in each subset file) nor with --sweep.")
     if args.multi and args.mixed:
         parser.error("-M and -X options cannot be activated together. Choose if you want to:\n"
                      "- allow several members in any number of genomes of a family (-M)\n"
@@ -289,7 +478,7 @@ def check_args(parser, args):
                      "a family to have exactly one member, which is not compatible. Do you want "
                      "to \n- lower the percentage of genomes required to have exactly "
                      "1 member (-t tol)\n- not allow mixed families (remove -X option)")
-    if args.floor and args.tol == 1:
+    if args.floor and args.tol == 1 and not args.sweep:
         parser.error("You are asking to use floor('tol'*N) as a minimum number of genomes "
                      "present in a family, but with 'tol'=1: the minimum number of genomes "
                      "will always be equal to N, using floor or the default ceil! Either "
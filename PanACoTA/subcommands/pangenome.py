@@ -57,11 +57,11 @@ def main_from_parse(args):
     cmd = "PanACoTA " + ' '.join(args.argv)
     main(cmd, args.lstinfo_file, args.dataset_name, args.dbpath, args.min_id, args.outdir,
          args.clust_mode, args.spedir, args.threads, args.outfile, args.verbose,
-         args.quiet)
+         args.quiet, args.sparse)
 
 
 def main(cmd, lstinfo, name, dbpath, min_id, outdir, clust_mode, spe_dir, threads, outfile=None,
-         verbose=0, quiet=False):
+         verbose=0, quiet=False, sparse=None):
     """
     Main method, doing all steps:
 
@@ -102,6 +102,8 @@ def main(cmd, lstinfo, name, dbpath, min_id, outdir, clust_mode, spe_dir, thread
         - >=15: Add DEBUG in stdout
     quiet : bool
         True if nothing must be sent to stdout/stderr, False otherwise
+    sparse : str or None
+        If given ('npz' or 'mtx'), also save the quantitative matrix in this sparse format
     """
     # import needed packages
     import logging
@@ -140,7 +142,7 @@ def main(cmd, lstinfo, name, dbpath, min_id, outdir, clust_mode, spe_dir, thread
     families, panfile = mmf.run_all_pangenome(min_id, clust_mode, outdir,
                                               prt_path, threads, outfile, quiet)
     # Create matrix pan_quali, pan_quanti and summary file
-    pt.post_treat(families, panfile)
+    pt.post_treat(families, panfile, sparse)
     logger.info("DONE")
     return panfile
 
@@ -202,6 +204,11 @@ def build_parser(parser):
                                 "Indicate on how many threads you want to parallelize. "
                                 "By default, it uses 1 thread. Put 0 if you want to use "
                                 "all threads of your computer."))
+    optional.add_argument("--sparse", dest="sparse", choices=["npz", "mtx"],
+                          help=("Also save the quantitative matrix (1 line per family, 1 column "
+                                "per genome) in a sparse format: 'npz' (scipy, loaded with "
+                                "scipy.sparse.load_npz) or 'mtx' (Matrix Market). Useful for "
+                                "large pangenomes, where the text matrices are mostly zeros."))
 
     helper = parser.add_argument_group('Others')
     helper.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
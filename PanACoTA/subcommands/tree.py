@@ -53,11 +53,13 @@ def main_from_parse(args):
     """
     cmd = "PanACoTA " + ' '.join(args.argv)
     main(cmd, args.alignment, args.outdir, args.soft, args.model, args.threads,
-         args.boot, args.write_boot, args.memory, args.fast, args.verbose, args.quiet)
+         args.boot, args.write_boot, args.memory, args.fast, args.verbose, args.quiet,
+         sites=args.sites, distances=args.distances, par_boot=args.par_boot)
 
 
 def main(cmd, align, outdir, soft, model, threads, boot=False, write_boot=False,
-         memory=False, fast=False, verbose=0, quiet=False):
+         memory=False, fast=False, verbose=0, quiet=False, sites=None, distances=None,
+         par_boot=False):
     """
     Inferring a phylogenetic tree from an alignment file, with the given software.
 
@@ -91,6 +93,18 @@ def main(cmd, align, outdir, soft, model, threads, boot=False, write_boot=False,
         - >=15: Add DEBUG in stdout
     quiet: bool
         True if nothing must be sent to stdout/stderr, False otherwise
+    sites: str or None
+        If given, filter the columns of the alignment before inferring the tree: 'nogap' to
+        remove all-gap columns, 'variable' to also remove constant columns, 'informative' to
+        keep only parsimony-informative columns
+    distances: str or None
+        If given (only for fastme and quicktree), compute the distance matrix with this model
+        ('p-distance', 'JC69' or 'K2P') from the site patterns of the alignment, and infer
+        the tree from this matrix
+    par_boot: bool
+        If True (only for fastme, fasttree and quicktree), bootstrap replicates are drawn by
+        PanACoTA, and their trees are inferred in parallel, each with 1 thread, instead of
+        asking bootstraps to the tree software. Supports are then added to the main tree.
     """
     # import needed packages
     import logging
@@ -155,12 +169,126 @@ def main(cmd, align, outdir, soft, model, threads, boot=False, write_boot=False,
     logger = logging.getLogger("tree")
     logger.info(f'PanACoTA version {version}')
     logger.info("Command used\n \t > " + cmd)
-    tree.run_tree(align, boot, outdir, quiet, threads, model=model, wb=write_boot,
-                  mem=memory, s=soft, f=fast)
+    fconst = None
+    if sites:
+        align, fconst = filter_sites(align, outdir, sites, soft)
+    seqs = align
+    if distances:
+        align = compute_distances(align, outdir, distances, threads)
+    if par_boot:
+        from PanACoTA.tree_module import bootstrap
+        treefile = tree.run_tree(align, None, outdir, quiet, threads, model=model, wb=False,
+                                 mem=memory, s=soft, f=fast, fconst=fconst,
+                                 matrix=bool(distances))
+        trees = bootstrap.run_bootstraps(seqs, outdir, soft, model, boot, threads,
+                                         distances=distances)
+        bootfile = None
+        if write_boot:
+            bootfile = os.path.splitext(treefile)[0] + ".bootstraps.nwk"
+        bootstrap.write_supports(treefile, trees, bootfile)
+    else:
+        tree.run_tree(align, boot, outdir, quiet, threads, model=model, wb=write_boot,
+                      mem=memory, s=soft, f=fast, fconst=fconst, matrix=bool(distances))
 
     logger.info("END")
 
 
+def filter_sites(align, outdir, sites, soft):
+    """
+    Write the alignment with only the columns kept by the given filter, to
+    '<outdir>/<alignment name>.<sites>.aln'. Information on removed columns is written to
+    '<outdir>/<alignment name>.<sites>.info'.
+
+    Parameters
+    ----------
+    align: str
+        Path to file containing alignments of persistent families grouped by genome
+    outdir: str
+        Directory where the filtered alignment must be saved
+    sites: str
+        filter: 'nogap', 'variable' or 'informative'
+    soft: str
+        Soft used to infer the phylogenetic tree
+
+    Returns
+    -------
+    tuple
+        (path to the filtered alignment, constant sites removed of each nucleotide as
+        'a,c,g,t' if they can be given back to the tree soft (IQtree), None otherwise)
+    """
+    import logging
+    import os
+    from PanACoTA import utils_alignment
+
+    logger = logging.getLogger("tree")
+    align_root = os.path.splitext(os.path.basename(align))[0]
+    filtered = os.path.join(outdir, f"{align_root}.{sites}.aln")
+    logger.info(f"Filtering columns of {align} ({sites} sites)")
+    try:
+        info = utils_alignment.filter_columns(align, filtered, sites)
+    except (OSError, ValueError) as err:
+        logger.error(f"Cannot filter columns of {align}: {err}")
+        sys.exit(1)
+    logger.info(f"{info['kept_columns']} columns kept out of {info['columns']} "
+                f"({info['allgap_columns']} with only gaps, {info['constant_columns']} "
+                f"constant). Filtered alignment in {filtered}")
+    if info["kept_columns"] == 0:
+        logger.error(f"No column left in {align} after filtering {sites} sites. Cannot "
+                     "infer a tree.")
+        sys.exit(1)
+    fconst = None
+    if sites == "variable" and soft in ["iqtree", "iqtree2"]:
+        # IQtree adds removed constant sites back to the likelihood computation
+        fconst = ",".join(str(info[f"constant_{base}"]) for base in "ACGT")
+    elif sites != "nogap":
+        logger.warning("Branch lengths are computed on the kept columns only: they are "
+                       "overestimated compared to a tree inferred from all columns.")
+    return filtered, fconst
+
+
+def compute_distances(align, outdir, model, threads):
+    """
+    Compute the distance matrix of the alignment from its site patterns, and write it to
+    '<outdir>/<alignment name>.<model>.dist', in PHYLIP square format.
+
+    Parameters
+    ----------
+    align: str
+        Path to file containing alignments of persistent families grouped by genome
+    outdir: str
+        Directory where the distance matrix must be saved
+    model: str
+        distance model: 'p-distance', 'JC69' or 'K2P'
+    threads: int
+        Maximum number of threads to use
+
+    Returns
+    -------
+    str
+        path to the distance matrix
+    """
+    import logging
+    import os
+    from PanACoTA import utils_alignment
+
+    logger = logging.getLogger("tree")
+    align_root = os.path.splitext(os.path.basename(align))[0]
+    matrix = os.path.join(outdir, f"{align_root}.{model}.dist")
+    logger.info(f"Computing {model} distances between sequences of {align}")
+    try:
+        nbcol, nbpat, nb_undef = utils_alignment.write_distances(align, matrix, model, threads)
+    except (OSError, ValueError) as err:
+        logger.error(f"Cannot compute distances from {align}: {err}")
+        sys.exit(1)
+    logger.info(f"{nbcol} columns compressed into {nbpat} site patterns. Distance matrix "
+                f"in {matrix}")
+    if nb_undef:
+        logger.warning(f"{nb_undef} pairs of sequences have no site in common, or are too "
+                       f"divergent for the {model} model: their distance is set to "
+                       f"{utils_alignment.MAX_DISTANCE}.")
+    return matrix
+
+
 def build_parser(parser):
     """
     Method to create a parser for command-line options
@@ -214,11 +342,40 @@ def build_parser(parser):
                                 " TNef, TIM, TIMef, TVM, TVMef, SYM, GTR, TEST. TEST to run standard model selection."))
     optional.add_argument("-B", dest="write_boot", action="store_true",
                           help=("Add this option if you want to write all bootstrap "
-                                "pseudo-trees. Only available with FastME and IQtree."))
+                                "pseudo-trees. Only available with FastME and IQtree, or "
+                                "with --par-boot."))
     optional.add_argument("--mem", dest="memory",
                           help=("Maximal RAM usage in GB | MB. Only available with iqtree."))
     optional.add_argument("-fast", dest="fast", action="store_true",
                           help=("Use -fast option with iqtree."))
+    optional.add_argument("--sites", dest="sites", choices=["nogap", "variable", "informative"],
+                          help=("Filter the columns of the alignment before inferring the "
+                                "tree, to reduce its size: 'nogap' removes columns with only "
+                                "gaps, 'variable' also removes constant columns, "
+                                "'informative' keeps only parsimony-informative columns. The "
+                                "filtered alignment is saved in the output directory, with a "
+                                "'.info' file giving the number of removed columns. With "
+                                "IQtree and 'variable', removed constant sites are given back "
+                                "to IQtree (-fconst option)."))
+    optional.add_argument("--distances", dest="distances",
+                          choices=["p-distance", "JC69", "K2P"],
+                          help=("Only with FastME and quicktree. Compute the distance matrix "
+                                "with this model from the site patterns of the alignment "
+                                "(identical columns are merged), and infer the tree from "
+                                "this matrix instead of the alignment. The matrix is saved "
+                                "in the output directory. Sites with a gap or an ambiguous "
+                                "nucleotide are ignored pairwise. With quicktree, --threads "
+                                "is used to compute the matrix. Not compatible with "
+                                "bootstraps (except with --par-boot), nor with '-m'."))
+    optional.add_argument("--par-boot", dest="par_boot", action="store_true",
+                          help=("Only with FastME, FastTree and quicktree, and '-b'. Instead "
+                                "of asking bootstraps to the tree software, PanACoTA draws "
+                                "the bootstrap replicates (resampling the site patterns of "
+                                "the alignment), and infers their trees in parallel on "
+                                "--threads processes, each running the software on 1 "
+                                "thread. Supports (percentage of replicates with each "
+                                "branch) are then added to the main tree. With -B, "
+                                "replicate trees are also saved."))
 
     helper = parser.add_argument_group('Others')
     helper.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
@@ -264,7 +421,29 @@ def check_args(parser, args):
                 "(see -h for more details)").format(choice, args.soft)
         parser.error(mmsg)
 
-    if args.soft == "quicktree" and args.threads != 1:
+    if args.distances:
+        if args.soft not in ["fastme", "quicktree"]:
+            msg = "'--distances' option is only available with FastME and quicktree."
+            parser.error(msg)
+        if (args.boot or args.write_boot) and not args.par_boot:
+            msg = ("'--distances' option is not compatible with '-B' and '--boot' options "
+                   "(bootstraps), except with '--par-boot'.")
+            parser.error(msg)
+        if args.model:
+            msg = ("With '--distances', the distance model is given by this option. You "
+                   "cannot choose a DNA substitution model with '-m'.")
+            parser.error(msg)
+
+    if args.par_boot:
+        if args.soft not in ["fastme", "fasttree", "quicktree"]:
+            msg = "'--par-boot' option is only available with FastME, FastTree and quicktree."
+            parser.error(msg)
+        if not args.boot:
+            msg = "'--par-boot' option needs a number of bootstraps ('-b' option)."
+            parser.error(msg)
+
+    if (args.soft == "quicktree" and args.threads != 1 and not args.distances
+            and not args.par_boot):
         msg = ("You cannot run quicktree with multiple threads. Choose another software, "
                "or remove the --threads option.")
         parser.error(msg)
@@ -285,7 +464,7 @@ def check_args(parser, args):
 
     # Write bootstrap option only available for fastme and iqtree
     if (args.soft != "iqtree" and args.soft != "iqtree2" and args.soft != "fastme"
-        and args.write_boot):
+        and args.write_boot and not args.par_boot):
         msg = "'-B' option is only available with FastME and IQtree."
         parser.error(msg)
 
@@ -297,7 +476,7 @@ def check_args(parser, args):
         parser.error(msg)
 
     # Check model name is valid for the chosen soft
-    if args.soft == "fastme":
+    if args.soft == "fastme" and not args.distances:
         if args.model:
             args.model = check_model(models_fastme, args.model)
         else:
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# ###############################################################################
+# This file is part of PanACOTA.                                                #
+#                                                                               #
+# Authors: Amandine Perrin                                                      #
+# Copyright © 2018-2020 Institut Pasteur (Paris).                               #
+# See the COPYRIGHT file for details.                                           #
+#                                                                               #
+# PanACOTA is a software providing tools for large scale bacterial comparative  #
+# genomics. From a set of complete and/or draft genomes, you can:               #
+#    -  Do a quality control of your strains, to eliminate poor quality         #
+# genomes, which would not give any information for the comparative study       #
+#    -  Uniformly annotate all genomes                                          #
+#    -  Do a Pan-genome                                                         #
+#    -  Do a Core or Persistent genome                                          #
+#    -  Align all Core/Persistent families                                      #
+#    -  Infer a phylogenetic tree from the Core/Persistent families             #
+#                                                                               #
+# PanACOTA is free software: you can redistribute it and/or modify it under the #
+# terms of the Affero GNU General Public License as published by the Free       #
+# Software Foundation, either version 3 of the License, or (at your option)     #
+# any later version.                                                            #
+#                                                                               #
+# PanACOTA is distributed in the hope that it will be useful, but WITHOUT ANY   #
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS     #
+# FOR A PARTICULAR PURPOSE. See the Affero GNU General Public License           #
+# for more details.                                                             #
+#                                                                               #
+# You should have received a copy of the Affero GNU General Public License      #
+# along with PanACOTA (COPYING file).                                           #
+# If not, see <https://www.gnu.org/licenses/>.                                  #
+# ###############################################################################
+
+"""
+Functions to compute bootstrap supports in PanACoTA, instead of asking them to the tree
+software: replicates are drawn from the site patterns of the alignment, their trees are
+inferred in parallel (1 process per replicate, each running the tree software on 1 thread),
+and supports are added to the main tree.
+
+@author gem
+"""
+
+import os
+import sys
+import glob
+import shutil
+import logging
+import logging.handlers
+import importlib
+import threading
+import multiprocessing
+import numpy as np
+
+from PanACoTA import utils
+from PanACoTA import utils_alignment
+
+logger = logging.getLogger("tree.bootstrap")
+
+# Character written for each code of utils_alignment.CODES (gap for all non-ACGT characters)
+CHARS = np.frombuffer(utils_alignment.STATES + b"-", dtype=np.uint8)
+
+# Site patterns of the alignment, shared by the processes inferring replicate trees
+_PATTERNS = None
+
+
+def get_replicate_weights(weights, rng):
+    """
+    Draw a bootstrap replicate: as many columns as in the alignment are drawn with
+    replacement, which amounts to drawing the number of times each site pattern is found
+    from a multinomial distribution.
+
+    Parameters
+    ----------
+    weights : numpy.ndarray
+        number of columns of each site pattern in the alignment
+    rng : numpy.random.Generator
+        random generator
+
+    Returns
+    -------
+    numpy.ndarray
+        number of columns of each site pattern in the replicate
+    """
+    total = int(weights.sum())
+    return rng.multinomial(total, weights / total)
+
+
+def write_replicate(names, patterns, weights, outfile):
+    """
+    Write a replicate alignment in fasta format, 1 line per sequence. Columns are written
+    grouped by site pattern. All characters which are not A, C, G or T are written as gaps.
+
+    Parameters
+    ----------
+    names : list
+        name of each sequence
+    patterns : numpy.ndarray
+        matrix of codes (see utils_alignment.CODES), 1 row per sequence and 1 column per
+        site pattern
+    weights : numpy.ndarray
+        number of columns of each site pattern in the replicate
+    outfile : str
+        path to the alignment to create
+    """
+    with open(outfile, "wb") as outf:
+        for name, row in zip(names, patterns):
+            outf.write(b">" + name.encode() + b"\n")
+            outf.write(CHARS[np.repeat(row, weights)])
+            outf.write(b"\n")
+
+
+def init_worker(patterns):
+    """
+    Give the site patterns of the alignment to a process inferring replicate trees
+
+    Parameters
+    ----------
+    patterns : tuple
+        (names, patterns, weights) as returned by ``utils_alignment.get_site_patterns``
+    """
+    global _PATTERNS
+    _PATTERNS = patterns
+
+
+def run_replicate(args):
+    """
+    Draw a bootstrap replicate, infer its tree with 1 thread, and remove all files created
+    for this replicate.
+
+    Only warnings and errors are logged, to avoid repeating the same information for each
+    replicate.
+
+    Parameters
+    ----------
+    args : tuple
+        (num, soft, repdir, model, seed, distances, q) with:
+
+        - num: number of the replicate
+        - soft: tree software: fastme, fasttree or quicktree
+        - repdir: directory where files of replicates are written
+        - model: DNA substitution model given to the tree software
+        - seed: seed of the random generator, combined with num
+        - distances: distance model, if the tree is inferred from a distance matrix
+          computed by PanACoTA (None otherwise)
+        - q: a queue, which will be used by logger to put logs while in other process
+
+    Returns
+    -------
+    tuple
+        (num, tree of the replicate in newick format, or None if it could not be inferred)
+    """
+    num, soft, repdir, model, seed, distances, q = args
+    qh = logging.handlers.QueueHandler(q)
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    root.handlers = []
+    root.addHandler(qh)
+    logging.disable(logging.INFO)
+    tree = importlib.import_module(f"PanACoTA.tree_module.{soft}_func")
+    names, patterns, weights = _PATTERNS
+    rep_weights = get_replicate_weights(weights, np.random.default_rng([seed, num]))
+    prefix = os.path.join(repdir, f"replicate{num}")
+    if distances:
+        infile = prefix + ".dist"
+        counts = utils_alignment.get_pair_counts(patterns, rep_weights)
+        dist, _ = utils_alignment.get_distances(counts, distances)
+        utils_alignment.write_distance_matrix(names, dist, infile)
+    else:
+        infile = prefix + ".aln"
+        write_replicate(names, patterns, rep_weights, infile)
+    newick = None
+    try:
+        treefile = tree.run_tree(infile, None, repdir, True, 1, model=model, wb=False,
+                                 matrix=bool(distances))
+        with open(treefile) as treef:
+            newick = treef.read().strip()
+    # Tree softwares exit when they fail: do not let the process exit
+    except (SystemExit, OSError):
+        logger.error(f"Could not infer the tree of bootstrap replicate {num}.")
+    for repfile in glob.glob(prefix + ".*"):
+        os.remove(repfile)
+    return num, newick
+
+
+def run_bootstraps(align, outdir, soft, model, boot, threads, distances=None, seed=None):
+    """
+    Infer the trees of 'boot' bootstrap replicates of the alignment, in 'threads'
+    processes.
+
+    Parameters
+    ----------
+    align : str
+        Path to file containing alignments of persistent families grouped by genome
+    outdir : str
+        output directory
+    soft : str
+        tree software: fastme, fasttree or quicktree
+    model : str or None
+        DNA substitution model given to the tree software
+    boot : int
+        number of replicates
+    threads : int
+        number of processes
+    distances : str or None
+        distance model, if trees are inferred from distance matrices computed by PanACoTA
+    seed : int or None
+        seed of the random generator (None: seed given by the system)
+
+    Returns
+    -------
+    list
+        tree of each replicate, in newick format
+    """
+    logger.info(f"Inferring trees of {boot} bootstrap replicates with {soft}, in {threads} "
+                "processes")
+    try:
+        patterns = utils_alignment.get_site_patterns(align)
+    except (OSError, ValueError) as err:
+        logger.error(f"Cannot read site patterns of {align}: {err}")
+        sys.exit(1)
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**32)
+    align_root = os.path.splitext(os.path.basename(align))[0]
+    repdir = os.path.join(outdir, f"{align_root}-{soft}-replicates")
+    os.makedirs(repdir, exist_ok=True)
+    m = multiprocessing.Manager()
+    q = m.Queue()
+    arguments = [(num, soft, repdir, model, seed, distances, q) for num in range(boot)]
+    trees = [None] * boot
+    pool = multiprocessing.Pool(threads, initializer=init_worker, initargs=(patterns,))
+    # Listen for logs in processes
+    lp = threading.Thread(target=utils.logger_thread, args=(q,))
+    lp.start()
+    try:
+        for num, newick in pool.imap_unordered(run_replicate, arguments, chunksize=1):
+            trees[num] = newick
+        pool.close()
+        pool.join()
+    # If an error occurs (or user kills with keybord), terminate pool and exit
+    except Exception as excp:  # pragma: no cover
+        pool.terminate()
+        logger.error(excp)
+        sys.exit(1)
+    finally:
+        q.put(None)
+        lp.join()
+    shutil.rmtree(repdir)
+    failed = [num for num, newick in enumerate(trees) if newick is None]
+    if failed:
+        logger.error(f"Trees of {len(failed)} bootstrap replicates could not be inferred.")
+        sys.exit(1)
+    return trees
+
+
+def read_newick(newick):
+    """
+    Read a tree in newick format
+
+    The tree is read with an explicit stack of the internal nodes being read, so that
+    deep trees (such as ladder trees with thousands of leaves) can be read.
+
+    Parameters
+    ----------
+    newick : str
+        tree in newick format
+
+    Returns
+    -------
+    dict
+        root node. Each node is a dict with keys 'children' (list of nodes), 'label' (name
+        of leaf, or support of internal node, as written in the newick) and 'length' (branch
+        length as written in the newick, or None)
+
+    Raises
+    ------
+    ValueError
+        if the newick is not well formed
+    """
+    pos = 0
+
+    def read_label():
+        nonlocal pos
+        if newick.startswith("'", pos):
+            end = newick.find("'", pos + 1)
+            if end == -1:
+                raise ValueError("Unclosed quote in newick tree.")
+            label = newick[pos + 1:end]
+            pos = end + 1
+            return label
+        start = pos
+        while pos < len(newick) and newick[pos] not in "(),:;":
+            pos += 1
+        return newick[start:pos].strip()
+
+    def read_end(node):
+        nonlocal pos
+        node["label"] = read_label()
+        if newick.startswith(":", pos):
+            pos += 1
+            node["length"] = read_label()
+
+    # Remove spaces and newlines, except in quoted labels
+    parts = newick.split("'")
+    parts[::2] = ["".join(part.split()) for part in parts[::2]]
+    newick = "'".join(parts)
+    # Internal nodes whose children are being read
+    stack = []
+    node = {"children": [], "label": "", "length": None}
+    while True:
+        while newick.startswith("(", pos):
+            pos += 1
+            stack.append(node)
+            node = {"children": [], "label": "", "length": None}
+        read_end(node)
+        # Node read: add it to its parent, and go to the next child, or close the parent
+        while stack:
+            stack[-1]["children"].append(node)
+            if newick.startswith(",", pos):
+                pos += 1
+                node = {"children": [], "label": "", "length": None}
+                break
+            if not newick.startswith(")", pos):
+                raise ValueError(f"Expected ')' at position {pos} of newick tree.")
+            pos += 1
+            node = stack.pop()
+            read_end(node)
+        else:
+            break
+    if not newick.startswith(";", pos) or pos + 1 != len(newick):
+        raise ValueError(f"Expected ';' at the end of newick tree (position {pos}).")
+    return node
+
+
+def write_newick(node):
+    """
+    Write a tree in newick format
+
+    Parameters
+    ----------
+    node : dict
+        root of the tree (see ``read_newick``)
+
+    Returns
+    -------
+    str
+        tree in newick format
+    """
+    parts = []
+    # Nodes to write, and text to write after their children
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        end = item["label"]
+        if item["length"] is not None:
+            end += ":" + item["length"]
+        if not item["children"]:
+            parts.append(end)
+            continue
+        parts.append("(")
+        stack.append(")" + end)
+        for num, child in enumerate(reversed(item["children"])):
+            if num:
+                stack.append(",")
+            stack.append(child)
+    return "".join(parts) + ";"
+
+
+def iter_postorder(root):
+    """
+    Get all nodes of a tree, each one after its children
+
+    Parameters
+    ----------
+    root : dict
+        root of the tree (see ``read_newick``)
+
+    Returns
+    -------
+    generator
+        nodes of the tree, in postorder
+    """
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if visited or not node["children"]:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node["children"]))
+
+
+def get_leaves(node):
+    """
+    Get the names of the leaves under the given node
+
+    Parameters
+    ----------
+    node : dict
+        node of a tree (see ``read_newick``)
+
+    Returns
+    -------
+    frozenset
+        names of all leaves under this node
+    """
+    return frozenset(leaf["label"] for leaf in iter_postorder(node) if not leaf["children"])
+
+
+def get_leaf_bits(leaves):
+    """
+    Give a bit to each leaf, in alphabetical order, to write sets of leaves as bitmasks
+
+    Parameters
+    ----------
+    leaves : frozenset
+        all leaves of the tree
+
+    Returns
+    -------
+    dict
+        {leaf name: bit of this leaf}
+    """
+    return {leaf: 1 << num for num, leaf in enumerate(sorted(leaves))}
+
+
+def get_clades(root, leaf_bits):
+    """
+    Get the leaves under each node of a tree, as bitmask
+
+    Parameters
+    ----------
+    root : dict
+        root of the tree (see ``read_newick``)
+    leaf_bits : dict
+        {leaf name: bit of this leaf}, as returned by ``get_leaf_bits``
+
+    Returns
+    -------
+    generator
+        (node, bitmask of the leaves under this node) for each node, in postorder
+
+    Raises
+    ------
+    ValueError
+        if a leaf of the tree is not in leaf_bits
+    """
+    # Bitmasks of nodes whose parent was not reached yet
+    clades = {}
+    for node in iter_postorder(root):
+        if node["children"]:
+            clade = 0
+            for child in node["children"]:
+                clade |= clades.pop(id(child))
+        elif node["label"] in leaf_bits:
+            clade = leaf_bits[node["label"]]
+        else:
+            raise ValueError(f"leaf {node['label']} is not in the main tree")
+        clades[id(node)] = clade
+        yield node, clade
+
+
+def get_split(clade, leaves):
+    """
+    Get the bipartition of leaves defined by a branch, independently of the root: side of
+    the bipartition which does not contain the first leaf (in alphabetical order).
+
+    Parameters
+    ----------
+    clade : int
+        bitmask of the leaves under the branch
+    leaves : int
+        bitmask of all leaves of the tree
+
+    Returns
+    -------
+    int
+        bitmask of the leaves of the side without the first leaf
+    """
+    if clade & 1:
+        return leaves ^ clade
+    return clade
+
+
+def is_trivial(split, nb_leaves):
+    """
+    Check if a bipartition separates at most 1 leaf from the others: it is in all trees
+
+    Parameters
+    ----------
+    split : int
+        bitmask of 1 side of the bipartition
+    nb_leaves : int
+        number of leaves of the tree
+
+    Returns
+    -------
+    bool
+        True if the bipartition is trivial
+    """
+    nb_split = bin(split).count("1")
+    return nb_split <= 1 or nb_split >= nb_leaves - 1
+
+
+def get_splits(root, leaf_bits):
+    """
+    Get all non trivial bipartitions defined by the branches of a tree
+
+    Parameters
+    ----------
+    root : dict
+        root of the tree (see ``read_newick``)
+    leaf_bits : dict
+        {leaf name: bit of this leaf}, as returned by ``get_leaf_bits``
+
+    Returns
+    -------
+    set
+        bipartitions (see ``get_split``), separating at least 2 leaves from the others
+    """
+    leaves = (1 << len(leaf_bits)) - 1
+    splits = set()
+    for _, clade in get_clades(root, leaf_bits):
+        split = get_split(clade, leaves)
+        if not is_trivial(split, len(leaf_bits)):
+            splits.add(split)
+    return splits
+
+
+def add_supports(root, trees):
+    """
+    Write, as label of each internal node of the tree (except the root), the percentage of
+    replicate trees containing the bipartition defined by its branch. Bipartitions separating
+    1 leaf from the others are in all trees: their support is 100.
+
+    Parameters
+    ----------
+    root : dict
+        root of the main tree (see ``read_newick``), updated
+    trees : list
+        replicate trees, in newick format
+
+    Raises
+    ------
+    ValueError
+        if a replicate tree is not well formed, or has a leaf which is not in the main tree
+    """
+    leaf_bits = get_leaf_bits(get_leaves(root))
+    counts = {}
+    for newick in trees:
+        for split in get_splits(read_newick(newick), leaf_bits):
+            counts[split] = counts.get(split, 0) + 1
+    leaves = (1 << len(leaf_bits)) - 1
+    for node, clade in get_clades(root, leaf_bits):
+        if not node["children"] or node is root:
+            continue
+        split = get_split(clade, leaves)
+        if is_trivial(split, len(leaf_bits)):
+            node["label"] = "100"
+        else:
+            node["label"] = str(round(100 * counts.get(split, 0) / len(trees)))
+
+
+def write_supports(treefile, trees, bootfile=None):
+    """
+    Add bootstrap supports to the main tree, in its file.
+
+    Parameters
+    ----------
+    treefile : str
+        path to the main tree, in newick format
+    trees : list
+        replicate trees, in newick format
+    bootfile : str or None
+        if given, path to the file where replicate trees are written, 1 per line
+    """
+    try:
+        with open(treefile) as treef:
+            root = read_newick(treef.read())
+        if set(get_leaves(root)) != set(get_leaves(read_newick(trees[0]))):
+            raise ValueError("leaves of replicate trees are not the leaves of the main tree")
+        add_supports(root, trees)
+    except (OSError, ValueError) as err:
+        logger.error(f"Cannot add bootstrap supports to {treefile}: {err}")
+        sys.exit(1)
+    with open(treefile, "w") as treef:
+        treef.write(write_newick(root) + "\n")
+    logger.info(f"Bootstrap supports added to {treefile}")
+    if bootfile:
+        with open(bootfile, "w") as bootf:
+            bootf.write("\n".join(trees) + "\n")
+        logger.info(f"Bootstrap trees written to {bootfile}")
@@ -40,11 +40,12 @@ Functions to infer a phylogenetic tree with fastME
 June 2017
 """
 
-from Bio import AlignIO
 import os
+import sys
 import logging
 
 from PanACoTA import utils
+from PanACoTA import utils_alignment
 
 logger = logging.getLogger("tree.fastme")
 
@@ -68,13 +69,23 @@ def run_tree(alignfile, boot, outdir, quiet, threads, **kwargs):
         DNA substitution model chosen by user
     kwargs["wb"]: bool
         True if all bootstrap pseudo-trees must be saved into a file, False otherwise
+    kwargs["matrix"]: bool
+        True if alignfile is a distance matrix (PHYLIP square format) instead of an alignment
+
+    Returns
+    -------
+    str
+        path to the inferred tree
     """
     model = kwargs["model"]
     write_boot = kwargs["wb"]
+    if kwargs.get("matrix"):
+        return run_fastme(alignfile, boot, write_boot, threads, model, outdir, quiet,
+                          matrix=True)
     align_name = os.path.basename(alignfile)
     align_phylip = os.path.join(outdir, align_name + ".phylip")
     convert2phylip(alignfile, align_phylip)
-    run_fastme(align_phylip, boot, write_boot, threads, model, outdir, quiet)
+    return run_fastme(align_phylip, boot, write_boot, threads, model, outdir, quiet)
 
 
 def convert2phylip(infile, outfile):
@@ -95,14 +106,19 @@ def convert2phylip(infile, outfile):
                         "will use it instead of re-converting {}.").format(outfile, infile))
         return
     logger.info("Converting fasta alignment to PHYLIP-relaxed format.")
-    with open(infile, 'r') as input_handle, open(outfile, 'w') as output_handle:
-        alignments = AlignIO.parse(input_handle, "fasta")
-        AlignIO.write(alignments, output_handle, "phylip-relaxed")
+    try:
+        utils_alignment.write_phylip(infile, outfile)
+    except (OSError, ValueError) as err:
+        # Do not leave a partial file, which would be used by next runs
+        if os.path.isfile(outfile):
+            os.remove(outfile)
+        logger.error(f"Cannot convert {infile} to PHYLIP-relaxed format: {err}")
+        sys.exit(1)
 
 
-def run_fastme(alignfile, boot, write_boot, threads, model, outdir, quiet):
+def run_fastme(alignfile, boot, write_boot, threads, model, outdir, quiet, matrix=False):
     """
-    Run fastME on the given alignment.
+    Run fastME on the given alignment, or distance matrix.
 
     Parameters
     ----------
@@ -120,6 +136,13 @@ def run_fastme(alignfile, boot, write_boot, threads, model, outdir, quiet):
         output directory to save all results
     quiet: bool
         True if nothing must be printed to stderr/stdout, False otherwise
+    matrix: bool
+        True if alignfile is a distance matrix: fastME does not compute distances (no model)
+
+    Returns
+    -------
+    str
+        path to the inferred tree
     """
     logger.info("Running FastME...")
     bootinfo = ""
@@ -139,10 +162,15 @@ def run_fastme(alignfile, boot, write_boot, threads, model, outdir, quiet):
     # If bootstrap pseudo-trees must be written, define the filename here
     if write_boot:
         outboot = "-B " + os.path.join(outdir, align_name + ".fastme_bootstraps.nwk")
+    # Without option -d, fastME reads a distance matrix
+    if matrix:
+        modelinfo = ""
     # Put default model if not given
-    if not model:
-        model = "T"
-    cmd = (f"fastme -i {alignfile} -d{model} -nB -s {threadinfo} {bootinfo} "
+    elif not model:
+        modelinfo = "-dT"
+    else:
+        modelinfo = f"-d{model}"
+    cmd = (f"fastme -i {alignfile} {modelinfo} -nB -s {threadinfo} {bootinfo} "
            f"-o {treefile} -I {logfile} {outboot}")
     logger.details(cmd)
     if quiet:
@@ -152,3 +180,4 @@ def run_fastme(alignfile, boot, write_boot, threads, model, outdir, quiet):
     error = ("Problem while running FastME. See log file ({}) for "
              "more information.").format(logfile)
     utils.run_cmd(cmd, error, stdout=fnull, eof=True, logger=logger, stderr=fnull)
+    return treefile
@@ -68,10 +68,15 @@ def run_tree(alignfile, boot, outdir, quiet, threads, **kwargs):
     kwargs: Object
         Used to be compatible with the 'run_tree' function of other softs like fastME and
         quicktree, which require more arguments
+
+    Returns
+    -------
+    str
+        path to the inferred tree
     """
     model = kwargs["model"]
     define_nb_threads(threads)
-    run_fasttree(alignfile, boot, outdir, model, quiet)
+    return run_fasttree(alignfile, boot, outdir, model, quiet)
 
 
 def define_nb_threads(threads):
@@ -103,6 +108,11 @@ def run_fasttree(alignfile, boot, outdir, model, quiet):
         DNA substitution model
     quiet: bool
         True if nothing must be printed to stderr/stdout, False otherwise
+
+    Returns
+    -------
+    str
+        path to the inferred tree
     """
     logger.info("Running FasttreeMP...")
     if not boot:
@@ -122,3 +132,4 @@ def run_fasttree(alignfile, boot, outdir, model, quiet):
     error = ("Problem while running Fasttree. See log file ({}) for "
              "more information.").format(logfile)
     utils.run_cmd(cmd, error, stdout=stdout, eof=True, logger=logger, stderr=fnull)
+    return treefile
@@ -71,6 +71,9 @@ def run_tree(alignfile, boot, outdir, quiet, threads, **kwargs):
     	Maximal RAM usage in GB | MB | % - Only for iqtree
     kwargs["s"]: str
     	soft to use (iqtree or iqtree2)
+    kwargs["fconst"]: str or None
+        Number of constant sites of each nucleotide ('a,c,g,t') removed from the alignment,
+        to add them back to the likelihood computation (IQtree -fconst option)
     """
     # Get optional arguments
     model = kwargs["model"]
@@ -78,6 +81,7 @@ def run_tree(alignfile, boot, outdir, quiet, threads, **kwargs):
     memory = kwargs["mem"]
     soft = kwargs["s"]
     fast = kwargs["f"]
+    fconst = kwargs.get("fconst")
     if not fast:
         fast = ""
     else:
@@ -136,6 +140,8 @@ def run_tree(alignfile, boot, outdir, quiet, threads, **kwargs):
         prefix = f"--prefix {treefile}"
     cmd = (f"{soft} -s {alignfile} {threadinfo} -m {model} {mem_info} {bootinfo} {wb_info} "
     	   f"{seqtype} {prefix} {qu} {fast}")
+    if fconst:
+        cmd += f" -fconst {fconst}"
     logger.details("IQtree command: " + cmd)
     if quiet:
         fnull = open(os.devnull, 'w')
@@ -40,11 +40,12 @@ Functions to infer a phylogenetic tree with quicktree
 June 2017
 """
 
-from Bio import AlignIO
 import os
+import sys
 import logging
 
 from PanACoTA import utils
+from PanACoTA import utils_alignment
 
 logger = logging.getLogger("tree.quicktree")
 
@@ -68,12 +69,20 @@ def run_tree(alignfile, boot, outdir, *args, **kwargs):
     kwargs: dict
         Used to be compatible with the 'run_tree' function of other softs like fastME and
         fastTree which require more arguments like the DNA substitution model, the number of
-        threads to use, etc.
+        threads to use, etc. kwargs["matrix"] is True if alignfile is a distance matrix
+        (PHYLIP square format) instead of an alignment.
+
+    Returns
+    -------
+    str
+        path to the inferred tree
     """
+    if kwargs.get("matrix"):
+        return run_quicktree(alignfile, boot, outdir, matrix=True)
     align_name = os.path.basename(alignfile)
     align_stock = os.path.join(outdir, align_name + ".stockholm")
     convert2stockholm(alignfile, align_stock)
-    run_quicktree(align_stock, boot, outdir)
+    return run_quicktree(align_stock, boot, outdir)
 
 
 def convert2stockholm(infile, outfile):
@@ -94,14 +103,19 @@ def convert2stockholm(infile, outfile):
                         "will use it instead of re-converting {}.").format(outfile, infile))
         return
     logger.info("Converting fasta alignment to stockholm format.")
-    with open(infile, 'r') as input_handle, open(outfile, 'w') as output_handle:
-        alignments = AlignIO.parse(input_handle, "fasta")
-        AlignIO.write(alignments, output_handle, "stockholm")
+    try:
+        utils_alignment.write_stockholm(infile, outfile)
+    except (OSError, ValueError) as err:
+        # Do not leave a partial file, which would be used by next runs
+        if os.path.isfile(outfile):
+            os.remove(outfile)
+        logger.error(f"Cannot convert {infile} to Stockholm format: {err}")
+        sys.exit(1)
 
 
-def run_quicktree(alignfile, boot, outdir):
+def run_quicktree(alignfile, boot, outdir, matrix=False):
     """
-    Run quicktree on the given alignment.
+    Run quicktree on the given alignment, or distance matrix.
 
     Parameters
     ----------
@@ -112,6 +126,13 @@ def run_quicktree(alignfile, boot, outdir):
         Number of bootstraps to compute. None if no bootstrap asked
     outdir: str or None
         Path to the tree file that must be created
+    matrix: bool
+        True if alignfile is a distance matrix in PHYLIP square format
+
+    Returns
+    -------
+    str
+        path to the inferred tree
     """
     logger.info("Running Quicktree...")
     bootinfo = ""
@@ -123,10 +144,12 @@ def run_quicktree(alignfile, boot, outdir):
     align_name = os.path.basename(alignfile)
     logfile = os.path.join(outdir, align_name + ".quicktree.log")
     treefile = os.path.join(outdir, align_name + ".quicktree_tree.nwk")
-    cmd = f"quicktree -in a -out t {bootinfo} {alignfile}"
+    intype = "m" if matrix else "a"
+    cmd = f"quicktree -in {intype} -out t {bootinfo} {alignfile}"
     outfile = open(treefile, "w")
     logfilef = open(logfile, "w")
     error = (f"Problem while running quicktree. See log file ({logfile}) for "
              "more information.")
     logger.details(cmd)
     utils.run_cmd(cmd, error, stdout=outfile, eof=True, logger=logger, stderr=logfilef)
+    return treefile
@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# ###############################################################################
+# This file is part of PanACOTA.                                                #
+#                                                                               #
+# Authors: Amandine Perrin                                                      #
+# Copyright © 2018-2020 Institut Pasteur (Paris).                               #
+# See the COPYRIGHT file for details.                                           #
+#                                                                               #
+# PanACOTA is a software providing tools for large scale bacterial comparative  #
+# genomics. From a set of complete and/or draft genomes, you can:               #
+#    -  Do a quality control of your strains, to eliminate poor quality         #
+# genomes, which would not give any information for the comparative study       #
+#    -  Uniformly annotate all genomes                                          #
+#    -  Do a Pan-genome                                                         #
+#    -  Do a Core or Persistent genome                                          #
+#    -  Align all Core/Persistent families                                      #
+#    -  Infer a phylogenetic tree from the Core/Persistent families             #
+#                                                                               #
+# PanACOTA is free software: you can redistribute it and/or modify it under the #
+# terms of the Affero GNU General Public License as published by the Free       #
+# Software Foundation, either version 3 of the License, or (at your option)     #
+# any later version.                                                            #
+#                                                                               #
+# PanACOTA is distributed in the hope that it will be useful, but WITHOUT ANY   #
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS     #
+# FOR A PARTICULAR PURPOSE. See the Affero GNU General Public License           #
+# for more details.                                                             #
+#                                                                               #
+# You should have received a copy of the Affero GNU General Public License      #
+# along with PanACOTA (COPYING file).                                           #
+# If not, see <https://www.gnu.org/licenses/>.                                  #
+# ###############################################################################
+
+
+"""
+Functions to compute statistics on the columns of a nucleic alignment (such as the
+alignment of persistent families grouped by genome), filter its columns, compress it into
+site patterns to compute distances between sequences, or convert it to the formats expected
+by tree softwares (PHYLIP-relaxed, Stockholm).
+
+The alignment is read through a memory map, by blocks of columns converted to uint8
+matrices (1 row per sequence), so that statistics of all columns can be computed without
+loading the whole alignment in memory.
+
+@author gem
+"""
+import os
+import mmap
+import logging
+import functools
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger("utils.alignment")
+
+# Nucleotide states. Any other character (gap, N, ambiguity code) is missing data.
+STATES = b"ACGT"
+# Code of each byte: index of its state in STATES (case insensitive), 4 if missing data
+CODES = np.full(256, len(STATES), dtype=np.uint8)
+for _num, _base in enumerate(STATES):
+    CODES[_base] = _num
+    CODES[ord(chr(_base).lower())] = _num
+# Filters available: keep columns which are not only gaps, keep variable columns, or keep
+# parsimony-informative columns
+SITE_FILTERS = ["nogap", "variable", "informative"]
+# Distance models available to compute a distance matrix
+DIST_MODELS = ["p-distance", "JC69", "K2P"]
+# Distance given to pairs of sequences without any site in common, or too divergent for the model
+MAX_DISTANCE = 10.0
+# Multiplier of the hash of site patterns (odd, so that no information is lost modulo 2^64)
+HASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def get_alignment_index(mm):
+    """
+    Find where each sequence is in the alignment.
+
+    Each sequence must be on a single line, or on lines of the same width (except the last
+    one), ending with '\\n'.
+
+    Parameters
+    ----------
+    mm : mmap.mmap or bytes
+        content of the alignment file, in fasta format
+
+    Returns
+    -------
+    tuple
+        (names, starts, widths, length) with names the list of sequence names (first word of
+        headers, as str), starts and widths the position of the first character and the line
+        width of each sequence, and length the length of the alignment.
+
+    Raises
+    ------
+    ValueError
+        if sequences do not all have the same length, or are not written on lines of the
+        same width
+    """
+    names = []
+    starts = []
+    widths = []
+    length = None
+    pos = mm.find(b">")
+    while pos != -1:
+        end_header = mm.find(b"\n", pos)
+        if end_header == -1:
+            end_header = len(mm)
+        header = bytes(mm[pos + 1:end_header]).split()
+        names.append(header[0].decode() if header else "")
+        start = end_header + 1
+        next_header = mm.find(b"\n>", end_header)
+        end = len(mm) if next_header == -1 else next_header + 1
+        # Sequence region, without empty lines at the end
+        while end > start and mm[end - 1:end] in (b"\n", b"\r", b" "):
+            end -= 1
+        width = mm.find(b"\n", start, end)
+        width = end - start if width == -1 else width - start
+        nb_lines = mm[start:end].count(b"\n") + 1 if width < end - start else 1
+        seq_len = end - start - (nb_lines - 1)
+        # Check number of lines, and position of the last line
+        last_line = start + (nb_lines - 1) * (width + 1)
+        if width > 0 and (nb_lines != -(-seq_len // width)
+                          or (nb_lines > 1 and mm[last_line - 1:last_line] != b"\n")):
+            raise ValueError(f"Sequence {names[-1]} is not written on lines of the same "
+                             "width.")
+        if length is None:
+            length = seq_len
+        elif seq_len != length:
+            raise ValueError(f"Sequence {names[-1]} has a different length ({seq_len}) from "
+                             f"previous sequences ({length}).")
+        starts.append(start)
+        widths.append(max(width, 1))
+        release_pages(mm)
+        pos = -1 if next_header == -1 else next_header + 1
+    return names, starts, widths, length or 0
+
+
+def read_row(mm, start, width, first, last):
+    """
+    Get characters [first, last[ of a sequence
+
+    Parameters
+    ----------
+    mm : mmap.mmap or bytes
+        content of the alignment file
+    start : int
+        position of the first character of the sequence in mm
+    width : int
+        width of the lines of the sequence
+    first : int
+        first column to get
+    last : int
+        column after the last one to get
+
+    Returns
+    -------
+    numpy.ndarray
+        characters of the sequence, as uint8
+    """
+    begin = start + first + first // width
+    end = start + last + (last - 1) // width
+    row = mm[begin:end]
+    if (last - 1) // width != first // width:
+        row = row.replace(b"\n", b"")
+    return np.frombuffer(row, dtype=np.uint8)
+
+
+def read_columns(mm, index, first, last):
+    """
+    Get a block of columns of the alignment
+
+    Parameters
+    ----------
+    mm : mmap.mmap or bytes
+        content of the alignment file
+    index : tuple
+        (names, starts, widths, length) as returned by ``get_alignment_index``
+    first : int
+        first column of the block
+    last : int
+        column after the last one of the block
+
+    Returns
+    -------
+    numpy.ndarray
+        matrix of uint8 codes (see CODES), with 1 row per sequence and 1 column per
+        alignment column
+    """
+    _, starts, widths, _ = index
+    block = np.empty((len(starts), last - first), dtype=np.uint8)
+    for num, (start, width) in enumerate(zip(starts, widths)):
+        block[num] = read_row(mm, start, width, first, last)
+    return CODES[block]
+
+
+def get_state_counts(block):
+    """
+    Count each nucleotide in each column of a block
+
+    Parameters
+    ----------
+    block : numpy.ndarray
+        matrix of codes, as returned by ``read_columns``
+
+    Returns
+    -------
+    numpy.ndarray
+        matrix with 1 row per state (A, C, G, T) and 1 column per column of the block,
+        containing the number of sequences with this state in this column
+    """
+    return np.stack([(block == num).sum(axis=0) for num in range(len(STATES))])
+
+
+def get_column_masks(counts):
+    """
+    Classify each column according to the number of states it contains
+
+    Parameters
+    ----------
+    counts : numpy.ndarray
+        number of sequences with each state in each column (see ``get_state_counts``)
+
+    Returns
+    -------
+    dict
+        {kind: boolean array} for each kind of column: 'allgap' (no nucleotide),
+        'constant' (only 1 state), 'variable' (at least 2 states), 'informative' (at least
+        2 states, each present in at least 2 sequences)
+    """
+    nb_states = (counts > 0).sum(axis=0)
+    return {"allgap": nb_states == 0,
+            "constant": nb_states == 1,
+            "variable": nb_states >= 2,
+            "informative": (counts >= 2).sum(axis=0) >= 2}
+
+
+def get_kept_columns(masks, sites):
+    """
+    Get the columns kept by the given filter
+
+    Parameters
+    ----------
+    masks : dict
+        masks of each kind of column, as returned by ``get_column_masks``
+    sites : str
+        filter (see SITE_FILTERS)
+
+    Returns
+    -------
+    numpy.ndarray
+        True for each kept column
+    """
+    if sites == "nogap":
+        return ~masks["allgap"]
+    return masks[sites]
+
+
+def get_block_width(nb_seqs, block_size):
+    """
+    Number of columns read at once, so that a block contains about 'block_size' characters
+    """
+    return max(1, block_size // max(1, nb_seqs))
+
+
+def filter_columns(alignfile, outfile, sites, block_size=2**26):
+    """
+    Write the alignment with only the columns kept by the given filter, and information on
+    removed columns (number of all-gap columns and constant columns of each nucleotide), to
+    '<outfile without extension>.info'. This information is needed by some tree softwares
+    to correct for removed sites (ascertainment bias).
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment, in fasta format
+    outfile : str
+        path to the filtered alignment to create
+    sites : str
+        filter (see SITE_FILTERS): 'nogap' to remove all-gap columns, 'variable' to also remove
+        constant columns, 'informative' to keep only parsimony-informative columns
+    block_size : int
+        approximate number of characters read at once
+
+    Returns
+    -------
+    dict
+        information on columns, as written to the info file
+    """
+    with open(alignfile, "rb") as alnf:
+        mm = mmap.mmap(alnf.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index = get_alignment_index(mm)
+            names, starts, widths, length = index
+            # First pass: statistics on columns, by blocks of columns
+            width = get_block_width(len(names), block_size)
+            keep = np.zeros(length, dtype=bool)
+            info = {"filter": sites, "sequences": len(names), "columns": length,
+                    "kept_columns": 0, "allgap_columns": 0, "constant_columns": 0,
+                    "variable_columns": 0, "informative_columns": 0}
+            constants = np.zeros(len(STATES), dtype=np.int64)
+            for first in range(0, length, width):
+                last = min(length, first + width)
+                counts = get_state_counts(read_columns(mm, index, first, last))
+                masks = get_column_masks(counts)
+                keep[first:last] = get_kept_columns(masks, sites)
+                for kind in ["allgap", "constant", "variable", "informative"]:
+                    info[f"{kind}_columns"] += int(masks[kind].sum())
+                const_counts = counts[:, masks["constant"]]
+                constants += np.bincount(const_counts.argmax(axis=0),
+                                         minlength=len(STATES))
+            info["kept_columns"] = int(keep.sum())
+            for base, count in zip(STATES.decode(), constants):
+                info[f"constant_{base}"] = int(count)
+            # Second pass: write kept columns of each sequence
+            with open(outfile, "wb") as outf:
+                for name, start, wid in zip(names, starts, widths):
+                    row = read_row(mm, start, wid, 0, length)[keep]
+                    outf.write(b">" + name.encode() + b"\n" + row.tobytes() + b"\n")
+        finally:
+            mm.close()
+    infofile = os.path.splitext(outfile)[0] + ".info"
+    with open(infofile, "w") as inff:
+        for key, value in info.items():
+            inff.write(f"{key}\t{value}\n")
+    return info
+
+
+def get_column_hashes(columns):
+    """
+    Compute a 64-bit hash of each column, to find identical columns without keeping their
+    content as dict keys. Different columns may have the same hash.
+
+    Parameters
+    ----------
+    columns : numpy.ndarray
+        matrix of codes with 1 row per column of the alignment
+
+    Returns
+    -------
+    numpy.ndarray
+        hash of each column (uint64)
+    """
+    hashes = np.zeros(len(columns), dtype=np.uint64)
+    for codes in columns.T:
+        # Overflow is expected: arithmetic is modulo 2^64
+        hashes *= HASH_MULT
+        hashes += codes
+    return hashes
+
+
+def get_site_patterns(alignfile, block_size=2**26):
+    """
+    Compress the alignment into its site patterns: each distinct column is kept once, with
+    the number of columns having this pattern as weight.
+
+    Patterns are stored once, in a matrix which grows with the number of patterns found, and
+    found by the hash of their column (see ``get_column_hashes``): each hash gives the index
+    of its pattern in the matrix.
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment, in fasta format
+    block_size : int
+        approximate number of characters read at once
+
+    Returns
+    -------
+    tuple
+        (names, patterns, weights) with names the list of sequence names, patterns the matrix
+        of codes (see CODES) with 1 row per sequence and 1 column per pattern, and weights
+        the number of columns of each pattern
+    """
+    found = {}
+    nb_patterns = 0
+    with open(alignfile, "rb") as alnf:
+        mm = mmap.mmap(alnf.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index = get_alignment_index(mm)
+            names, _, _, length = index
+            width = get_block_width(len(names), block_size)
+            # 1 row per pattern, so that the matrix can grow in place
+            patterns = np.empty((min(length, width), len(names)), dtype=np.uint8)
+            weights = np.zeros(len(patterns), dtype=np.int64)
+            for first in range(0, length, width):
+                block = read_columns(mm, index, first, min(length, first + width))
+                uniques, counts = np.unique(block.T, axis=0, return_counts=True)
+                hashes = get_column_hashes(uniques)
+                for column, key, count in zip(uniques, hashes.tolist(), counts.tolist()):
+                    num = found.get(key)
+                    # Another pattern has the same hash: try the next one
+                    while num is not None and not np.array_equal(patterns[num], column):
+                        key = (key + 1) % 2**64
+                        num = found.get(key)
+                    if num is None:
+                        num = nb_patterns
+                        nb_patterns += 1
+                        found[key] = num
+                        if num == len(patterns):
+                            patterns.resize((2 * num, len(names)), refcheck=False)
+                            weights.resize(2 * num, refcheck=False)
+                        patterns[num] = column
+                    weights[num] += count
+        finally:
+            mm.close()
+    patterns.resize((nb_patterns, len(names)), refcheck=False)
+    weights.resize(nb_patterns, refcheck=False)
+    return names, patterns.T, weights
+
+
+def add_block_counts(onehot, weights, counts, rows):
+    """
+    Add, for the sequences in 'rows' against all sequences, the weighted number of sites
+    where both have a nucleotide, where they have the same one, and where they differ by a
+    transition (A <-> G or C <-> T), on a block of site patterns.
+
+    Parameters
+    ----------
+    onehot : list
+        [A, C, G, T] matrices of 0/1, with 1 row per sequence and 1 column per pattern of the
+        block
+    weights : numpy.ndarray
+        weight of each pattern of the block
+    counts : tuple
+        (valid, same, transitions) matrices of shape (nb sequences, nb sequences), updated
+    rows : slice
+        sequences handled
+    """
+    valid, same, transitions = counts
+    bases_a, bases_c, bases_g, bases_t = onehot
+    present = bases_a + bases_c + bases_g + bases_t
+    valid[rows] += (present[rows] * weights) @ present.T
+    for base in onehot:
+        same[rows] += (base[rows] * weights) @ base.T
+    for base1, base2 in [(bases_a, bases_g), (bases_g, bases_a), (bases_c, bases_t),
+                         (bases_t, bases_c)]:
+        transitions[rows] += (base1[rows] * weights) @ base2.T
+
+
+def get_pair_counts(patterns, weights, threads=1, block_size=2**22):
+    """
+    For each pair of sequences, count the sites where both have a nucleotide, where they
+    have the same one, and where they differ by a transition.
+
+    Site patterns are converted to weighted 0/1 matrices by blocks, and counts are obtained
+    by matrix products. The rows of the count matrices are split between threads (matrix
+    products release the GIL).
+
+    Parameters
+    ----------
+    patterns : numpy.ndarray
+        matrix of codes, 1 row per sequence and 1 column per pattern
+    weights : numpy.ndarray
+        number of columns of each pattern
+    threads : int
+        number of threads
+    block_size : int
+        approximate number of characters of patterns converted at once
+
+    Returns
+    -------
+    tuple
+        (valid, same, transitions) matrices of shape (nb sequences, nb sequences)
+    """
+    nb_seqs, nb_patterns = patterns.shape
+    counts = tuple(np.zeros((nb_seqs, nb_seqs)) for _ in range(3))
+    bounds = np.linspace(0, nb_seqs, min(threads, max(nb_seqs, 1)) + 1).astype(int)
+    row_blocks = [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+    width = get_block_width(nb_seqs, block_size)
+    with ThreadPool(len(row_blocks)) as pool:
+        for first in range(0, nb_patterns, width):
+            codes = patterns[:, first:first + width]
+            onehot = [(codes == num).astype(np.float64) for num in range(len(STATES))]
+            block_weights = weights[first:first + width].astype(np.float64)
+            pool.map(functools.partial(add_block_counts, onehot, block_weights, counts),
+                     row_blocks)
+    return counts
+
+
+def get_distances(counts, model):
+    """
+    Compute the distance between each pair of sequences
+
+    Parameters
+    ----------
+    counts : tuple
+        (valid, same, transitions) matrices, as returned by ``get_pair_counts``
+    model : str
+        'p-distance' (proportion of different sites), 'JC69' (Jukes-Cantor) or 'K2P'
+        (Kimura 2 parameters)
+
+    Returns
+    -------
+    tuple
+        (distance matrix, number of pairs of sequences whose distance cannot be computed:
+        no site in common, or too divergent for the model. Their distance is MAX_DISTANCE)
+    """
+    valid, same, transitions = counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff = (valid - same) / valid
+        if model == "p-distance":
+            dist = diff
+        elif model == "JC69":
+            dist = -0.75 * np.log(1 - 4 * diff / 3)
+        else:
+            trans = transitions / valid
+            transv = diff - trans
+            dist = -0.5 * np.log(1 - 2 * trans - transv) - 0.25 * np.log(1 - 2 * transv)
+    undefined = ~np.isfinite(dist)
+    np.fill_diagonal(undefined, False)
+    dist[undefined] = MAX_DISTANCE
+    np.fill_diagonal(dist, 0)
+    return dist, int(undefined.sum()) // 2
+
+
+def write_distance_matrix(names, dist, outfile):
+    """
+    Write a distance matrix in PHYLIP square format
+
+    Parameters
+    ----------
+    names : list
+        name of each sequence
+    dist : numpy.ndarray
+        distance matrix
+    outfile : str
+        path to the file to create
+    """
+    with open(outfile, "w") as outf:
+        outf.write(f"{len(names)}\n")
+        for name, row in zip(names, dist):
+            outf.write(name + " " + " ".join(f"{val:.8f}" for val in row) + "\n")
+
+
+def write_distances(alignfile, outfile, model, threads=1):
+    """
+    Compute the distance matrix of an alignment from its site patterns, and write it in
+    PHYLIP square format.
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment, in fasta format
+    outfile : str
+        path to the distance matrix to create
+    model : str
+        'p-distance', 'JC69' or 'K2P' (see DIST_MODELS)
+    threads : int
+        number of threads
+
+    Returns
+    -------
+    tuple
+        (number of columns, number of site patterns, number of pairs whose distance could not
+        be computed)
+    """
+    names, patterns, weights = get_site_patterns(alignfile)
+    counts = get_pair_counts(patterns, weights, threads)
+    dist, nb_undefined = get_distances(counts, model)
+    write_distance_matrix(names, dist, outfile)
+    return int(weights.sum()), len(weights), nb_undefined
+
+
+def release_pages(mm):
+    """
+    Tell the system that pages of the memory map already read are not needed anymore, so
+    that they are not counted in the memory used by the process (read-only map: they are
+    read again from the file if needed). Nothing is done if the system does not support it.
+
+    Parameters
+    ----------
+    mm : mmap.mmap or bytes
+        memory map of the alignment (nothing is done for bytes)
+    """
+    if hasattr(mm, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+        mm.madvise(mmap.MADV_DONTNEED)
+
+
+def check_names(names, fmt):
+    """
+    Check that the alignment can be written in the given format: at least 1 sequence, no
+    duplicate name.
+
+    Parameters
+    ----------
+    names : list
+        names of the sequences
+    fmt : str
+        name of the format, for error messages
+
+    Raises
+    ------
+    ValueError
+        if there is no sequence, or if several sequences have the same name
+    """
+    if not names:
+        raise ValueError(f"No sequence found: cannot write it in {fmt} format.")
+    found = set()
+    for name in names:
+        if name in found:
+            raise ValueError(f"Several sequences are named '{name}': cannot write it in "
+                             f"{fmt} format.")
+        found.add(name)
+
+
+def get_phylip_lines(rows, labels, first_block):
+    """
+    Get complete PHYLIP interleaved blocks (50 columns, in 5 groups of 10 characters) for
+    the given rows.
+
+    Parameters
+    ----------
+    rows : numpy.ndarray
+        characters of each sequence (uint8), 1 row per sequence. Its number of columns must
+        be a multiple of 50
+    labels : numpy.ndarray
+        names of the sequences, padded with spaces (uint8), 1 row per sequence
+    first_block : bool
+        True if rows start at the first column of the alignment: names are written before
+        the first block, and spaces before the next ones
+
+    Returns
+    -------
+    numpy.ndarray
+        characters of each block (uint8), of shape (nb blocks, nb sequences, line length)
+    """
+    nb_seqs, nb_cols = rows.shape
+    id_width = labels.shape[1]
+    nb_blocks = nb_cols // 50
+    lines = np.full((nb_blocks, nb_seqs, id_width + 56), ord(" "), dtype=np.uint8)
+    if first_block and nb_blocks:
+        lines[0, :, :id_width] = labels
+    groups = lines[:, :, id_width:id_width + 55].reshape(nb_blocks, nb_seqs, 5, 11)
+    groups[:, :, :, 1:] = rows.reshape(nb_seqs, nb_blocks, 5, 10).transpose(1, 0, 2, 3)
+    lines[:, :, -1] = ord("\n")
+    return lines
+
+
+def write_phylip(alignfile, outfile, block_size=2**26):
+    """
+    Convert an alignment in fasta format to PHYLIP-relaxed (interleaved) format, without
+    loading the whole alignment in memory: the alignment is indexed, and then read by
+    blocks of columns. The output is the same as the one of Biopython
+    (AlignIO 'phylip-relaxed').
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment, in fasta format
+    outfile : str
+        path to the file to create, in PHYLIP-relaxed format
+    block_size : int
+        approximate number of characters read at once
+
+    Raises
+    ------
+    ValueError
+        if sequences do not all have the same length, have the same name, or if the
+        alignment is empty
+    """
+    if not os.path.getsize(alignfile):
+        raise ValueError(f"{alignfile} is empty.")
+    with open(alignfile, "rb") as alnf:
+        mm = mmap.mmap(alnf.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            names, starts, widths, length = get_alignment_index(mm)
+            check_names(names, "PHYLIP")
+            if not length:
+                raise ValueError("Sequences are empty: cannot write them in PHYLIP format.")
+            id_width = max(len(name) for name in names) + 1
+            labels = np.frombuffer(b"".join(name.encode().ljust(id_width) for name in names),
+                                   dtype=np.uint8).reshape(len(names), id_width)
+            width = max(1, get_block_width(len(names), block_size) // 50) * 50
+            with open(outfile, "wb") as outf:
+                outf.write(f" {len(names)} {length}\n".encode())
+                sep = b""
+                for first in range(0, length, width):
+                    last = min(length, first + width)
+                    rows = np.empty((len(names), last - first), dtype=np.uint8)
+                    for num, (start, wid) in enumerate(zip(starts, widths)):
+                        rows[num] = read_row(mm, start, wid, first, last)
+                    end_full = (last - first) // 50 * 50
+                    for block in get_phylip_lines(rows[:, :end_full], labels, first == 0):
+                        outf.write(sep)
+                        outf.write(block)
+                        sep = b"\n"
+                    release_pages(mm)
+                    if end_full == last - first:
+                        continue
+                    # Last block of the alignment, with less than 50 columns
+                    lines = []
+                    for num, row in enumerate(rows[:, end_full:]):
+                        line = (labels[num].tobytes() if first + end_full == 0
+                                else b" " * id_width)
+                        seq = row.tobytes()
+                        # Same groups of 10 characters as Biopython
+                        for pos in range(0, 50, 10):
+                            line += b" " + seq[pos:pos + 10]
+                            if first + end_full + pos + 10 > length:
+                                break
+                        lines.append(line + b"\n")
+                    outf.write(sep + b"".join(lines))
+        finally:
+            mm.close()
+
+
+def write_stockholm(alignfile, outfile, block_size=2**26):
+    """
+    Convert an alignment in fasta format to Stockholm format, without loading the whole
+    alignment in memory: each sequence is copied by blocks of 'block_size' characters. The
+    output is the same as the one of Biopython (AlignIO 'stockholm') for headers without
+    description.
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment, in fasta format
+    outfile : str
+        path to the file to create, in Stockholm format
+    block_size : int
+        maximum number of characters read at once
+
+    Raises
+    ------
+    ValueError
+        if sequences do not all have the same length, have the same name, or if the
+        alignment is empty
+    """
+    if not os.path.getsize(alignfile):
+        raise ValueError(f"{alignfile} is empty.")
+    with open(alignfile, "rb") as alnf:
+        mm = mmap.mmap(alnf.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            names, starts, widths, length = get_alignment_index(mm)
+            names = [name.replace(" ", "_") for name in names]
+            check_names(names, "Stockholm")
+            if not length:
+                raise ValueError("Sequences are empty: cannot write them in Stockholm "
+                                 "format.")
+            with open(outfile, "wb") as outf:
+                outf.write(f"# STOCKHOLM 1.0\n#=GF SQ {len(names)}\n".encode())
+                for name, start, wid in zip(names, starts, widths):
+                    outf.write(name.encode() + b" ")
+                    for first in range(0, length, block_size):
+                        last = min(length, first + block_size)
+                        outf.write(read_row(mm, start, wid, first, last))
+                        release_pages(mm)
+                    outf.write(f"\n#=GS {name} AC {name}\n#=GS {name} DE {name}\n".encode())
+                outf.write(b"//\n")
+        finally:
+            mm.close()
@@ -42,6 +42,10 @@ April 2017
 import logging
 import os
 import sys
+import numpy as np
+from scipy import sparse
+from scipy import io as spio
+
 from PanACoTA import utils
 
 logger = logging.getLogger("utils.pan")
@@ -220,3 +224,135 @@ def read_lstinfo(lstinfo, logger):
         logger.error(f"No genome found in {lstinfo} file.")
         sys.exit(1)
     return genomes
+
+
+def build_count_matrix(fams_by_strain, all_strains):
+    """
+    Build the count matrix of the pangenome: 1 row per family (sorted by family number),
+    1 column per genome (in the order of 'all_strains'). Each cell contains the number of
+    members of the family in the genome. As most cells are 0 for open pangenomes, the matrix
+    is stored in sparse CSR format.
+
+    Parameters
+    ----------
+    fams_by_strain : dict
+        {fam_num: {strain: [members]}}
+    all_strains : list
+        list of all genome names, in the order wanted for the columns
+
+    Returns
+    -------
+    (matrix, fam_nums) : tuple
+        with:
+
+        - matrix: scipy.sparse.csr_matrix of shape (nb_families, nb_genomes)
+        - fam_nums: list of family numbers, in the order of the matrix rows
+    """
+    strain_idx = {strain: num for num, strain in enumerate(all_strains)}
+    fam_nums = sorted(fams_by_strain, key=lambda x: int(x))
+    indptr = [0]
+    indices = []
+    data = []
+    for fam_num in fam_nums:
+        strains = fams_by_strain[fam_num]
+        # Keep columns sorted inside each row (canonical CSR format)
+        cols = sorted(strain_idx[strain] for strain in strains if strain in strain_idx)
+        for col in cols:
+            indices.append(col)
+            data.append(len(strains[all_strains[col]]))
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.int32),
+                                np.array(indices, dtype=np.int32),
+                                np.array(indptr, dtype=np.int64)),
+                               shape=(len(fam_nums), len(all_strains)))
+    return matrix, fam_nums
+
+
+def write_sparse_matrix(matrix, fam_nums, all_strains, outbase, fmt):
+    """
+    Save the count matrix of the pangenome in a sparse format.
+
+    - npz: scipy format, readable with scipy.sparse.load_npz. Family numbers and genome names
+      are saved in the same file (arrays 'families' and 'genomes').
+    - mtx: Matrix Market format, readable by most languages. Family numbers and genome names
+      are saved in 2 text files (1 name per line): '<outbase>.families.txt' and
+      '<outbase>.genomes.txt'
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        count matrix (lines = families, columns = genomes)
+    fam_nums : list
+        family numbers, in the order of matrix rows
+    all_strains : list
+        genome names, in the order of matrix columns
+    outbase : str
+        path to the output file, without extension
+    fmt : str
+        npz or mtx
+
+    Returns
+    -------
+    str
+        path to the file containing the matrix
+    """
+    if fmt == "npz":
+        outfile = outbase + ".npz"
+        # Same content as scipy.sparse.save_npz, with row and column names added
+        np.savez_compressed(outfile, data=matrix.data, indices=matrix.indices,
+                            indptr=matrix.indptr, shape=np.array(matrix.shape),
+                            format=np.array(matrix.format),
+                            families=np.array(fam_nums, dtype=str),
+                            genomes=np.array(all_strains, dtype=str))
+    elif fmt == "mtx":
+        outfile = outbase + ".mtx"
+        spio.mmwrite(outfile, matrix, field="integer",
+                     comment="lines = families, columns = genomes")
+        utils.write_list(fam_nums, outbase + ".families.txt")
+        utils.write_list(all_strains, outbase + ".genomes.txt")
+    else:
+        logger.error(f"Unknown sparse matrix format '{fmt}'. Choose between npz and mtx.")
+        sys.exit(1)
+    return outfile
+
+
+def load_sparse_matrix(matfile):
+    """
+    Load a count matrix saved by write_sparse_matrix (npz or Matrix Market format,
+    according to file extension)
+
+    Parameters
+    ----------
+    matfile : str
+        path to the .npz or .mtx file
+
+    Returns
+    -------
+    (matrix, fam_nums, all_strains) : tuple
+        with:
+
+        - matrix: scipy.sparse.csr_matrix (lines = families, columns = genomes)
+        - fam_nums: list of family numbers, in the order of matrix rows
+        - all_strains: list of genome names, in the order of matrix columns
+    """
+    if not os.path.isfile(matfile):
+        logger.error(f"{matfile} file not found.")
+        sys.exit(1)
+    if matfile.endswith(".npz"):
+        with np.load(matfile) as loaded:
+            matrix = sparse.csr_matrix((loaded["data"], loaded["indices"], loaded["indptr"]),
+                                       shape=tuple(loaded["shape"]))
+            fam_nums = [str(num) for num in loaded["families"]]
+            all_strains = [str(strain) for strain in loaded["genomes"]]
+    elif matfile.endswith(".mtx"):
+        outbase = matfile[:-len(".mtx")]
+        matrix = sparse.csr_matrix(spio.mmread(matfile))
+        with open(outbase + ".families.txt") as famf:
+            fam_nums = [line.strip() for line in famf]
+        with open(outbase + ".genomes.txt") as genf:
+            all_strains = [line.strip() for line in genf]
+    else:
+        logger.error(f"{matfile}: unknown sparse matrix format. Extension must be "
+                     ".npz or .mtx")
+        sys.exit(1)
+    return matrix, fam_nums, all_strains
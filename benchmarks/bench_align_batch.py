@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Benchmark of the alignment step on many small families, with and without batches of
+families (``align --align-batch``).
+
+The 8 families of the test dataset (test/data/align/exp_files/exp_aldir-pers) are copied
+'copies' times under new family numbers, to get a core genome with many small families.
+Each configuration is run on a fresh copy of those files, and the wall time and number of
+families aligned per second are written to stdout.
+
+mafft must be installed. Run from the root of the repository:
+
+    python benchmarks/bench_align_batch.py --copies 50 --threads 4 --batches 0 5000 20000
+
+@author: GEM, Institut Pasteur
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from PanACoTA import utils
+from PanACoTA.align_module import alignment as ali
+
+DATADIR = os.path.join("test", "data", "align", "exp_files", "exp_aldir-pers")
+FAMILIES = [1, 4, 6, 8, 10, 11, 13, 14]
+NGENOMES = 4
+DNAME = "BENCH"
+
+
+def make_dataset(aldir, copies):
+    """
+    Copy extracted proteins, genes and missing genomes of the test families 'copies' times
+    in aldir.
+
+    Parameters
+    ----------
+    aldir : str
+        directory where extraction files are copied
+    copies : int
+        number of copies of each family
+
+    Returns
+    -------
+    list
+        list of all family numbers
+    """
+    os.makedirs(aldir)
+    all_fams = []
+    for copy in range(copies):
+        for fam in FAMILIES:
+            num_fam = copy * 100 + fam
+            for ext in ["prt", "gen", "miss.lst"]:
+                shutil.copyfile(os.path.join(DATADIR, f"current.{fam}.{ext}"),
+                                os.path.join(aldir, f"{DNAME}-current.{num_fam}.{ext}"))
+            all_fams.append(num_fam)
+    return all_fams
+
+
+def run(copies, threads, batch_residues):
+    """
+    Align all families of a fresh dataset, and measure the wall time.
+
+    Parameters
+    ----------
+    copies : int
+        number of copies of each test family
+    threads : int
+        number of threads
+    batch_residues : int or None
+        size of batches of families (None: 1 task per family)
+
+    Returns
+    -------
+    tuple
+        (number of families, time in seconds)
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        aldir = os.path.join(tmpdir, "Align-" + DNAME)
+        all_fams = make_dataset(aldir, copies)
+        prefix = os.path.join(aldir, DNAME)
+        start = time.perf_counter()
+        status = ali.align_all_families(prefix, all_fams, NGENOMES, DNAME, True, threads,
+                                        batch_residues=batch_residues)
+        elapsed = time.perf_counter() - start
+    if not status:
+        print("Problem while aligning families", file=sys.stderr)
+        sys.exit(1)
+    return len(all_fams), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batches of families in align")
+    parser.add_argument("--copies", type=int, default=50,
+                        help="Number of copies of each of the 8 test families (default 50)")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="Number of threads (default 4)")
+    parser.add_argument("--batches", type=int, nargs="+", default=[0, 5000, 20000],
+                        help=("Batch sizes (in residues) to compare. 0 means 1 task per "
+                              "family (default: 0 5000 20000)"))
+    args = parser.parse_args()
+    if not utils.check_installed("mafft"):
+        print("mafft is not installed: cannot run this benchmark.", file=sys.stderr)
+        sys.exit(1)
+    print("batch_residues\tfamilies\ttime_s\tfamilies_per_s")
+    for batch in args.batches:
+        nbfam, elapsed = run(args.copies, args.threads, batch or None)
+        print(f"{batch}\t{nbfam}\t{elapsed:.2f}\t{nbfam / elapsed:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Benchmark of the aligners available in ``align --aligner``, on the families of the test
+dataset (test/data/align/exp_files/exp_aldir-pers).
+
+For each installed aligner, all families are aligned 'repeats' times, and the total wall
+time, as well as the length of each alignment, are written to stdout. Aligners which are
+not installed are skipped.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_aligners.py --repeats 3 --threads 1
+
+@author: GEM, Institut Pasteur
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+from PanACoTA import utils
+from PanACoTA.align_module import aligners
+from PanACoTA.align_module import alignment as ali
+
+DATADIR = os.path.join("test", "data", "align", "exp_files", "exp_aldir-pers")
+FAMILIES = [1, 4, 6, 8, 10, 11, 13, 14]
+
+
+def run(aligner, outdir, repeats, threads):
+    """
+    Align all test families with the given aligner
+
+    Parameters
+    ----------
+    aligner : str
+        name of aligner (key of aligners.ALIGNERS)
+    outdir : str
+        directory where alignments are written
+    repeats : int
+        number of times each family is aligned
+    threads : int
+        number of threads given to the aligner
+
+    Returns
+    -------
+    tuple
+        (total time in seconds, {num_fam: alignment length}), or None if an alignment failed
+    """
+    logger = logging.getLogger("bench.aligners")
+    lengths = {}
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for fam in FAMILIES:
+            prt_file = os.path.join(DATADIR, f"current.{fam}.prt")
+            nbfprt, _ = ali.get_aln_stats(prt_file)
+            aln_file = os.path.join(outdir, f"{aligner}.{fam}.aln")
+            if not ali.mafft_align(fam, prt_file, aln_file, nbfprt, logger, threads,
+                                   aligner=aligner):
+                return None
+            _, lens = ali.get_aln_stats(aln_file)
+            lengths[fam] = max(lens)
+    return time.perf_counter() - start, lengths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark aligners available in align")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Number of times each family is aligned (default 3)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Number of threads given to the aligner (default 1)")
+    args = parser.parse_args()
+    print("aligner\ttime_s\t" + "\t".join(f"len_fam{fam}" for fam in FAMILIES))
+    with tempfile.TemporaryDirectory() as outdir:
+        for aligner in aligners.ALIGNERS:
+            if not utils.check_installed(aligners.get_executable(aligner)):
+                print(f"{aligner}\tnot installed")
+                continue
+            res = run(aligner, outdir, args.repeats, args.threads)
+            if res is None:
+                print(f"{aligner}\tfailed", file=sys.stderr)
+                continue
+            elapsed, lengths = res
+            print(f"{aligner}\t{elapsed:.2f}\t" +
+                  "\t".join(str(lengths[fam]) for fam in FAMILIES))
+
+
+if __name__ == '__main__':
+    main()
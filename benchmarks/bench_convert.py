@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Benchmark of the conversion of the alignment of persistent families (fasta) to the formats
+read by FastME (PHYLIP-relaxed) and quicktree (Stockholm).
+
+A synthetic alignment of 'nseq' sequences of 'length' columns is generated (each sequence
+differs from a random reference at about 1% of sites, with some gaps). Each converter runs
+in its own process, and its wall time and peak memory (RSS) are written to stdout.
+Biopython converters (used before) are only run with --biopython, as they load the whole
+alignment in memory.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_convert.py --nseq 2000 --length 2000000 --biopython
+
+@author: GEM, Institut Pasteur
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from PanACoTA import utils_alignment
+
+CHARS = np.frombuffer(b"ACGT-", dtype=np.uint8)
+
+
+def make_alignment(alignfile, nseq, length, seed=1):
+    """
+    Write a synthetic alignment, 1 line per sequence
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment to create
+    nseq : int
+        number of sequences
+    length : int
+        number of columns
+    seed : int
+        seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    ref = CHARS[rng.integers(0, 4, length)]
+    with open(alignfile, "wb") as alnf:
+        for num in range(nseq):
+            seq = ref.copy()
+            changed = rng.random(length) < 0.01
+            seq[changed] = CHARS[rng.integers(0, 5, int(changed.sum()))]
+            alnf.write(f">GEN{num:05d}.0000.00001\n".encode() + seq.tobytes() + b"\n")
+
+
+def convert_biopython(alignfile, outfile, fmt):
+    """
+    Conversion with Biopython, as done before streaming converters
+    """
+    from Bio import AlignIO
+    with open(alignfile, 'r') as input_handle, open(outfile, 'w') as output_handle:
+        AlignIO.write(AlignIO.parse(input_handle, "fasta"), output_handle, fmt)
+
+
+def run_one(name, alignfile, outfile, queue):
+    """
+    Run 1 converter, and put (time in seconds, peak RSS in MB) in queue
+    """
+    start = time.perf_counter()
+    if name == "phylip":
+        utils_alignment.write_phylip(alignfile, outfile)
+    elif name == "stockholm":
+        utils_alignment.write_stockholm(alignfile, outfile)
+    elif name == "biopython-phylip":
+        convert_biopython(alignfile, outfile, "phylip-relaxed")
+    else:
+        convert_biopython(alignfile, outfile, "stockholm")
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kB on Linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fasta to PHYLIP/Stockholm")
+    parser.add_argument("--nseq", type=int, default=2000,
+                        help="Number of sequences (default 2000)")
+    parser.add_argument("--length", type=int, default=2000000,
+                        help="Number of columns (default 2000000)")
+    parser.add_argument("--biopython", action="store_true",
+                        help="Also run Biopython converters (needs the whole alignment in "
+                             "memory)")
+    parser.add_argument("--tmpdir", default=None,
+                        help="Directory where the alignment and converted files are written "
+                             "(needs about 3 times the alignment size)")
+    args = parser.parse_args()
+    names = ["phylip", "stockholm"]
+    if args.biopython:
+        names += ["biopython-phylip", "biopython-stockholm"]
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmpdir:
+        alignfile = os.path.join(tmpdir, "bench.grp.aln")
+        start = time.perf_counter()
+        make_alignment(alignfile, args.nseq, args.length)
+        size = os.path.getsize(alignfile) / 2**20
+        print(f"# alignment of {args.nseq} x {args.length} ({size:.0f} MB) generated in "
+              f"{time.perf_counter() - start:.1f} s", file=sys.stderr)
+        print("converter\ttime_s\tpeak_rss_mb\toutput_mb")
+        for name in names:
+            outfile = os.path.join(tmpdir, "bench." + name)
+            queue = ctx.Queue()
+            proc = ctx.Process(target=run_one, args=(name, alignfile, outfile, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                print(f"{name}\tfailed")
+                continue
+            elapsed, rss = queue.get()
+            out_size = os.path.getsize(outfile) / 2**20
+            print(f"{name}\t{elapsed:.2f}\t{rss:.0f}\t{out_size:.0f}")
+            os.remove(outfile)
+
+
+if __name__ == '__main__':
+    main()
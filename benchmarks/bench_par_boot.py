@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Benchmark of the bootstraps computed by ``tree --par-boot``: time to infer the trees of
+'boot' replicates with 1, 2, 4... processes, for each installed software among FastME,
+FastTree and quicktree.
+
+A synthetic alignment of 'nseq' sequences of 'length' columns is generated (each sequence
+differs from a random reference at about 5% of sites). For each software and number of
+processes, the wall time and the speedup compared to 1 process are written to stdout.
+Softwares which are not installed are skipped.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_par_boot.py --nseq 100 --length 100000 --boot 100 --threads 8
+
+@author: GEM, Institut Pasteur
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from PanACoTA import utils
+from PanACoTA.tree_module import bootstrap
+
+CHARS = np.frombuffer(b"ACGT", dtype=np.uint8)
+# executable, and default model set by 'tree' (FastME: TN93, FastTree: GTR)
+SOFTS = {"fastme": ("fastme", "T"), "fasttree": ("FastTreeMP", "-gtr"),
+         "quicktree": ("quicktree", None)}
+
+
+def make_alignment(alignfile, nseq, length, seed=1):
+    """
+    Write a synthetic alignment, 1 line per sequence
+
+    Parameters
+    ----------
+    alignfile : str
+        path to the alignment to create
+    nseq : int
+        number of sequences
+    length : int
+        number of columns
+    seed : int
+        seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    ref = CHARS[rng.integers(0, 4, length)]
+    with open(alignfile, "wb") as alnf:
+        for num in range(nseq):
+            seq = ref.copy()
+            changed = rng.random(length) < 0.05
+            seq[changed] = CHARS[rng.integers(0, 4, int(changed.sum()))]
+            alnf.write(f">GEN{num:05d}.0000.00001\n".encode() + seq.tobytes() + b"\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tree --par-boot")
+    parser.add_argument("--nseq", type=int, default=100,
+                        help="Number of sequences (default 100)")
+    parser.add_argument("--length", type=int, default=100000,
+                        help="Number of columns (default 100000)")
+    parser.add_argument("--boot", type=int, default=100,
+                        help="Number of bootstrap replicates (default 100)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(),
+                        help="Maximum number of processes (default: all cores)")
+    parser.add_argument("--distances", default=None, choices=["p-distance", "JC69", "K2P"],
+                        help="Distance model for FastME and quicktree (default: none)")
+    args = parser.parse_args()
+    nums = [1]
+    while nums[-1] * 2 <= args.threads:
+        nums.append(nums[-1] * 2)
+    print("soft\tprocesses\ttime_s\tspeedup")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        utils.init_logger(os.path.join(tmpdir, "bench"), 0, "bench_par_boot")
+        alignfile = os.path.join(tmpdir, "bench.grp.aln")
+        make_alignment(alignfile, args.nseq, args.length)
+        for soft, (exe, model) in SOFTS.items():
+            if not utils.check_installed(exe):
+                print(f"{soft}\tnot installed")
+                continue
+            distances = args.distances if soft != "fasttree" else None
+            if distances:
+                model = None
+            ref = None
+            for threads in nums:
+                start = time.perf_counter()
+                bootstrap.run_bootstraps(alignfile, tmpdir, soft, model, args.boot, threads,
+                                         distances=distances, seed=1)
+                elapsed = time.perf_counter() - start
+                ref = ref or elapsed
+                print(f"{soft}\t{threads}\t{elapsed:.2f}\t{ref / elapsed:.2f}")
+                sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
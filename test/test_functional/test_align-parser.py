@@ -23,7 +23,13 @@ def test_parser_noarg(capsys):
     assert "usage: " in err
     assert "-c COREPERS -l LIST_GENOMES -n DATASET_NAME -d DBPATH" in err
     assert "-o OUTDIR" in err
-    assert "[--threads THREADS] [-F] [-P] [-v] [-q] [-h]" in err
+    assert "[--threads THREADS] [-F] [-P]" in err
+    assert "[--aligner {mafft,mafft-fft,muscle,famsa,clustalo}]" in err
+    assert "[--extract-batch EXTRACT_BATCH]" in err
+    assert "[--getentry] [--align-batch RESIDUES] [--no-concat]" in err
+    assert "[--cache-dir CACHE_DIR]" in err
+    assert "[--add-genomes PREV_ALIGN_DIR]" in err
+    assert "[-v] [-q] [-h]" in err
     assert "[-h]" in err
     assert "the following arguments are required: -c, -l, -n, -d, -o" in err
 
@@ -90,7 +96,14 @@ def test_parser_default():
     assert options.verbose == 0
     assert options.quiet is False
     assert options.prot_ali is False
-    
+    assert options.extract_batch is None
+    assert options.getentry is False
+    assert options.aligner == "mafft"
+    assert options.align_batch is None
+    assert options.no_concat is False
+    assert options.cache_dir is None
+    assert options.add_genomes is None
+
 
 def test_parser_allthreads():
     """
@@ -133,3 +146,60 @@ def test_parser_all_ok():
     assert options.verbose == 0
     assert options.quiet is False
     assert options.prot_ali is True
+
+
+def test_parser_extract_batch_neg(capsys):
+    """
+    Test that when the number of families by extraction batch is not positive, it returns
+    the expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Align families", add_help=False)
+    align.build_parser(parser)
+    with pytest.raises(SystemExit):
+        align.parse(parser, "-c cp -l listgenome -n dname -d dbpath -o outdir "
+                            "--extract-batch 0".split())
+    _, err = capsys.readouterr()
+    assert "--extract-batch must be a positive number of families. Invalid value: 0" in err
+
+
+def test_parser_add_genomes_wrong(capsys):
+    """
+    Test that when the directory given to --add-genomes is not an 'Align-<dataset_name>'
+    directory, it returns the expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Align families", add_help=False)
+    align.build_parser(parser)
+    with pytest.raises(SystemExit):
+        align.parse(parser, "-c cp -l listgenome -n dname -d dbpath -o outdir "
+                            "--add-genomes test/data/align".split())
+    _, err = capsys.readouterr()
+    assert ("--add-genomes must be the 'Align-<dataset_name>' directory of a previous run. "
+            "Invalid value: test/data/align") in err
+
+
+def test_parser_align_batch_neg(capsys):
+    """
+    Test that when the number of residues by alignment batch is not positive, it returns
+    the expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Align families", add_help=False)
+    align.build_parser(parser)
+    with pytest.raises(SystemExit):
+        align.parse(parser, "-c cp -l listgenome -n dname -d dbpath -o outdir "
+                            "--align-batch -5".split())
+    _, err = capsys.readouterr()
+    assert "--align-batch must be a positive number of residues. Invalid value: -5" in err
+
+
+def test_parser_aligner_wrong(capsys):
+    """
+    Test that when the aligner given is not in the available ones, it returns the expected
+    error message.
+    """
+    parser = argparse.ArgumentParser(description="Align families", add_help=False)
+    align.build_parser(parser)
+    with pytest.raises(SystemExit):
+        align.parse(parser, "-c cp -l listgenome -n dname -d dbpath -o outdir "
+                            "--aligner tcoffee".split())
+    _, err = capsys.readouterr()
+    assert "argument --aligner: invalid choice: 'tcoffee'" in err
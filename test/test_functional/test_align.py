@@ -58,7 +58,7 @@ def test_main():
     force = False
     cmd = "cmd"
     prot_ali = False
-    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force)
+    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, getentry=True)
     # Check creation of the 3 subdirectories
     aldir = os.path.join(outdir, "Align-" + dname)
     listdir = os.path.join(outdir, "List-" + dname)
@@ -122,6 +122,160 @@ def test_main():
     assert "END" in " ".join(log_content)
 
 
+def test_main_cache():
+    """
+    Test that when giving a cache directory, alignments are saved in it, and reused by a
+    second run on another dataset name: mafft is not run again, and the final alignment is
+    the same.
+    """
+    corepers = os.path.join(TESTPATH, "test_pers0.99FX.lst")
+    list_genomes = os.path.join("test", "data", "pangenome", "test_files", "list_to_pan.txt")
+    dbpath = os.path.join("test", "data", "pangenome", "test_files", "example_db")
+    outdir = GENEPATH
+    cache_dir = os.path.join(GENEPATH, "aln-cache")
+    fams = [1, 4, 6, 8, 10, 11, 13, 14]
+    al.main("cmd", corepers, list_genomes, "TEST4", dbpath, outdir, False, 1, False,
+            cache_dir=cache_dir)
+    cached = [fname for _, _, files in os.walk(cache_dir) for fname in files]
+    assert len(cached) == len(fams)
+    assert all(fname.endswith(".aln") for fname in cached)
+    # Same families under another dataset name: all alignments come from the cache
+    al.main("cmd", corepers, list_genomes, "TEST4bis", dbpath, outdir, False, 1, False,
+            cache_dir=cache_dir)
+    aldir = os.path.join(outdir, "Align-TEST4bis")
+    base_log = os.path.join(outdir, "PanACoTA-align_TEST4bis.log")
+    with open(base_log + ".details", "r") as lc:
+        log_content = lc.read()
+    assert "Mafft command" not in log_content
+    for fam in fams:
+        assert f"fam {fam}: alignment found in cache" in log_content
+        assert not os.path.isfile(os.path.join(aldir, f"TEST4bis-mafft-align.{fam}.aln.log"))
+        assert tutil.compare_order_content(
+            os.path.join(aldir, f"TEST4bis-mafft-prt2nuc.{fam}.aln"),
+            os.path.join(outdir, "Align-TEST4", f"TEST4-mafft-prt2nuc.{fam}.aln"))
+    out_grp = os.path.join(outdir, "Phylo-TEST4bis", "TEST4bis.nucl.grp.aln")
+    exp_grp = os.path.join(EXPPATH, "exp_pers4genomes.grp.aln")
+    assert tutil.compare_order_content(out_grp, exp_grp)
+
+
+def test_main_restart():
+    """
+    Test that when running align again on the same output directory, families already
+    aligned are found in the journal of the first run, and are not checked nor aligned again
+    (even if the lists of missing genomes are generated again before alignment).
+    """
+    corepers = os.path.join(TESTPATH, "test_pers0.99FX.lst")
+    list_genomes = os.path.join("test", "data", "pangenome", "test_files", "list_to_pan.txt")
+    dbpath = os.path.join("test", "data", "pangenome", "test_files", "example_db")
+    outdir = GENEPATH
+    fams = [1, 4, 6, 8, 10, 11, 13, 14]
+    al.main("cmd", corepers, list_genomes, "TEST4", dbpath, outdir, False, 1, False)
+    aldir = os.path.join(outdir, "Align-TEST4")
+    journal = os.path.join(aldir, "TEST4-align.journal")
+    with open(journal, "r") as journalf:
+        assert len(journalf.readlines()) == len(fams)
+    mtimes = {fam: os.stat(os.path.join(aldir, f"TEST4-mafft-prt2nuc.{fam}.aln")).st_mtime_ns
+              for fam in fams}
+    # Remove grouped alignment, so that the second run goes until grouping
+    grp_file = os.path.join(outdir, "Phylo-TEST4", "TEST4.nucl.grp.aln")
+    os.remove(grp_file)
+    al.main("cmd", corepers, list_genomes, "TEST4", dbpath, outdir, False, 1, False)
+    # No family journaled again, and alignment files not rewritten
+    with open(journal, "r") as journalf:
+        assert len(journalf.readlines()) == len(fams)
+    for fam in fams:
+        assert (os.stat(os.path.join(aldir, f"TEST4-mafft-prt2nuc.{fam}.aln")).st_mtime_ns
+                == mtimes[fam])
+    exp_grp = os.path.join(EXPPATH, "exp_pers4genomes.grp.aln")
+    assert tutil.compare_order_content(grp_file, exp_grp)
+    log_content = ""
+    for logfile in os.listdir(outdir):
+        if logfile.endswith(".log.details"):
+            with open(os.path.join(outdir, logfile), "r") as lc:
+                log_content += lc.read()
+    assert (f"{len(fams)} families already aligned in a previous run (according to "
+            f"{journal}): they are not checked again.") in log_content
+
+
+def test_main_add_genomes():
+    """
+    Test that when giving the alignment directory of a previous run, families whose proteins
+    were all already aligned are not aligned again, and the final alignment is the same.
+    """
+    corepers = os.path.join(TESTPATH, "test_pers0.99FX.lst")
+    list_genomes = os.path.join("test", "data", "pangenome", "test_files", "list_to_pan.txt")
+    dbpath = os.path.join("test", "data", "pangenome", "test_files", "example_db")
+    outdir = GENEPATH
+    fams = [1, 4, 6, 8, 10, 11, 13, 14]
+    al.main("cmd", corepers, list_genomes, "TEST4", dbpath, outdir, False, 1, False)
+    prev_dir = os.path.join(outdir, "Align-TEST4")
+    al.main("cmd", corepers, list_genomes, "TEST4bis", dbpath, outdir, False, 1, False,
+            add_genomes=prev_dir)
+    base_log = os.path.join(outdir, "PanACoTA-align_TEST4bis.log")
+    with open(base_log + ".details", "r") as lc:
+        log_content = lc.read()
+    assert ("New proteins of each family will be added to its alignment in "
+            "test/data/align/generated_by_func_tests/Align-TEST4") in log_content
+    assert "Mafft command" not in log_content
+    for fam in fams:
+        assert tutil.compare_order_content(
+            os.path.join(outdir, "Align-TEST4bis", f"TEST4bis-mafft-prt2nuc.{fam}.aln"),
+            os.path.join(prev_dir, f"TEST4-mafft-prt2nuc.{fam}.aln"))
+    out_grp = os.path.join(outdir, "Phylo-TEST4bis", "TEST4bis.nucl.grp.aln")
+    exp_grp = os.path.join(EXPPATH, "exp_pers4genomes.grp.aln")
+    assert tutil.compare_order_content(out_grp, exp_grp)
+    assert ("8 families taken from alignments of the previous run, 0 of them completed with "
+            "mafft --add") in log_content
+
+
+def test_main_add_genomes_renumbered():
+    """
+    Test that when families were renumbered since the previous run, the previous alignment
+    of each family is found from its proteins, and families are not aligned again.
+    """
+    corepers = os.path.join(TESTPATH, "test_pers0.99FX.lst")
+    list_genomes = os.path.join("test", "data", "pangenome", "test_files", "list_to_pan.txt")
+    dbpath = os.path.join("test", "data", "pangenome", "test_files", "example_db")
+    outdir = GENEPATH
+    fams = [1, 4, 6, 8, 10, 11, 13, 14]
+    al.main("cmd", corepers, list_genomes, "TEST4", dbpath, outdir, False, 1, False)
+    # Previous run, where family N was family 100 + N
+    prev_dir = os.path.join(outdir, "Align-TEST4prev")
+    os.makedirs(prev_dir)
+    for fam in fams:
+        shutil.copyfile(os.path.join(outdir, "Align-TEST4", f"TEST4-mafft-align.{fam}.aln"),
+                        os.path.join(prev_dir, f"TEST4prev-mafft-align.{fam + 100}.aln"))
+    al.main("cmd", corepers, list_genomes, "TEST4bis", dbpath, outdir, False, 1, False,
+            add_genomes=prev_dir)
+    base_log = os.path.join(outdir, "PanACoTA-align_TEST4bis.log")
+    with open(base_log + ".details", "r") as lc:
+        log_content = lc.read()
+    assert "Mafft command" not in log_content
+    assert ("8 families taken from alignments of the previous run, 0 of them completed with "
+            "mafft --add") in log_content
+    for fam in fams:
+        assert tutil.compare_order_content(
+            os.path.join(outdir, "Align-TEST4bis", f"TEST4bis-mafft-prt2nuc.{fam}.aln"),
+            os.path.join(outdir, "Align-TEST4", f"TEST4-mafft-prt2nuc.{fam}.aln"))
+
+
+def test_main_add_genomes_samedir(caplog):
+    """
+    Test that when giving, as previous run, the alignment directory of the current run,
+    it exits with an error message
+    """
+    corepers = os.path.join(TESTPATH, "test_pers0.99FX.lst")
+    list_genomes = os.path.join("test", "data", "pangenome", "test_files", "list_to_pan.txt")
+    dbpath = os.path.join("test", "data", "pangenome", "test_files", "example_db")
+    outdir = GENEPATH
+    with pytest.raises(SystemExit):
+        al.main("cmd", corepers, list_genomes, "TEST4", dbpath, outdir, False, 1, False,
+                add_genomes=os.path.join(outdir, "Align-TEST4"))
+    assert ("test/data/align/generated_by_func_tests/Align-TEST4 is the alignment directory "
+            "of this run. To add new genomes to a previous run, give another output directory "
+            "or dataset name.") in caplog.text
+
+
 def test_main_exist_ok():
     """
     Test main all files exist and are ok, no force -> end without error, with warnings on re-use
@@ -187,7 +341,7 @@ def test_main_exist_ok():
     shutil.copyfile(refgrp, outgrp)
 
     # RUN align module
-    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force)
+    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, getentry=True)
 
     # Check logs
     logfile = os.path.join(outdir, "PanACoTA-align_TEST4exists.log.details")
@@ -292,7 +446,7 @@ def test_main_exist_emptygrp(capsys):
     open(outgrp, "w").close()
 
     # Run align module
-    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, verbose=2)
+    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, verbose=2, getentry=True)
 
     # Check nucl grp still empty
     assert os.stat(outgrp).st_size == 0
@@ -414,7 +568,7 @@ def test_main_exist_emptycat(capsys):
     with open(outgrp, "w") as outf:
         outf.write("It's me !!")
     # Run align module
-    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, verbose=16)
+    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, verbose=16, getentry=True)
     # Check concat and grp did not change
     with open(outcat, "r") as of:
         assert of.readlines() == ["Hello !!"]
@@ -523,7 +677,7 @@ def test_main_exist_emptyp2n(capsys):
         og.write("grouped grp aln")
 
     # Run align module
-    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force)
+    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, getentry=True)
 
     # Check btr file for fam 1 was changed
     ref_btr1 = os.path.join(ex_aldir, "mafft-prt2nuc.1.aln")
@@ -643,7 +797,7 @@ def test_main_emptymafft1(capsys):
         outf.write("Hello !!")
 
     # RUN
-    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force)
+    al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, getentry=True)
 
     # Check content of mafft and prt2nuc files for fam 1
     ref_mafft1 = os.path.join(ex_aldir, "mafft-align.1.aln")
@@ -772,7 +926,7 @@ def test_main_emptyprtgen(capsys):
 
     # Run alignment, but problem
     with pytest.raises(SystemExit):
-        al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force)
+        al.main(cmd, corepers, list_genomes, dname, dbpath, outdir, prot_ali, threads, force, getentry=True)
 
     # Check that align and prt2nuc files are removed for fam 1 and 4
     for fam in [1, 4]:
@@ -957,6 +1111,13 @@ def test_main_from_parse_force(capsys):
     args.force = force
     args.verbose = 2
     args.quiet = False
+    args.extract_batch = None
+    args.getentry = True
+    args.no_concat = False
+    args.cache_dir = None
+    args.add_genomes = None
+    args.align_batch = None
+    args.aligner = "mafft"
     args.argv = "cmd test_main_exist_empty-m1"
 
     # Create output directories and files
@@ -267,3 +267,18 @@ def test_parser_error_contig_annotate(capsys):
     out, err = capsys.readouterr()
     assert ("cutn not allowed in annotate section.") in out
 
+
+
+def test_get_tree_par_boot():
+    """
+    Test that par_boot given in tree section of config file is read as a boolean, and that
+    tree options have their default value when not given
+    """
+    tree_dict = allm.get_tree({"configfile": "test/data/all/init_files/tree-par-boot.ini"})
+    assert tree_dict["par_boot"] is True
+    assert tree_dict["boot"] == 100
+    assert tree_dict["soft"] == "fastme"
+    assert tree_dict["sites"] is None
+    tree_dict = allm.get_tree({})
+    assert tree_dict["par_boot"] is False
+    assert tree_dict["sites"] is None
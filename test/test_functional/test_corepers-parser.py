@@ -120,6 +120,10 @@ def test_parser_default():
     assert not options.floor
     assert options.verbose == 0
     assert not options.quiet
+    assert options.sweep is None
+    assert options.modes is None
+    assert options.subsets is None
+    assert options.threads == 1
 
 
 def test_parser_mixed_floor():
@@ -138,3 +142,54 @@ def test_parser_mixed_floor():
     assert options.floor is True
     assert options.verbose == 0
     assert not options.quiet
+
+
+def test_parser_sweep_mixed(capsys):
+    """
+    Test that when the user asks for a sweep with -X option, it returns an error message
+    """
+    parser = argparse.ArgumentParser(description="Do corepers", add_help=False)
+    corepers.build_parser(parser)
+    with pytest.raises(SystemExit):
+        corepers.parse(parser, "-p pangenome -o outdir --sweep 0.9 1 -X".split())
+    _, err = capsys.readouterr()
+    assert ("With --sweep, choose the type(s) of persistent genome to generate with "
+            "--modes (strict, mixed and/or multi) instead of -M/-X options.") in err
+
+
+def test_parser_modes_nosweep(capsys):
+    """
+    Test that when the user gives --modes without --sweep, it returns an error message
+    """
+    parser = argparse.ArgumentParser(description="Do corepers", add_help=False)
+    corepers.build_parser(parser)
+    with pytest.raises(SystemExit):
+        corepers.parse(parser, "-p pangenome -o outdir --modes mixed".split())
+    _, err = capsys.readouterr()
+    assert "--modes option can only be used with --sweep." in err
+
+
+def test_parser_sweep():
+    """
+    Test that sweep tol values and modes are parsed as expected
+    """
+    parser = argparse.ArgumentParser(description="Do corepers", add_help=False)
+    corepers.build_parser(parser)
+    options = corepers.parse(parser, "-p pangenome -o outdir --sweep 0.9 0.95 1 "
+                                     "--modes strict multi -F".split())
+    assert options.sweep == [0.9, 0.95, 1]
+    assert options.modes == ["strict", "multi"]
+    assert options.floor is True
+
+
+def test_parser_subsets_lstinfo(capsys):
+    """
+    Test that when the user gives both --subsets and -l options, it returns an error message
+    """
+    parser = argparse.ArgumentParser(description="Do corepers", add_help=False)
+    corepers.build_parser(parser)
+    with pytest.raises(SystemExit):
+        corepers.parse(parser, "-p pangenome -o outdir --subsets subdir -l list".split())
+    _, err = capsys.readouterr()
+    assert ("--subsets option cannot be used with -l (list of genomes is given "
+            "in each subset file) nor with --sweep.") in err
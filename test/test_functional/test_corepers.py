@@ -293,6 +293,10 @@ def test_main_from_parse(capsys):
     args.outputdir = GENEPATH
     args.verbose = 0
     args.quiet = False
+    args.sweep = None
+    args.modes = None
+    args.subsets = None
+    args.threads = 1
     args.argv = "PanACoTA corepers test_main_from_parse"
 
     corepers.main_from_parse(args)
@@ -315,3 +319,75 @@ def test_main_from_parse(capsys):
     assert "Generating Persistent genome of a dataset containing 4 genomes" in out
     assert ("The core genome contains 2 families, each one having exactly 4 "
             "members, from the 4 different genomes.") in out
+
+
+def test_main_sweep(capsys):
+    """
+    Test that with a sweep over 2 tol values and 3 modes, it creates all expected persistent
+    genomes (mixed with tol=1 being skipped), with the same content as when running them one
+    by one, and a summary file.
+    """
+    cmd = "cmd"
+    floor = True
+    lstinfo = ""
+    outfiles = corepers.main(cmd, UPAN, 1, False, False, GENEPATH, lstinfo, floor, 0, False,
+                             sweep=[1, 0.99], modes=["strict", "mixed", "multi"])
+    exp_names = ["PersGenome_pangenome.lst-all_F1.lst",
+                 "PersGenome_pangenome.lst-all_F1-multi.lst",
+                 "PersGenome_pangenome.lst-all_F0.99.lst",
+                 "PersGenome_pangenome.lst-all_F0.99-mixed.lst",
+                 "PersGenome_pangenome.lst-all_F0.99-multi.lst"]
+    assert outfiles == [os.path.join(GENEPATH, name) for name in exp_names]
+    exp_pers = os.path.join(EXP_PATH, "exp_coregenome.txt")
+    assert tutil.compare_order_content(outfiles[0], exp_pers)
+    exp_mixed = os.path.join(EXP_PATH, "exp_pers-floor-mixed.txt")
+    assert tutil.compare_order_content(outfiles[3], exp_mixed)
+    summary = os.path.join(GENEPATH, "PersGenome_pangenome.lst-all_sweep-summary.txt")
+    with open(summary) as sumf:
+        lines = [line.split() for line in sumf]
+    assert lines[0] == ["tol", "mode", "min_genomes", "nb_families", "file"]
+    assert [line[:4] for line in lines[1:]] == [["1", "strict", "4", "2"],
+                                                ["1", "multi", "4", "4"],
+                                                ["0.99", "strict", "3", "5"],
+                                                ["0.99", "mixed", "3", "7"],
+                                                ["0.99", "multi", "3", "8"]]
+    out, err = capsys.readouterr()
+    assert "Generating Persistent genome of a dataset containing 4 genomes" in out
+    assert ("Mixed persistent genome is not compatible with tol=1 (100% of the genomes "
+            "having exactly 1 member): skipped.") in err
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_main_subsets(threads, capsys):
+    """
+    Test that with a manifest of 2 subsets, it creates the persistent genome of each subset,
+    identical to the ones obtained with -l option.
+    """
+    lst1 = os.path.join(GENEPATH, "lstinfo-ok.lst")
+    with open(lst1, "w") as lst:
+        lst.write("GEN4.1111.00001 toto we don't use other fields\n")
+        lst.write("GENO.1216.00003\n")
+    subdir = os.path.join(GENEPATH, "subdir")
+    os.makedirs(subdir)
+    lst2 = os.path.join(subdir, "all.lst")
+    with open(lst2, "w") as lst:
+        lst.write("GEN4.1111.00001\nGENO.0817.00001\nGENO.1216.00002\nGENO.1216.00003\n")
+    manifest = os.path.join(GENEPATH, "subsets.txt")
+    with open(manifest, "w") as manf:
+        manf.write("# my clades\nlstinfo-ok.lst\n\nsubdir/all.lst\n")
+    outdir = os.path.join(GENEPATH, "outdir")
+    outfiles = corepers.main("cmd", UPAN, 0.99, True, False, outdir, "", True, 0, False,
+                             subsets=manifest, threads=threads)
+    assert outfiles == [os.path.join(outdir,
+                                     "PersGenome_pangenome.lst-lstinfo-ok.lst_F0.99-multi.lst"),
+                        os.path.join(outdir, "PersGenome_pangenome.lst-all.lst_F0.99-multi.lst")]
+    exp_pers = os.path.join(EXP_PATH, "exp_pers-floor-multi_subset.txt")
+    assert tutil.compare_order_content(outfiles[0], exp_pers)
+    exp_pers = os.path.join(EXP_PATH, "exp_pers-floor-multi.txt")
+    assert tutil.compare_order_content(outfiles[1], exp_pers)
+    out, err = capsys.readouterr()
+    assert "Generating persistent genomes of 2 subsets of genomes" in out
+    if threads == 1:
+        assert "Generating Persistent genome of a dataset containing 2 genomes" in out
+        assert ("The persistent genome contains 9 families with members present in "
+                "at least 1 different genomes (99.0% of the total number of genomes).") in out
@@ -57,6 +57,7 @@ def test_main_from_parse():
     args.clust_mode = 1
     args.spedir = None
     args.threads = 1
+    args.sparse = None
     args.outfile = None
     args.verbose = 0
     args.quiet = False
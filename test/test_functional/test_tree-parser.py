@@ -25,8 +25,12 @@ def test_parser_noarg(capsys):
     assert "[-s {fasttree,fastme,quicktree,iqtree,iqtree2}] [-b BOOT]" in err
     assert "[--threads THREADS] [-m MODEL]" in err
     assert "[-B] [--mem MEMORY" in err
+    assert "[--sites {nogap,variable,informative}]" in err
+    assert "[--distances {p-distance,JC69,K2P}]" in err
+    assert "[--par-boot]" in err
     assert "[-v]" in err
-    assert "[-q] [-h]" in err
+    assert "[-q]" in err
+    assert "[-h]" in err
     assert "the following arguments are required: -a, -o" in err
 
 
@@ -99,6 +103,105 @@ def test_parser_quicktree_parallel(capsys):
             "the --threads option.") in err
 
 
+def test_parser_distances_soft(capsys):
+    """
+    Test that when asking for a distance matrix with a soft which does not take a distance
+    matrix, it returns the expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    with pytest.raises(SystemExit):
+        tree.parse(parser, "-a align -o outdir -s fasttree --distances K2P".split())
+    _, err = capsys.readouterr()
+    assert "'--distances' option is only available with FastME and quicktree." in err
+
+
+def test_parser_distances_boot(capsys):
+    """
+    Test that when asking for a distance matrix and bootstraps, it returns the expected
+    error message.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    with pytest.raises(SystemExit):
+        tree.parse(parser, "-a align -o outdir -s fastme --distances K2P -b 10".split())
+    _, err = capsys.readouterr()
+    assert ("'--distances' option is not compatible with '-B' and '--boot' options "
+            "(bootstraps), except with '--par-boot'.") in err
+
+
+def test_parser_distances_model(capsys):
+    """
+    Test that when asking for a distance matrix and a model with fastme, it returns the
+    expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    with pytest.raises(SystemExit):
+        tree.parse(parser, "-a align -o outdir -s fastme --distances JC69 -m T".split())
+    _, err = capsys.readouterr()
+    assert ("With '--distances', the distance model is given by this option. You cannot "
+            "choose a DNA substitution model with '-m'.") in err
+
+
+def test_parser_distances_quicktree():
+    """
+    Test that with quicktree and a distance matrix, several threads can be used (to compute
+    the matrix), and no model is set.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    args = tree.parse(parser, "-a align -o outdir -s quicktree --distances p-distance "
+                              "--threads 1".split())
+    assert args.distances == "p-distance"
+    assert args.model is None
+    args = tree.parse(parser, "-a align -o outdir -s fastme --distances K2P".split())
+    assert args.distances == "K2P"
+    assert args.model is None
+
+
+def test_parser_par_boot_soft(capsys):
+    """
+    Test that when asking for parallel bootstraps with a soft which is not supported, it
+    returns the expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    with pytest.raises(SystemExit):
+        tree.parse(parser, "-a align -o outdir -s iqtree -b 1000 --par-boot".split())
+    _, err = capsys.readouterr()
+    assert "'--par-boot' option is only available with FastME, FastTree and quicktree." in err
+
+
+def test_parser_par_boot_noboot(capsys):
+    """
+    Test that when asking for parallel bootstraps without giving the number of bootstraps,
+    it returns the expected error message.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    with pytest.raises(SystemExit):
+        tree.parse(parser, "-a align -o outdir -s fasttree --par-boot".split())
+    _, err = capsys.readouterr()
+    assert "'--par-boot' option needs a number of bootstraps ('-b' option)." in err
+
+
+def test_parser_par_boot_quicktree():
+    """
+    Test that with quicktree and parallel bootstraps, -B and distances can be used.
+    """
+    parser = argparse.ArgumentParser(description="Tree", add_help=False)
+    tree.build_parser(parser)
+    args = tree.parse(parser, "-a align -o outdir -s quicktree -b 10 -B --par-boot "
+                              "--distances JC69".split())
+    assert args.par_boot
+    assert args.write_boot
+    assert args.boot == 10
+    assert args.distances == "JC69"
+    args = tree.parse(parser, "-a align -o outdir -s fasttree -b 10".split())
+    assert not args.par_boot
+
+
 def test_parser_quicktree_model(capsys):
     """
     Test that when soft is quicktree, and we ask for a specific model, it returns the expected
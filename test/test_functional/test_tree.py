@@ -8,6 +8,7 @@ import os
 import subprocess
 import shutil
 import pytest
+import logging
 
 from PanACoTA.subcommands import tree
 from test.test_unit.test_tree import utilities as tutils
@@ -379,6 +380,9 @@ def test_main_from_parse(capsys):
     args.quiet = False
     args.memory = False
     args.fast = False
+    args.sites = None
+    args.distances = None
+    args.par_boot = False
     args.argv = "PanACoTA tree test_main_from_parse"
     tree.main_from_parse(args)
     # Check output files
@@ -409,3 +413,104 @@ def test_main_from_parse(capsys):
             "-nt 1 -m HKY    -st DNA -pre test/data/tree/generated_by_func_tests/"
             "exp_pers4genomes.grp.aln.iqtree_tree -quiet") in out
     assert "END" in out
+
+
+def test_filter_sites_iqtree(caplog):
+    """
+    Test that when filtering variable sites before running IQtree, the filtered alignment
+    and its info file are created in outdir, and the number of constant sites of each
+    nucleotide is returned, to be given to IQtree
+    """
+    caplog.set_level(logging.DEBUG)
+    filtered, fconst = tree.filter_sites(ALIGNMENT, GENEPATH, "variable", "iqtree2")
+    assert filtered == os.path.join(GENEPATH, "exp_pers4genomes.grp.variable.aln")
+    assert os.path.isfile(filtered)
+    infofile = os.path.join(GENEPATH, "exp_pers4genomes.grp.variable.info")
+    with open(infofile) as inff:
+        info = dict(line.strip().split("\t") for line in inff)
+    assert fconst == ",".join(info[f"constant_{base}"] for base in "ACGT")
+    assert info["columns"] == "6438"
+    assert "Filtering columns of test/data/align/exp_files/exp_pers4genomes.grp.aln" in caplog.text
+    assert f"{info['kept_columns']} columns kept out of 6438" in caplog.text
+
+
+def test_filter_sites_fasttree(caplog):
+    """
+    Test that when filtering informative sites for another soft than IQtree, no constant
+    sites are returned, and a warning is given on branch lengths
+    """
+    caplog.set_level(logging.DEBUG)
+    filtered, fconst = tree.filter_sites(ALIGNMENT, GENEPATH, "informative", "fasttree")
+    assert filtered == os.path.join(GENEPATH, "exp_pers4genomes.grp.informative.aln")
+    assert fconst is None
+    assert "Branch lengths are computed on the kept columns only" in caplog.text
+
+
+def test_filter_sites_error(caplog):
+    """
+    Test that when the alignment does not exist, it exits with an error message
+    """
+    with pytest.raises(SystemExit):
+        tree.filter_sites("wrong_align.aln", GENEPATH, "nogap", "fastme")
+    assert "Cannot filter columns of wrong_align.aln" in caplog.text
+
+
+def test_compute_distances(caplog):
+    """
+    Test that the distance matrix is written in outdir, and that the number of site
+    patterns is logged
+    """
+    caplog.set_level(logging.DEBUG)
+    matrix = tree.compute_distances(ALIGNMENT, GENEPATH, "K2P", 2)
+    assert matrix == os.path.join(GENEPATH, "exp_pers4genomes.grp.K2P.dist")
+    with open(matrix) as matf:
+        lines = matf.readlines()
+    assert lines[0] == "4\n"
+    assert len(lines) == 5
+    assert "Computing K2P distances between sequences of" in caplog.text
+    assert "6438 columns compressed into 81 site patterns" in caplog.text
+    assert "too divergent" not in caplog.text
+
+
+def test_compute_distances_error(caplog):
+    """
+    Test that when the alignment does not exist, it exits with an error message
+    """
+    with pytest.raises(SystemExit):
+        tree.compute_distances("wrong_align.aln", GENEPATH, "JC69", 1)
+    assert "Cannot compute distances from wrong_align.aln" in caplog.text
+
+
+def test_main_distances_quicktree(capsys):
+    """
+    Test that quicktree infers the tree from the distance matrix computed from the alignment
+    """
+    outdir = GENEPATH
+    tree.main("cmd", ALIGNMENT, outdir, "quicktree", None, 1, sites="variable",
+              verbose=2, distances="p-distance")
+    matrix = os.path.join(GENEPATH, "exp_pers4genomes.grp.variable.p-distance.dist")
+    assert os.path.isfile(matrix)
+    out, _ = capsys.readouterr()
+    assert f"quicktree -in m -out t  {matrix}" in out
+    tree_file = matrix + ".quicktree_tree.nwk"
+    assert tutils.is_tree_lengths(tree_file)
+
+
+def test_main_par_boot_quicktree(capsys):
+    """
+    Test that with parallel bootstraps, quicktree infers the main tree and the trees of
+    replicates, and that supports are added to the main tree
+    """
+    outdir = GENEPATH
+    tree.main("cmd", ALIGNMENT, outdir, "quicktree", None, 1, boot=5, write_boot=True,
+              verbose=2, distances="JC69", par_boot=True)
+    out, _ = capsys.readouterr()
+    assert "Inferring trees of 5 bootstrap replicates with quicktree" in out
+    matrix = os.path.join(GENEPATH, "exp_pers4genomes.grp.JC69.dist")
+    tree_file = matrix + ".quicktree_tree.nwk"
+    assert tutils.is_tree_bootstrap(tree_file)
+    boot_file = matrix + ".quicktree_tree.bootstraps.nwk"
+    with open(boot_file) as bootf:
+        assert len(bootf.readlines()) == 5
+    # Replicates are removed
+    assert not os.path.exists(os.path.join(GENEPATH, "exp_pers4genomes.grp-quicktree-replicates"))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Unit tests for the aligners submodule in align module
+"""
+import PanACoTA.align_module.aligners as aligners
+
+
+def test_mafft():
+    """
+    Test command of default aligner: mafft --auto, writing alignment to stdout, with
+    threads only if more than 1
+    """
+    assert aligners.get_command("mafft", "fam.prt", "fam.aln") == ("mafft --auto fam.prt", True)
+    assert aligners.get_command("mafft", "fam.prt", "fam.aln", 4) == (
+        "mafft --auto --thread 4 fam.prt", True)
+    assert aligners.get_executable("mafft") == "mafft"
+    assert aligners.get_name("mafft") == "Mafft"
+    assert aligners.get_identity("mafft") == "mafft --auto"
+
+
+def test_mafft_fft():
+    """
+    Test command of mafft FFT-NS-1
+    """
+    assert aligners.get_command("mafft-fft", "fam.prt", "fam.aln") == (
+        "mafft --retree 1 --maxiterate 0 fam.prt", True)
+    assert aligners.get_command("mafft-fft", "fam.prt", "fam.aln", 2) == (
+        "mafft --retree 1 --maxiterate 0 --thread 2 fam.prt", True)
+    assert aligners.get_executable("mafft-fft") == "mafft"
+
+
+def test_other_aligners():
+    """
+    Test commands of aligners writing the alignment to the output file
+    """
+    assert aligners.get_command("muscle", "fam.prt", "fam.aln", 3) == (
+        "muscle -super5 fam.prt -output fam.aln -threads 3", False)
+    assert aligners.get_command("famsa", "fam.prt", "fam.aln") == (
+        "famsa -t 1 fam.prt fam.aln", False)
+    assert aligners.get_command("clustalo", "fam.prt", "fam.aln", 2) == (
+        "clustalo -i fam.prt -o fam.aln --outfmt=fasta --threads=2 --force", False)
+    assert [aligners.get_executable(ali) for ali in ["muscle", "famsa", "clustalo"]] == [
+        "muscle", "famsa", "clustalo"]
+
+
+def test_identities_differ():
+    """
+    Test that all aligners have a different identity, so that their alignments are not
+    mixed in the alignment cache
+    """
+    identities = [aligners.get_identity(ali) for ali in aligners.ALIGNERS]
+    assert len(set(identities)) == len(aligners.ALIGNERS)
@@ -9,8 +9,12 @@ import os
 import subprocess
 import pytest
 import shutil
+from unittest.mock import ANY
 
 import multiprocessing
+from multiprocessing.pool import ThreadPool
+import threading
+import time
 
 import PanACoTA.align_module.alignment as al
 import test.test_unit.utilities_for_tests as tutil
@@ -201,6 +205,220 @@ def test_backtranslate_problem(caplog):
     assert not os.path.isfile(btr_file)
 
 
+def test_backtranslate_shortgene(caplog):
+    """
+    Test that when a gene is missing for a protein of the alignment, back-translated sequences
+    do not all have the same length: returns False with an error message, and keeps btr file
+    """
+    caplog.set_level(logging.DEBUG)
+    mafft_file = os.path.join(GENEPATH, "test_short-mafft.aln")
+    gen_file = os.path.join(GENEPATH, "test_short.gen")
+    btr_file = os.path.join(GENEPATH, "test_btr_output.aln")
+    with open(mafft_file, "w") as mafftf:
+        mafftf.write(">GEN1_00001 info\nM-K\nL\n>GEN2_00001\nMRKL\n")
+    with open(gen_file, "w") as genf:
+        genf.write(">GEN1_00001 info\nATGAAA\nCTGTAA\n")
+    logger = logging.getLogger("test_backtranslate")
+    assert not al.back_translate(2, mafft_file, gen_file, btr_file, 2, logger)
+    assert ("Nucleic alignments for family 2 (in test/data/align/generated_by_unit-tests/"
+            "test_btr_output.aln) do not all have the same length") in caplog.text
+    with open(btr_file, "r") as btrf:
+        assert btrf.readlines() == [">GEN1_00001\n", "ATG---AAACTG\n", ">GEN2_00001\n"]
+
+
+def test_read_fasta_records():
+    """
+    Check that sequences are read one by one, with the first word of the header as name, and
+    sequence lines joined
+    """
+    fasta = os.path.join(GENEPATH, "test_records.fa")
+    with open(fasta, "w") as fastf:
+        fastf.write(">seq1 some info\nAAC\nGT\n>seq2\n>seq3\nCC\n")
+    assert list(al.read_fasta_records(fasta)) == [(b"seq1", b"AACGT"), (b"seq2", b""),
+                                                  (b"seq3", b"CC")]
+
+
+def test_get_aln_stats():
+    """
+    Check that number of sequences and set of sequence lengths are returned, for an alignment
+    and for an empty file
+    """
+    aln_file = os.path.join(GENEPATH, "test_stats.aln")
+    with open(aln_file, "w") as alnf:
+        alnf.write(">seq1 info\nAAC\nGT\n>seq2\nAC-GT\n>seq3\nAC\n")
+    assert al.get_aln_stats(aln_file) == (3, {5, 2})
+    empty = os.path.join(GENEPATH, "test_empty.aln")
+    open(empty, "w").close()
+    assert al.get_aln_stats(empty) == (0, {0})
+
+
+def test_check_nb_genomes(caplog):
+    """
+    Check the number of genomes of an alignment: ok, missing genomes before padding (returns
+    alignment length), missing genomes after padding (error)
+    """
+    caplog.set_level(logging.DEBUG)
+    logger = logging.getLogger("test_check_nb_genomes")
+    assert al.check_nb_genomes(0, 4, 3, 4, logger, prev=False) is True
+    assert al.check_nb_genomes(0, 3, 3, 4, logger, prev=True) == 0
+    assert al.check_nb_genomes(12, 3, 3, 4, logger, prev=False) is False
+    assert ("ERROR: family 3 contains 3 genomes in total instead of the 4 genomes in "
+            "input.") in caplog.text
+
+
+def test_get_family_cost():
+    """
+    Check that cost of a family is the size of its protein file, and 0 if the protein file
+    does not exist
+    """
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    assert al.get_family_cost(prt_file) == os.path.getsize(prt_file)
+    assert al.get_family_cost(os.path.join(GENEPATH, "current.1.prt")) == 0
+
+
+def test_get_mafft_threads():
+    """
+    Check that batches get 1 thread while there are more batches left than idle cores, and
+    that idle cores are then shared according to the remaining cost
+    """
+    assert al.get_mafft_threads(10, 100, 1, 1) == 1
+    # More batches left than idle cores
+    assert al.get_mafft_threads(90, 100, 8, 8) == 1
+    assert al.get_mafft_threads(90, 100, 8, 20) == 1
+    # Tail of the run
+    assert al.get_mafft_threads(50, 100, 8, 3) == 4
+    assert al.get_mafft_threads(100, 100, 8, 1) == 8
+    assert al.get_mafft_threads(10, 100, 8, 2) == 1
+    # At least 1 core is left to each other batch
+    assert al.get_mafft_threads(99, 100, 8, 4) == 5
+    assert al.get_mafft_threads(0, 0, 8, 1) == 1
+
+
+def test_run_batches():
+    """
+    Check that all batches are run, with 1 thread while the queue is longer than the number
+    of idle cores, and that the last ones get the cores left idle, without ever using more
+    than 'threads' cores
+    """
+    costs = {1: 100, 2: 90, 3: 80, 4: 70, 5: 60, 6: 50, 7: 40, 8: 30}
+    batches = [[1], [2], [3], [4], [5], [6], [7, 8]]
+    used = []
+    lock = threading.Lock()
+
+    def run(args):
+        batch, nb_threads = args
+        with lock:
+            used.append(nb_threads)
+            assert sum(used) <= 4
+        time.sleep(0.05)
+        with lock:
+            used.remove(nb_threads)
+        return batch
+
+    pool = ThreadPool(4)
+    res = list(al.run_batches(pool, run, batches, costs, 4, lambda batch, nb: (batch, nb)))
+    pool.close()
+    pool.join()
+    assert sorted(batch for _, batch in res) == batches
+    started = {batch[0]: nb for nb, batch in res}
+    # 4 first batches start together, on 1 core each
+    assert [started[num] for num in [1, 2, 3, 4]] == [1, 1, 1, 1]
+    # 1 core used by each started batch, never more than 4 cores
+    assert all(1 <= nb <= 4 for nb in started.values())
+
+
+def test_run_batches_tail():
+    """
+    Check that when there are less batches than cores, cores are shared between batches
+    according to their cost
+    """
+    costs = {1: 300, 2: 100}
+    pool = ThreadPool(4)
+    res = list(al.run_batches(pool, lambda args: args, [[1], [2]], costs, 4,
+                              lambda batch, nb: (batch, nb)))
+    pool.close()
+    pool.join()
+    assert sorted(res) == [(1, ([2], 1)), (3, ([1], 3))]
+
+
+def test_run_batches_error():
+    """
+    Check that an error in a batch is raised in the main process
+    """
+
+    def fail(args):
+        raise ValueError("bad batch")
+
+    pool = ThreadPool(2)
+    with pytest.raises(ValueError, match="bad batch"):
+        list(al.run_batches(pool, fail, [[1], [2]], {1: 1, 2: 1}, 2,
+                            lambda batch, nb: (batch, nb)))
+    pool.terminate()
+
+
+def test_write_timings(caplog):
+    """
+    Check that time of each family is written, from the slowest to the fastest
+    """
+    caplog.set_level(logging.DEBUG)
+    outfile = os.path.join(GENEPATH, "align-times.tsv")
+    timings = [(1, True, 0.5), (8, "OK", 2.25), (11, False, 0.0004)]
+    costs = {1: 100, 8: 400, 11: 3}
+    mafft_threads = {1: 1, 8: 2, 11: 1}
+    al.write_timings(outfile, timings, costs, mafft_threads)
+    with open(outfile, "r") as outf:
+        assert outf.readlines() == ["family\tcost\tmafft_threads\ttime_s\tstatus\n",
+                                    "8\t400\t2\t2.250\tOK\n",
+                                    "1\t100\t1\t0.500\tTrue\n",
+                                    "11\t3\t1\t0.000\tFalse\n"]
+    assert "Slowest family: 8 (2.25 s)" in caplog.text
+
+
+def test_journal(caplog):
+    """
+    Check that families are journaled only if their alignment went well and all their files
+    exist, and that a journaled family is considered as done only while its files do not change
+    """
+    aldir = os.path.join(GENEPATH, "aldir_journal")
+    os.makedirs(aldir)
+    prefix = os.path.join(aldir, "TESTjournal")
+    for num_fam in [1, 2, 3]:
+        for famfile in al.get_family_files(prefix, num_fam):
+            with open(famfile, "w") as famf:
+                famf.write(f">fam{num_fam}\nAAA\n")
+    # Family 4 has no file
+    assert al.get_fingerprint(prefix, 4) is None
+    assert al.get_fingerprint(prefix, 1).count(",") == 4
+    journal = prefix + "-align.journal"
+    with open(journal, "a") as journalf:
+        al.write_journal(journalf, prefix, 1, True)
+        al.write_journal(journalf, prefix, 2, "OK")
+        al.write_journal(journalf, prefix, 3, False)
+        al.write_journal(journalf, prefix, 4, True)
+        # Incomplete line
+        journalf.write("3\tdo")
+    assert al.get_done_families(journal, prefix, [1, 2, 3, 4]) == {1, 2}
+    # Family 2 btr file is modified: not done anymore
+    with open(al.get_family_files(prefix, 2)[4], "a") as btrf:
+        btrf.write(">other\nAAA\n")
+    assert al.get_done_families(journal, prefix, [1, 2, 3, 4]) == {1}
+    assert al.get_done_families(journal + "-none", prefix, [1, 2, 3, 4]) == set()
+
+
+def test_make_batches():
+    """
+    Test that families are grouped, in the given order, into batches of at least the given
+    cost, and that each family is alone in its batch if no batch size is given
+    """
+    costs = {1: 1000, 2: 400, 3: 300, 4: 200, 5: 100, 6: 50}
+    sorted_fams = [1, 2, 3, 4, 5, 6]
+    assert al.make_batches(sorted_fams, costs, None) == [[1], [2], [3], [4], [5], [6]]
+    assert al.make_batches(sorted_fams, costs, 500) == [[1], [2, 3], [4, 5, 6]]
+    assert al.make_batches(sorted_fams, costs, 350) == [[1], [2], [3, 4], [5, 6]]
+    assert al.make_batches(sorted_fams, costs, 10**6) == [sorted_fams]
+    assert al.make_batches([], costs, 500) == []
+
+
 def test_mafft_align(caplog):
     """
     Test that when giving a file containing extracted proteins, it aligns them as expected
@@ -236,6 +454,21 @@ def test_mafft_align_error(caplog):
     assert not os.path.isfile(mafft_file)
 
 
+def test_mafft_align_other_aligner_error(caplog):
+    """
+    Test that when the aligner chosen fails (here, no input file, or aligner not installed),
+    it returns False, and the alignment file is not created
+    """
+    caplog.set_level(logging.DEBUG)
+    prt_file = os.path.join(GENEPATH, "prtfile")
+    mafft_file = os.path.join(GENEPATH, "test_mafft_align.aln")
+    logger = logging.getLogger("test_check_mafft_align")
+    assert not al.mafft_align(1, prt_file, mafft_file, 4, logger, aligner="clustalo")
+    assert ("Clustal Omega command: clustalo -i test/data/align/generated_by_unit-tests/prtfile "
+            "-o test/data/align/generated_by_unit-tests/test_mafft_align.aln") in caplog.text
+    assert not os.path.isfile(mafft_file)
+
+
 def test_mafft_align_wrongnbfam(caplog):
     """
     Test that when giving a file containing extracted protein to align, it aligns them,
@@ -258,6 +491,200 @@ def test_mafft_align_wrongnbfam(caplog):
     assert tutil.compare_file_content(mafft_file, exp_mafft)
 
 
+def write_prev_alignment(prev_file, skip=(), change=None, padding=True):
+    """
+    Write a previous alignment of family 1, from its expected mafft alignment, without the
+    proteins whose index is in skip. If change is given, the sequence of this protein is
+    modified. If padding, add a missing genome with only gaps, as done by align.
+    """
+    exp_mafft = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+    records = list(al.read_fasta_records(exp_mafft))
+    with open(prev_file, "wb") as prevf:
+        for num, (name, row) in enumerate(records):
+            if num in skip:
+                continue
+            if num == change:
+                row = row.replace(b"M", b"W", 1)
+            prevf.write(b">" + name + b"\n" + row + b"\n")
+        if padding:
+            prevf.write(b">GENO.0101.00001\n" + b"-" * len(records[0][1]) + b"\n")
+
+
+def test_add_to_alignment_noprev(caplog):
+    """
+    Test that when there is no previous alignment for the family, it returns False, without
+    writing anything
+    """
+    caplog.set_level(logging.DEBUG)
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    mafft_file = os.path.join(GENEPATH, "test_add_align.aln")
+    prev_file = os.path.join(GENEPATH, "prev-mafft-align.1.aln")
+    logger = logging.getLogger("test_add_align")
+    assert not al.add_to_alignment(1, prt_file, mafft_file, prev_file, logger)
+    assert not os.path.isfile(mafft_file)
+
+
+def test_add_to_alignment_nonew(caplog):
+    """
+    Test that when all proteins of the family were already in the previous alignment, this
+    alignment is written (without missing genomes), in the order of extracted proteins, with
+    their full header, without running mafft.
+    """
+    caplog.set_level(logging.DEBUG)
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    mafft_file = os.path.join(GENEPATH, "test_add_align.aln")
+    prev_file = os.path.join(GENEPATH, "prev-mafft-align.1.aln")
+    write_prev_alignment(prev_file)
+    logger = logging.getLogger("test_add_align")
+    assert al.add_to_alignment(1, prt_file, mafft_file, prev_file, logger)
+    assert "Mafft command" not in caplog.text
+    # No protein added
+    assert al._ADDED.pop(1) == 0
+    exp_mafft = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+    assert tutil.compare_order_content(mafft_file, exp_mafft)
+
+
+def test_add_to_alignment_changed(caplog):
+    """
+    Test that when a protein of the previous alignment is not in the family anymore, or
+    has another sequence, it returns False: the family must be aligned from scratch.
+    """
+    caplog.set_level(logging.DEBUG)
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    mafft_file = os.path.join(GENEPATH, "test_add_align.aln")
+    prev_file = os.path.join(GENEPATH, "prev-mafft-align.1.aln")
+    logger = logging.getLogger("test_add_align")
+    write_prev_alignment(prev_file, change=2)
+    assert not al.add_to_alignment(1, prt_file, mafft_file, prev_file, logger)
+    assert ("fam 1: proteins of previous alignment test/data/align/generated_by_unit-tests/"
+            "prev-mafft-align.1.aln changed. Aligning the whole family.") in caplog.text
+    assert not os.path.isfile(mafft_file)
+    # Previous alignment has a protein which is not in the family anymore
+    write_prev_alignment(prev_file)
+    with open(prev_file, "a") as prevf:
+        prevf.write(">GENO.0101.00001.i0001_00005\nMPHF\n")
+    caplog.clear()
+    assert not al.add_to_alignment(1, prt_file, mafft_file, prev_file, logger)
+    assert "changed. Aligning the whole family." in caplog.text
+    assert not os.path.isfile(mafft_file)
+
+
+def test_add_to_alignment_new(caplog):
+    """
+    Test that when the family has a new protein, it is added to the previous alignment with
+    mafft --add, and the alignment is written in the order of extracted proteins.
+    """
+    caplog.set_level(logging.DEBUG)
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    mafft_file = os.path.join(GENEPATH, "test_add_align.aln")
+    prev_file = os.path.join(GENEPATH, "prev-mafft-align.1.aln")
+    # Previous alignment had the 3 last proteins
+    write_prev_alignment(prev_file, skip=[0])
+    logger = logging.getLogger("test_add_align")
+    assert al.add_to_alignment(1, prt_file, mafft_file, prev_file, logger)
+    assert ("fam 1: adding 1 new proteins to previous alignment "
+            "test/data/align/generated_by_unit-tests/prev-mafft-align.1.aln") in caplog.text
+    assert "Mafft command: mafft --auto --add" in caplog.text
+    assert al._ADDED.pop(1) == 1
+    assert not os.path.isfile(mafft_file + ".new")
+    assert not os.path.isfile(mafft_file + ".existing")
+    # All proteins aligned, in the order of extracted proteins
+    aligned = list(al.read_fasta_records(mafft_file))
+    extracted = list(al.read_fasta_records(prt_file))
+    assert [name for name, _ in aligned] == [name for name, _ in extracted]
+    assert [row.replace(b"-", b"") for _, row in aligned] == [seq for _, seq in extracted]
+    assert len({len(row) for _, row in aligned}) == 1
+
+
+def test_mafft_align_add(caplog):
+    """
+    Test that when a previous alignment containing all proteins of the family is given,
+    mafft_align uses it instead of aligning the family, and returns the number of proteins
+    aligned
+    """
+    caplog.set_level(logging.DEBUG)
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    mafft_file = os.path.join(GENEPATH, "test_mafft_align.aln")
+    prev_file = os.path.join(GENEPATH, "prev-mafft-align.1.aln")
+    write_prev_alignment(prev_file)
+    logger = logging.getLogger("test_mafft_align_add")
+    assert al.mafft_align(1, prt_file, mafft_file, 4, logger, prev_file=prev_file) == 4
+    assert "Mafft command" not in caplog.text
+    exp_mafft = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+    assert tutil.compare_order_content(mafft_file, exp_mafft)
+    al._ADDED.clear()
+
+
+def test_get_previous_families(caplog):
+    """
+    Test that all proteins aligned in a previous run are indexed with their family number,
+    ignoring missing genomes added to alignments, and files which are not family alignments
+    """
+    caplog.set_level(logging.DEBUG)
+    prev_prefix = os.path.join(GENEPATH, "prev")
+    write_prev_alignment(f"{prev_prefix}-mafft-align.5.aln", skip=[0])
+    shutil.copyfile(f"{prev_prefix}-mafft-align.5.aln", f"{prev_prefix}-mafft-align.5.aln.log")
+    with open(f"{prev_prefix}-mafft-align.12.aln", "w") as prevf:
+        prevf.write(">GENO.0101.00001.i0001_00005\nMPHF\n")
+    prev_families = al.get_previous_families(prev_prefix)
+    exp_mafft = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+    names = [name for name, _ in al.read_fasta_records(exp_mafft)]
+    assert prev_families == {**{name: "5" for name in names[1:]},
+                             b"GENO.0101.00001.i0001_00005": "12"}
+    assert "4 proteins found in alignments of test/data/align/generated_by_unit-tests/prev" \
+        in caplog.text
+
+
+def test_get_previous_file_renumbered():
+    """
+    Test that the previous alignment of a family is found from its proteins, when families
+    were renumbered since the previous run: the previous family containing most of its
+    proteins, with the smallest number if there is a tie. If no protein of the family was
+    aligned, there is no previous alignment
+    """
+    prt_file = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+    prev_prefix = os.path.join(GENEPATH, "prev")
+    exp_mafft = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+    names = [name for name, _ in al.read_fasta_records(exp_mafft)]
+    # Previous family 7 has 2 proteins of family 1, families 3 and 9 only 1 each
+    al.init_previous(prev_prefix, {names[0]: "9", names[1]: "7", names[2]: "7", names[3]: "3"})
+    assert al.get_previous_file(prev_prefix, prt_file) == f"{prev_prefix}-mafft-align.7.aln"
+    # Tie between families 9 and 10: take the smallest number
+    al.init_previous(prev_prefix, {names[0]: "10", names[1]: "10", names[2]: "9", names[3]: "9"})
+    assert al.get_previous_file(prev_prefix, prt_file) == f"{prev_prefix}-mafft-align.9.aln"
+    al.init_previous(prev_prefix, {b"other_protein": "1"})
+    assert al.get_previous_file(prev_prefix, prt_file) is None
+    # Index of another previous run: read from its files
+    other_prefix = os.path.join(GENEPATH, "other")
+    write_prev_alignment(f"{other_prefix}-mafft-align.4.aln")
+    assert al.get_previous_file(other_prefix, prt_file) == f"{other_prefix}-mafft-align.4.aln"
+    al.init_previous(None, {})
+
+
+def test_handle_family_renumbered(caplog):
+    """
+    Test that a family whose proteins were all aligned in a previous run, with another
+    family number, takes its alignment from this previous family, without running mafft
+    """
+    caplog.set_level(logging.DEBUG)
+    aldir = os.path.join(GENEPATH, "aldir_renum")
+    os.makedirs(aldir)
+    prefix = os.path.join(aldir, "TEST")
+    for ext in ["prt", "gen"]:
+        shutil.copyfile(os.path.join(EXPPATH, "exp_aldir", f"current.1.{ext}"),
+                        f"{prefix}-current.1.{ext}")
+    open(f"{prefix}-current.1.miss.lst", "w").close()
+    prev_prefix = os.path.join(GENEPATH, "prev")
+    # In the previous run, proteins of family 1 were in family 6
+    write_prev_alignment(f"{prev_prefix}-mafft-align.6.aln")
+    al.init_previous(None, {})
+    assert al.time_family((prefix, 1, 4, None, 1, None, prev_prefix))[1:] == (True, ANY, 0)
+    assert "Mafft command" not in caplog.text
+    exp_mafft = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+    assert tutil.compare_order_content(f"{prefix}-mafft-align.1.aln", exp_mafft)
+    al.init_previous(None, {})
+
+
 def test_check_extract(caplog):
     """
     Test that given the 3 files (prt, gen and miss) for a given family, having the expected number
@@ -990,6 +1417,31 @@ def test_handle_family_already_ok():
     assert not q.get()
 
 
+def test_align_batch_already_ok():
+    """
+    Check that a batch gives logs of its families to the queue, and returns the status and
+    time of each family
+    """
+    aldir = os.path.join(GENEPATH, "aldir")
+    prefix = os.path.join(aldir, "TESThandlefam")
+    q = multiprocessing.Manager().Queue()
+    os.makedirs(aldir)
+    for ref, cur in [("current.8.prt", "current.8.prt"), ("current.8.gen", "current.8.gen"),
+                     ("current.8.miss.lst", "current.8.miss.lst"),
+                     ("mafft-align.8-completed.aln", "mafft-align.8.aln"),
+                     ("mafft-prt2nuc.8.aln", "mafft-prt2nuc.8.aln")]:
+        shutil.copyfile(os.path.join(EXPPATH, "exp_aldir-pers", ref),
+                        os.path.join(aldir, f"TESThandlefam-{cur}"))
+    res = al.align_batch((prefix, [(8, 1)], 4, q, None, None, "mafft"))
+    assert res == [(8, "OK", ANY, None)]
+    q.put(None)
+    messages = []
+    while (record := q.get()) is not None:
+        messages.append(record.message)
+    assert "Checking extractions for family 8" in messages[0]
+    assert "fam 8 handled in" in messages[-1]
+
+
 def test_handle_family_wrongextract():
     """
     Giving an aldir with correct prt, gen, miss, mafft and btr files, but says that there are 5
@@ -1114,6 +1566,8 @@ def test_align_all_true(caplog):
     concat = os.path.join(aldir, dname + "-complete.nucl.cat.aln")
     open(concat, "w").close()
     assert al.align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads)
+    # Time spent on each family is saved
+    assert os.path.isfile(prefix + "-align-times.tsv")
     # Check output files
     out_mafft1 = os.path.join(aldir, dname + "-mafft-align.1.aln")
     out_btr1 = os.path.join(aldir, dname + "-mafft-prt2nuc.1.aln")
@@ -1138,6 +1592,14 @@ def test_align_all_true(caplog):
     assert "Aligning family 8" in caplog.text
     assert "Back-translating family 8" in caplog.text
     assert "Adding missing genomes for family 8" in caplog.text
+    # Run again: both families are in the journal, with unchanged files, so they are skipped
+    caplog.clear()
+    open(concat, "w").close()
+    assert al.align_all_families(prefix, all_fams, ngenomes, dname, quiet, threads)
+    assert "2 families already aligned in a previous run" in caplog.text
+    assert "Checking extractions for family" not in caplog.text
+    # Nothing was redone: concatenated file is kept
+    assert os.path.isfile(concat)
 
 
 def test_align_all_exists_true(caplog):
@@ -1209,6 +1671,41 @@ def test_align_all_exists_true(caplog):
             "steps") in caplog.text
 
 
+def test_align_all_exists_batch(caplog):
+    """
+    Giving aldir with all files already done for families 1 and 8, and a batch size such that
+    both families are in the same batch: they are checked by the same process, and it
+    returns True.
+    """
+    caplog.set_level(logging.DEBUG)
+    aldir = os.path.join(GENEPATH, "aldir")
+    dname = "TESTalign-all"
+    prefix = os.path.join(aldir, dname)
+    os.makedirs(aldir)
+    refs = {"current.8.prt": os.path.join("exp_aldir-pers", "current.8.prt"),
+            "current.8.gen": os.path.join("exp_aldir-pers", "current.8.gen"),
+            "current.8.miss.lst": os.path.join("exp_aldir-pers", "current.8.miss.lst"),
+            "mafft-align.8.aln": os.path.join("exp_aldir-pers", "mafft-align.8-completed.aln"),
+            "mafft-prt2nuc.8.aln": os.path.join("exp_aldir-pers", "mafft-prt2nuc.8.aln"),
+            "current.1.prt": os.path.join("exp_aldir", "current.1.prt"),
+            "current.1.gen": os.path.join("exp_aldir", "current.1.gen"),
+            "mafft-align.1.aln": os.path.join("exp_aldir", "mafft-align.1.aln"),
+            "mafft-prt2nuc.1.aln": os.path.join("exp_aldir", "mafft-prt2nuc.1.aln")}
+    for cur, ref in refs.items():
+        shutil.copyfile(os.path.join(EXPPATH, ref), f"{prefix}-{cur}")
+    open(f"{prefix}-current.1.miss.lst", "w").close()
+    assert al.align_all_families(prefix, [1, 8], 4, dname, True, 2, batch_residues=10**6)
+    assert ("protein alignment already done for family 1. The program will use it for next "
+            "steps") in caplog.text
+    assert ("protein alignment already done for family 8. The program will use it for next "
+            "steps") in caplog.text
+    with open(prefix + "-align-times.tsv") as timef:
+        lines = timef.readlines()
+    assert len(lines) == 3
+    assert {line.split()[0] for line in lines[1:]} == {"1", "8"}
+    assert {line.split()[-1] for line in lines[1:]} == {"OK"}
+
+
 def test_align_all_false(caplog):
     """
     Giving aldir with prt, gen, miss files for families 1 and 8, as well as
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Unit tests for the aln_cache submodule in align module
+"""
+import logging
+import os
+import pytest
+import shutil
+
+import PanACoTA.align_module.aln_cache as cache
+import PanACoTA.align_module.alignment as al
+import PanACoTA.align_module.aligners as aligners
+import test.test_unit.utilities_for_tests as tutil
+
+
+# Define common variables
+ALDIR = os.path.join("test", "data", "align")
+EXPPATH = os.path.join(ALDIR, "exp_files")
+GENEPATH = os.path.join(ALDIR, "generated_by_unit-tests")
+PRT_FILE = os.path.join(EXPPATH, "exp_aldir", "current.1.prt")
+MAFFT_FILE = os.path.join(EXPPATH, "exp_aldir", "mafft-align.1.aln")
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown_module():
+    """
+    Before each test: create directory to put generated files
+    After: remove directory with generated results
+    """
+    os.mkdir(GENEPATH)
+    print("setup")
+
+    yield
+    shutil.rmtree(GENEPATH)
+    print("teardown")
+
+
+def test_read_records():
+    """
+    Test that all sequences are read, with their full header line, and sequence on 1 line
+    """
+    records = cache.read_records(PRT_FILE)
+    assert len(records) == 4
+    assert records[0][0] == (b"GEN2.1017.00001.i0002_00004 381 hpcD | 5-carboxymethyl-2-"
+                             b"hydroxymuconate Delta-isomerase | 5.3.3.10 | similar to AA "
+                             b"sequence:UniProtKB:Q05354")
+    assert records[0][1] == (b"MPHFIAECTENIREQADLPSLFSKVNEALAATGIFPIGGIRSRAHWLDTWQMADGKHDYA"
+                             b"FVHMTLKIGAGRSLESRQEVGEMLFGLIKAHFADLMENRYLALSFEIAELHPTLNYKQNN"
+                             b"VHALFK")
+    assert len(records[3][1]) == 157
+
+
+def test_get_key():
+    """
+    Test that the key does not depend on protein names nor on their order, but depends on
+    their sequences and on the aligner
+    """
+    records = [(b"prot1", b"MPHF"), (b"prot2", b"MKKL"), (b"prot3", b"MPHF")]
+    key = cache.get_key(records, "mafft --auto")
+    assert len(key) == 64
+    other_names = [(b"fam2_a", b"MKKL"), (b"fam2_b", b"mphf"), (b"fam2_c", b"MPHF")]
+    assert cache.get_key(other_names, "mafft --auto") == key
+    assert cache.get_key(records, "muscle") != key
+    assert cache.get_key(records[:2], "mafft --auto") != key
+    assert cache.get_key([(b"prot1", b"MPHFMKKL")], "mafft --auto") != key
+
+
+def test_save_get_alignment():
+    """
+    Test that an alignment saved in the cache is found for a family with the same proteins,
+    even if they have other names and are not in the same order.
+    """
+    cache_dir = os.path.join(GENEPATH, "cache")
+    records = cache.read_records(PRT_FILE)
+    key = cache.get_key(records, "mafft --auto")
+    mafft_file = os.path.join(GENEPATH, "mafft.aln")
+    assert not cache.get_alignment(cache_dir, key, records, mafft_file)
+    assert not os.path.isfile(mafft_file)
+    assert cache.save_alignment(cache_dir, key, records, MAFFT_FILE)
+    cache_file = os.path.join(cache_dir, key[:2], key + ".aln")
+    assert os.path.isfile(cache_file)
+    # No temporary file left
+    assert os.listdir(os.path.join(cache_dir, key[:2])) == [key + ".aln"]
+    # Same family: same alignment as mafft
+    assert cache.get_alignment(cache_dir, key, records, mafft_file)
+    assert tutil.compare_file_content(mafft_file, MAFFT_FILE)
+    # Other names, other order
+    renamed = [(b"new_" + header.split()[0], seq) for header, seq in reversed(records)]
+    assert cache.get_key(renamed, "mafft --auto") == key
+    assert cache.get_alignment(cache_dir, key, renamed, mafft_file)
+    exp = [(b"new_GENO.1216.00002.i0001_00003", b"MPKRRRLPKHYWRSTARINRARYREDSLFEDMPHFIA"),
+           (b"new_GENO.1017.00001.b0002_00003", b"-------------------------------MPHFIA"),
+           (b"new_GEN4.1111.00001.i0001_00002", b"-------------------------------MPHFIA"),
+           (b"new_GEN2.1017.00001.i0002_00004", b"-------------------------------MPHFIA")]
+    found = cache.read_records(mafft_file)
+    assert [(name, seq[:37]) for name, seq in found] == exp
+    assert {len(seq) for _, seq in found} == {157}
+
+
+def test_get_alignment_wrong_cache(caplog):
+    """
+    Test that a cache file which does not correspond to the proteins of the family
+    (truncated, or other sequences) is ignored, with a warning
+    """
+    caplog.set_level(logging.DEBUG)
+    cache_dir = os.path.join(GENEPATH, "cache")
+    records = [(b"prot1", b"MPHF"), (b"prot2", b"MKKL")]
+    key = cache.get_key(records, "mafft --auto")
+    cache_file = cache.get_cache_file(cache_dir, key)
+    os.makedirs(os.path.dirname(cache_file))
+    mafft_file = os.path.join(GENEPATH, "mafft.aln")
+    # Only 1 row for 2 distinct sequences
+    with open(cache_file, "w") as cachef:
+        cachef.write("MKKL-\n")
+    assert not cache.get_alignment(cache_dir, key, records, mafft_file)
+    assert "does not correspond to the family. Ignored." in caplog.text
+    # Rows not corresponding to sequences
+    with open(cache_file, "w") as cachef:
+        cachef.write("MKKL-\nMPHW-\n")
+    assert not cache.get_alignment(cache_dir, key, records, mafft_file)
+    assert not os.path.isfile(mafft_file)
+    # Right rows
+    with open(cache_file, "w") as cachef:
+        cachef.write("MKKL-\nMPHF-\n")
+    assert cache.get_alignment(cache_dir, key, records, mafft_file)
+    with open(mafft_file) as mafftf:
+        assert mafftf.read() == ">prot1\nMPHF-\n>prot2\nMKKL-\n"
+
+
+def test_save_alignment_wrong(caplog):
+    """
+    Test that an alignment which does not contain the sequences of the family is not saved
+    """
+    caplog.set_level(logging.DEBUG)
+    cache_dir = os.path.join(GENEPATH, "cache")
+    records = [(b"prot1", b"MPHF"), (b"prot2", b"MKKL")]
+    key = cache.get_key(records, "mafft --auto")
+    mafft_file = os.path.join(GENEPATH, "mafft.aln")
+    with open(mafft_file, "w") as mafftf:
+        mafftf.write(">prot1\nMPHF-\n>prot2\nMKK-X\n")
+    assert not cache.save_alignment(cache_dir, key, records, mafft_file)
+    assert "It is not saved in cache" in caplog.text
+    assert not os.path.isfile(cache.get_cache_file(cache_dir, key))
+
+
+def test_mafft_align_from_cache(caplog):
+    """
+    Test that when the alignment of the family is in the cache, mafft_align writes it without
+    running mafft, and returns the number of proteins aligned
+    """
+    caplog.set_level(logging.DEBUG)
+    cache_dir = os.path.join(GENEPATH, "cache")
+    records = cache.read_records(PRT_FILE)
+    key = cache.get_key(records, aligners.get_identity("mafft"))
+    assert cache.save_alignment(cache_dir, key, records, MAFFT_FILE)
+    mafft_file = os.path.join(GENEPATH, "test_mafft_align.aln")
+    logger = logging.getLogger("test_mafft_align_cache")
+    assert al.mafft_align(1, PRT_FILE, mafft_file, 4, logger, cache_dir=cache_dir) == 4
+    assert "fam 1: alignment found in cache" in caplog.text
+    assert "Mafft command" not in caplog.text
+    assert tutil.compare_file_content(mafft_file, MAFFT_FILE)
+    assert not os.path.isfile(mafft_file + ".log")
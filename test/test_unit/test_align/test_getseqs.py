@@ -52,103 +52,6 @@ def setup_teardown_module():
 
 
 # Start tests
-def test_extract_noseq_out_given():
-    """
-    Test that when giving an open fasta file, an empty list of sequences to extract, and
-    an open file to which extracted sequences must be written, the output file is empty.
-    """
-    to_extract = {}
-    outfile = os.path.join(GENEPATH, "test_noextract_out-given.prt")
-    with open(FASTA, "r") as fasf, open(outfile, "w") as outf:
-        gseq.extract_sequences(to_extract, fasf, outf=outf)
-    with open(outfile, "r") as outf:
-        assert outf.readlines() == []
-
-
-def test_extract_seq_out_given():
-    """
-    Test that when giving an open fasta file, a list of 3 sequences to extract, and
-    a open file to which extracted sequences must be written, it writes the
-    expected sequences to output file.
-    """
-    to_extract = ["GEN2.1017.00001.b0001_00001", "GEN2.1017.00001.i0003_00008",
-                  "GEN2.1017.00001.b0004_00013"]
-    outfile = os.path.join(GENEPATH, "test_extract_out-given.prt")
-    with open(FASTA, "r") as fasf, open(outfile, "w") as outf:
-        gseq.extract_sequences(to_extract, fasf, outf=outf)
-    exp_extracted = os.path.join(EXPPATH, "exp_extracted.prt")
-    assert tutil.compare_file_content(outfile, exp_extracted)
-
-
-def test_extract_seq_out_given_wrongname():
-    """
-    Test that when giving an open fasta file, a list of 4 sequences to extract, and
-    a open file to which extracted sequences must be written, it writes the
-    expected sequences to output file. If a sequence does not exist, it is just not written.
-    """
-    to_extract = {"GEN2.1017.00001.b0001_00001": "", "GEN2.1017.00001.i0003_00008": "",
-                  "GEN2.1017.00001.b0004_00013": "", "toto": ""}
-    outfile = os.path.join(GENEPATH, "test_extract_out-given.prt")
-    with open(FASTA, "r") as fasf, open(outfile, "w") as outf:
-        gseq.extract_sequences(to_extract, fasf, outf=outf)
-    exp_extracted = os.path.join(EXPPATH, "exp_extracted.prt")
-    assert tutil.compare_file_content(outfile, exp_extracted)
-
-
-def test_extract_seq_out_allsame():
-    """
-    Test that when giving an open fasta file, a list of 3 sequences to extract with a
-    corresponding output file (same for all 3 proteins), it writes the
-    expected sequences to output file.
-    """
-    out = os.path.join(GENEPATH, "test_extract1.prt")
-    to_extract = {"GEN2.1017.00001.b0001_00001": out,
-                  "GEN2.1017.00001.i0003_00008": out,
-                  "GEN2.1017.00001.b0004_00013": out}
-    with open(FASTA, "r") as fasf:
-        gseq.extract_sequences(to_extract, fasf, files_todo=[out])
-    exp_extracted = os.path.join(EXPPATH, "exp_extracted.prt")
-    assert tutil.compare_file_content(out, exp_extracted)
-
-
-def test_extract_seq_out_different():
-    """
-    Test that when giving an open fasta file, a list of 3 sequences to extract with a
-    corresponding output file for each, it writes the expected sequences to the expected output
-    file.
-    """
-    out1 = os.path.join(GENEPATH, "test_extract1.prt")
-    out2 = os.path.join(GENEPATH, "test_extract2.prt")
-    to_extract = {"GEN2.1017.00001.b0001_00001": out1,
-                  "GEN2.1017.00001.i0003_00008": out2,
-                  "GEN2.1017.00001.b0004_00013": out1}
-    with open(FASTA, "r") as fasf:
-        gseq.extract_sequences(to_extract, fasf, files_todo=[out1, out2])
-    exp_extracted1 = os.path.join(EXPPATH, "exp_extracted1.prt")
-    exp_extracted2 = os.path.join(EXPPATH, "exp_extracted2.prt")
-    assert tutil.compare_file_content(out1, exp_extracted1)
-    assert tutil.compare_file_content(out2, exp_extracted2)
-
-
-def test_extract_seq_out_different_notasked():
-    """
-    Test that when giving an open fasta file, a list of 3 sequences to extract with a
-    corresponding output file for each, it writes the
-    expected sequences to expected output file, only if this file is contained in 'files_todo'.
-    If not, file is not created, and protein not extracted.
-    """
-    out1 = os.path.join(GENEPATH, "test_extract1.prt")
-    out2 = os.path.join(GENEPATH, "test_extract2.prt")
-    to_extract = {"GEN2.1017.00001.b0001_00001": out1,
-                  "GEN2.1017.00001.i0003_00008": out2,
-                  "GEN2.1017.00001.b0004_00013": out1}
-    with open(FASTA, "r") as fasf:
-        gseq.extract_sequences(to_extract, fasf, files_todo=[out1])
-    exp_extracted1 = os.path.join(EXPPATH, "exp_extracted1.prt")
-    assert tutil.compare_file_content(out1, exp_extracted1)
-    assert not os.path.isfile(out2)
-
-
 def test_get_names_files():
     """
     Test that given an open tab file (containing 2 columns: name of sequence to extract,
@@ -214,86 +117,6 @@ def test_get_names_out_and1column():
     assert toext == exp_toext
 
 
-def test_get_genome_all_seqs():
-    """
-    Test that given a fasta file, and a tab file containing all sequences to extract, with the
-    files to which it must be extracted, it extracts everything in the right file.
-    """
-    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
-    todo = ["file1.txt", "file2.txt"]
-    todo = [os.path.join(GENEPATH, f) for f in todo]
-    gseq.get_genome_seqs(FASTA, tabfile, todo)
-    for i in range(1, 3):
-        outfile = os.path.join(GENEPATH, f"file{i}.txt")
-        exp_file = os.path.join(EXPPATH, f"exp_extracted{i}.prt")
-        assert os.path.isfile(outfile)
-        assert tutil.compare_file_content(outfile, exp_file)
-
-
-def test_get_genome_seqs_outgiven_2cols():
-    """
-    Test that given a fasta file, and a tab file containing all sequences to extract, with the
-    files to which it must be extracted, and an output file, it extracts all sequences to the
-    same output file, ignoring the ones given in tab file
-    """
-    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
-    outfile = os.path.join(GENEPATH, "fileout.txt")
-    todo = []
-    gseq.get_genome_seqs(FASTA, tabfile, todo, outfile)
-    assert os.path.isfile(outfile)
-    exp_file = os.path.join(EXPPATH, "exp_extracted.prt")
-    assert tutil.compare_file_content(outfile, exp_file)
-    os.remove(outfile)
-
-
-def test_get_genome_seqs_outgiven_1col():
-    """
-    Test that given a fasta file, and a tab file containing only all sequences to extract,
-    (no filename), and an output file, it extracts all sequences to the same output file.
-    """
-    tabfile = os.path.join(TESTPATH, "getentry_all_1column.txt")
-    outfile = os.path.join(GENEPATH, "fileout.txt")
-    todo = []
-    gseq.get_genome_seqs(FASTA, tabfile, todo, outfile)
-    assert os.path.isfile(outfile)
-    exp_file = os.path.join(EXPPATH, "exp_extracted.prt")
-    assert tutil.compare_file_content(outfile, exp_file)
-
-
-def test_get_genome_seqs_1notasked():
-    """
-    Test that given a fasta file, and a tab file containing all sequences to extract, with the
-    files to which it must be extracted, and only 1 of them in 'files_todo', it extracts only
-    the proteins going to this file.
-    """
-    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
-    outfile1 = os.path.join(GENEPATH, "file1.txt")
-    outfile2 = os.path.join(GENEPATH, "file2.txt")
-    todo = [outfile1]
-    gseq.get_genome_seqs(FASTA, tabfile, todo)
-    assert os.path.isfile(outfile1)
-    exp_file = os.path.join(EXPPATH, "exp_extracted1.prt")
-    assert tutil.compare_file_content(outfile1, exp_file)
-    assert not os.path.isfile(outfile2)
-
-
-def test_get_genome_seqs_exists(caplog):
-    """
-    Test that when the output file given aleady exists, it does not overwrite it, but returns a
-    warning message saying that it will be used for next step.
-    """
-    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
-    outfile = os.path.join(GENEPATH, "fileout.txt")
-    open(outfile, "w").close()
-    todo = []
-    gseq.get_genome_seqs(FASTA, tabfile, todo, outfile)
-    assert ("Sequences are already extracted in test/data/align/generated_by_unit-tests/fileout.txt. "
-            "This will be used for next step. If "
-            "you want to re-extract all sequences, use option -F (or --force)") in caplog.text
-    with open(outfile, "r") as outf:
-        assert outf.readlines() == []
-
-
 def test_check_extract_empty():
     """
     Test that when no file is present, it returns all gen and prt files, for all families
@@ -397,6 +220,123 @@ def test_check_extract_allexist():
     shutil.rmtree(aldir)
 
 
+def extract_from_tab(tabfile, files_todo, outfile=None):
+    """
+    Extract the sequences listed in tabfile from FASTA, with its index, as done for each
+    genome by get_all_seqs
+    """
+    with open(tabfile) as tabf:
+        to_extract = gseq.get_names_to_extract(tabf, outfile)
+    files_todo = set(files_todo) | ({outfile} if outfile else set())
+    with gseq.FileHandlePool() as handles:
+        gseq.extract_indexed(FASTA, gseq.build_fasta_index(FASTA), to_extract, files_todo,
+                             handles)
+
+
+def test_extract_indexed_noseq():
+    """
+    Test that when there is no sequence to extract, no output file is created
+    """
+    outfile = os.path.join(GENEPATH, "test_noextract_out-given.prt")
+    with gseq.FileHandlePool() as handles:
+        gseq.extract_indexed(FASTA, gseq.build_fasta_index(FASTA), {}, {outfile}, handles)
+    assert not os.path.isfile(outfile)
+
+
+def test_extract_indexed_allsame():
+    """
+    Test that when giving 3 sequences to extract to the same output file (and 1 which is
+    not in the fasta file, and is just not written), it writes the expected sequences to this
+    file.
+    """
+    out = os.path.join(GENEPATH, "test_extract1.prt")
+    to_extract = {"GEN2.1017.00001.b0001_00001": out,
+                  "GEN2.1017.00001.i0003_00008": out,
+                  "GEN2.1017.00001.b0004_00013": out,
+                  "toto": out}
+    with gseq.FileHandlePool() as handles:
+        gseq.extract_indexed(FASTA, gseq.build_fasta_index(FASTA), to_extract, {out}, handles)
+    exp_extracted = os.path.join(EXPPATH, "exp_extracted.prt")
+    assert tutil.compare_file_content(out, exp_extracted)
+
+
+def test_extract_indexed_different():
+    """
+    Test that when giving 3 sequences to extract with a corresponding output file for each,
+    it writes the expected sequences to the expected output file.
+    """
+    out1 = os.path.join(GENEPATH, "test_extract1.prt")
+    out2 = os.path.join(GENEPATH, "test_extract2.prt")
+    to_extract = {"GEN2.1017.00001.b0001_00001": out1,
+                  "GEN2.1017.00001.i0003_00008": out2,
+                  "GEN2.1017.00001.b0004_00013": out1}
+    with gseq.FileHandlePool() as handles:
+        gseq.extract_indexed(FASTA, gseq.build_fasta_index(FASTA), to_extract, {out1, out2},
+                             handles)
+    exp_extracted1 = os.path.join(EXPPATH, "exp_extracted1.prt")
+    exp_extracted2 = os.path.join(EXPPATH, "exp_extracted2.prt")
+    assert tutil.compare_file_content(out1, exp_extracted1)
+    assert tutil.compare_file_content(out2, exp_extracted2)
+
+
+def test_extract_tab_all_seqs():
+    """
+    Test that given a tab file containing all sequences to extract, with the files to which
+    they must be extracted, it extracts everything in the right file.
+    """
+    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
+    todo = [os.path.join(GENEPATH, f) for f in ["file1.txt", "file2.txt"]]
+    extract_from_tab(tabfile, todo)
+    for i in range(1, 3):
+        outfile = os.path.join(GENEPATH, f"file{i}.txt")
+        exp_file = os.path.join(EXPPATH, f"exp_extracted{i}.prt")
+        assert os.path.isfile(outfile)
+        assert tutil.compare_file_content(outfile, exp_file)
+
+
+def test_extract_tab_outgiven_2cols():
+    """
+    Test that given a tab file containing all sequences to extract, with the files to which
+    they must be extracted, and an output file, it extracts all sequences to the same output
+    file, ignoring the ones given in tab file
+    """
+    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
+    outfile = os.path.join(GENEPATH, "fileout.txt")
+    extract_from_tab(tabfile, [], outfile)
+    exp_file = os.path.join(EXPPATH, "exp_extracted.prt")
+    assert tutil.compare_file_content(outfile, exp_file)
+    assert not os.path.isfile(os.path.join(GENEPATH, "file1.txt"))
+
+
+def test_extract_tab_outgiven_1col():
+    """
+    Test that given a tab file containing only the sequences to extract (no filename), and an
+    output file, it extracts all sequences to this output file.
+    """
+    tabfile = os.path.join(TESTPATH, "getentry_all_1column.txt")
+    outfile = os.path.join(GENEPATH, "fileout.txt")
+    extract_from_tab(tabfile, [], outfile)
+    exp_file = os.path.join(EXPPATH, "exp_extracted.prt")
+    assert tutil.compare_file_content(outfile, exp_file)
+
+
+def test_extract_tab_1notasked(capsys):
+    """
+    Test that given a tab file containing all sequences to extract, with the files to which
+    they must be extracted, and only 1 of them in 'files_todo', it extracts only the proteins
+    going to this file.
+    """
+    tabfile = os.path.join(TESTPATH, "getentry_all_2columns.txt")
+    outfile1 = os.path.join(GENEPATH, "file1.txt")
+    outfile2 = os.path.join(GENEPATH, "file2.txt")
+    extract_from_tab(tabfile, [outfile1])
+    exp_file = os.path.join(EXPPATH, "exp_extracted1.prt")
+    assert tutil.compare_file_content(outfile1, exp_file)
+    assert not os.path.isfile(outfile2)
+    assert ("Sequence GEN2.1017.00001.i0003_00008 not written because no output file "
+            "specified") in capsys.readouterr().err
+
+
 def test_get_all_seqs(caplog):
     """
     Test that when giving a list of family numbers, and output directories are empty,
@@ -602,3 +542,125 @@ def test_get_all_seqs_allexist(caplog):
             "will use them for the next step. If you want to re-extract a given "
             "family, remove its prt and gen extraction files. If you want to "
             "re-extract all families, use option -F (or --force).") in caplog.text
+
+
+def test_fasta_index_cache():
+    """
+    Test that the index of a fasta file gives the position of each entry, is saved in the
+    given directory, and re-read from it next time
+    """
+    index = gseq.get_fasta_index(FASTA, GENEPATH)
+    idxfile = os.path.join(GENEPATH, "GEN2.1017.00001.prt.idx")
+    assert os.path.isfile(idxfile)
+    with open(FASTA, "rb") as fasf:
+        content = fasf.read()
+    offset, length = index["GEN2.1017.00001.i0003_00008"]
+    entry = content[offset:offset + length].decode()
+    assert entry.startswith(">GEN2.1017.00001.i0003_00008")
+    assert entry.count(">") == 1
+    assert sum(length for _, length in index.values()) == len(content)
+    assert gseq.read_fasta_index(idxfile) == index
+    # Not writable directory: index only in memory
+    assert gseq.get_fasta_index(FASTA, os.path.join(GENEPATH, "nodir")) == index
+
+
+def test_extract_indexed_lru():
+    """
+    Test that extracting sequences with the fasta index, with only 1 output file open at
+    a time, writes the expected sequences to the expected output files, in their order in
+    the fasta file
+    """
+    out1 = os.path.join(GENEPATH, "test_extract1.prt")
+    out2 = os.path.join(GENEPATH, "test_extract2.prt")
+    out3 = os.path.join(GENEPATH, "test_extract3.prt")
+    to_extract = {"GEN2.1017.00001.b0004_00013": out1,
+                  "GEN2.1017.00001.i0003_00008": out2,
+                  "GEN2.1017.00001.b0001_00001": out1,
+                  "GEN2.1017.00001.b0001_00002": out3,
+                  "toto": out1}
+    index = gseq.build_fasta_index(FASTA)
+    with gseq.FileHandlePool(max_open=1) as handles:
+        gseq.extract_indexed(FASTA, index, to_extract, {out1, out2}, handles)
+    assert not os.path.isfile(out3)
+    exp_extracted1 = os.path.join(EXPPATH, "exp_extracted1.prt")
+    exp_extracted2 = os.path.join(EXPPATH, "exp_extracted2.prt")
+    assert tutil.compare_order_content(out1, exp_extracted1)
+    assert tutil.compare_order_content(out2, exp_extracted2)
+
+
+@pytest.mark.parametrize("batch, threads", [(1, 1), (4, 1), (10, 1), (1, 3), (None, 2)])
+def test_get_all_seqs_by_family(batch, threads, caplog):
+    """
+    Test that family-major extraction (with batches of 1, 4 or all families, on 1 or several
+    threads) gives exactly the same family files as genome-major extraction
+    """
+    caplog.set_level(logging.DEBUG)
+    all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
+    dname = "TESTgetAllSeq"
+    listdir = os.path.join(GENEPATH, "Listdir")
+    aldir = os.path.join(GENEPATH, "Align")
+    refdir = os.path.join(GENEPATH, "Align-genome-major")
+    all_fams = [1, 6, 10, 11, 13, 14]
+    os.makedirs(listdir)
+    os.makedirs(aldir)
+    ref_listdir = os.path.join(TESTPATH, "test_listdir")
+    for gen in all_genomes:
+        for ftype in ["gen", "prt"]:
+            shutil.copyfile(os.path.join(ref_listdir, f"getentry-{ftype}_{gen}"),
+                            os.path.join(listdir, f"{dname}-getEntry_{ftype}_{gen}.txt"))
+    gseq.get_all_seqs(all_genomes, dname, DBPATH, listdir, aldir, all_fams, True)
+    os.rename(aldir, refdir)
+    os.makedirs(aldir)
+    gseq.get_all_seqs(all_genomes, dname, DBPATH, listdir, aldir, all_fams, True, batch=batch,
+                      threads=threads)
+    for fam in all_fams:
+        for ftype in ["gen", "prt"]:
+            fam_file = os.path.join(aldir, f"{dname}-current.{fam}.{ftype}")
+            ref_file = os.path.join(refdir, f"{dname}-current.{fam}.{ftype}")
+            with open(fam_file) as famf, open(ref_file) as reff:
+                assert famf.read() == reff.read()
+    if threads == 1:
+        nb_batches = (len(all_fams) + batch - 1) // batch
+        assert (f"Extracting proteins and genes of families batch {nb_batches}/"
+                f"{nb_batches}") in caplog.text
+    else:
+        # Without batch size, 1 batch per thread
+        nb_batches = (len(all_fams) + batch - 1) // batch if batch else threads
+        assert f"Indexing 4 genomes on {threads} threads" in caplog.text
+        assert (f"Extracting {nb_batches} batches of families on {threads} "
+                "threads") in caplog.text
+
+
+@pytest.mark.parametrize("batch", [None, 2])
+def test_get_all_seqs_inmemory(batch):
+    """
+    Test that when giving the proteins to extract in memory, it extracts the same family files
+    as when reading them from getEntry files
+    """
+    all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
+    dname = "TESTgetAllSeq"
+    listdir = os.path.join(GENEPATH, "Listdir")
+    aldir = os.path.join(GENEPATH, "Align")
+    refdir = os.path.join(GENEPATH, "Align-getentry")
+    all_fams = [1, 6, 10, 11, 13, 14]
+    os.makedirs(listdir)
+    os.makedirs(aldir)
+    ref_listdir = os.path.join(TESTPATH, "test_listdir")
+    to_extract = {}
+    for gen in all_genomes:
+        for ftype in ["gen", "prt"]:
+            shutil.copyfile(os.path.join(ref_listdir, f"getentry-{ftype}_{gen}"),
+                            os.path.join(listdir, f"{dname}-getEntry_{ftype}_{gen}.txt"))
+        with open(os.path.join(ref_listdir, f"getentry-prt_{gen}")) as tabf:
+            to_extract[gen] = {line.split()[0]: line.split(".")[-2] for line in tabf}
+    gseq.get_all_seqs(all_genomes, dname, DBPATH, listdir, aldir, all_fams, True)
+    os.rename(aldir, refdir)
+    os.makedirs(aldir)
+    gseq.get_all_seqs(all_genomes, dname, DBPATH, listdir, aldir, all_fams, True, batch=batch,
+                      to_extract=to_extract)
+    for fam in all_fams:
+        for ftype in ["gen", "prt"]:
+            fam_file = os.path.join(aldir, f"{dname}-current.{fam}.{ftype}")
+            ref_file = os.path.join(refdir, f"{dname}-current.{fam}.{ftype}")
+            with open(fam_file) as famf, open(ref_file) as reff:
+                assert famf.read() == reff.read()
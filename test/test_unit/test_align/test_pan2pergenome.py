@@ -85,7 +85,8 @@ def test_get_per_genome(caplog):
     list_gen = os.path.join(TESTPATH, "listfile.txt")
     dname = "TEST-all-gembase"
     outdir = os.path.join(GENEPATH, "test_get_per_genome")
-    all_genomes, aldir, listdir, fams = p2p.get_per_genome(pers, list_gen, dname, outdir)
+    all_genomes, aldir, listdir, fams, to_extract = p2p.get_per_genome(pers, list_gen, dname,
+                                                                       outdir)
     assert ("Reading PersGenome and constructing lists of missing genomes "
             "in each family") in caplog.text
     exp_al = os.path.join(outdir, "Align-TEST-all-gembase")
@@ -98,6 +99,31 @@ def test_get_per_genome(caplog):
     assert all_genomes == exp_genomes
     exp_fams = ['1', '3', '5', '8', '10', '11', '12']
     assert set(fams) == set(exp_fams)
+    # Proteins to extract given in memory, no getEntry file written
+    assert os.listdir(listdir) == []
+    assert set(to_extract) == set(exp_genomes)
+    # GENO.1216.00002 has 2 members in family 1: nothing to extract
+    assert set(to_extract["GENO.1216.00002"].values()) == {'3', '5', '8', '10', '11', '12'}
+    assert to_extract["GENO.1216.00003"] == {"GENO.1216.00003.i0001_00003": '1',
+                                             "GENO.1216.00003.i0001_01010": '3',
+                                             "GENO.1216.00003.i0080_00010": '5'}
+
+
+def test_get_per_genome_getentry():
+    """
+    Test that when asking for getEntry files, they are written for each genome, and
+    no list of proteins to extract is returned
+    """
+    pers = os.path.join("test", "data", "persgenome", "exp_files", "exp_pers-floor-mixed.txt")
+    list_gen = os.path.join(TESTPATH, "listfile.txt")
+    dname = "TEST-all-gembase"
+    outdir = os.path.join(GENEPATH, "test_get_per_genome")
+    all_genomes, _, listdir, _, to_extract = p2p.get_per_genome(pers, list_gen, dname, outdir,
+                                                                getentry=True)
+    assert to_extract is None
+    for gen in all_genomes:
+        assert os.path.isfile(os.path.join(listdir, f"{dname}-getEntry_prt_{gen}.txt"))
+        assert os.path.isfile(os.path.join(listdir, f"{dname}-getEntry_gen_{gen}.txt"))
 
 
 def test_prot_per_strain_gembase():
@@ -523,3 +549,27 @@ def test_write_missing():
         miss_file = os.path.join(GENEPATH, f"{dname}-current.{num}.miss.lst")
         assert os.path.isfile(miss_file)
         assert tutil.compare_file_to_list(miss_file, exp_res[num])
+
+
+def test_write_missing_unchanged():
+    """
+    Test that genomes are sorted in files of missing genomes, and that a file already
+    containing the expected genomes is not rewritten, while a different one is.
+    """
+    dname = "test_write_missing"
+    p2p.write_missing_genomes(FAM_GENOMES, SEVERAL, ALL_GENOMES, GENEPATH, dname)
+    miss2 = os.path.join(GENEPATH, f"{dname}-current.2.miss.lst")
+    miss3 = os.path.join(GENEPATH, f"{dname}-current.3.miss.lst")
+    with open(miss2, "r") as mf:
+        assert mf.read() == "ESCO1\nESCO3\nESCO5\nESCO6\n"
+    # Put an old modification time, and a wrong content in family 3
+    for miss_file in [miss2, miss3]:
+        os.utime(miss_file, ns=(10**9, 10**9))
+    with open(miss3, "w") as mf:
+        mf.write("ESCO2\n")
+    os.utime(miss3, ns=(10**9, 10**9))
+    p2p.write_missing_genomes(FAM_GENOMES, SEVERAL, ALL_GENOMES, GENEPATH, dname)
+    assert os.stat(miss2).st_mtime_ns == 10**9
+    assert os.stat(miss3).st_mtime_ns != 10**9
+    with open(miss3, "r") as mf:
+        assert mf.read() == "ESCO1\n"
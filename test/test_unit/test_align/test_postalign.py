@@ -85,68 +85,51 @@ def test_get_genome_notfound(caplog):
             "['TOTO.0315.00001', 'ESCO.0215.00002', 'ESCO.0215.00001']") in caplog.text
 
 
-def test_write_groups(caplog):
+def test_build_genome_index():
     """
-    Check that giving a list of genomes and corresponding sequences, it writes all of them in
-    fasta format in the given output file.
+    Check that genome names are indexed by length, and that a genome given several times
+    keeps its first position
     """
-    caplog.set_level(logging.DEBUG)
-    outfile = os.path.join(GENEPATH, "test_write_groups.fa")
-    sequences = {"ESCO.0216.00001": ["AAAAA-", "TTTTT", "CCCCC", "GGGGG"],
-                 "ESCO.0216.00002": ["AAAAT-", "TTTTA", "-CCCG", "GGGGC"],
-                 "ESCO.0216.00003": ["AAAAAA", "TT-TT", "CCC-C", "GCGG-"]}
-    pal.write_groups(outfile, sequences)
-    assert "Writing alignments per genome" in caplog.text
-    with open(outfile, "r") as outf:
-        lines = outf.readlines()
-    assert len(lines) == 6
-    exp_lines = [">ESCO.0216.00001\n", "AAAAA-TTTTTCCCCCGGGGG\n",
-                 ">ESCO.0216.00002\n", "AAAAT-TTTTA-CCCGGGGGC\n",
-                 ">ESCO.0216.00003\n", "AAAAAATT-TTCCC-CGCGG-\n"]
-    assert lines == exp_lines
+    genomes = ["86KG", "6KG", "GEN1.1", "6KG"]
+    lengths, ranks = pal.build_genome_index(genomes)
+    assert lengths == [3, 4, 6]
+    assert ranks == {"86KG": 0, "6KG": 1, "GEN1.1": 2}
 
 
-def test_read_alignment(caplog):
+def test_get_genome_index():
     """
-    Giving a file with proteins aligned, and a list of genomes, returns, for each genome,
-    the list of sequences found.
+    Check that, with a genome index, headers are assigned to the same genomes as without:
+    genome name must be at the beginning of the header, and if several genome names match,
+    the first one in the list of genomes is returned
     """
-    caplog.set_level(logging.DEBUG)
-    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes.aln")
-    all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
-    seqs = pal.read_alignments(alnfile, all_genomes)
-    exp_seq = {"GEN2.1017.00001": ["AAATCTCGGAGATCTCGCGCGGATATATCGCGCTATAGCGCT",
-                                   "---TTCGCGCGGAGAGGCGCTCTCGGCG",
-                                   "----------------------------------------------------"],
-               "GEN4.1111.00001": ["AAATCTCGGAGTTCTCGCGCGGGTA---CGCGCTATAGCGCT",
-                                   "---TTCGCGCGGAGAGGCGCTCTCG---",
-                                   "CGGTATAGGGCGCTAC----CCGGATATAGGGCTCTCGGAATTCGCAAC-CC"],
-               "GENO.1017.00001": ["-------GGAGATCTCGCGCGGATATATCGCGCTATAGCGCT",
-                                   "AAATTCGCGCGGAGAGGCGCTCTCGAAA",
-                                   "CGGTATAGGGCGCTACTTTTCCGGATATAGGGCTCTCGGAATTCG--ACACC"],
-               "GENO.1216.00002": ["AAATCTCGGAGATCTCGCGCGGATATATAAAACTATAGCGCT",
-                                   "----------------------------",
-                                   "CGGTATGGGGCGCTAC----CCGGATATAGGGCTCTCGGAATTCGCAAC-CG"]
-               }
-    assert seqs == exp_seq
-    assert "3 sequences found per genome" in caplog.text
+    genomes = ["86KG", "6KG", "GEN1", "GEN1.1"]
+    index = pal.build_genome_index(genomes)
+    assert pal.get_genome(">86KG_12345", genomes, index) == "86KG"
+    assert pal.get_genome(">6KG_12345 info", genomes, index) == "6KG"
+    assert pal.get_genome(">GEN1.1_00001", genomes, index) == "GEN1"
+    genomes = ["GEN1.1", "GEN1"]
+    index = pal.build_genome_index(genomes)
+    assert pal.get_genome(">GEN1.1_00001", genomes, index) == "GEN1.1"
+    assert pal.get_genome(">GEN1_00001", genomes, index) == "GEN1"
+    assert pal.get_genome(">GEN", genomes, index) is None
 
 
-def test_read_alignment_diffnbseq(caplog):
+def test_count_alignments(caplog):
     """
-    Giving a file with proteins aligned, and a list of genomes, with 3 proteins for each genome,
-    except for 1 genome which has 4 proteins. Exits with an error message.
+    Giving alignment files and a list of genomes, returns, for each genome, its number of
+    sequences and the total length of its sequences
     """
     caplog.set_level(logging.DEBUG)
-    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes-diffnbseq.aln")
+    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes.aln")
     all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
-    assert pal.read_alignments(alnfile, all_genomes) is None
-    assert ("Problems occurred while grouping alignments by genome: all genomes do not have the "
-            "same number of sequences. Check that each protein name contains the name of the "
-            "genome from which it comes.") in caplog.text
+    index = pal.build_genome_index(all_genomes)
+    rows = pal.count_alignments([alnfile, alnfile], all_genomes, index)
+    assert rows == {genome: [6, 244] for genome in all_genomes}
+    assert pal.check_rows(rows)
+    assert "6 sequences found per genome" in caplog.text
 
 
-def test_read_alignment_nogenome(caplog):
+def test_count_alignments_nogenome(caplog):
     """
     Giving a file with proteins aligned, and a list of genomes, but with one genome missing,
     check that it returns None, and an error message specifying the protein not having a
@@ -155,132 +138,184 @@ def test_read_alignment_nogenome(caplog):
     caplog.set_level(logging.DEBUG)
     alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes-diffnbseq.aln")
     all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
-    assert pal.read_alignments(alnfile, all_genomes) is None
+    index = pal.build_genome_index(all_genomes)
+    assert pal.count_alignments([alnfile], all_genomes, index) is None
     assert ("Protein GENO.1216.00002.i0001_00003 does not correspond to any genome name given... "
             "['GEN2.1017.00001', 'GEN4.1111.00001', 'GENO.1017.00001']") in caplog.text
 
 
-def test_group_by_genome(caplog):
+def test_check_rows_diffnbseq(caplog):
     """
-    Test that giving a file with all proteins aligned, a list of genomes, and an output
-    filename, it writes in output the alignment grouped by genome and returns True
+    Giving a file with proteins aligned, and a list of genomes, with 3 proteins for each genome,
+    except for 1 genome which has 4 proteins. Returns False with an error message.
     """
     caplog.set_level(logging.DEBUG)
-    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes.aln")
+    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes-diffnbseq.aln")
     all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
-    outgrp = os.path.join(GENEPATH, "test_group_by_genome")
-    args = (all_genomes, alnfile, outgrp)
-    assert pal.group_by_genome(args)
-    exp_grp = os.path.join(EXPPATH, "exp_fictive.grp.aln")
-    assert tutil.compare_order_content(outgrp, exp_grp)
-    assert "3 sequences found per genome" in caplog.text
-    assert "Writing alignments per genome" in caplog.text
-
+    index = pal.build_genome_index(all_genomes)
+    assert not pal.check_rows(pal.count_alignments([alnfile], all_genomes, index))
+    assert ("Problems occurred while grouping alignments by genome: all genomes do not have the "
+            "same number of sequences. Check that each protein name contains the name of the "
+            "genome from which it comes.") in caplog.text
 
-def test_group_by_genome_nogenome(caplog):
+def test_check_rows_difflen(caplog):
     """
-    Test that giving a file with all proteins aligned, a list of genomes but with 1 genome missing,
-    it returns False, and an error message with the protein not having a corresponding genome
+    Giving an alignment file where all genomes have the same number of sequences, but
+    1 genome has a longer sequence than the others. Returns False with an error message.
     """
     caplog.set_level(logging.DEBUG)
-    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes.aln")
-    all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
-    outgrp = os.path.join(GENEPATH, "test_group_by_genome")
-    args = (all_genomes, alnfile, outgrp)
-    assert pal.group_by_genome(args) is False
-    assert not os.path.isfile(outgrp)
-    assert ("Protein GENO.1216.00002.i0001_00003 does not correspond to any genome name given... "
-            "['GEN2.1017.00001', 'GEN4.1111.00001', 'GENO.1017.00001']") in caplog.text
+    alnfile = os.path.join(GENEPATH, "difflen.aln")
+    with open(alnfile, "w") as alnf:
+        alnf.write(">GEN1_00001\nAAC-\n>GEN2_00001\nAAC-T\n")
+    all_genomes = ["GEN1", "GEN2"]
+    index = pal.build_genome_index(all_genomes)
+    assert not pal.check_rows(pal.count_alignments([alnfile], all_genomes, index))
+    assert ("Problems occurred while grouping alignments by genome: all genomes do not have the "
+            "same alignment length.") in caplog.text
 
 
-def test_launch_gbg(caplog):
+def test_group_alignments_chunks(caplog):
     """
-    Giving an alignment file, and a list of genomes, and a tree directory, check that it
-    generates the expected filename, with the expected content, and returns True.
+    Giving 2 outputs to create from family alignment files, check that, processed by chunks
+    of families on 2 threads, alignments are grouped by genome as when processed on 1 thread
     """
     caplog.set_level(logging.DEBUG)
-    all_genomes = ["GENO.1216.00002", "GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
-    alnfile = os.path.join(TESTPATH, "complete.cat.pers4genomes.aln")
-    status = "Done"
-    treedir = os.path.join(GENEPATH, "test_phylo-pers4genomes")
-    # Create tree dir, with empty output file
-    os.makedirs(treedir)
-    out_grp = os.path.join(treedir, "TESTlaunch.grp.aln")
-    open(out_grp, "w").close()
-    dname = "TESTlaunch"
-    quiet = False
-    assert pal.launch_group_by_genome(all_genomes, alnfile, status, out_grp, dname, "nucl", quiet) is True
-    exp_grp = os.path.join(EXPPATH, "exp_pers4genomes.grp.aln")
-    assert tutil.compare_order_content(out_grp, exp_grp)
-    assert "Grouping nucl alignments per genome" in caplog.text
+    all_genomes = ["GEN2", "GEN1"]
+    alns = []
+    for num, content in enumerate([">GEN2_00001\nAAC\nT-\n>GEN1_00003\nA-CTT\n",
+                                   ">GEN1_00005\nGG\n>GEN2_00002\n-G\n",
+                                   ">GEN1_00007\nC\n>GEN2_00007\nT\n"]):
+        aln = os.path.join(GENEPATH, f"fam{num}.aln")
+        with open(aln, "w") as alnf:
+            alnf.write(content)
+        alns.append(aln)
+    out1 = os.path.join(GENEPATH, "test_grp1.grp.aln")
+    out2 = os.path.join(GENEPATH, "test_grp2.grp.aln")
+    to_group = [(alns, out1, "nucleic"), (alns[1:], out2, "protein")]
+    assert pal.group_alignments(all_genomes, to_group, 2, False) == [True, True]
+    with open(out1, "r") as outf:
+        assert outf.readlines() == [">GEN1\n", "A-CTTGGC\n", ">GEN2\n", "AACT--GT\n"]
+    with open(out2, "r") as outf:
+        assert outf.readlines() == [">GEN1\n", "GGC\n", ">GEN2\n", "-GT\n"]
+    assert "Grouping nucleic alignments per genome" in caplog.text
+    assert "Grouping protein alignments per genome" in caplog.text
+    assert "3 sequences found per genome" in caplog.text
+    assert "2 sequences found per genome" in caplog.text
+    out3 = os.path.join(GENEPATH, "test_grp3.grp.aln")
+    assert pal.group_alignments(all_genomes, [(alns, out3, "nucleic")], 1, True) == [True]
+    assert tutil.compare_order_content(out1, out3)
 
 
-def test_launch_gbg_existsempty(caplog):
+def test_group_alignments_error(caplog):
     """
-    Giving an alignment file, and a list of genomes, and saying that we did not re-create this
-    concatenated file. As the group by genome file already exists (even if empty...), it won't
-    recreate it, just return None and keep it.
+    Giving 2 outputs to create, 1 of them having a protein which does not correspond to
+    any genome. Check that the other output is created, and only the wrong one fails.
     """
     caplog.set_level(logging.DEBUG)
-    all_genomes = ["GENO.1216.00002", "GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
-    alnfile = os.path.join(TESTPATH, "complete.cat.pers4genomes.aln")
-    status = "OK"
-    treedir = os.path.join(GENEPATH, "test_phylo-pers4genomes")
-    # Create tree dir, with empty output file
-    os.makedirs(treedir)
-    out_grp = os.path.join(treedir, "TESTlaunch.grp.aln")
-    open(out_grp, "w").close()
-    dname = "TESTlaunch"
-    quiet = False
-    assert pal.launch_group_by_genome(all_genomes, alnfile, status, out_grp, dname, "aa", quiet) is True
-    assert "Grouping aa alignments per genome" not in caplog.text
-    with open(out_grp, "r") as outf:
-        assert outf.readlines() == []
-
-
-def test_launch_gbg_ok_notexist(caplog):
+    all_genomes = ["GEN2", "GEN1"]
+    aln_ok = os.path.join(GENEPATH, "fam_ok.aln")
+    aln_wrong = os.path.join(GENEPATH, "fam_wrong.aln")
+    with open(aln_ok, "w") as alnf:
+        alnf.write(">GEN1_00005\nGG\n>GEN2_00002\n-G\n")
+    with open(aln_wrong, "w") as alnf:
+        alnf.write(">GEN1_00005\nGG\n>GEN3_00002\n-G\n")
+    out_ok = os.path.join(GENEPATH, "test_grp_ok.grp.aln")
+    out_wrong = os.path.join(GENEPATH, "test_grp_wrong.grp.aln")
+    to_group = [([aln_ok, aln_wrong], out_wrong, "nucleic"), ([aln_ok], out_ok, "protein")]
+    assert pal.group_alignments(all_genomes, to_group, 2, True) == [False, True]
+    assert not os.path.isfile(out_wrong)
+    with open(out_ok, "r") as outf:
+        assert outf.readlines() == [">GEN1\n", "GG\n", ">GEN2\n", "-G\n"]
+    assert "Protein GEN3_00002 does not correspond to any genome name given" in caplog.text
+
+
+def test_group_alignments_concat(caplog):
     """
-    Giving an alignment file, and a list of genomes, and a tree directory, and saying that we
-    did not re-create this concatenated file. As group by genome file does not exist,
-    it will create it as if concatenation was just done, and return True
+    Test that giving a file with all proteins aligned, a list of genomes, and an output
+    filename, it writes in output the alignment grouped by genome and returns True
     """
     caplog.set_level(logging.DEBUG)
+    alnfile = os.path.join(TESTPATH, "complete.cat.fictive4genomes.aln")
     all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
+    outgrp = os.path.join(GENEPATH, "test_group_by_genome")
+    assert pal.group_alignments(all_genomes, [(alnfile, outgrp, "nucl")], 1, True) == [True]
+    exp_grp = os.path.join(EXPPATH, "exp_fictive.grp.aln")
+    assert tutil.compare_order_content(outgrp, exp_grp)
+    assert "3 sequences found per genome" in caplog.text
+    assert "Writing alignments per genome" in caplog.text
+
+def test_split_alignment():
+    """
+    Test that an alignment file is split into parts starting at a header, covering the whole
+    file, and that reading them gives all lines of the file
+    """
     alnfile = os.path.join(TESTPATH, "complete.cat.pers4genomes.aln")
-    status = "OK"
-    treedir = os.path.join(GENEPATH, "test_phylo-pers4genomes")
-    # Create tree dir
-    os.makedirs(treedir)
-    out_grp = os.path.join(treedir, "TESTlaunch.grp.aln")
-    dname = "TESTlaunch"
-    quiet = False
-    assert pal.launch_group_by_genome(all_genomes, alnfile, status, out_grp, dname, "toto", quiet) is True
+    with open(alnfile, "rb") as alnf:
+        lines = alnf.readlines()
+    size = os.path.getsize(alnfile)
+    for nb_chunks in [1, 3, 8, 1000]:
+        parts = pal.split_alignment(alnfile, nb_chunks)
+        assert 1 <= len(parts) <= nb_chunks
+        assert parts[0][1] == 0
+        assert parts[-1][2] == size
+        assert all(part[2] == nxt[1] for part, nxt in zip(parts, parts[1:]))
+        read = [line for part in parts for line in pal.read_lines(part)]
+        assert read == lines
+        assert all(next(pal.read_lines(part)).startswith(b">") for part in parts)
+    # 1 part per sequence at most
+    assert len(pal.split_alignment(alnfile, 1000)) == sum(line.startswith(b">")
+                                                          for line in lines)
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_group_alignments_concat_chunks(threads, caplog):
+    """
+    Giving the concatenated alignment file of persistent families of 4 genomes, check that
+    it is grouped by genome as expected, when split into chunks processed in parallel
+    """
+    caplog.set_level(logging.DEBUG)
+    all_genomes = ["GENO.1216.00002", "GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
+    alnfile = os.path.join(TESTPATH, "complete.cat.pers4genomes.aln")
+    out_grp = os.path.join(GENEPATH, "TESTlaunch.grp.aln")
+    assert pal.group_alignments(all_genomes, [(alnfile, out_grp, "nucl")], threads,
+                                False) == [True]
     exp_grp = os.path.join(EXPPATH, "exp_pers4genomes.grp.aln")
     assert tutil.compare_order_content(out_grp, exp_grp)
-    assert "Grouping toto alignments per genome" in caplog.text
+    assert "Grouping nucl alignments per genome" in caplog.text
 
 
-def test_launch_gbg_nogenome(caplog):
+def test_group_alignments_concat_nogenome(caplog):
     """
-    Giving an alignment file, and a list of genomes with one genome missing, check that it
-    returns False, with an error message for the protein not having a corresponding genome,
-    and does not create grp file
+    Giving the concatenated alignment file, and a list of genomes with one genome missing,
+    check that it returns False, with an error message for the protein not having a
+    corresponding genome, and does not create grp file
     """
     caplog.set_level(logging.DEBUG)
     all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
     alnfile = os.path.join(TESTPATH, "complete.cat.pers4genomes.aln")
-    status = "OK"
-    treedir = os.path.join(GENEPATH, "test_phylo-pers4genomes")
-    # Create tree dir
-    os.makedirs(treedir)
-    out_grp = os.path.join(treedir, "TESTlaunch.grp.aln")
-    dname = "TESTlaunch"
-    quiet = False
-    assert pal.launch_group_by_genome(all_genomes, alnfile, status, treedir, dname, "nn", quiet) is False
+    out_grp = os.path.join(GENEPATH, "TESTlaunch.grp.aln")
+    assert pal.group_alignments(all_genomes, [(alnfile, out_grp, "nn")], 2, True) == [False]
     assert not os.path.isfile(out_grp)
     assert "Grouping nn alignments per genome" in caplog.text
+    assert "Protein GENO.1216.00002.i0001_00003 does not correspond to any genome" in caplog.text
 
 
+def test_check_grouped(caplog):
+    """
+    Check that an existing grouped file is kept (even if empty) if the concatenated file was
+    not re-created, and removed if it was just re-created
+    """
+    caplog.set_level(logging.DEBUG)
+    out_grp = os.path.join(GENEPATH, "TESTlaunch.grp.aln")
+    assert not pal.check_grouped(out_grp, "OK", "aa")
+    open(out_grp, "w").close()
+    assert pal.check_grouped(out_grp, "OK", "aa")
+    assert "aa alignments already grouped by genome" in caplog.text
+    with open(out_grp, "r") as outf:
+        assert outf.readlines() == []
+    assert not pal.check_grouped(out_grp, "Done", "aa")
+    assert not os.path.isfile(out_grp)
+
 def test_concat_nucl(caplog):
     """
     Given a list of families, and a directory where are alignment files, check that the files
@@ -313,6 +348,29 @@ def test_concat_nucl(caplog):
     assert "Concatenating all nucl alignment files" in caplog.text
 
 
+def test_concat_threads(caplog):
+    """
+    Check that concatenating alignment files with several threads gives the same file as
+    with 1 thread
+    """
+    caplog.set_level(logging.DEBUG)
+    aldir = os.path.join(GENEPATH, "test_concat_aldir")
+    dname = "TEST-concat"
+    prefix = os.path.join(aldir, dname)
+    os.makedirs(aldir)
+    shutil.copyfile(os.path.join(EXPPATH, "exp_aldir", "mafft-prt2nuc.1.aln"),
+                    prefix + "-mafft-prt2nuc.1.aln")
+    for num in [8, 11]:
+        shutil.copyfile(os.path.join(EXPPATH, "exp_aldir-pers", f"mafft-prt2nuc.{num}.aln"),
+                        prefix + f"-mafft-prt2nuc.{num}.aln")
+    for threads in [2, 3, 8]:
+        output, mess = pal.concat_alignments([1, 8, 11], prefix, "nucl", True, threads)
+        ref_concat = os.path.join(EXPPATH, "exp_concat_4genomes-fam1-8-11.aln")
+        assert tutil.compare_order_content(output, ref_concat)
+        assert mess == "Done"
+        os.remove(output)
+
+
 def test_concat_aa(caplog):
     """
     Given a list of families, and a directory where are alignment files, check that the files
@@ -528,6 +586,45 @@ def test_postalign(caplog):
     assert "Grouping protein alignments per genome" in caplog.text
 
 
+def test_postalign_noconcat(caplog):
+    """
+    Test that when running post-alignment without concatenation, it does not create the
+    concatenated alignments, but creates the same alignments grouped by genome as with
+    concatenation. Running it again does not redo grouped files, as they are more recent
+    than all family alignments. Nucleic and protein alignments are grouped on 2 threads.
+    """
+    caplog.set_level(logging.DEBUG)
+    fam_nums = [1, 8, 11]
+    all_genomes = ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
+    outdir = os.path.join(GENEPATH, "test_post-align")
+    aldir = os.path.join(outdir, "aldir_post-align")
+    os.makedirs(aldir)
+    dname = "TESTpost"
+    prefix = os.path.join(aldir, dname)
+    for num, folder in [(1, "exp_aldir"), (8, "exp_aldir-pers"), (11, "exp_aldir-pers")]:
+        shutil.copyfile(os.path.join(EXPPATH, folder, f"mafft-prt2nuc.{num}.aln"),
+                        f"{prefix}-mafft-prt2nuc.{num}.aln")
+        ali = f"mafft-align.{num}.aln" if num != 8 else "mafft-align.8-completed.aln"
+        shutil.copyfile(os.path.join(EXPPATH, folder, ali), f"{prefix}-mafft-align.{num}.aln")
+    out_grp = pal.post_alignment(fam_nums, all_genomes, prefix, outdir, dname, True, True,
+                                 concat=False, threads=2)
+    assert not os.path.isfile(os.path.join(aldir, dname + "-complete.nucl.cat.aln"))
+    assert not os.path.isfile(os.path.join(aldir, dname + "-complete.aa.cat.aln"))
+    treedir = os.path.join(outdir, "Phylo-" + dname)
+    assert out_grp == os.path.join(treedir, dname + ".nucl.grp.aln")
+    exp_grp = os.path.join(EXPPATH, "exp_grp_4genomes-fam1-8-11.aln")
+    assert tutil.compare_order_content(out_grp, exp_grp)
+    out_grp_aa = os.path.join(treedir, dname + ".aa.grp.aln")
+    exp_grp_aa = os.path.join(EXPPATH, "exp_grp_4genomes-fam1-8-11.aa.aln")
+    assert tutil.compare_order_content(out_grp_aa, exp_grp_aa)
+    assert "Concatenating all" not in caplog.text
+    assert "Grouping nucleic alignments per genome" in caplog.text
+    # Run again: grouped files are up to date, they are kept
+    pal.post_alignment(fam_nums, all_genomes, prefix, outdir, dname, True, True, concat=False)
+    assert "nucleic alignments already grouped by genome" in caplog.text
+    assert "protein alignments already grouped by genome" in caplog.text
+
+
 def test_postalign_aa_missalign(caplog):
     """
     Test that when running post-alignment on a folder containing all expected alignment files
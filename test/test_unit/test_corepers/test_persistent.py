@@ -10,6 +10,7 @@ import pytest
 import shutil
 
 import PanACoTA.corepers_module.persistent_functions as persf
+from PanACoTA import utils_pangenome as utilsp
 import test.test_unit.utilities_for_tests as tutils
 
 
@@ -415,3 +416,129 @@ def test_get_99pers_multi(caplog):
     assert exp_fams == fams
     assert ("The persistent genome contains 4 families with members present in "
             "at least 4 different genomes (99.0% of the total number of genomes).") in caplog.text
+
+
+def test_fam_stats():
+    """
+    Test that, from the count matrix, we get the expected number of genomes present, number of
+    genomes with exactly 1 member and max number of members for each family
+    """
+    all_strains = ["GEN4.1111.00001", "GENO.0817.00001", "GENO.1216.00002", "GENO.1216.00003"]
+    matrix, fam_nums = utilsp.build_count_matrix(FAMS_BY_STRAIN, all_strains)
+    nb_present, nb_mono, max_members = persf.get_fam_stats(matrix)
+    assert fam_nums[:4] == ['1', '2', '3', '4']
+    assert list(nb_present[:4]) == [4, 1, 4, 1]
+    assert list(nb_mono[:4]) == [3, 1, 4, 1]
+    assert list(max_members[:4]) == [2, 1, 1, 1]
+
+
+@pytest.mark.parametrize("tol, multi, mixed, floor",
+                         [(1, False, False, False), (1, True, False, False),
+                          (0.99, False, False, True), (0.99, False, True, True),
+                          (0.99, True, False, True), (0.99, False, False, False),
+                          (0.99, False, True, False), (0.99, True, False, False),
+                          (0.5, False, True, False), (0.3, False, False, True)])
+def test_get_pers_matrix(tol, multi, mixed, floor, caplog):
+    """
+    Check that persistent genomes computed from the count matrix are the same as the ones
+    computed from the families by strain, with the same log message
+    """
+    caplog.set_level(logging.DEBUG)
+    all_strains = ["GEN4.1111.00001", "GENO.0817.00001", "GENO.1216.00002", "GENO.1216.00003"]
+    exp_fams = persf.get_pers(FAMS_BY_STRAIN, FAMILIES, 4, tol=tol, multi=multi,
+                              mixed=mixed, floor=floor)
+    exp_log = caplog.records[-1].message
+    matrix, fam_nums = utilsp.build_count_matrix(FAMS_BY_STRAIN, all_strains)
+    fams = persf.get_pers_matrix(matrix, fam_nums, FAMILIES, 4, tol=tol, multi=multi,
+                                 mixed=mixed, floor=floor)
+    assert fams == exp_fams
+    assert caplog.records[-1].message == exp_log
+
+
+def test_genome_mask():
+    """
+    Test that the mask of genomes has True only for columns of genomes in the given list
+    (genomes not in the pangenome are ignored)
+    """
+    all_strains = ["GEN4.1111.00001", "GENO.0817.00001", "GENO.1216.00002", "GENO.1216.00003"]
+    mask = persf.get_genome_mask(all_strains, ["GENO.1216.00003", "GEN4.1111.00001",
+                                               "GENO.0000.00001"])
+    assert list(mask) == [True, False, False, True]
+
+
+@pytest.mark.parametrize("tol, multi, mixed, floor",
+                         [(1, False, False, False), (1, True, False, False),
+                          (0.99, False, True, True), (0.99, True, False, True),
+                          (0.5, False, False, False), (0.3, False, False, True)])
+def test_get_subset_pers(tol, multi, mixed, floor, caplog):
+    """
+    Check that the persistent genome of a subset of genomes, computed from the count matrix,
+    is the same as the one computed from the subset of families by strain
+    """
+    caplog.set_level(logging.DEBUG)
+    all_strains = ["GEN4.1111.00001", "GENO.0817.00001", "GENO.1216.00002", "GENO.1216.00003"]
+    lstinfo = os.path.join(GENEPATH, "lstinfo-ok.lst")
+    with open(lstinfo, "w") as lst:
+        lst.write("GEN4.1111.00001 toto we don't use other fields\n")
+        lst.write("GENO.1216.00003\n")
+        lst.write("GENO.1216.00002\n")
+    fbs, fam, genomes = persf.get_subset_genomes(FAMS_BY_STRAIN, FAMILIES, lstinfo)
+    exp_fams = persf.get_pers(fbs, fam, len(genomes), tol=tol, multi=multi, mixed=mixed,
+                              floor=floor)
+    matrix, fam_nums = utilsp.build_count_matrix(FAMS_BY_STRAIN, all_strains)
+    sub_matrix, list_genomes = persf.get_subset_matrix(matrix.tocsc(), all_strains, lstinfo)
+    assert sub_matrix.shape == (14, 3)
+    assert list_genomes == genomes
+    fams = persf.get_subset_pers(sub_matrix, fam_nums, FAMS_BY_STRAIN, list_genomes, tol=tol,
+                                 multi=multi, mixed=mixed, floor=floor)
+    assert {num: sorted(mems) for num, mems in fams.items()} == \
+           {num: sorted(mems) for num, mems in exp_fams.items()}
+
+
+def test_read_subset_lists_dir():
+    """
+    Test that, when a directory is given, all its (non hidden) files are used as subset lists
+    """
+    subdir = os.path.join(GENEPATH, "subsets")
+    os.makedirs(os.path.join(subdir, "folder"))
+    for name in ["cladeB.lst", "cladeA.lst", ".hidden"]:
+        open(os.path.join(subdir, name), "w").close()
+    assert persf.read_subset_lists(subdir) == [os.path.join(subdir, "cladeA.lst"),
+                                               os.path.join(subdir, "cladeB.lst")]
+
+
+def test_read_subset_lists_same_name(caplog):
+    """
+    Test that, when a manifest gives 2 list files with the same name (in different
+    directories), it exits with an error, as their output files would have the same name
+    """
+    caplog.set_level(logging.DEBUG)
+    for clade in ["cladeA", "cladeB"]:
+        os.makedirs(os.path.join(GENEPATH, clade))
+        open(os.path.join(GENEPATH, clade, "list.txt"), "w").close()
+    open(os.path.join(GENEPATH, "other.txt"), "w").close()
+    manifest = os.path.join(GENEPATH, "manifest.txt")
+    with open(manifest, "w") as manf:
+        manf.write("cladeA/list.txt\nother.txt\ncladeB/list.txt\n")
+    with pytest.raises(SystemExit):
+        persf.read_subset_lists(manifest)
+    assert ("Output files are named after list files, so list files given in "
+            "test/data/persgenome/generated_by_unit-tests/manifest.txt must have different "
+            "names. Rename the following ones: "
+            "test/data/persgenome/generated_by_unit-tests/cladeA/list.txt, "
+            "test/data/persgenome/generated_by_unit-tests/cladeB/list.txt") in caplog.text
+
+
+def test_read_subset_lists_missing(caplog):
+    """
+    Test that, when a manifest gives a list file which does not exist, it exits with an error
+    """
+    caplog.set_level(logging.DEBUG)
+    manifest = os.path.join(GENEPATH, "manifest.txt")
+    with open(manifest, "w") as manf:
+        manf.write("clade1.lst\n")
+    with pytest.raises(SystemExit):
+        persf.read_subset_lists(manifest)
+    assert ("The following list files, given in test/data/persgenome/generated_by_unit-tests/"
+            "manifest.txt, do not exist: test/data/persgenome/generated_by_unit-tests/"
+            "clade1.lst") in caplog.text
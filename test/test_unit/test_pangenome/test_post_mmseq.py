@@ -245,4 +245,19 @@ def test_all_post():
 
     # Check that bin pangenome file was created (as it did not exist before)
     assert os.path.isfile(pangenome + ".bin")
-    
\ No newline at end of file
+    
+
+def test_all_post_sparse():
+    """
+    Check that when asking for a sparse output, post-treatment also saves the quantitative
+    matrix in npz format, with the same values as the text matrix
+    """
+    from PanACoTA import utils_pangenome as utilsp
+    pangenome = os.path.join(GENEPATH, "test_all_post_sparse")
+    post.post_treat(FAMILIES, pangenome, sparse_fmt="npz")
+    assert tutil.compare_order_content(pangenome + ".quanti.txt", EXP_QUANTIF)
+    assert os.path.isfile(pangenome + ".quanti.npz")
+    matrix, fam_nums, genomes = utilsp.load_sparse_matrix(pangenome + ".quanti.npz")
+    assert genomes == ALL_STRAINS
+    for row, fam_num in enumerate(fam_nums):
+        assert list(matrix[row].toarray()[0]) == EXP_QUANTIS[fam_num]
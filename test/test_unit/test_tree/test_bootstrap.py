@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Unit tests for bootstrap submodule of tree_module
+"""
+
+import os
+import pytest
+import shutil
+import logging
+import numpy as np
+
+import PanACoTA.tree_module.bootstrap as bt
+from PanACoTA import utils
+from PanACoTA import utils_alignment
+from . import utilities as tree_util
+
+ALPATH = os.path.join("test", "data", "align")
+ALIGNMENT = os.path.join(ALPATH, "exp_files", "exp_pers4genomes.grp.aln")
+TREEPATH = os.path.join("test", "data", "tree")
+GENEPATH = os.path.join(TREEPATH, "generated_by_unit-tests")
+LOGFILE_BASE = "log_test_bootstrap"
+LOGFILES = [LOGFILE_BASE + ext for ext in [".log", ".log.debug", ".log.details", ".log.err"]]
+MAIN_TREE = "((A:0.1,B:0.2)0.9:0.05,(C:0.1,D:0.3):0.02,E:0.4);"
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown_module():
+    """
+    Before each test: init logger, and create directory to put generated files
+    After: remove log files, and directory with generated results
+    """
+    utils.init_logger(LOGFILE_BASE, 0, 'test_bootstrap', verbose=1)
+    os.mkdir(GENEPATH)
+    print("setup")
+
+    yield
+    for f in LOGFILES:
+        if os.path.exists(f):
+            os.remove(f)
+    shutil.rmtree(GENEPATH)
+    print("teardown")
+
+
+def test_replicate_weights():
+    """
+    Test that a replicate has as many columns as the alignment, only from its site patterns,
+    and that the same seed gives the same replicate
+    """
+    weights = np.array([10, 0, 5, 85])
+    rep = bt.get_replicate_weights(weights, np.random.default_rng([3, 1]))
+    assert rep.sum() == 100
+    assert rep[1] == 0
+    assert np.array_equal(rep, bt.get_replicate_weights(weights,
+                                                        np.random.default_rng([3, 1])))
+    reps = [bt.get_replicate_weights(weights, np.random.default_rng([3, num]))
+            for num in range(5)]
+    assert len({tuple(rep) for rep in reps}) > 1
+
+
+def test_write_replicate():
+    """
+    Test that each site pattern is written as many times as its weight, with gaps for all
+    characters which are not nucleotides
+    """
+    outfile = os.path.join(GENEPATH, "replicate.aln")
+    patterns = np.array([[0, 1, 4], [3, 2, 0]], dtype=np.uint8)
+    bt.write_replicate(["s1", "s2"], patterns, np.array([2, 0, 3]), outfile)
+    with open(outfile) as outf:
+        assert outf.read() == ">s1\nAA---\n>s2\nTTAAA\n"
+
+
+def test_read_write_newick():
+    """
+    Test that a tree read and written again is unchanged (except spaces and quotes)
+    """
+    root = bt.read_newick(MAIN_TREE)
+    assert len(root["children"]) == 3
+    assert root["children"][0]["label"] == "0.9"
+    assert root["children"][0]["length"] == "0.05"
+    assert root["children"][0]["children"][1] == {"children": [], "label": "B",
+                                                   "length": "0.2"}
+    assert bt.write_newick(root) == MAIN_TREE
+    root = bt.read_newick("(('gen 1':1, gen2:2)\n, gen3);\n")
+    assert bt.write_newick(root) == "((gen 1:1,gen2:2),gen3);"
+    assert bt.get_leaves(root) == {"gen 1", "gen2", "gen3"}
+
+
+def test_read_newick_errors():
+    """
+    Test that a newick which is not well formed raises a ValueError
+    """
+    with pytest.raises(ValueError) as err:
+        bt.read_newick("((A,B),C;")
+    assert "Expected ')'" in str(err.value)
+    with pytest.raises(ValueError) as err:
+        bt.read_newick("((A,B),C)")
+    assert "Expected ';' at the end of newick tree" in str(err.value)
+    with pytest.raises(ValueError) as err:
+        bt.read_newick("(('A,B),C);")
+    assert "Unclosed quote" in str(err.value)
+
+
+def test_get_splits():
+    """
+    Test that bipartitions do not depend on the root of the tree, and are given as bitmasks
+    of the leaves, in alphabetical order. Trivial bipartitions are not given.
+    """
+    leaf_bits = bt.get_leaf_bits(frozenset("EDCBA"))
+    assert leaf_bits == {"A": 1, "B": 2, "C": 4, "D": 8, "E": 16}
+    splits = bt.get_splits(bt.read_newick(MAIN_TREE), leaf_bits)
+    # CD|ABE, and AB|CDE given by its side without A
+    assert splits == {4 + 8, 4 + 8 + 16}
+    rerooted = bt.get_splits(bt.read_newick("(A:1,(B:1,((C:1,D:1):1,E:1):1):1);"), leaf_bits)
+    assert rerooted == splits
+    with pytest.raises(ValueError) as err:
+        bt.get_splits(bt.read_newick("((A,B),(C,D),F);"), leaf_bits)
+    assert "leaf F is not in the main tree" in str(err.value)
+
+
+def test_deep_tree(caplog):
+    """
+    Test that a ladder tree with thousands of leaves is read, written, and gets its
+    bootstrap supports
+    """
+    caplog.set_level(logging.DEBUG)
+    nb_leaves = 5000
+    names = [f"L{num:05d}" for num in range(nb_leaves)]
+    main_tree = names[0]
+    for name in names[1:]:
+        main_tree = f"({main_tree}:1,{name}:1)"
+    main_tree += ";"
+    root = bt.read_newick(main_tree)
+    assert bt.write_newick(root) == main_tree
+    assert bt.get_leaves(root) == set(names)
+    leaf_bits = bt.get_leaf_bits(bt.get_leaves(root))
+    # All internal branches (except the 2 around the root, and the cherry) are non trivial
+    assert len(bt.get_splits(root, leaf_bits)) == nb_leaves - 3
+    # Replicate: the same ladder, with the 2 first leaves swapped with the 2 last ones
+    rep_names = names[-2:] + names[2:-2] + names[:2]
+    rep_tree = rep_names[0]
+    for name in rep_names[1:]:
+        rep_tree = f"({rep_tree},{name})"
+    treefile = os.path.join(GENEPATH, "main.nwk")
+    with open(treefile, "w") as treef:
+        treef.write(main_tree + "\n")
+    bt.write_supports(treefile, [rep_tree + ";", main_tree])
+    with open(treefile) as treef:
+        root = bt.read_newick(treef.read())
+    supports = [node["label"] for node in bt.iter_postorder(root)
+                if node["children"] and node is not root]
+    assert len(supports) == nb_leaves - 2
+    assert set(supports) == {"50", "100"}
+    assert "Bootstrap supports added to" in caplog.text
+
+
+def test_add_supports():
+    """
+    Test that each internal branch gets the percentage of replicates containing its
+    bipartition, and that bipartitions separating 1 leaf get 100
+    """
+    root = bt.read_newick(MAIN_TREE)
+    trees = ["((A,B),(C,D),E);", "(A,(B,(C,D)),E);", "(((A,C),B),D,E);",
+             "((A,B),(C,E),D);"]
+    bt.add_supports(root, trees)
+    assert bt.write_newick(root) == "((A:0.1,B:0.2)50:0.05,(C:0.1,D:0.3)50:0.02,E:0.4);"
+    root = bt.read_newick("((A:1,B:1):1,(C:1,(D:1,E:1):1):1);")
+    bt.add_supports(root, trees)
+    # (C,(D,E)) separates A and B from the other leaves, as (A,B)
+    assert bt.write_newick(root) == "((A:1,B:1)50:1,(C:1,(D:1,E:1)25:1)50:1);"
+    root = bt.read_newick("((A:1,(B:1,C:1):1):1,D:1);")
+    bt.add_supports(root, ["((A,B),C,D);"])
+    # (A,(B,C)) only separates D
+    assert bt.write_newick(root) == "((A:1,(B:1,C:1)0:1)100:1,D:1);"
+
+
+def test_write_supports(caplog):
+    """
+    Test that supports are written to the main tree file, and replicate trees to the given
+    file
+    """
+    caplog.set_level(logging.DEBUG)
+    treefile = os.path.join(GENEPATH, "main.nwk")
+    with open(treefile, "w") as treef:
+        treef.write(MAIN_TREE + "\n")
+    bootfile = os.path.join(GENEPATH, "boot.nwk")
+    trees = ["((A,B),(C,D),E);", "((A,B),C,(D,E));"]
+    bt.write_supports(treefile, trees, bootfile)
+    with open(treefile) as treef:
+        assert treef.read() == "((A:0.1,B:0.2)100:0.05,(C:0.1,D:0.3)50:0.02,E:0.4);\n"
+    assert tree_util.is_tree_bootstrap(treefile)
+    with open(bootfile) as bootf:
+        assert bootf.read() == "((A,B),(C,D),E);\n((A,B),C,(D,E));\n"
+    assert "Bootstrap supports added to" in caplog.text
+
+
+def test_write_supports_error(caplog):
+    """
+    Test that when replicate trees do not have the same leaves as the main tree, it exits
+    with an error message
+    """
+    treefile = os.path.join(GENEPATH, "main.nwk")
+    with open(treefile, "w") as treef:
+        treef.write(MAIN_TREE)
+    with pytest.raises(SystemExit):
+        bt.write_supports(treefile, ["((A,B),(C,D),F);"])
+    assert ("Cannot add bootstrap supports to test/data/tree/generated_by_unit-tests/main.nwk: "
+            "leaves of replicate trees are not the leaves of the main tree") in caplog.text
+    with open(treefile) as treef:
+        assert treef.read() == MAIN_TREE
+
+
+def test_run_bootstraps(caplog):
+    """
+    Test inferring trees of bootstrap replicates with quicktree, from distance matrices:
+    replicate files are removed, and all trees have the leaves of the alignment
+    """
+    caplog.set_level(logging.DEBUG)
+    trees = bt.run_bootstraps(ALIGNMENT, GENEPATH, "quicktree", None, 5, 1,
+                              distances="JC69", seed=12)
+    assert len(trees) == 5
+    names, _, _ = utils_alignment.get_site_patterns(ALIGNMENT)
+    for newick in trees:
+        assert bt.get_leaves(bt.read_newick(newick)) == set(names)
+    assert os.listdir(GENEPATH) == []
+    assert "Inferring trees of 5 bootstrap replicates with quicktree, in 1 processes" in caplog.text
@@ -12,6 +12,7 @@ import shutil
 
 import PanACoTA.tree_module.fastme_func as fme
 from PanACoTA import utils
+from PanACoTA import utils_alignment
 import test.test_unit.utilities_for_tests as tutil
 from . import utilities as tree_util
 
@@ -19,6 +20,8 @@ from . import utilities as tree_util
 # Define common variables
 ALPATH = os.path.join("test", "data", "align")
 ALIGNMENT = os.path.join(ALPATH, "exp_files", "exp_pers4genomes.grp.aln")
+# Order of sequences in the alignment used to make expected PHYLIP and Stockholm files
+EXP_ORDER = ["GENO.1216.00002", "GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
 TREEPATH = os.path.join("test", "data", "tree")
 EXPPATH = os.path.join(TREEPATH, "exp_files")
 GENEPATH = os.path.join(TREEPATH, "generated_by_unit-tests")
@@ -53,18 +56,37 @@ def setup_teardown_module():
 
 def test_convert_phylip(caplog):
     """
-    Test that when giving a valid fasta alignment file, it converts it to Stockholm format,
-    as expected.
+    Test that when giving a valid fasta alignment file, it converts it to PHYLIP format,
+    as expected, keeping the order of sequences of the alignment.
     """
     caplog.set_level(logging.DEBUG)
+    align = os.path.join(GENEPATH, "pers4genomes.aln")
+    tutil.reorder_fasta(ALIGNMENT, align, EXP_ORDER)
     outfile = os.path.join(GENEPATH, "test_2phylip")
-    fme.convert2phylip(ALIGNMENT, outfile)
+    fme.convert2phylip(align, outfile)
     exp_stk = os.path.join(EXPPATH, "exp_align_phylip.ph")
     assert os.path.isfile(outfile)
-    tutil.compare_order_content(outfile, exp_stk)
+    assert tutil.compare_order_content(outfile, exp_stk)
     assert "Converting fasta alignment to PHYLIP-relaxed format" in caplog.text
 
 
+def test_convert_phylip_error(caplog):
+    """
+    Test that when sequences of the alignment do not have the same length, it exits with an
+    error message, and does not leave a partial phylip file
+    """
+    caplog.set_level(logging.DEBUG)
+    align = os.path.join(GENEPATH, "wrong.aln")
+    with open(align, "w") as alnf:
+        alnf.write(">s1\nACGT\n>s2\nACG\n")
+    outfile = os.path.join(GENEPATH, "wrong.phylip")
+    with pytest.raises(SystemExit):
+        fme.convert2phylip(align, outfile)
+    assert ("Cannot convert test/data/tree/generated_by_unit-tests/wrong.aln to PHYLIP-relaxed "
+            "format: Sequence s2 has a different length (3)") in caplog.text
+    assert not os.path.isfile(outfile)
+
+
 def test_convert_exists(caplog):
     """
     Test that when asking to convert a file in phylip format, but output file already exists,
@@ -255,3 +277,21 @@ def test_run_tree(caplog):
     # bootfile = os.path.join(GENEPATH, "exp_pers4genomes.grp.aln.phylip.fastme_bootstraps.nwk")
     assert os.path.isfile(bootfile)
 
+
+
+def test_run_tree_matrix(caplog):
+    """
+    Test generating tree from a distance matrix with fastme: no conversion, and no model
+    given to fastme
+    """
+    caplog.set_level(logging.DEBUG)
+    matrix = os.path.join(GENEPATH, "exp_pers4genomes.grp.K2P.dist")
+    utils_alignment.write_distances(ALIGNMENT, matrix, "K2P")
+    fme.run_tree(matrix, None, GENEPATH, False, 2, model=None, wb=False, matrix=True)
+    assert "Converting fasta alignment" not in caplog.text
+    assert ("fastme -i test/data/tree/generated_by_unit-tests/exp_pers4genomes.grp.K2P.dist "
+            " -nB -s -T 2  -o test/data/tree/generated_by_unit-tests/"
+            "exp_pers4genomes.grp.K2P.dist.fastme_tree.nwk") in caplog.text
+    treefile = os.path.join(GENEPATH, "exp_pers4genomes.grp.K2P.dist.fastme_tree.nwk")
+    assert tree_util.is_tree_lengths(treefile)
+    assert not tree_util.is_tree_bootstrap(treefile)
@@ -12,12 +12,15 @@ import logging
 
 import PanACoTA.tree_module.quicktree_func as qt
 from PanACoTA import utils
+from PanACoTA import utils_alignment
 from . import utilities as tree_util
 import test.test_unit.utilities_for_tests as tutil
 
 # Define common variables
 ALPATH = os.path.join("test", "data", "align")
 ALIGNMENT = os.path.join(ALPATH, "exp_files", "exp_pers4genomes.grp.aln")
+# Order of sequences in the alignment used to make expected PHYLIP and Stockholm files
+EXP_ORDER = ["GENO.1216.00002", "GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
 TREEPATH = os.path.join("test", "data", "tree")
 EXPPATH = os.path.join(TREEPATH, "exp_files")
 GENEPATH = os.path.join(TREEPATH, "generated_by_unit-tests")
@@ -53,17 +56,36 @@ def setup_teardown_module():
 def test_convert_stockholm(caplog):
     """
     Test that when giving a valid fasta alignment file, it converts it to Stockholm format,
-    as expected.
+    as expected, keeping the order of sequences of the alignment.
     """
     caplog.set_level(logging.DEBUG)
+    align = os.path.join(GENEPATH, "pers4genomes.aln")
+    tutil.reorder_fasta(ALIGNMENT, align, EXP_ORDER)
     outfile = os.path.join(GENEPATH, "test_2stockholm")
-    qt.convert2stockholm(ALIGNMENT, outfile)
+    qt.convert2stockholm(align, outfile)
     exp_stk = os.path.join(EXPPATH, "exp_align_stockholm.stk")
     assert os.path.isfile(outfile)
-    tutil.compare_order_content(outfile, exp_stk)
+    assert tutil.compare_order_content(outfile, exp_stk)
     assert "Converting fasta alignment to stockholm format" in caplog.text
 
 
+def test_convert_stockholm_error(caplog):
+    """
+    Test that when 2 sequences of the alignment have the same name, it exits with an error
+    message, and does not leave a partial stockholm file
+    """
+    caplog.set_level(logging.DEBUG)
+    align = os.path.join(GENEPATH, "wrong.aln")
+    with open(align, "w") as alnf:
+        alnf.write(">s1\nACGT\n>s1\nACGA\n")
+    outfile = os.path.join(GENEPATH, "wrong.stockholm")
+    with pytest.raises(SystemExit):
+        qt.convert2stockholm(align, outfile)
+    assert ("Cannot convert test/data/tree/generated_by_unit-tests/wrong.aln to Stockholm "
+            "format: Several sequences are named 's1'") in caplog.text
+    assert not os.path.isfile(outfile)
+
+
 def test_convert_exists(caplog):
     """
     Test that when asking to convert a file in stockholm format, but output file already exists,
@@ -115,6 +137,22 @@ def test_run_quicktree_boot_notree(caplog):
     assert tree_util.is_tree_bootstrap(treefile)
 
 
+def test_run_tree_matrix(caplog):
+    """
+    Test generating phylogenetic tree from a distance matrix with quicktree: no conversion
+    """
+    caplog.set_level(logging.DEBUG)
+    matrix = os.path.join(GENEPATH, "exp_pers4genomes.grp.JC69.dist")
+    utils_alignment.write_distances(ALIGNMENT, matrix, "JC69")
+    qt.run_tree(matrix, None, GENEPATH, matrix=True)
+    assert "Converting fasta alignment" not in caplog.text
+    assert ("quicktree -in m -out t  test/data/tree/generated_by_unit-tests/"
+            "exp_pers4genomes.grp.JC69.dist") in caplog.text
+    treefile = os.path.join(GENEPATH, "exp_pers4genomes.grp.JC69.dist.quicktree_tree.nwk")
+    assert tree_util.is_tree_lengths(treefile)
+    assert not tree_util.is_tree_bootstrap(treefile)
+
+
 def test_run_twice(caplog):
     """
     Test generating phylogenetic tree from fasta alignment with quicktree
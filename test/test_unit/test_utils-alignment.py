@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Unit tests for the utils_alignment submodule of PanACoTA
+"""
+import os
+import shutil
+import pytest
+import numpy as np
+
+from PanACoTA import utils_alignment as ualn
+import test.test_unit.utilities_for_tests as tutil
+
+
+# Define common variables
+ALDIR = os.path.join("test", "data", "align")
+GRP_ALN = os.path.join(ALDIR, "exp_files", "exp_pers4genomes.grp.aln")
+# Order of sequences in the alignment used to make expected PHYLIP and Stockholm files
+EXP_ORDER = ["GENO.1216.00002", "GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001"]
+GENEPATH = os.path.join(ALDIR, "generated_by_unit-tests")
+TREE_EXP = os.path.join("test", "data", "tree", "exp_files")
+# 3 sequences of 7 columns: 2 constant A, 2 constant C, 1 only gaps, 1 variable with a
+# singleton (T, A, T), 1 variable (T, A, -), written on lines of 5 characters
+SMALL_ALN = b">s1 desc\nACGT-\nAC\n>s2\nACGA-\nNC\n>s3\nACTT-\nA-\n\n"
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown_module():
+    """
+    Before each test: create directory to put generated files
+    After: remove directory with generated results
+    """
+    os.mkdir(GENEPATH)
+    print("setup")
+
+    yield
+    shutil.rmtree(GENEPATH)
+    print("teardown")
+
+
+def test_index_wrapped():
+    """
+    Test that sequences written on several lines of the same width are found
+    """
+    names, starts, widths, length = ualn.get_alignment_index(SMALL_ALN)
+    assert names == ["s1", "s2", "s3"]
+    assert starts == [9, 22, 35]
+    assert widths == [5, 5, 5]
+    assert length == 7
+
+
+def test_index_oneline():
+    """
+    Test that sequences written on a single line are found
+    """
+    with open(GRP_ALN, "rb") as alnf:
+        content = alnf.read()
+    names, starts, widths, length = ualn.get_alignment_index(content)
+    assert names == ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001",
+                     "GENO.1216.00002"]
+    assert length == 6438
+    assert widths == [6438] * 4
+    assert content[starts[1] - 1:starts[1]] == b"\n"
+
+
+def test_index_errors():
+    """
+    Test that an alignment with sequences of different lengths, or not written on lines of
+    the same width, raises a ValueError
+    """
+    with pytest.raises(ValueError) as err:
+        ualn.get_alignment_index(b">s1\nACGT\n>s2\nACG\n")
+    assert "Sequence s2 has a different length (3) from previous sequences (4)" in str(err.value)
+    with pytest.raises(ValueError) as err:
+        ualn.get_alignment_index(b">s1\nAC\nGTA\nC\n")
+    assert "Sequence s1 is not written on lines of the same width" in str(err.value)
+
+
+def test_read_columns():
+    """
+    Test that a block of columns is read as codes, in the middle of wrapped lines
+    """
+    index = ualn.get_alignment_index(SMALL_ALN)
+    block = ualn.read_columns(SMALL_ALN, index, 3, 6)
+    exp = np.array([[3, 4, 0], [0, 4, 4], [3, 4, 0]], dtype=np.uint8)
+    assert np.array_equal(block, exp)
+    # lower case nucleotides are the same as upper case
+    index = ualn.get_alignment_index(b">s1\nacgtn\n")
+    assert ualn.read_columns(b">s1\nacgtn\n", index, 0, 5).tolist() == [[0, 1, 2, 3, 4]]
+
+
+def test_column_masks():
+    """
+    Test classification of columns
+    """
+    index = ualn.get_alignment_index(SMALL_ALN)
+    counts = ualn.get_state_counts(ualn.read_columns(SMALL_ALN, index, 0, 7))
+    assert counts[:, 3].tolist() == [1, 0, 0, 2]
+    masks = ualn.get_column_masks(counts)
+    assert masks["allgap"].tolist() == [False, False, False, False, True, False, False]
+    assert masks["constant"].tolist() == [True, True, False, False, False, True, True]
+    assert masks["variable"].tolist() == [False, False, True, True, False, False, False]
+    assert masks["informative"].tolist() == [False] * 7
+    assert ualn.get_kept_columns(masks, "nogap").sum() == 6
+
+
+def test_filter_columns():
+    """
+    Test that only kept columns are written, whatever the size of blocks, and that removed
+    columns are counted in the info file
+    """
+    alnfile = os.path.join(GENEPATH, "small.aln")
+    with open(alnfile, "wb") as alnf:
+        alnf.write(SMALL_ALN)
+    outfile = os.path.join(GENEPATH, "small.variable.aln")
+    for block_size in [3, 6, 100]:
+        info = ualn.filter_columns(alnfile, outfile, "variable", block_size=block_size)
+        with open(outfile) as outf:
+            assert outf.read() == ">s1\nGT\n>s2\nGA\n>s3\nTT\n"
+        assert info["kept_columns"] == 2
+        assert info["allgap_columns"] == 1
+        assert info["constant_columns"] == 4
+        assert (info["constant_A"], info["constant_C"]) == (2, 2)
+        assert (info["constant_G"], info["constant_T"]) == (0, 0)
+    with open(os.path.join(GENEPATH, "small.variable.info")) as inff:
+        lines = inff.read().split("\n")
+    assert lines[:4] == ["filter\tvariable", "sequences\t3", "columns\t7", "kept_columns\t2"]
+    info = ualn.filter_columns(alnfile, outfile, "nogap")
+    with open(outfile) as outf:
+        assert outf.read() == ">s1\nACGTAC\n>s2\nACGANC\n>s3\nACTTA-\n"
+    assert info["kept_columns"] == 6
+
+
+def test_filter_columns_grp():
+    """
+    Test filtering the alignment of persistent families of 4 genomes: the number of columns
+    of each kind must sum to the number of columns, and informative columns are a subset of
+    variable ones
+    """
+    outfile = os.path.join(GENEPATH, "grp.informative.aln")
+    info = ualn.filter_columns(GRP_ALN, outfile, "informative", block_size=1000)
+    assert info["columns"] == 6438
+    assert (info["allgap_columns"] + info["constant_columns"]
+            + info["variable_columns"]) == info["columns"]
+    assert info["kept_columns"] == info["informative_columns"]
+    assert info["informative_columns"] <= info["variable_columns"]
+    assert sum(info[f"constant_{base}"] for base in "ACGT") == info["constant_columns"]
+    index = ualn.get_alignment_index(open(outfile, "rb").read())
+    assert index[3] == info["kept_columns"]
+
+
+def test_site_patterns():
+    """
+    Test that identical columns are merged into 1 pattern, whatever the size of blocks, and
+    that weights sum to the number of columns
+    """
+    alnfile = os.path.join(GENEPATH, "patterns.aln")
+    with open(alnfile, "wb") as alnf:
+        alnf.write(b">a\nACAAC\nAc\n>b\nACAAT\nAC\n")
+    for block_size in [2, 6, 100]:
+        names, patterns, weights = ualn.get_site_patterns(alnfile, block_size=block_size)
+        assert names == ["a", "b"]
+        found = sorted((tuple(col.tolist()), int(weight))
+                       for col, weight in zip(patterns.T, weights))
+        # columns 1, 3, 4, 6 are A/A, columns 2 and 7 are C/C
+        assert found == [((0, 0), 4), ((1, 1), 2), ((1, 3), 1)]
+    _, patterns, weights = ualn.get_site_patterns(GRP_ALN, block_size=1000)
+    assert weights.sum() == 6438
+    assert patterns.shape == (4, len(weights))
+    assert len(np.unique(patterns.T, axis=0)) == len(weights)
+
+
+def test_site_patterns_collisions(monkeypatch):
+    """
+    Test that columns having the same hash are still different patterns, and that the
+    patterns found are the same as with distinct hashes
+    """
+    exp = ualn.get_site_patterns(GRP_ALN, block_size=1000)
+    assert len(set(ualn.get_column_hashes(exp[1].T).tolist())) == len(exp[2])
+    # All columns have the same hash
+    monkeypatch.setattr(ualn, "get_column_hashes",
+                        lambda columns: np.zeros(len(columns), dtype=np.uint64))
+    names, patterns, weights = ualn.get_site_patterns(GRP_ALN, block_size=1000)
+    assert names == exp[0]
+    assert np.array_equal(patterns, exp[1])
+    assert np.array_equal(weights, exp[2])
+
+
+def test_distances():
+    """
+    Test p-distance, JC69 and K2P distances on the small alignment: pairs are compared only
+    on sites where both sequences have a nucleotide
+    """
+    alnfile = os.path.join(GENEPATH, "small.aln")
+    with open(alnfile, "wb") as alnf:
+        alnf.write(SMALL_ALN)
+    names, patterns, weights = ualn.get_site_patterns(alnfile)
+    assert names == ["s1", "s2", "s3"]
+    counts = ualn.get_pair_counts(patterns, weights, threads=2)
+    # s1/s2: 5 sites in common, 1 difference (T/A: transversion)
+    # s2/s3: 4 sites in common, 2 differences (G/T, A/T: transversions)
+    assert counts[0].tolist() == [[6, 5, 5], [5, 5, 4], [5, 4, 5]]
+    assert counts[1][0, 1] == 4
+    assert counts[2].sum() == 0
+    dist, nb_undef = ualn.get_distances(counts, "p-distance")
+    assert np.allclose(dist, [[0, 0.2, 0.2], [0.2, 0, 0.5], [0.2, 0.5, 0]])
+    assert nb_undef == 0
+    dist, nb_undef = ualn.get_distances(counts, "JC69")
+    assert dist[0, 1] == pytest.approx(-0.75 * np.log(1 - 4 * 0.2 / 3))
+    assert nb_undef == 0
+    # K2P for s2/s3: 2Q = 1 -> undefined distance
+    dist, nb_undef = ualn.get_distances(counts, "K2P")
+    assert dist[0, 1] == pytest.approx(-0.5 * np.log(0.8) - 0.25 * np.log(0.6))
+    assert dist[1, 2] == dist[2, 1] == ualn.MAX_DISTANCE
+    assert nb_undef == 1
+    assert np.all(np.diag(dist) == 0)
+
+
+def test_pair_counts_blocks():
+    """
+    Test that counts do not depend on the number of threads nor on the size of blocks
+    """
+    _, patterns, weights = ualn.get_site_patterns(GRP_ALN)
+    ref = ualn.get_pair_counts(patterns, weights)
+    for threads, block_size in [(3, 10), (4, 1000), (10, 10**6)]:
+        counts = ualn.get_pair_counts(patterns, weights, threads, block_size)
+        for exp, found in zip(ref, counts):
+            assert np.array_equal(exp, found)
+    # Valid sites of a sequence with itself: its number of nucleotides
+    with open(GRP_ALN) as alnf:
+        seq = alnf.read().split(">")[1].split("\n", 1)[1].replace("\n", "")
+    assert ref[0][0, 0] == sum(seq.upper().count(base) for base in "ACGT")
+
+
+def test_write_distances():
+    """
+    Test that the distance matrix of the alignment of persistent families is written in
+    PHYLIP square format
+    """
+    outfile = os.path.join(GENEPATH, "grp.dist")
+    nbcol, nbpat, nb_undef = ualn.write_distances(GRP_ALN, outfile, "JC69", threads=2)
+    assert nbcol == 6438
+    assert nbpat < nbcol
+    assert nb_undef == 0
+    with open(outfile) as outf:
+        lines = outf.read().split("\n")
+    assert lines[0] == "4"
+    assert lines[-1] == ""
+    rows = [line.split() for line in lines[1:-1]]
+    assert [row[0] for row in rows] == ["GEN2.1017.00001", "GEN4.1111.00001",
+                                        "GENO.1017.00001", "GENO.1216.00002"]
+    matrix = np.array([[float(val) for val in row[1:]] for row in rows])
+    assert np.allclose(matrix, matrix.T)
+    assert np.all(np.diag(matrix) == 0)
+    assert np.all(matrix[~np.eye(4, dtype=bool)] > 0)
+
+
+def test_write_phylip():
+    """
+    Test converting the alignment of persistent families to PHYLIP-relaxed format, whatever
+    the size of blocks
+    """
+    alnfile = os.path.join(GENEPATH, "grp.aln")
+    tutil.reorder_fasta(GRP_ALN, alnfile, EXP_ORDER)
+    outfile = os.path.join(GENEPATH, "grp.phylip")
+    for block_size in [10, 1000, 2**26]:
+        ualn.write_phylip(alnfile, outfile, block_size=block_size)
+        with open(outfile) as outf, open(os.path.join(TREE_EXP, "exp_align_phylip.ph")) as expf:
+            assert outf.read() == expf.read()
+
+
+def test_write_phylip_last_block():
+    """
+    Test PHYLIP format when the last block has less than 50 columns, for wrapped sequences
+    """
+    alnfile = os.path.join(GENEPATH, "small.aln")
+    seq1 = "ACGT" * 18
+    seq2 = "TG-A" * 18
+    with open(alnfile, "w") as alnf:
+        alnf.write(f">s1\n{seq1[:60]}\n{seq1[60:]}\n>long_name\n{seq2[:60]}\n{seq2[60:]}\n")
+    outfile = os.path.join(GENEPATH, "small.phylip")
+    ualn.write_phylip(alnfile, outfile, block_size=10)
+    groups1 = " ".join(seq1[pos:pos + 10] for pos in range(0, 50, 10))
+    groups2 = " ".join(seq2[pos:pos + 10] for pos in range(0, 50, 10))
+    exp = (" 2 72\n"
+           f"s1         {groups1}\n"
+           f"long_name  {groups2}\n"
+           "\n"
+           f"           {seq1[50:60]} {seq1[60:70]} {seq1[70:]}\n"
+           f"           {seq2[50:60]} {seq2[60:70]} {seq2[70:]}\n")
+    with open(outfile) as outf:
+        assert outf.read() == exp
+
+
+def test_write_stockholm():
+    """
+    Test converting the alignment of persistent families to Stockholm format, whatever the
+    size of blocks
+    """
+    alnfile = os.path.join(GENEPATH, "grp.aln")
+    tutil.reorder_fasta(GRP_ALN, alnfile, EXP_ORDER)
+    outfile = os.path.join(GENEPATH, "grp.stk")
+    for block_size in [100, 2**26]:
+        ualn.write_stockholm(alnfile, outfile, block_size=block_size)
+        with open(outfile) as outf, open(os.path.join(TREE_EXP,
+                                                      "exp_align_stockholm.stk")) as expf:
+            assert outf.read() == expf.read()
+    # Sequences are written in the order of the input alignment
+    ualn.write_stockholm(GRP_ALN, outfile)
+    with open(outfile) as outf:
+        names = [line.split()[0] for line in outf if line[0] not in "#/"]
+    assert names == ["GEN2.1017.00001", "GEN4.1111.00001", "GENO.1017.00001", "GENO.1216.00002"]
+
+
+def test_write_formats_errors():
+    """
+    Test that an empty alignment, or an alignment with duplicate names, raises a ValueError
+    """
+    alnfile = os.path.join(GENEPATH, "wrong.aln")
+    outfile = os.path.join(GENEPATH, "wrong.out")
+    open(alnfile, "w").close()
+    with pytest.raises(ValueError) as err:
+        ualn.write_phylip(alnfile, outfile)
+    assert "wrong.aln is empty" in str(err.value)
+    with open(alnfile, "w") as alnf:
+        alnf.write(">s1\nAC\n>s2\nAC\n>s1\nAA\n")
+    with pytest.raises(ValueError) as err:
+        ualn.write_stockholm(alnfile, outfile)
+    assert "Several sequences are named 's1': cannot write it in Stockholm format" in str(err.value)
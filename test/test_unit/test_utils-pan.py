@@ -446,4 +446,65 @@ def test_read_lstinfo_nofile(caplog):
     with pytest.raises(SystemExit):
         upan.read_lstinfo("non-existing-file.txt", logger)
     assert ("non-existing-file.txt file not found") in caplog.text
-    
\ No newline at end of file
+    
+
+def test_build_count_matrix():
+    """
+    Build the sparse count matrix (families x genomes) from families sorted by strain
+    """
+    matrix, fam_nums = upan.build_count_matrix(FAMS_BY_STRAIN, ALL_STRAINS)
+    assert fam_nums == [str(num) for num in range(1, 17)]
+    assert matrix.shape == (16, 4)
+    assert matrix.format == "csr"
+    dense = matrix.toarray()
+    assert list(dense[0]) == [1, 1, 1, 1]
+    assert list(dense[3]) == [1, 1, 1, 2]
+    assert list(dense[7]) == [1, 1, 2, 1]
+    assert list(dense[15]) == [0, 0, 0, 1]
+    # Only non-zero cells are stored
+    assert matrix.nnz == 43
+
+
+def test_write_load_sparse_npz():
+    """
+    Save count matrix in npz format, and check that it is loaded back with its family
+    numbers and genome names. The file can also be read by scipy directly.
+    """
+    from scipy import sparse
+    matrix, fam_nums = upan.build_count_matrix(FAMS_BY_STRAIN, ALL_STRAINS)
+    outbase = os.path.join(GENEPATH, "test_sparse.quanti")
+    outfile = upan.write_sparse_matrix(matrix, fam_nums, ALL_STRAINS, outbase, "npz")
+    assert outfile == outbase + ".npz"
+    mat, fams, genomes = upan.load_sparse_matrix(outfile)
+    assert fams == fam_nums
+    assert genomes == ALL_STRAINS
+    assert (mat != matrix).nnz == 0
+    assert (sparse.load_npz(outfile) != matrix).nnz == 0
+
+
+def test_write_load_sparse_mtx():
+    """
+    Save count matrix in Matrix Market format, with files containing family numbers
+    and genome names, and load it back
+    """
+    matrix, fam_nums = upan.build_count_matrix(FAMS_BY_STRAIN, ALL_STRAINS)
+    outbase = os.path.join(GENEPATH, "test_sparse.quanti")
+    outfile = upan.write_sparse_matrix(matrix, fam_nums, ALL_STRAINS, outbase, "mtx")
+    assert outfile == outbase + ".mtx"
+    assert os.path.isfile(outbase + ".families.txt")
+    assert os.path.isfile(outbase + ".genomes.txt")
+    mat, fams, genomes = upan.load_sparse_matrix(outfile)
+    assert fams == fam_nums
+    assert genomes == ALL_STRAINS
+    assert (mat != matrix).nnz == 0
+
+
+def test_load_sparse_wrongext(caplog):
+    """
+    Loading a sparse matrix from a file which is not npz nor mtx: error
+    """
+    matfile = os.path.join(GENEPATH, "matrix.txt")
+    open(matfile, "w").close()
+    with pytest.raises(SystemExit):
+        upan.load_sparse_matrix(matfile)
+    assert "unknown sparse matrix format" in caplog.text
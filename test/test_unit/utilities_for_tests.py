@@ -102,3 +102,20 @@ def compare_file_to_list(file1, exp):
         print("Not same lines")
         return False
     return True
+
+
+def reorder_fasta(infile, outfile, names):
+    """
+    Write the sequences of fasta file 'infile' to 'outfile', in the order given by 'names'
+    """
+    seqs = {}
+    with open(infile, "r") as inf:
+        for line in inf:
+            if line.startswith(">"):
+                name = line[1:].strip()
+                seqs[name] = []
+            else:
+                seqs[name].append(line)
+    with open(outfile, "w") as outf:
+        for name in names:
+            outf.write(f">{name}\n{''.join(seqs[name])}")